@@ -0,0 +1,104 @@
+"""
+Sizing the swarm to hold a target request rate.
+
+An autoscaled attack runs in time buckets.  In each bucket every active
+bee fires for most of the bucket, reporting how busy its CPU was, and the
+controller compares the swarm's rate with the target.  Assuming each
+concurrent connection carries a steady share of the rate, the total
+concurrency needed follows directly; how many bees should carry it
+follows from how busy they were, so the swarm grows when bees saturate
+and shrinks when they idle.  Changes take effect at the next bucket
+boundary.
+"""
+
+import math
+import re
+
+
+# printed by a bee on stderr before and after firing: the cpu line of /proc/stat
+CPU_MARKER = 'bees-cpu:'
+
+CPU_SAMPLE_COMMAND = "sed -n 's/^cpu  */%s /p' /proc/stat >&2" % CPU_MARKER
+
+# CPU busy fraction above which a bee counts as saturated
+SATURATED = 0.85
+
+# how close to the target counts as on target
+TOLERANCE = 0.05
+
+# the most the concurrency, or the number of bees, changes by in one
+# bucket, either way
+MAX_STEP = 2.0
+
+
+def get_sampled_command(command):
+    """
+    Wrap a tester command so the bee reports its CPU counters on stderr
+    before and after it.
+    """
+    return '%s && %s; %s' % (CPU_SAMPLE_COMMAND, command, CPU_SAMPLE_COMMAND)
+
+
+def parse_cpu_busy(output):
+    """
+    @return: the fraction of CPU time the bee was busy while firing, or
+        None if the output does not have both samples
+    """
+    samples = re.findall(re.escape(CPU_MARKER) + r'((?:\s+\d+)+)', output)
+    if len(samples) < 2:
+        return None
+    before, after = [[int(f) for f in s.split()] for s in (samples[0], samples[-1])]
+    deltas = [a - b for a, b in zip(after, before)]
+    total = sum(deltas[:8])
+    if total <= 0:
+        return None
+    # idle and iowait
+    return 1.0 - float(sum(deltas[3:5])) / total
+
+
+def plan(target_rps, achieved_rps, bees, concurrency, busy, max_bees):
+    """
+    Size the swarm for the next bucket.
+
+    @param target_rps: the rate to hold
+    @param achieved_rps: the swarm's rate in the last bucket
+    @param bees: how many bees fired in the last bucket
+    @param concurrency: each bee's concurrency in the last bucket
+    @param busy: the bees' mean CPU busy fraction, or None if unknown
+    @param max_bees: the most bees the swarm may grow to
+    @return: (bees, concurrency per bee) for the next bucket
+    """
+    if bees and abs(achieved_rps - target_rps) <= target_rps * TOLERANCE:
+        return (bees, concurrency)
+
+    if achieved_rps > 0:
+        step = min(MAX_STEP, max(1.0 / MAX_STEP, float(target_rps) / achieved_rps))
+    else:
+        step = MAX_STEP
+    total = max(1, int(math.ceil(bees * concurrency * step)))
+
+    # the concurrency one bee carries before it saturates
+    if busy:
+        per_bee = max(1, int(concurrency * SATURATED / busy))
+    else:
+        per_bee = concurrency
+
+    wanted = int(math.ceil(float(total) / per_bee))
+    wanted = max(1, int(math.ceil(bees / MAX_STEP)), min(max_bees, wanted))
+    concurrency = max(1, int(math.ceil(float(total) / wanted)))
+    if busy:
+        # rather short of the target than measuring saturated bees
+        concurrency = min(concurrency, per_bee)
+    return (wanted, concurrency)
+
+
+def next_boundary(first, bucket, earliest):
+    """
+    @param first: the first bucket's start, epoch seconds
+    @param bucket: bucket length in seconds
+    @param earliest: the earliest the next bucket could start
+    @return: the start of the first bucket beginning at or after earliest
+    """
+    if earliest <= first:
+        return first
+    return first + math.ceil((earliest - first) / bucket) * bucket
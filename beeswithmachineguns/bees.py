@@ -26,90 +26,164 @@ THE SOFTWARE.
 
 import logging
 import hashlib
-from multiprocessing import Pool
+import json
+import math
 import os
+import Queue
 import re
+import shutil
 import socket
 import sys
+import threading
 import time
-import urllib2
+import tempfile
 import urlparse
+import zipfile
 
-import boto, boto.ec2
-from boto.s3.key import Key
-import paramiko
+# boto, paramiko and multiprocessing are imported where they are used, so
+# that commands which do not need them (and the Swarm API) start quickly
 
-from tester import ABTester, SiegeTester, TesterResult, WideloadTester, get_aggregate_result
+import autoscale
+import breakdown
+import capacity
+import clock
+import exemplars
+from histogram import Histogram, merge_all
+import local
+import metrics
+import soak
+from tester import ENGINES, ConnectionModel, ScenarioTester, ScheduleTester, TesterResult, get_aggregate_result, get_seconds
+from tracing import NullTracer, Tracer
 
 
 STATE_FILENAME = os.path.expanduser('~/.bees')
 
-# Utilities
+# where the controller checkpoints a soak attack
+SOAK_FILENAME = os.path.expanduser('~/.bees-soak')
+
+# seconds past a soak's end after which a bee that cannot be reached is
+# given up on
+SOAK_GRACE = 600
+
+# the longest a round of pulls from the bees may take
+PULL_TIMEOUT = 3600
+
+# how long the controller waits for every bee to arm before firing anyway
+ARM_TIMEOUT = 300
+
+# seconds between the last bee arming and the synchronized start
+FIRE_LEAD = 2.0
 
-def _read_server_list():
-    instance_ids = []
+# runs the relay entry point on a relay bee
+BEE_MODULE_COMMAND = 'PYTHONPATH=bees.zip python -m beeswithmachineguns.%s'
 
-    if not os.path.isfile(STATE_FILENAME):
-        return (None, None, None, None)
+RELAY_COMMAND = BEE_MODULE_COMMAND % 'relay'
 
-    with open(STATE_FILENAME, 'r') as f:
-        region = f.readline().strip()
-        username = f.readline().strip()
-        key_name = f.readline().strip()
-        text = f.read()
-        instance_ids = text.split('\n')
+# pinned hosts are marked so they can be removed after the attack
+PIN_HOSTS_COMMAND = "sudo -n sh -c 'echo \"%s %s # bees-pinned\" >> /etc/hosts'"
 
-        logging.debug('Read %i bees from the roster.' % len(instance_ids))
+UNPIN_HOSTS_COMMAND = "sudo -n sed -i '/ # bees-pinned$/d' /etc/hosts"
 
-    return (region, username, key_name, instance_ids)
+# prefix of the line on which a relay prints its merged result
+RELAY_RESULT_MARKER = 'bees-relay-result:'
 
-def _write_server_list(region, username, key_name, instances):
-    with open(STATE_FILENAME, 'w') as f:
-        f.write('%s\n' % region)
-        f.write('%s\n' % username)
-        f.write('%s\n' % key_name)
-        f.write('\n'.join([instance.id for instance in instances]))
+# trace pids for relays, clear of the bees' pids
+RELAY_PID_BASE = 100000
 
-def _delete_server_list():
-    os.remove(STATE_FILENAME)
+# how long started or fresh bees get to become ready before they are replaced
+READY_TIMEOUT = 600
+
+# written by the user data script once a bee is provisioned
+READY_COMMAND = 'test -f ready && echo ready'
+
+# Utilities
 
 def _get_pem_path(key):
     return os.path.expanduser('~/.ssh/%s.pem' % key)
 
-# Methods
+def _connect_ec2(region):
+    import boto.ec2
+    return boto.ec2.connect_to_region(region)
 
-def up(count, group, zone, image_id, instance_type, username, key_name, siege_keepalive):
+def get_zones(region):
     """
-    Startup the load testing server.
+    @return: the names of the region's available zones
     """
-    existing_region, existing_username, existing_key_name, instance_ids = _read_server_list()
-
-    if instance_ids:
-        logging.warning('Bees are already assembled and awaiting orders.')
-        return
+    return sorted(z.name for z in _connect_ec2(region).get_all_zones() if z.state == 'available')
 
-    count = int(count)
+def _get_instances(region, instance_ids):
+    """
+    Look up the roster's instances, from EC2 or the local provider.
+    """
+    if region == local.LOCAL_REGION:
+        return local.get_instances(instance_ids)
 
-    pem_path = _get_pem_path(key_name)
+    ec2_connection = _connect_ec2(region)
 
-    if not os.path.isfile(pem_path):
-        logging.error('No key file found at %s' % pem_path)
-        return
+    # filtering, unlike asking for the ids, does not fail on missing bees
+    reservations = ec2_connection.get_all_instances(filters={'instance-id': instance_ids})
 
-    logging.info('Connecting to the hive.')
+    instances = []
 
-    region = zone[:-1]
-    ec2_connection = boto.ec2.connect_to_region(region)
+    for reservation in reservations:
+        instances.extend(reservation.instances)
 
-    logging.info('Attempting to call up %i bees.' % count)
+    return instances
 
+def _connect(params):
+    """
+    Open a connection to a bee, over ssh or to a local bee.
+    """
+    if params.get('region') == local.LOCAL_REGION:
+        client = local.LocalClient()
+        client.connect(params['instance_name'])
+        return client
+
+    import paramiko
+    client = paramiko.SSHClient()
+    client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+    client.connect(
+        params['instance_name'],
+        username=params['username'],
+        key_filename=_get_pem_path(params['key_name']))
+    return client
+
+def _build_package_zip(filename):
+    """
+    Zip up this package so bees can run its modules with
+    PYTHONPATH=bees.zip.
+    """
+    package_dir = os.path.dirname(os.path.abspath(__file__))
+    with zipfile.ZipFile(filename, 'w', zipfile.ZIP_DEFLATED) as z:
+        for name in sorted(os.listdir(package_dir)):
+            if name.endswith('.py'):
+                z.write(os.path.join(package_dir, name), 'beeswithmachineguns/%s' % name)
+    return filename
+
+def _stage_file(client, local_path, remote_path, ident, mode=0644):
+    """
+    Copy a file to a bee unless an identical copy is already there.
+    """
+    md5 = hashlib.md5(open(local_path, 'rb').read()).hexdigest()
+    stdin, stdout, stderr = _exec_command_blocking(client, 'md5sum %s' % remote_path, ident)
+    if stdout.read().split(' ')[0] != md5:
+        sftp = client.open_sftp()
+        sftp.put(local_path, remote_path)
+        sftp.chmod(remote_path, mode)
+        sftp.close()
+
+def _get_user_data(username, siege_keepalive):
+    """
+    @return: the script which provisions a new bee
+    """
     user_data="""#!/bin/sh
 
 set -e -x
 
 echo 'starting'
 apt-get --yes --quiet update
-apt-get --yes --quiet install gcc siege apache2-utils
+apt-get --yes --quiet install gcc siege apache2-utils python-boto python-paramiko
+apt-get --yes --quiet install nghttp2-client || echo 'h2load is not available'
 
 echo 'maxing out tcp/network limits'
 
@@ -124,6 +198,8 @@ sysctl -w net.core.rmem_max='16777216';
 sysctl -w net.core.wmem_max='16777216';
 sysctl -w net.ipv4.tcp_rmem='4096 87380 16777216';
 sysctl -w net.ipv4.tcp_wmem='4096 65536 16777216';
+sysctl -w fs.file-max='2097152';
+echo '* - nofile 1048576' > /etc/security/limits.d/beeswithmachineguns.conf
 
 echo 'installing stuff'"""
 
@@ -134,82 +210,972 @@ echo "connection = keep-alive" > /home/%(username)s/.siegerc"""
     user_data += """
 touch /home/%(username)s/ready"""
 
-    user_data = user_data % {'username': username}
+    return user_data % {'username': username}
 
-    reservation = ec2_connection.run_instances(
-        image_id=image_id,
-        min_count=count,
-        max_count=count,
-        key_name=key_name,
-        security_groups=[group],
-        instance_type=instance_type,
-        user_data=user_data,
-        placement=zone)
 
-    logging.info('Waiting for bees to load their machine guns...')
+def _run_batch(region, count, group, zone, image_id, instance_type, user_data, key_name, tracer):
+    """
+    Run up to count new EC2 bees in one request, and tag them.
 
-    instance_ids = []
+    @return: list of the new instances, fewer than count if the zone
+        could only launch some of them
+    @raise provision.CapacityError: if it could launch none
+    """
+    from boto.exception import EC2ResponseError
+    from provision import CAPACITY_ERRORS, CapacityError
 
-    for instance in reservation.instances:
-        while instance.state != 'running':
-            logging.debug('.')
-            time.sleep(5)
-            instance.update()
+    ec2_connection = _connect_ec2(region)
+    try:
+        with tracer.span('run_instances', count=count, zone=zone, instance_type=instance_type):
+            reservation = ec2_connection.run_instances(
+                image_id=image_id,
+                min_count=1,
+                max_count=count,
+                key_name=key_name,
+                security_groups=[group],
+                instance_type=instance_type,
+                user_data=user_data,
+                placement=zone)
+    except EC2ResponseError, e:
+        if e.error_code in CAPACITY_ERRORS:
+            logging.warning('No capacity for %i %s bees in %s: %s' % (count, instance_type, zone or region, e.error_code))
+            raise CapacityError(e.error_code)
+        raise
+
+    instances = reservation.instances
+    if len(instances) < count:
+        logging.warning('Only %i of %i %s bees could be called up in %s.' % (len(instances), count, instance_type, zone or region))
+
+    # new instances may not be visible to every endpoint yet
+    with tracer.span('create_tags'):
+        for attempt in range(5):
+            try:
+                ec2_connection.create_tags([i.id for i in instances], { "Name": "load testing bee (beeswithmachineguns)!" })
+                break
+            except EC2ResponseError, e:
+                logging.debug('Could not tag the bees yet: %s' % e)
+                time.sleep(2)
 
-        instance_ids.append(instance.id)
+    return instances
 
-        logging.info('Bee %s is ready for the attack.' % instance.id)
 
-    ec2_connection.create_tags(instance_ids, { "Name": "load testing bee (beeswithmachineguns)!" })
+def _call_up(ec2_connection, count, group, zone, image_id, instance_type, username, key_name, siege_keepalive, tracer, fallback_zones=(), fallback_types=(), batch=None, quorum=None):
+    """
+    Run count new EC2 bees, in batches requested at once, and wait for a
+    quorum of them to be running.
+
+    Each batch asks the zone for the instance type first, then the
+    fallback zones and types, for whatever is still missing; see
+    L{provision}.
+
+    @return: list of the new instances, including those not running yet
+    """
+    import provision
+    from multiprocessing.pool import ThreadPool
+
+    logging.info('Attempting to call up %i bees.' % count)
 
-    _write_server_list(region, username, key_name, reservation.instances)
+    user_data = _get_user_data(username, siege_keepalive)
+    region = ec2_connection.region.name
+    placements = provision.get_placements(zone, instance_type, fallback_zones, fallback_types)
+    exhausted = set()
 
-    logging.info('The swarm has assembled %i bees.' % len(reservation.instances))
+    def launch(zone, instance_type, count):
+        return _run_batch(region, count, group, zone, image_id, instance_type, user_data, key_name, tracer)
 
-def report():
+    batches = provision.get_batches(count, batch or provision.BATCH)
+    pool = ThreadPool(len(batches))
+    launched = pool.map(lambda size: provision.launch_batch(size, placements, launch, exhausted), batches)
+    pool.close()
+    instances = [i for batch_instances in launched for i in batch_instances]
+    if len(instances) < count:
+        logging.warning('Only %i of %i bees could be called up.' % (len(instances), count))
+    if not instances:
+        return []
+
+    logging.info('Waiting for bees to load their machine guns...')
+
+    needed = provision.get_needed(len(instances), quorum or provision.QUORUM)
+    deadline = time.time() + READY_TIMEOUT
+    with tracer.span('wait_running', count=len(instances)):
+        while True:
+            instances = ec2_connection.get_only_instances(instance_ids=[i.id for i in instances])
+            gone = [i.id for i in instances if i.state in ('shutting-down', 'terminated')]
+            if gone:
+                logging.warning('Bees %s were lost while starting.' % ', '.join(gone))
+                instances = [i for i in instances if i.id not in gone]
+            running = [i for i in instances if i.state == 'running']
+            if len(running) >= min(needed, len(instances)) or time.time() >= deadline:
+                break
+            logging.debug('%i of %i bees are running.' % (len(running), len(instances)))
+            time.sleep(5)
+
+    for instance in running:
+        logging.info('Bee %s is ready for the attack.' % instance.id)
+    if len(running) < len(instances):
+        logging.info('%i bees are still starting and will join the swarm as they come up.' % (len(instances) - len(running)))
+
+    return instances
+
+# Methods
+
+class Swarm(object):
     """
-    Report the status of the load testing servers.
+    A swarm of load testing servers: the roster of their region, login,
+    key and instance ids, and the commands for them.
+
+    The roster is kept in memory; with a state_filename it is also loaded
+    from and saved to that file, as the bees command does with ~/.bees.
+    Nothing is printed, attacks return an L{AttackResult}, so several
+    swarms can be driven (and attack at once) from one process.
+
+    With a history_filename, attacks are recorded in it for planning (see
+    L{planner.record}), as the bees command does in ~/.bees-history.  With
+    a profile_filename, calibrations are saved to it and attacks check
+    their load against it (see L{calibrate}), as the bees command does
+    with ~/.bees-profiles.
     """
-    region, username, key_name, instance_ids = _read_server_list()
 
-    if not instance_ids:
-        logging.info('No bees have been mobilized.')
-        return
+    def __init__(self, region=None, username=None, key_name=None, instance_ids=(), state_filename=None, history_filename=None, profile_filename=None):
+        self.region = region
+        self.username = username
+        self.key_name = key_name
+        self.instance_ids = list(instance_ids)
+        self.state_filename = state_filename
+        self.history_filename = history_filename
+        self.profile_filename = profile_filename
+        self._lock = threading.Lock()
+
+
+    @classmethod
+    def load(cls, state_filename=STATE_FILENAME):
+        """
+        @return: the swarm whose roster is saved in state_filename, which
+            is empty if there is no such file
+        """
+        swarm = cls(state_filename=state_filename)
+        if os.path.isfile(state_filename):
+            with open(state_filename, 'r') as f:
+                swarm.region = f.readline().strip()
+                swarm.username = f.readline().strip()
+                swarm.key_name = f.readline().strip()
+                swarm.instance_ids = [i for i in f.read().split('\n') if i]
+
+            logging.debug('Read %i bees from the roster.' % len(swarm.instance_ids))
+        return swarm
+
+
+    def _enlist(self, region, username, key_name, instances):
+        """
+        Make the instances the swarm's roster, saving it if there is a
+        state file.
+        """
+        with self._lock:
+            self.region, self.username, self.key_name = region, username, key_name
+            self.instance_ids = [instance.id for instance in instances]
+            self._save()
+
+
+    def _join(self, instances):
+        """
+        Add the instances to the swarm's roster, keeping the bees already
+        on it, saving it if there is a state file.
+        """
+        with self._lock:
+            self.instance_ids.extend(i.id for i in instances if i.id not in self.instance_ids)
+            self._save()
+
+
+    def _save(self):
+        """
+        Save the roster if there is a state file; called with the lock held.
+        """
+        if self.state_filename:
+            with open(self.state_filename, 'w') as f:
+                f.write('%s\n' % self.region)
+                f.write('%s\n' % self.username)
+                f.write('%s\n' % self.key_name)
+                f.write('\n'.join(self.instance_ids))
+
+
+    def _disband(self):
+        with self._lock:
+            self.instance_ids = []
+            if self.state_filename and os.path.isfile(self.state_filename):
+                os.remove(self.state_filename)
+
+
+    def up(self, count, group, zone, image_id, instance_type, username, key_name, siege_keepalive, tracer=None, local_bees=False, zones=None, fallback_zones=(), fallback_types=(), batch=None, quorum=None):
+        """
+        Startup the load testing server.
+
+        With local_bees, the bees are local processes instead of EC2 instances.
+        zones is an optional list of (zone, count), all in one region, to
+        spread the bees over instead of starting count in zone (see
+        L{planner.spread}).
+
+        The bees are called up in batches of at most batch, falling back to
+        the fallback zones and instance types where a zone runs short, and
+        the swarm is assembled once a quorum (a share, default all) of
+        them is running; the rest join the roster as they start, and
+        attacks use them once they are running.  See L{provision}.
+        """
+        tracer = tracer or NullTracer()
+
+        if self.instance_ids:
+            logging.warning('Bees are already assembled and awaiting orders (use "bees unpark" if they are parked).')
+            return
+
+        count = int(count)
+
+        if local_bees:
+            instances = local.up(count)
+            self._enlist(local.LOCAL_REGION, username, key_name or '', instances)
+            logging.info('The swarm has assembled %i local bees.' % len(instances))
+            return
+
+        pem_path = _get_pem_path(key_name)
+
+        if not os.path.isfile(pem_path):
+            logging.error('No key file found at %s' % pem_path)
+            return
+
+        logging.info('Connecting to the hive.')
+
+        zones = zones or [(zone, count)]
+        region = zones[0][0][:-1]
+        with tracer.span('ec2_connect'):
+            ec2_connection = _connect_ec2(region)
+
+        def call_up(placement):
+            zone, zone_count = placement
+            # the other zones of the spread take up any shortfall too
+            others = [z for z, c in zones if z != zone] + list(fallback_zones)
+            return _call_up(ec2_connection, zone_count, group, zone, image_id, instance_type, username, key_name,
+                            siege_keepalive, tracer, others, fallback_types, batch, quorum)
+
+        from multiprocessing.pool import ThreadPool
+        pool = ThreadPool(len(zones))
+        instances = [i for called in pool.map(call_up, zones) for i in called]
+        pool.close()
 
-    ec2_connection = boto.ec2.connect_to_region(region)
+        if not instances:
+            logging.error('No bees could be called up.')
+            return
 
-    reservations = ec2_connection.get_all_instances(instance_ids=instance_ids)
+        self._enlist(region, username, key_name, instances)
+
+        logging.info('The swarm has assembled %i of %i bees.' % (len(instances), count))
+
+
+    def report(self):
+        """
+        Report the status of the load testing servers.
 
-    instances = []
+        @return: list of the bees' instances
+        """
+        if not self.instance_ids:
+            logging.info('No bees have been mobilized.')
+            return []
+
+        instances = _get_instances(self.region, self.instance_ids)
 
-    for reservation in reservations:
-        instances.extend(reservation.instances)
+        for instance in instances:
+            logging.info('Bee %s: %s @ %s' % (instance.id, instance.state, instance.ip_address))
+        return instances
 
-    for instance in instances:
-        logging.info('Bee %s: %s @ %s' % (instance.id, instance.state, instance.ip_address))
 
-def down():
-    """
-    Shutdown the load testing server.
+    def down(self):
+        """
+        Shutdown the load testing server.
+        """
+        if not self.instance_ids:
+            logging.info('No bees have been mobilized.')
+            return
+
+        logging.info('Connecting to the hive.')
+
+        if self.region == local.LOCAL_REGION:
+            terminated_instance_ids = local.down(self.instance_ids)
+        else:
+            ec2_connection = _connect_ec2(self.region)
+
+            logging.info('Calling off the swarm.')
+
+            terminated_instance_ids = ec2_connection.terminate_instances(
+                instance_ids=self.instance_ids)
+
+        logging.info('Stood down %i bees.' % len(terminated_instance_ids))
+
+        self._disband()
+
+
+    def park(self):
+        """
+        Stop the load testing servers without terminating them, keeping them in
+        the roster so that unpark can bring them back in seconds.
+        """
+        region, instance_ids = self.region, self.instance_ids
+
+        if not instance_ids:
+            logging.info('No bees have been mobilized.')
+            return
+
+        if region == local.LOCAL_REGION:
+            parked_instance_ids = local.park(instance_ids)
+        else:
+            ec2_connection = _connect_ec2(region)
+            running = [i.id for i in _get_instances(region, instance_ids) if i.state in ('pending', 'running')]
+            parked_instance_ids = running and [i.id for i in ec2_connection.stop_instances(instance_ids=running)]
+
+        logging.info('Parked %i bees, they will keep until unparked or stood down.' % len(parked_instance_ids))
+
+
+    def unpark(self, group, zone, image_id, instance_type, siege_keepalive, tracer=None):
+        """
+        Start parked load testing servers and wait until they are ready.
+
+        Bees which have gone missing, or which do not become ready in time,
+        are replaced with fresh ones (using the given 'up' settings), so the
+        swarm comes back at its parked size.
+        """
+        tracer = tracer or NullTracer()
+
+        region, username, key_name, instance_ids = self.region, self.username, self.key_name, self.instance_ids
+
+        if not instance_ids:
+            logging.info('No bees are parked.')
+            return
+
+        logging.info('Connecting to the hive.')
+
+        with tracer.span('ec2_describe', count=len(instance_ids)):
+            instances = _get_instances(region, instance_ids)
+
+        if region == local.LOCAL_REGION:
+            ec2_connection = None
+            with tracer.span('start_instances'):
+                local.unpark(instance_ids)
+        else:
+            ec2_connection = _connect_ec2(region)
+            with tracer.span('start_instances'):
+                _start_instances(ec2_connection, instances)
+
+        with tracer.span('wait_ready', count=len(instances)):
+            ready = _wait_for_ready(region, username, key_name,
+                                    [i for i in instances if i.state in ('pending', 'running')])
+
+        _stand_down_unready(ec2_connection, [i for i in instances if i.state in ('pending', 'running')], ready)
+
+        missing = len(instance_ids) - len(ready)
+        if missing:
+            logging.info('Calling up %i fresh bees to replace the ones that are gone.' % missing)
+            if ec2_connection:
+                fresh = _call_up(ec2_connection, missing, group, (zone.startswith(region) and zone) or None,
+                                 image_id, instance_type, username, key_name, siege_keepalive, tracer)
+            else:
+                fresh = local.up(missing, exclude=instance_ids)
+            with tracer.span('wait_ready', count=len(fresh)):
+                fresh_ready = _wait_for_ready(region, username, key_name, fresh)
+            _stand_down_unready(ec2_connection, fresh, fresh_ready)
+            ready.extend(fresh_ready)
+
+        self._enlist(region, username, key_name, ready)
+
+        logging.info('The swarm has reassembled %i of %i bees.' % (len(ready), len(instance_ids)))
+
+    def attack(self, url, url_file=None, n=1000, c=100, keepalive=False, engine='ab', time=None, sync=True, tracer=None, relays=0, warmup=None, connection=None, autoscaling=None, slo=None, scrape=None, scenario=None, soak=None, corpus=None, preflight=False, request=None, schedule=None):
+        """
+        Test the root url of this site.
+
+        With sync, every bee stages and arms first and they all start firing
+        together at a common time.  With relays, that many bees are used as
+        relays which each command a share of the rest of the swarm, so the
+        controller only talks to the relays.
+
+        warmup is an optional dict: each bee sends 'requests' warm-up requests
+        before the attack, drawn from a random 'sample' of that many urls from
+        the url file if given, after resolving the target hosts and pinning
+        them in /etc/hosts if 'pin_dns' is set.
+
+        connection is an optional L{ConnectionModel} with connection settings
+        beyond keepalive, applied by the engines which support them.  Its
+        ramp_rate is for the whole swarm, like c.
+
+        autoscaling is an optional dict which makes the attack hold a
+        'target_rps' for the given time, in buckets of 'bucket' seconds,
+        growing the swarm up to 'max_bees' (calling up fresh bees with the
+        'up' dict of up() settings) and shrinking it as needed; see
+        L{_autoscale_attack}.
+
+        slo is an optional dict which turns the attack into a capacity search
+        for the highest total concurrency at which the 99th percentile stays
+        within 'p99' ms and the fraction of errors within 'errors'; see
+        L{_capacity_search}.
+
+        scrape is an optional dict of metrics 'sources' (see L{metrics.fetch})
+        to scrape every 'interval' seconds while the bees fire; the
+        samples are kept with the results, and the target's 'cpu' and
+        'queue' metrics are summarized over each of the attack's time
+        buckets (see L{_get_timeline}).
+
+        scenario is the plan (see L{scenario.compile_scenario}) the scenario
+        engine runs: c virtual users in all go through its flows, and n
+        counts their requests across every step.
+
+        soak is an optional dict which makes the attack a soak: the bees
+        fire for the given time in the background, in segments of
+        'segment' seconds, and the controller pulls and merges their
+        results into the 'checkpoint' file (default L{SOAK_FILENAME}) as it
+        goes; see L{soak} and L{reattach}.
+
+        corpus is an optional dict for a url_file which is a url corpus
+        (see L{corpus}): each bee fires at a 'sample' of that many of its
+        urls, in 'order' (weighted, random or sequential).
+
+        With preflight, each bee's limits are checked (and tuned where the
+        bee allows) before the attack, and c is shared between the bees
+        within what each can hold; see L{_preflight_swarm}.
+
+        If the bees were calibrated (see L{calibrate}), the attack warns
+        when its load is more than, or near, what they can fire.
+
+        request is an optional L{template.Request}: the method, headers and
+        body the engines which support it (see L{Tester.supports_request})
+        send instead of a plain GET.  Templates whose requests vary run as
+        scenarios instead; see L{template}.
+
+        schedule is an optional dict for the schedule engine: each bee
+        replays its share of the requests (n, or the 'rate' for the time),
+        drawn from the url file in 'order' and paced at the swarm's 'rate'
+        (requests per second, None for as fast as it can) from the 'seed'
+        (see L{schedule.deal}).  The attack is not fired if the schedules'
+        digest is not the 'digest' given.
+
+        @return: an L{AttackResult}, or None if the attack could not start
+            (or a soak was no longer followed)
+        """
+        tracer = tracer or NullTracer()
+        engine = engine or 'ab'
+
+        if connection is None:
+            connection = ConnectionModel(keepalive=bool(keepalive))
+        for option in ENGINES[engine]().get_unsupported(connection):
+            logging.warning('%s does not support the %s connection setting, ignoring it.' % (engine, option))
+
+        region, username, key_name, instance_ids = self.region, self.username, self.key_name, self.instance_ids
+
+        if not instance_ids:
+            logging.info('No bees are ready to attack.')
+            return None
+
+        logging.info('Connecting to the hive.')
+
+        logging.info('Assembling bees.')
+
+        with tracer.span('ec2_describe', count=len(instance_ids)):
+            instances = _get_instances(region, instance_ids)
+
+        parked = [i for i in instances if i.state in ('stopping', 'stopped')]
+        if parked:
+            logging.error('%i bees are parked, run "bees unpark" before attacking.' % len(parked))
+            return None
+
+        # the bees still starting stay on the roster (instance_ids), they
+        # just do not fire
+        starting = [i for i in instances if i.state == 'pending']
+        if starting:
+            logging.info('%i bees are still starting, attacking without them.' % len(starting))
+            instances = [i for i in instances if i.state != 'pending']
+            if not instances:
+                logging.error('No bees are running yet.')
+                return None
+
+        if (engine == 'scenario') != bool(scenario):
+            logging.error('The scenario engine, and only it, needs a scenario.')
+            return None
+
+        if (engine == 'schedule') != bool(schedule):
+            logging.error('The schedule engine, and only it, needs a seeded schedule.')
+            return None
+
+        if schedule and (not url_file or url_file.startswith('s3://') or relays or autoscaling or slo or soak or preflight):
+            logging.error('A seeded schedule needs a local url file (-f), and does not work with relays, autoscaling, a capacity search, a soak or a pre-flight.')
+            return None
+
+        if request and (not ENGINES[engine].supports_request or relays or soak):
+            logging.error('%s cannot send a request template; ab, siege and h2load can, without relays or a soak.' % engine)
+            return None
+
+        if engine == 'hold' and (not time or not url or autoscaling or slo):
+            logging.error('Holding connections needs a time (-w) to hold them for and a single url (-u), and does not work with autoscaling or a capacity search.')
+            return None
+
+        relays = int(relays or 0)
+        if autoscaling and (relays or not time):
+            logging.error('Autoscaling needs a time (-w) to run for, and does not work with relays.')
+            return None
+
+        if slo and (relays or autoscaling):
+            logging.error('A capacity search does not work with relays or autoscaling.')
+            return None
+
+        if soak and (relays or autoscaling or slo or warmup or scrape):
+            logging.error('A soak does not work with relays, autoscaling, a capacity search, a warm-up or scraping.')
+            return None
+
+        if soak and (not time or engine in ('wideload', 'hold')):
+            logging.error('A soak needs a time (-w) to run for, and an engine which can run for a time.')
+            return None
+
+        if preflight and (relays or autoscaling or slo):
+            logging.error('A pre-flight does not work with relays, autoscaling or a capacity search.')
+            return None
+
+        if relays and relays * 2 > len(instances):
+            logging.error('Relays need at least one bee each to command, %i bees are too few for %i relays.' % (len(instances), relays))
+            return None
+
+        relay_plan = _plan_relays(instances, relays)
+        instances = instances[relays:]
+
+        import calibrate
+        ceiling = _get_ceiling(instances, engine, keepalive, self.profile_filename)
+        if ceiling and autoscaling and autoscaling['target_rps'] > ceiling:
+            logging.warning('The bees were calibrated to fire at most %.0f requests per second with %s, short of the %.0f to hold.' % (
+                ceiling, engine, autoscaling['target_rps']))
+
+        instance_count = len(instances)
+        requests_per_instance = int(float(n) / instance_count)
+        connections_per_instance = int(float(c) / instance_count)
+        keepalive = bool(keepalive)
+        if connection.ramp_rate:
+            connection = connection._replace(ramp_rate=float(connection.ramp_rate) / instance_count)
+
+        logging.debug( 'Each of %i bees will fire %s rounds, %s at a time.' % (instance_count, requests_per_instance, connections_per_instance))
+
+        schedules = None
+        if schedule:
+            import schedule as scheduling
+            count = n
+            if time and schedule.get('rate'):
+                count = int(schedule['rate'] * get_seconds(time))
+            with tracer.span('build_schedule', requests=count):
+                try:
+                    schedules = [scheduling.dumps(s) for s in scheduling.deal(
+                        url_file, schedule['seed'], instance_count, count, schedule.get('rate'), schedule.get('order') or 'random')]
+                except (IOError, ValueError), e:
+                    logging.error('Could not schedule the requests from %s: %s' % (url_file, e))
+                    return None
+            digest = scheduling.get_digest(schedules)
+            if schedule.get('digest') and schedule['digest'] != digest:
+                logging.error('The schedule\'s digest is %s, not %s: the seed, the swarm or the url file has changed.' % (digest, schedule['digest']))
+                return None
+            schedule = dict(schedule, digest=digest, requests=count)
+            logging.info('Each bee will replay its share of %i requests scheduled with seed %s (digest %s).' % (count, schedule['seed'], digest))
+            # the bees get their schedules instead
+            url_file = None
+
+        # default s3 bucket when we use it for url files
+        bucket_name = 'haw-bees'
+
+        # if there's a url file, it's time to:
+        # 1) verify it's already present on the worker instances
+        # 2a) if not, copy it to s3
+        # 2b) and then pull it down from s3 to the workers
+        if url_file:
+            with tracer.span('stage_url_file_s3', url_file=url_file):
+                import boto
+                s3 = boto.connect_s3()
+
+                if url_file.startswith('s3://'):
+                    # make sure the file exists
+                    url_parts = urlparse.urlparse(url_file)
+                    bucket_name, s3_name = url_parts.netloc, url_parts.path[1:]
+                    logging.debug('bucket_name: [%s]  s3_name: [%s]' % (bucket_name, s3_name))
+                    lt_bucket = s3.get_bucket(bucket_name)
+                    key = lt_bucket.get_key(s3_name)
+                    if not key:
+                        # invalid file
+                        msg = 'invalid s3 bucket/key: [%s] [%s]'  % (bucket_name, s3_name)
+                        logging.error(msg)
+                        raise Exception, msg
+                else:
+                    # local file
+                    md5 = hashlib.md5()
+                    f = open(url_file, 'rb')
+                    try:
+                        while True:
+                            data = f.read(2**20)
+                            if not data:
+                                break
+                            md5.update(data)
+                    finally:
+                        f.close()
+                    local_hash = md5.hexdigest()
+                    logging.debug('hash of local url file is %s' % local_hash)
+
+                    s3_name = os.path.basename(url_file)
+                    lt_bucket = s3.get_bucket(bucket_name)
+                    logging.debug('s3 bucket is %s' % lt_bucket)
+                    key = lt_bucket.get_key(s3_name)
+                    logging.debug('key is %s' % key)
+
+                    if key:
+                        remote_hash = key.etag.replace('"','')
+                        # if etag matches local hash, nothing to be done.
+                        # if they differ, fail and force the user to either rename the
+                        # local file or manually overwrite the existing version in s3.
+                        if remote_hash != local_hash:
+                            msg = 'a urls file with the same name [%s], different md5 [%s] '
+                            msg+= 'already exists in the bucket.  Please rename the local '
+                            msg+= 'urls file or manually overwrite the existing file in s3.'
+                            logging.error(msg % (s3_name, remote_hash))
+                            raise Exception, msg % (s3_name, remote_hash)
+                    else:
+                        # needs to be uploaded.
+                        logging.info('uploading urls file to %s' % s3_name)
+                        key = lt_bucket.new_key(s3_name)
+                        key.set_contents_from_filename(url_file)
+                        key.set_acl('public-read') # FIXME security
+                        logging.info('...upload complete')
+
+            url_file = s3_name
+            logging.info('using url file: %s' % url_file)
+
+        package_zip = _build_package_zip(os.path.join(tempfile.mkdtemp(), 'bees.zip'))
+
+        scenario_file = None
+        if scenario:
+            scenario_file = os.path.join(os.path.dirname(package_zip), 'scenario.json')
+            with open(scenario_file, 'w') as f:
+                json.dump(scenario, f)
+
+        request_body = None
+        if request and request.body is not None:
+            request_body = os.path.join(os.path.dirname(package_zip), 'request.body')
+            with open(request_body, 'wb') as f:
+                f.write(request.body)
+
+        schedule_files = schedule_digests = [None] * instance_count
+        if schedules:
+            schedule_files = [os.path.join(os.path.dirname(package_zip), 'schedule-%i.txt' % i) for i in range(instance_count)]
+            schedule_digests = map(scheduling.get_bee_digest, schedules)
+            for filename, text in zip(schedule_files, schedules):
+                with open(filename, 'wb') as f:
+                    f.write(text)
+
+        params = []
+
+        for i, instance in enumerate(instances):
+            params.append({
+                'i': i,
+                'region': region,
+                'package_zip': package_zip,
+                'instance_id': instance.id,
+                'instance_name': instance.public_dns_name,
+                'url': url,
+                'url_file': url_file,
+                'url_file_bucket': bucket_name,
+                'scenario': scenario_file,
+                'corpus': corpus,
+                'request': request,
+                'request_body': request_body,
+                'schedule': schedule_files[i],
+                'schedule_digest': schedule_digests[i],
+                'concurrent_requests': connections_per_instance,
+                'num_requests': requests_per_instance,
+                'username': username,
+                'key_name': key_name,
+                'keepalive': keepalive,
+                'engine': engine,
+                'time' : time,
+                'connection': connection,
+                'trace': not isinstance(tracer, NullTracer),
+            })
+
+        if warmup and warmup.get('requests'):
+            logging.info('Bees will warm up with %i requests each before the attack.' % warmup['requests'])
+            for p in params:
+                p['warmup'] = warmup
+
+        checks = None
+        if preflight:
+            checks, params = _preflight_swarm(params, c, n, tracer)
+            if not params:
+                logging.error('No bees can take part in the attack.')
+                shutil.rmtree(os.path.dirname(package_zip))
+                return None
+
+        scraper = None
+        if scrape and scrape.get('sources'):
+            scraper = metrics.Scraper(scrape['sources'], scrape.get('interval') or metrics.INTERVAL).start()
+
+        if relays:
+            relay_params = []
+            for k, (relay, children) in enumerate(relay_plan):
+                relay_params.append({
+                    'i': k,
+                    'region': region,
+                    'package_zip': package_zip,
+                    'instance_id': relay.id,
+                    'instance_name': relay.public_dns_name,
+                    'username': username,
+                    'key_name': key_name,
+                    'engine': engine,
+                    'scenario': scenario_file,
+                    'trace': not isinstance(tracer, NullTracer),
+                    # relays stage the package (and scenario) they run from on their bees
+                    'children': [dict(params[j], package_zip='bees.zip',
+                                      scenario=scenario_file and ScenarioTester.plan_file) for j in children],
+                })
+            reports = _run_swarm(relay_params, sync, tracer, worker=_relay_attack)
+        elif autoscaling:
+            summary = _autoscale_attack(params, instances, autoscaling, time, tracer,
+                                        self.instance_ids, self._join)
+        elif slo:
+            summary = _capacity_search(params, slo, tracer)
+        elif soak:
+            summary = _soak_attack(params, get_seconds(time), soak, tracer)
+        else:
+            reports = _run_swarm(params, sync, tracer)
+
+        samples = scraper and scraper.stop()
+
+        shutil.rmtree(os.path.dirname(package_zip))
+
+        logging.debug('Offensive complete.')
+
+        if not (autoscaling or slo or soak):
+            with tracer.span('aggregate', bees=len(reports)):
+                summary = _aggregate_reports(reports)
+
+        if summary is None:
+            return None
+
+        logging.info('%s of %s clients succeeded.' % (summary['bees'] - summary['failed'], summary['bees']))
+
+        summary['preflight'] = checks
+
+        result = summary['result']
+        if (ceiling and not autoscaling and result and result.requests_per_second is not None
+                and result.requests_per_second >= calibrate.NEAR_CEILING * ceiling):
+            logging.warning('The bees fired %.0f requests per second, near the %.0f they were calibrated to fire with %s: the target may take more than was measured.' % (
+                result.requests_per_second, ceiling, engine))
+        summary['ceiling'] = ceiling
+
+        if schedule:
+            replayed = [r['schedule'] for r in reports if r.get('schedule')]
+            summary['schedule'] = dict(schedule, late=None, max_lag_ms=None,
+                                       mismatched=len([r for r in replayed if r.get('mismatched')]))
+            if schedule.get('rate'):
+                # without a rate every request is due at once, none is late
+                paced = [r for r in replayed if r['late'] is not None]
+                summary['schedule'].update(late=sum(r['late'] for r in paced),
+                                           max_lag_ms=max([r['max_lag_ms'] for r in paced] or [0.0]))
+
+        if result and result.requests_per_second is not None and self.history_filename:
+            import planner
+            types = {}
+            for instance in instances:
+                types[instance.instance_type] = types.get(instance.instance_type, 0) + 1
+            entry = {'engine': engine, 'keepalive': keepalive, 'types': types, 'rps': result.requests_per_second,
+                     'concurrency': result.concurrency, 'seconds': result.time_taken}
+            if schedule:
+                entry.update(seed=schedule['seed'], digest=schedule['digest'])
+            try:
+                planner.record(entry, self.history_filename)
+            except IOError, e:
+                logging.warning('Could not record the attack for planning: %s' % e)
+
+        if scraper:
+            summary['metrics'] = samples
+            summary['timeline'] = metrics.align(samples, _get_timeline(summary),
+                                                scrape.get('cpu') or metrics.CPU_METRIC,
+                                                scrape.get('queue') or metrics.QUEUE_METRIC)
+
+        return AttackResult(summary, autoscaling=autoscaling, slo=slo)
+
+
+    def reattach(self, filename=SOAK_FILENAME):
+        """
+        Carry on following a soak from its checkpoint, after the controller
+        stopped following it.
+
+        @return: an L{AttackResult}, or None if there is no soak to follow
+            or it was no longer followed
+        """
+        if not os.path.isfile(filename):
+            logging.error('There is no soak to reattach to in %s.' % filename)
+            return None
+        summary = _follow_soak(soak.Checkpoint.load(filename), filename)
+        return summary and AttackResult(summary)
+
+
+    def attack_async(self, *args, **kwargs):
+        """
+        Start an attack (see L{attack}, which takes the same arguments) in
+        the background, so that several can run at once.
+
+        @return: a multiprocessing AsyncResult whose get() returns the
+            attack's L{AttackResult}
+        """
+        from multiprocessing.pool import ThreadPool
+        pool = ThreadPool(1)
+        result = pool.apply_async(self.attack, args, kwargs)
+        pool.close()
+        return result
+
+
+    def calibrate(self, levels=None, seconds=None, keepalive=False, tracer=None, filename=None):
+        """
+        Measure the most each engine can fire from the bees, against a sink
+        on each bee, and save the profile of each of their instance types
+        to filename (default the swarm's profile_filename, if any), which
+        attacks check their load against.
+
+        @return: dict of the profiles found by instance type (see
+            L{calibrate.merge_profiles}), or None if no bee was calibrated
+        """
+        import calibrate
+
+        tracer = tracer or NullTracer()
+        filename = filename or self.profile_filename
+
+        if not self.instance_ids:
+            logging.info('No bees are ready to calibrate.')
+            return None
+
+        with tracer.span('ec2_describe', count=len(self.instance_ids)):
+            instances = _get_instances(self.region, self.instance_ids)
+
+        package_zip = _build_package_zip(os.path.join(tempfile.mkdtemp(), 'bees.zip'))
+        options = ' -t %i -l %s' % (seconds or calibrate.SECONDS, ','.join(map(str, levels or calibrate.LEVELS)))
+        if keepalive:
+            options += ' -k'
+
+        params = []
+        for i, instance in enumerate(instances):
+            params.append({
+                'i': i,
+                'region': self.region,
+                'package_zip': package_zip,
+                'instance_id': instance.id,
+                'instance_name': instance.public_dns_name,
+                'username': self.username,
+                'key_name': self.key_name,
+                'options': options,
+                'trace': not isinstance(tracer, NullTracer),
+            })
+
+        logging.info('Calibrating the engines on %i bees.' % len(params))
+        reports = _run_swarm(params, False, tracer, worker=_calibrate)
+        shutil.rmtree(os.path.dirname(package_zip))
+
+        results = {}
+        for instance, report in zip(instances, sorted(reports, key=lambda r: r['i'])):
+            if report['calibration']:
+                results.setdefault(instance.instance_type, []).append(report['calibration'])
+        if not results:
+            logging.error('No bee could be calibrated.')
+            return None
+
+        found = dict((instance_type, calibrate.merge_profiles(r)) for instance_type, r in results.items())
+        if filename:
+            profiles = calibrate.load_profiles(filename)
+            profiles.update(found)
+            calibrate.save_profiles(profiles, filename)
+        return found
+
+
+def _stand_down_unready(ec2_connection, instances, ready):
     """
-    region, username, key_name, instance_ids = _read_server_list()
+    Terminate the instances which did not become ready, so that bees
+    dropped from the roster are not left running (and billing).
 
-    if not instance_ids:
-        logging.info('No bees have been mobilized.')
+    @param ec2_connection: None for local bees
+    """
+    ready_ids = set(i.id for i in ready)
+    unready = [i.id for i in instances if i.id not in ready_ids]
+    if not unready:
         return
+    logging.warning('Bees %s did not become ready, standing them down.' % ', '.join(unready))
+    if ec2_connection:
+        ec2_connection.terminate_instances(instance_ids=unready)
+    else:
+        local.down(unready)
 
-    logging.info('Connecting to the hive.')
-
-    ec2_connection = boto.ec2.connect_to_region(region)
 
-    logging.info('Calling off the swarm.')
+def _start_instances(ec2_connection, instances):
+    """
+    Start the stopped EC2 instances (once any still stopping have stopped)
+    and wait for them all to be running, refreshing their states.
+    """
+    deadline = time.time() + READY_TIMEOUT
+    while any(i.state == 'stopping' for i in instances) and time.time() < deadline:
+        time.sleep(5)
+        for i in instances:
+            i.update()
+
+    stopped = [i.id for i in instances if i.state == 'stopped']
+    if stopped:
+        ec2_connection.start_instances(instance_ids=stopped)
+
+    while time.time() < deadline:
+        for i in instances:
+            i.update()
+        if not any(i.state in ('pending', 'stopped', 'stopping') for i in instances):
+            break
+        logging.debug('.')
+        time.sleep(5)
+
+def _check_ready(params):
+    """
+    Wait for a bee to accept connections and report that it is provisioned.
 
-    terminated_instance_ids = ec2_connection.terminate_instances(
-        instance_ids=instance_ids)
+    Intended for use with multiprocessing.
 
-    logging.info('Stood down %i bees.' % len(terminated_instance_ids))
+    @return: the bee's instance id, or None if it was not ready in time
+    """
+    from paramiko import SSHException
+    deadline = time.time() + params['timeout']
+    while True:
+        try:
+            client = _connect(params)
+            try:
+                stdin, stdout, stderr = _exec_command_blocking(client, READY_COMMAND, params['instance_id'])
+                if stdout.read().strip() == 'ready':
+                    return params['instance_id']
+            finally:
+                client.close()
+        except (socket.error, SSHException, IOError), e:
+            logging.debug('Bee %s is not ready yet: %s' % (params['instance_id'], e))
+        if time.time() >= deadline:
+            return None
+        time.sleep(5)
+
+def _wait_for_ready(region, username, key_name, instances):
+    """
+    Check the instances' readiness in parallel.
 
-    _delete_server_list()
+    @return: list of the instances which are ready
+    """
+    if not instances:
+        return []
+    params = [{
+        'region': region,
+        'instance_id': instance.id,
+        'instance_name': instance.public_dns_name,
+        'username': username,
+        'key_name': key_name,
+        'timeout': READY_TIMEOUT,
+    } for instance in instances]
+    # threads, as this also runs alongside an attack's processes
+    from multiprocessing.pool import ThreadPool
+    pool = ThreadPool(len(params))
+    ready_ids = set(pool.map(_check_ready, params))
+    pool.close()
+    return [instance for instance in instances if instance.id in ready_ids]
 
 
 def _exec_command_blocking(ssh_client, command, ident):
@@ -227,27 +1193,112 @@ def _exec_command_blocking(ssh_client, command, ident):
         logging.info(msg % (ident, command, exit_status, et))
 
 
-def _attack(params):
+def _measure_clock_offset(ssh_client, samples=5):
     """
-    Test the target URL with requests.
+    Estimate the bee's clock offset over its ssh connection.
 
-    Intended for use with multiprocessing.
+    @return: (offset, rtt) in seconds, where bee time = local time + offset
     """
-    logging.info('Bee %i is joining the swarm.' % params['i'])
-    logging.debug('Bee %i params: %s' % (params['i'], params))
+    stdin, stdout, stderr = ssh_client.exec_command(clock.CLOCK_ECHO_COMMAND)
+    try:
+        measurements = []
+        for n in range(samples):
+            sent = time.time()
+            stdin.write('\n')
+            stdin.flush()
+            line = stdout.readline()
+            if not line:
+                raise IOError('could not read the bee\'s clock: %s' % stderr.read())
+            remote = float(line)
+            measurements.append((sent, remote, time.time()))
+        return clock.estimate_offset(measurements)
+    finally:
+        stdin.close()
+        stdout.channel.recv_exit_status()
 
-    # for logging
-    ident = '%s/%s' % (params['i'], params['instance_id'])
 
-    try:
-        client = paramiko.SSHClient()
-        client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-        client.connect(
-            params['instance_name'],
-            username=params['username'],
-            key_filename=_get_pem_path(params['key_name']))
-
-        if params['engine'] == 'siege':
+def _await_fire(barrier, i, rtt, ident):
+    """
+    Report this bee as armed and wait for the swarm's fire time.
+
+    @return: the fire time on the controller's clock, or None if the swarm
+        was called off before firing.
+    """
+    barrier['armed'].put((i, True, rtt))
+
+    # relays may wait on their own upstream controller, hence the slack
+    barrier['fire'].wait(2 * ARM_TIMEOUT + FIRE_LEAD)
+    if not barrier['fire'].is_set() or not barrier['fire_at'].value:
+        logging.error('Bee %s was never given the order to fire.' % ident)
+        return None
+
+    return barrier['fire_at'].value
+
+
+def _warm_up(client, params, tracer, ident, report):
+    """
+    Resolve and pin the target hosts, then send a warm-up burst whose
+    results are kept in report['warmup'], apart from the attack's.
+
+    @return: whether any hosts were pinned in /etc/hosts
+    """
+    from warmup import RESOLVED_MARKER as WARMUP_RESOLVED_MARKER, WARMUP_MARKER
+
+    warmup = params['warmup']
+    target = params['url'] or 'urls.txt'
+    pinned = False
+
+    if warmup.get('pin_dns'):
+        with tracer.span('warmup_resolve'):
+            stdin, stdout, stderr = _exec_command_blocking(
+                client, BEE_MODULE_COMMAND % 'warmup' + ' resolve "%s"' % target, ident)
+            for line in stdout.read().splitlines():
+                if line.startswith(WARMUP_RESOLVED_MARKER):
+                    address, host = line.split()[1:3]
+                    stdin, stdout, stderr = _exec_command_blocking(client, PIN_HOSTS_COMMAND % (address, host), ident)
+                    if stdout.channel.recv_exit_status() == 0:
+                        pinned = True
+                    else:
+                        logging.warning('Bee %s could not pin %s: %s' % (ident, host, stderr.read()))
+
+    with tracer.span('warmup_fire', requests=warmup['requests']):
+        cmd = BEE_MODULE_COMMAND % 'warmup' + ' fire -n %i -c %i -s %i "%s"' % (
+            warmup['requests'], max(1, params['concurrent_requests']), warmup.get('sample') or 0, target)
+        stdin, stdout, stderr = _exec_command_blocking(client, cmd, ident)
+        output = stdout.read()
+        m = re.search(re.escape(WARMUP_MARKER) + r'\s*(\{.*\})', output)
+        if m:
+            report['warmup'] = json.loads(m.group(1))
+        else:
+            logging.warning('Bee %s could not warm up: %s' % (ident, stderr.read()))
+
+    return pinned
+
+
+def _stage(client, params, tracer, ident):
+    """
+    Stage what the bee needs to fire: the package, the scenario, the
+    request's body, the schedule, siege's helper and the url file.
+    """
+    if params.get('package_zip'):
+        with tracer.span('stage_package'):
+            _stage_file(client, params['package_zip'], 'bees.zip', ident)
+
+    if params.get('scenario'):
+        with tracer.span('stage_scenario'):
+            _stage_file(client, params['scenario'], ScenarioTester.plan_file, ident)
+
+    if params.get('request_body'):
+        with tracer.span('stage_request_body'):
+            from template import BODY_FILE
+            _stage_file(client, params['request_body'], BODY_FILE, ident)
+
+    if params.get('schedule'):
+        with tracer.span('stage_schedule'):
+            _stage_file(client, params['schedule'], ScheduleTester.schedule_file, ident)
+
+    if params['engine'] == 'siege':
+        with tracer.span('stage_tools'):
             stdin, stdout, stderr = _exec_command_blocking(client, 'stat siege_calc', ident)
             if 'No such file or directory' in stderr.read():
                 sftp = client.open_sftp()
@@ -255,7 +1306,8 @@ def _attack(params):
                 sftp.chmod('siege_calc',0774)
                 sftp.close()
 
-        if params['url_file']:
+    if params['url_file']:
+        with tracer.span('stage_url_file', url_file=params['url_file']):
             logging.debug('checking for url file %s' % params['url_file'])
             stdin, stdout, stderr = _exec_command_blocking(client, 'stat %s' % params['url_file'], ident)
             if 'No such file or directory' in stderr.read():
@@ -265,41 +1317,146 @@ def _attack(params):
             else:
                 logging.debug('found file!')
 
-            if params['url_file'].endswith('.gz'):
+            import corpus
+            if corpus.is_corpus(params['url_file']):
+                sampling = params.get('corpus') or {}
+                count = sampling.get('sample') or corpus.SAMPLE
+                logging.debug('sampling %i urls to urls.txt' % count)
+                # sequential samples take the next stretch of the corpus for each bee
+                cmd = corpus.get_sample_command(params['url_file'], count, sampling.get('order') or 'weighted',
+                                                params['i'] * count)
+                stdin, stdout, stderr = _exec_command_blocking(client, cmd, ident)
+                if stdout.channel.recv_exit_status() != 0:
+                    logging.warning('Bee %s could not sample the url corpus: %s' % (ident, stderr.read()))
+            elif params['url_file'].endswith('.gz'):
                 logging.debug('gunzipping to urls.txt')
                 _exec_command_blocking(client, 'gunzip -c %s > urls.txt' % params['url_file'], ident)
             else:
                 logging.debug('copying to urls.txt')
                 _exec_command_blocking(client, 'cp %s urls.txt' % params['url_file'], ident)
 
+
+def _attack(params):
+    """
+    Test the target URL with requests.
+
+    Intended for use with multiprocessing.  Returns a dict describing this
+    bee's run: 'result' holds the parsed L{TesterResult} (None if the
+    output could not be parsed, or the error the bee failed with) and
+    'spans' holds the phase timings recorded when tracing is enabled.
+    """
+    logging.info('Bee %i is joining the swarm.' % params['i'])
+    logging.debug('Bee %i params: %s' % (params['i'], params))
+
+    # for logging
+    ident = '%s/%s' % (params['i'], params['instance_id'])
+
+    if params.get('trace'):
+        tracer = Tracer(pid=params['i'] + 1)
+    else:
+        tracer = NullTracer()
+
+    report = {
+        'i': params['i'],
+        'instance_id': params['instance_id'],
+        'result': None,
+        'spans': tracer.spans,
+    }
+
+    try:
+        with tracer.span('ssh_connect', bee=ident):
+            client = _connect(params)
+
+        _stage(client, params, tracer, ident)
+
+        pinned = False
         try:
+            if params.get('warmup'):
+                pinned = _warm_up(client, params, tracer, ident, report)
+
+            fire_at = None
+            offset = 0.0
+            if params.get('barrier'):
+                with tracer.span('arm'):
+                    offset, rtt = _measure_clock_offset(client)
+                    logging.debug('Bee %s clock offset %.6fs (rtt %.6fs)' % (ident, offset, rtt))
+                    report['armed'] = True
+                    fire_at = _await_fire(params['barrier'], params['i'], rtt, ident)
+                if fire_at is None:
+                    return report
+                # on the bee's clock
+                fire_at += offset
+
             logging.debug('Bee %i is firing his machine gun. Bang bang!' % params['i'])
 
-            engines = {
-                'ab': ABTester,
-                'siege': SiegeTester,
-                'wideload': WideloadTester,
-            }
-            t = engines[params['engine']]()
+            t = ENGINES[params['engine']]()
 
+            connection = params.get('connection')
             cmd = t.get_command(
                 params['num_requests'],
                 params['concurrent_requests'],
                 params['keepalive'],
                 params['url'],
-                params['time']
+                params['time'],
+                # relays pass it on as a json list
+                connection and ConnectionModel(*connection),
+                params.get('request')
                 )
 
-
-            t1 = time.time()
-            stdin, stdout, stderr = _exec_command_blocking(client, cmd, ident)
-
-            if params['engine'] == 'siege':
-                output = stderr.read()
-                logging.debug(output)
-            else:
-                output = stdout.read()
-            result = t.parse_output(output)
+            if params.get('sample_cpu'):
+                cmd = autoscale.get_sampled_command(cmd)
+            if fire_at:
+                cmd = clock.get_fire_command(cmd, fire_at)
+            if params.get('nofile'):
+                from preflight import get_limited_command
+                cmd = get_limited_command(cmd, params['nofile'])
+
+            with tracer.span('attack', engine=params['engine']):
+                stdin, stdout, stderr = _exec_command_blocking(client, cmd, ident)
+
+            with tracer.span('transfer_output'):
+                if params['engine'] == 'siege':
+                    output = stderr.read()
+                    logging.debug(output)
+                else:
+                    output = stdout.read()
+                    if fire_at:
+                        output += stderr.read()
+
+            with tracer.span('parse_output'):
+                result = t.parse_output(output)
+                histogram = t.parse_histogram(output)
+                if histogram is not None:
+                    report['histogram'] = histogram.to_dict()
+                requests = t.parse_breakdown(output)
+                if requests is not None:
+                    report['breakdown'] = requests.to_dict()
+                samples = t.parse_exemplars(output)
+                if samples is not None:
+                    for e in samples.entries():
+                        # on the controller's clock
+                        e['start'] -= offset
+                        e['bee'] = params['instance_id']
+                    report['exemplars'] = samples.to_dict()
+                if params.get('scenario'):
+                    steps = t.parse_steps(output)
+                    if steps is not None:
+                        report['steps'] = steps.to_dict()
+                if params.get('schedule'):
+                    replayed = t.parse_schedule(output)
+                    if replayed is not None and replayed['digest'] != params['schedule_digest']:
+                        logging.error('Bee %s replayed a schedule other than the one it was dealt.' % ident)
+                        replayed['mismatched'] = True
+                    report['schedule'] = replayed
+                if params['engine'] == 'hold':
+                    report['hold'] = t.parse_hold(output)
+                if params.get('sample_cpu'):
+                    report['cpu'] = autoscale.parse_cpu_busy(output)
+                fired_at = clock.parse_fired_at(output)
+                if fired_at and result is not None:
+                    # firing window on the controller's clock
+                    start = fired_at - offset
+                    report['window'] = (start, start + result.time_taken)
             if result is None:
                 msg = 'could not parse result from output (%s):' % ident
                 logging.error(msg)
@@ -307,166 +1464,1074 @@ def _attack(params):
             else:
                 msg = 'finished testing: (%s)' % ident
                 logging.info(msg)
-            return result
+            report['result'] = result
+            return report
 
         finally:
+            if pinned:
+                _exec_command_blocking(client, UNPIN_HOSTS_COMMAND, ident)
             client.close()
 
-    except socket.error, e:
-        msg = 'encountered socket error (%s):' % ident
+    except Exception, e:
+        # any bee going down fails that bee only, not the whole attack
+        msg = 'encountered %s (%s):' % (type(e).__name__, ident)
         logging.error(msg)
         logging.exception(e)
-        return e
+        report['result'] = _get_failure(e)
+        return report
+
+    finally:
+        if params.get('barrier') and not report.get('armed'):
+            # never leave the controller waiting on a bee that went down
+            params['barrier']['armed'].put((params['i'], False, None))
 
 
-def attack(url, url_file, n, c, keepalive, output_type, engine, time):
+def _relay_attack(params):
     """
-    Test the root url of this site.
+    Have a relay bee run the attack on its own subset of the swarm.
+
+    Intended for use with multiprocessing, like L{_attack}, and returns the
+    same kind of report, except that 'result' and 'histogram' are already
+    merged over the relay's bees, 'window' spans all of them and 'bees' /
+    'failed' count them.
     """
-    region, username, key_name, instance_ids = _read_server_list()
+    ident = 'relay %s/%s' % (params['i'], params['instance_id'])
+    logging.info('Relay %s is taking command of %i bees.' % (ident, len(params['children'])))
 
-    if not instance_ids:
-        logging.info('No bees are ready to attack.')
-        return
+    if params.get('trace'):
+        tracer = Tracer(pid=RELAY_PID_BASE + params['i'])
+    else:
+        tracer = NullTracer()
+
+    report = {
+        'i': params['i'],
+        'instance_id': params['instance_id'],
+        'relay': True,
+        'result': None,
+        'bees': len(params['children']),
+        'spans': tracer.spans,
+    }
 
-    logging.info('Connecting to the hive.')
+    try:
+        with tracer.span('ssh_connect', bee=ident):
+            client = _connect(params)
 
-    ec2_connection = boto.ec2.connect_to_region(region)
+        try:
+            with tracer.span('stage_relay'):
+                _stage_file(client, params['package_zip'], 'bees.zip', ident)
+                if params['engine'] == 'siege':
+                    _stage_file(client, 'siege_calc', 'siege_calc', ident, 0774)
+                if params.get('scenario'):
+                    _stage_file(client, params['scenario'], ScenarioTester.plan_file, ident)
+                if params.get('region') != local.LOCAL_REGION:
+                    _stage_file(client, _get_pem_path(params['key_name']),
+                                '.ssh/%s.pem' % params['key_name'], ident, 0600)
+
+            with tracer.span('clock_sync'):
+                offset, rtt = _measure_clock_offset(client)
+
+            plan = {
+                'pid': RELAY_PID_BASE + params['i'],
+                'children': params['children'],
+                'sync': bool(params.get('barrier')),
+                'trace': params.get('trace'),
+                'verbose': logging.getLogger().isEnabledFor(logging.DEBUG),
+            }
 
-    logging.info('Assembling bees.')
+            stdin, stdout, stderr = client.exec_command(RELAY_COMMAND)
+            stdin.write(json.dumps(plan) + '\n')
+            stdin.flush()
+
+            if params.get('barrier'):
+                with tracer.span('arm'):
+                    armed, relay_rtt = stdout.readline().split()[1:3]
+                    if int(armed):
+                        report['armed'] = True
+                        fire_at = _await_fire(params['barrier'], params['i'], rtt + float(relay_rtt), ident)
+                    else:
+                        fire_at = None
+                    # on the relay's clock, 0 calls the attack off
+                    stdin.write('fire %.6f\n' % ((fire_at and fire_at + offset) or 0))
+                    stdin.flush()
+
+            with tracer.span('attack', relay=True):
+                output = stdout.read()
+                exit_status = stdout.channel.recv_exit_status()
+            errors = stderr.read()
+            logging.debug('Relay %s exited %s:\n%s' % (ident, exit_status, errors))
 
-    reservations = ec2_connection.get_all_instances(instance_ids=instance_ids)
+            summary = parse_relay_result(output)
+            if summary is None:
+                logging.error('could not parse result from relay (%s):' % ident)
+                logging.error(output)
+                logging.error(errors)
+                return report
+
+            # back to the controller's clock
+            for span in summary['spans']:
+                span['start'] -= offset
+            tracer.extend(summary['spans'])
+            if summary['window']:
+                report['window'] = (summary['window'][0] - offset, summary['window'][1] - offset)
+            report['result'] = summary['result']
+            report['histogram'] = summary['histogram']
+            report['breakdown'] = summary['breakdown']
+            report['steps'] = summary.get('steps')
+            report['hold'] = summary.get('hold')
+            if summary['exemplars']:
+                samples = exemplars.Exemplars.from_dict(summary['exemplars'])
+                for e in samples.entries():
+                    e['start'] -= offset
+                report['exemplars'] = samples.to_dict()
+            report['failed'] = summary['failed']
+            report['warmup'] = summary['warmup']
+            return report
 
-    instances = []
+        finally:
+            client.close()
 
-    for reservation in reservations:
-        instances.extend(reservation.instances)
+    except Exception, e:
+        logging.error('encountered %s (%s):' % (type(e).__name__, ident))
+        logging.exception(e)
+        report['result'] = _get_failure(e)
+        return report
 
-    instance_count = len(instances)
-    requests_per_instance = int(float(n) / instance_count)
-    connections_per_instance = int(float(c) / instance_count)
-    keepalive = bool(keepalive)
-
-    logging.debug( 'Each of %i bees will fire %s rounds, %s at a time.' % (instance_count, requests_per_instance, connections_per_instance))
-
-    # default s3 bucket when we use it for url files
-    bucket_name = 'haw-bees'
-
-    # if there's a url file, it's time to:
-    # 1) verify it's already present on the worker instances
-    # 2a) if not, copy it to s3
-    # 2b) and then pull it down from s3 to the workers
-    if url_file:
-
-        s3 = boto.connect_s3()
-
-        if url_file.startswith('s3://'):
-            # make sure the file exists
-            url_parts = urlparse.urlparse(url_file)
-            bucket_name, s3_name = url_parts.netloc, url_parts.path[1:]
-            logging.debug('bucket_name: [%s]  s3_name: [%s]' % (bucket_name, s3_name))
-            lt_bucket = s3.get_bucket(bucket_name)
-            key = lt_bucket.get_key(s3_name)
-            if not key:
-                # invalid file
-                msg = 'invalid s3 bucket/key: [%s] [%s]'  % (bucket_name, s3_name)
-                logging.error(msg)
-                raise Exception, msg
-        else:
-            # local file
-            md5 = hashlib.md5()
-            f = open(url_file, 'rb')
-            try:
-                while True:
-                    data = f.read(2**20)
-                    if not data:
-                        break
-                    md5.update(data)
-            finally:
-                f.close()
-            local_hash = md5.hexdigest()
-            logging.debug('hash of local url file is %s' % local_hash)
-
-            s3_name = os.path.basename(url_file)
-            lt_bucket = s3.get_bucket(bucket_name)
-            logging.debug('s3 bucket is %s' % lt_bucket)
-            key = lt_bucket.get_key(s3_name)
-            logging.debug('key is %s' % key)
-
-            if key:
-                remote_hash = key.etag.replace('"','')
-                # if etag matches local hash, nothing to be done.
-                # if they differ, fail and force the user to either rename the
-                # local file or manually overwrite the existing version in s3.
-                if remote_hash != local_hash:
-                    msg = 'a urls file with the same name [%s], different md5 [%s] '
-                    msg+= 'already exists in the bucket.  Please rename the local '
-                    msg+= 'urls file or manually overwrite the existing file in s3.'
-                    logging.error(msg % (s3_name, remote_hash))
-                    raise Exception, msg % (s3_name, remote_hash)
+    finally:
+        if params.get('barrier') and not report.get('armed'):
+            params['barrier']['armed'].put((params['i'], False, None))
+
+
+def parse_relay_result(output):
+    """
+    @return: the summary printed by a relay (see L{format_relay_result}),
+        or None if there is none
+    """
+    m = re.search(re.escape(RELAY_RESULT_MARKER) + r'\s*(\{.*\})', output)
+    if m is None:
+        return None
+    summary = json.loads(m.group(1))
+    if summary['result'] is not None:
+        summary['result'] = TesterResult(**summary['result'])
+    return summary
+
+
+def format_relay_result(summary, spans):
+    """
+    Format a merged summary (see L{_aggregate_reports}) for a relay to send
+    back to the controller.
+    """
+    result = summary['result']
+    windows = summary['windows']
+    return '%s %s' % (RELAY_RESULT_MARKER, json.dumps({
+        'result': result is not None and dict(result._asdict()) or None,
+        'histogram': summary['histogram'] is not None and summary['histogram'].to_dict() or None,
+        'breakdown': summary['breakdown'] is not None and summary['breakdown'].to_dict() or None,
+        'exemplars': summary['exemplars'] is not None and summary['exemplars'].to_dict() or None,
+        'steps': summary['steps'] is not None and summary['steps'].to_dict() or None,
+        'hold': summary['hold'],
+        'window': windows and (min(w[0] for w in windows), max(w[1] for w in windows)) or None,
+        'failed': summary['failed'],
+        'warmup': summary['warmup'] and dict(summary['warmup'], histogram=summary['warmup']['histogram'].to_dict()),
+        'spans': spans,
+    }))
+
+
+def _fire_when_armed(barrier, count, get_fire_at=None):
+    """
+    Wait for the bees to arm, then set a common fire time.
+
+    @param get_fire_at: optional callable taking the number of armed bees
+        and their worst round trip time and returning the fire time, used
+        when a relay takes its orders from the controller.
+    @return: the fire time (local clock), or None if the attack is off.
+    """
+    rtts = []
+    deadline = time.time() + ARM_TIMEOUT
+
+    for n in range(count):
+        try:
+            i, ok, rtt = barrier['armed'].get(timeout=max(0, deadline - time.time()))
+        except Queue.Empty:
+            logging.warning('Only %i of %i bees armed in time, firing without the rest.' % (len(rtts), count))
+            break
+        if ok:
+            rtts.append(rtt)
+
+    fire_at = None
+    if get_fire_at:
+        fire_at = get_fire_at(len(rtts), max(rtts or [0.0]))
+    elif rtts:
+        fire_at = time.time() + FIRE_LEAD + max(rtts)
+
+    if fire_at:
+        barrier['fire_at'].value = fire_at
+        logging.info('%i bees armed, firing in %.2f seconds.' % (len(rtts), fire_at - time.time()))
+    else:
+        logging.error('No bees armed, calling off the attack.')
+
+    barrier['fire'].set()
+    return fire_at
+
+
+def _run_swarm(params, sync, tracer, worker=_attack, get_fire_at=None):
+    """
+    Run worker (L{_attack} or L{_relay_attack}) for every bee in parallel.
+
+    With sync the bees arm first and fire together; see L{_fire_when_armed}
+    for get_fire_at.
+
+    @return: list of the workers' reports
+    """
+    from multiprocessing import Manager, Pool
+
+    barrier = None
+    if sync and (len(params) > 1 or get_fire_at):
+        manager = Manager()
+        barrier = {
+            'armed': manager.Queue(),
+            'fire': manager.Event(),
+            'fire_at': manager.Value('d', 0.0),
+        }
+        for p in params:
+            p['barrier'] = barrier
+
+    # Spin up processes for connecting to the bees
+    with tracer.span('swarm_attack', bees=len(params)):
+        pool = Pool(len(params))
+        pending = pool.map_async(worker, params)
+        if barrier:
+            with tracer.span('arm_swarm'):
+                _fire_when_armed(barrier, len(params), get_fire_at)
+        reports = pending.get()
+        pool.close()
+
+    for report in reports:
+        tracer.extend(report['spans'])
+
+    return reports
+
+
+def _get_failure(e):
+    """
+    @return: the error a bee failed with, as it can travel back from a
+        worker process (not every exception survives pickling)
+    """
+    if isinstance(e, (socket.error, IOError)):
+        return e
+    return Exception('%s: %s' % (type(e).__name__, e))
+
+
+def _is_complete(result):
+    return result is not None and not isinstance(result, Exception)
+
+
+def _aggregate_reports(reports):
+    """
+    Merge bee or relay reports into one summary.
+
+    @return: dict with the aggregate 'result' (None if no bee completed),
+        the merged 'histogram' (None unless every completed bee had one),
+        the merged per-url and per-status 'breakdown' (None if no bee had one),
+        the swarm's slowest and failed request 'exemplars' (likewise),
+        the merged latencies by scenario step in 'steps' (likewise),
+        the timeline of connections held in 'hold' (likewise),
+        the completed bees' firing 'windows' (None unless all had one) and
+        the number of 'bees' and of 'failed' bees.
+    """
+    complete = [r for r in reports if _is_complete(r['result'])]
+
+    summary = {
+        'bees': sum([r.get('bees', 1) for r in reports]),
+        'failed': sum([r.get('failed', 0) for r in complete]) +
+                  sum([r.get('bees', 1) for r in reports if not _is_complete(r['result'])]),
+        'result': None,
+        'histogram': None,
+        'breakdown': None,
+        'exemplars': None,
+        'steps': None,
+        'hold': None,
+        'windows': None,
+        'warmup': _merge_warmups([r['warmup'] for r in reports if r.get('warmup')]),
+    }
+
+    if not complete:
+        return summary
+
+    if all(r.get('histogram') for r in complete):
+        summary['histogram'] = merge_all([r['histogram'] for r in complete])
+
+    summary['breakdown'] = breakdown.merge_all([r['breakdown'] for r in complete if r.get('breakdown')])
+    if any(r.get('exemplars') for r in complete):
+        summary['exemplars'] = exemplars.merge_all([r['exemplars'] for r in complete if r.get('exemplars')])
+    summary['steps'] = breakdown.merge_all([r['steps'] for r in complete if r.get('steps')])
+    if any(r.get('hold') for r in complete):
+        import hold
+        summary['hold'] = hold.merge_all([r.get('hold') for r in complete])
+
+    # firing windows are only comparable when every bee reported one
+    windows = [r.get('window') for r in complete]
+    if all(windows):
+        summary['windows'] = windows
+
+    results = [r['result'] for r in complete]
+    if any(r.get('relay') for r in complete):
+        # relays already measured their rates over their own windows
+        result = get_aggregate_result(results, None, summary['histogram'])
+        if summary['windows']:
+            result = result._replace(time_taken=max(w[1] for w in windows) - min(w[0] for w in windows))
+    else:
+        result = get_aggregate_result(results, summary['windows'], summary['histogram'])
+    summary['result'] = result
+
+    return summary
+
+
+def _merge_warmups(warmups):
+    """
+    Merge bees' warm-up summaries (see L{warmup.fire}).
+
+    @return: merged summary, with a L{Histogram}, or None if none warmed up
+    """
+    if not warmups:
+        return None
+    merged = {'requests': 0, 'failed': 0, 'non_2xx': 0, 'elapsed': 0.0}
+    for w in warmups:
+        for k in ('requests', 'failed', 'non_2xx'):
+            merged[k] += w[k]
+        merged['elapsed'] = max(merged['elapsed'], w['elapsed'])
+    merged['histogram'] = merge_all([w['histogram'] for w in warmups])
+    return merged
+
+
+def _autoscale_attack(params, instances, autoscaling, duration, tracer, roster, enlist):
+    """
+    Hold a target request rate by resizing the swarm between time buckets.
+
+    The roster's bees start out with params' concurrency.  In every bucket
+    the active bees arm, fire together at the bucket boundary for most of
+    the bucket (the rest is left for reporting and re-arming) and report
+    their CPU use; L{autoscale.plan} then sizes the swarm for the next
+    bucket.  Bees beyond the roster are called up in the background and
+    join at the first boundary after they are ready; they are passed to
+    enlist, which adds them to the roster (the ids of every bee in the
+    swarm, firing or still starting) so that 'bees down' takes care of
+    them, and those which never become ready are terminated.  A bee warms
+    up (if asked to) before its first bucket only.
+
+    @return: a summary like L{_aggregate_reports}'s over every bee's every
+        bucket, whose rate counts each bucket's firing window (so that it
+        is measured only while bees were firing), with the 'buckets'
+        timeline.
+    """
+    target_rps = autoscaling['target_rps']
+    bucket = autoscaling['bucket']
+    max_bees = max(len(instances), autoscaling.get('max_bees') or 0)
+    firing_time = '%iS' % max(1, bucket - max(5, bucket // 5))
+    common = params[0]
+    region, username, key_name = common['region'], common['username'], common['key_name']
+
+    available = list(instances)
+    arrived = Queue.Queue()
+    calling_up = [0]
+    warmed = set()
+
+    def call_up(count):
+        try:
+            if region == local.LOCAL_REGION:
+                ec2_connection = None
+                fresh = local.up(count, exclude=list(roster))
             else:
-                # needs to be uploaded.
-                logging.info('uploading urls file to %s' % s3_name)
-                key = lt_bucket.new_key(s3_name)
-                key.set_contents_from_filename(url_file)
-                key.set_acl('public-read') # FIXME security
-                logging.info('...upload complete')
-
-        url_file = s3_name
-        logging.info('using url file: %s' % url_file)
-
-    params = []
-
-    for i, instance in enumerate(instances):
-        params.append({
-            'i': i,
-            'instance_id': instance.id,
-            'instance_name': instance.public_dns_name,
-            'url': url,
-            'url_file': url_file,
-            'url_file_bucket': bucket_name,
-            'concurrent_requests': connections_per_instance,
-            'num_requests': requests_per_instance,
-            'username': username,
-            'key_name': key_name,
-            'keepalive': keepalive,
-            'engine': engine,
-            'time' : time,
+                up = autoscaling['up']
+                ec2_connection = _connect_ec2(region)
+                fresh = _call_up(ec2_connection, count, up['group'], up['zone'],
+                                 up['image_id'], up['instance_type'], username, key_name,
+                                 up['siege_keepalive'], NullTracer())
+            ready = _wait_for_ready(region, username, key_name, fresh)
+            _stand_down_unready(ec2_connection, fresh, ready)
+            arrived.put(ready)
+        except Exception, e:
+            logging.exception(e)
+            arrived.put([])
+
+    boundaries = []
+
+    def get_fire_at(armed, rtt):
+        if not armed:
+            return None
+        earliest = time.time() + FIRE_LEAD + rtt
+        if not boundaries:
+            boundaries.append(earliest)
+        return autoscale.next_boundary(boundaries[0], bucket, earliest)
+
+    wanted, concurrency = len(instances), common['concurrent_requests']
+    buckets = []
+    reports = []
+    deadline = time.time() + get_seconds(duration)
+
+    while time.time() < deadline:
+        while not arrived.empty():
+            fresh = arrived.get()
+            calling_up[0] = 0
+            if fresh:
+                available.extend(fresh)
+                enlist(fresh)
+                logging.info('%i fresh bees joined the swarm.' % len(fresh))
+
+        firing = available[:wanted]
+        bucket_params = []
+        for k, instance in enumerate(firing):
+            p = dict(common, i=len(reports) + k, instance_id=instance.id,
+                     instance_name=instance.public_dns_name,
+                     concurrent_requests=concurrency, time=firing_time, sample_cpu=True)
+            if instance.id in warmed:
+                p.pop('warmup', None)
+            warmed.add(instance.id)
+            bucket_params.append(p)
+
+        with tracer.span('bucket', bees=len(firing), concurrency=concurrency):
+            bucket_reports = _run_swarm(bucket_params, True, tracer, get_fire_at=get_fire_at)
+        reports.extend(bucket_reports)
+
+        summary = _aggregate_reports(bucket_reports)
+        result = summary['result']
+        achieved = (result and result.requests_per_second) or 0.0
+        cpus = [r['cpu'] for r in bucket_reports if r.get('cpu') is not None]
+        busy = (cpus and sum(cpus) / len(cpus)) or None
+        windows = summary['windows'] or []
+        buckets.append({
+            'start': (windows and min(w[0] for w in windows)) or None,
+            'end': (windows and max(w[1] for w in windows)) or None,
+            'bees': len(firing),
+            'concurrency': concurrency,
+            'rps': achieved,
+            'p99': (result and result.pctile_99) or 0.0,
+            'busy': busy,
+        })
+        logging.info('Bucket %i: %i bees at concurrency %i made %.1f requests per second (target %.1f), CPU %s busy.' % (
+            len(buckets), len(firing), concurrency, achieved, target_rps,
+            (busy is None and 'unknown') or '%i%%' % (busy * 100)))
+
+        wanted, concurrency = autoscale.plan(target_rps, achieved, len(firing), concurrency, busy, max_bees)
+        if wanted > len(available) and not calling_up[0]:
+            # the bees there are fire meanwhile
+            calling_up[0] = wanted - len(available)
+            logging.info('Calling up %i more bees to reach the target.' % calling_up[0])
+            thread = threading.Thread(target=call_up, args=(calling_up[0],))
+            thread.daemon = True
+            thread.start()
+
+    # merge every bee's every bucket, then rate them over the buckets' firing windows
+    summary = _aggregate_reports([dict(r, window=None) for r in reports])
+    spans = [(b['start'], b['end']) for b in buckets if b['start'] is not None]
+    if summary['result'] is not None and spans:
+        firing_seconds = sum(end - start for start, end in spans)
+        summary['result'] = summary['result']._replace(
+            concurrency=float(max(b['bees'] * b['concurrency'] for b in buckets)),
+            time_taken=spans[-1][1] - spans[0][0],
+            requests_per_second=summary['result'].complete_requests / firing_seconds)
+    summary['buckets'] = buckets
+    return summary
+
+
+def _capacity_search(params, slo, tracer):
+    """
+    Search for the highest total concurrency which meets the objective.
+
+    Each stage spreads a load level over the bees and runs for up to
+    'stage' seconds, in chunks of 'min_stage' seconds; after every chunk
+    the merged results so far are judged (see L{capacity.judge}) and the
+    stage ends as soon as the verdict is clear.  The search itself is
+    L{capacity.search}, from 'start' up to 'max' concurrent requests.
+
+    @return: the summary (see L{_aggregate_reports}) of the best passing
+        stage, or an empty one if none passed, with the search's 'stages'
+        and the 'capacity' found.
+    """
+    bees = len(params)
+    stages = []
+    # total concurrency -> (verdict, summary); levels are rounded down to
+    # a multiple of the bees, so several may come to the same one
+    probed = {}
+    counter = [0]
+
+    def total(level):
+        return max(1, level // bees) * bees
+
+    def probe(level):
+        if total(level) in probed:
+            return probed[total(level)][0]
+        per_bee = total(level) // bees
+        reports = []
+        elapsed = 0
+        verdict = None
+        summary = _aggregate_reports([])
+        result = None
+        requests = errors = 0
+        started = time.time()
+        while verdict is None and elapsed < slo['stage']:
+            chunk = min(slo['min_stage'], slo['stage'] - elapsed)
+            chunk_params = []
+            for p in params:
+                chunk_params.append(dict(p, i=counter[0], concurrent_requests=per_bee, time='%iS' % chunk))
+                counter[0] += 1
+            # the bees warm up before the first stage only
+            for p in params:
+                p.pop('warmup', None)
+
+            with tracer.span('stage_chunk', level=per_bee * bees, seconds=chunk):
+                reports.extend(_run_swarm(chunk_params, True, tracer))
+            elapsed += chunk
+
+            summary = _aggregate_reports([dict(r, window=None) for r in reports])
+            result = summary['result']
+            requests = errors = 0
+            if result is not None:
+                requests = int(result.complete_requests)
+                errors = min(requests, int(result.failed_requests + result.non_2xx_responses))
+            verdict = capacity.judge(summary['histogram'], requests, errors, slo['p99'], slo['errors'],
+                                     final=elapsed >= slo['stage'])
+
+        p99 = (summary['histogram'] and summary['histogram'].quantile(0.99)) or (result and result.pctile_99) or 0.0
+        if result is not None:
+            # the bees' rates add up within a chunk, not across chunks
+            summary['result'] = result = result._replace(
+                concurrency=float(per_bee * bees), time_taken=float(elapsed),
+                requests_per_second=result.complete_requests / elapsed)
+        windows = [r['window'] for r in reports if r.get('window')]
+        stages.append({
+            'start': (windows and min(w[0] for w in windows)) or started,
+            'end': (windows and max(w[1] for w in windows)) or time.time(),
+            'rps': (result and result.requests_per_second) or 0.0,
+            'level': per_bee * bees,
+            'seconds': elapsed,
+            'requests': requests,
+            'errors': errors,
+            'p99': p99,
+            'passed': verdict,
         })
+        probed[total(level)] = (verdict, summary)
+        logging.info('Stage at %i concurrent requests %s after %is: 99%% time %i [ms], %i errors in %i requests.' % (
+            per_bee * bees, verdict and 'passed' or 'failed', elapsed, p99, errors, requests))
+        return verdict
+
+    best = capacity.search(probe, slo['start'], slo['max'], slo['precision'])
+    if best:
+        best = total(best)
+        summary = probed[best][1]
+    else:
+        summary = _aggregate_reports([])
+    summary['stages'] = stages
+    summary['capacity'] = best
+    return summary
 
-    logging.info('Stinging URL so it will be cached for the attack.')
 
-    # Ping url so it will be cached for testing
-    #if url:
-    #    #urllib2.urlopen(url, timeout=5)
+def _preflight(params):
+    """
+    Tune a bee where it falls short and collect its limits.
 
-    # Spin up processes for connecting to EC2 instances
-    pool = Pool(len(params))
-    results = pool.map(_attack, params)
+    Intended for use with multiprocessing, like L{_attack}.  The report's
+    'limits' are those printed by the bee (see L{preflight.main}), or None
+    if it could not be checked.
+    """
+    from preflight import parse as parse_preflight
 
-    logging.debug('Offensive complete.')
+    ident = '%s/%s' % (params['i'], params['instance_id'])
 
-    timeout_bees = [r for r in results if r is None]
-    exception_bees = [r for r in results if type(r) == socket.error]
-    complete_bees = [r for r in results if r is not None and type(r) != socket.error]
+    if params.get('trace'):
+        tracer = Tracer(pid=params['i'] + 1)
+    else:
+        tracer = NullTracer()
 
-    logging.info('%s of %s clients succeeded.' % (len(complete_bees), len(results)))
+    report = {
+        'i': params['i'],
+        'instance_id': params['instance_id'],
+        'limits': None,
+        'spans': tracer.spans,
+    }
 
-    aggregate_result = get_aggregate_result(complete_bees)
+    try:
+        with tracer.span('ssh_connect', bee=ident):
+            client = _connect(params)
+        try:
+            with tracer.span('stage_package'):
+                _stage_file(client, params['package_zip'], 'bees.zip', ident)
+            with tracer.span('preflight'):
+                stdin, stdout, stderr = _exec_command_blocking(client, BEE_MODULE_COMMAND % 'preflight' + ' --tune', ident)
+                report['limits'] = parse_preflight(stdout.read())
+            if report['limits'] is None:
+                logging.warning('Bee %s could not check its limits: %s' % (ident, stderr.read()))
+        finally:
+            client.close()
 
-    if output_type=='csvh':
-        print >> sys.stdout, ','.join(aggregate_result._fields)
-        output_type = 'csv'
+    except Exception, e:
+        # the bee is attacked with no limits known, the others are checked
+        logging.warning('Could not check the limits of %s: %s: %s' % (ident, type(e).__name__, e))
 
-    if output_type=='csv':
-        # it is presumed that csv output should be suppressed when some
-        # workers failed.
-        if not timeout_bees and not exception_bees:
-            print >> sys.stdout, ','.join(map(str,aggregate_result))
-        else:
-            logging.warning('test results invalid - one or more clients failed')
+    return report
+
+
+def _calibrate(params):
+    """
+    Stage a bee and calibrate its engines.
+
+    Intended for use with multiprocessing, like L{_attack}.  The report's
+    'calibration' is what the bee printed (see L{calibrate.main}), or None
+    if it could not be calibrated.
+    """
+    from calibrate import parse as parse_calibration
+
+    ident = '%s/%s' % (params['i'], params['instance_id'])
+
+    if params.get('trace'):
+        tracer = Tracer(pid=params['i'] + 1)
+    else:
+        tracer = NullTracer()
+
+    report = {
+        'i': params['i'],
+        'instance_id': params['instance_id'],
+        'calibration': None,
+        'spans': tracer.spans,
+    }
+
+    try:
+        with tracer.span('ssh_connect', bee=ident):
+            client = _connect(params)
+        try:
+            # siege needs its helper, where there is one to stage
+            engine = (os.path.exists('siege_calc') and 'siege') or 'ab'
+            _stage(client, {'package_zip': params['package_zip'], 'engine': engine, 'url_file': None}, tracer, ident)
+            with tracer.span('calibrate'):
+                stdin, stdout, stderr = _exec_command_blocking(
+                    client, BEE_MODULE_COMMAND % 'calibrate' + params['options'], ident)
+                report['calibration'] = parse_calibration(stdout.read())
+            if report['calibration'] is None:
+                logging.warning('Bee %s could not be calibrated: %s' % (ident, stderr.read()))
+        finally:
+            client.close()
+
+    except Exception, e:
+        # the bee's measurements are dropped, the others are still saved
+        logging.warning('Could not calibrate %s: %s: %s' % (ident, type(e).__name__, e))
+
+    return report
+
+
+def _get_ceiling(instances, engine, keepalive, filename):
+    """
+    @param filename: the calibrated profiles, None for none
+    @return: the most requests per second the bees were calibrated to
+        fire with the engine (see L{calibrate.get_ceiling}), or None
+    """
+    if not filename:
+        return None
+    import calibrate
+    profiles = calibrate.load_profiles(filename)
+    if not profiles:
+        return None
+    return calibrate.get_ceiling(profiles, [i.instance_type for i in instances],
+                                 calibrate.get_key(engine, keepalive))
+
+
+def _preflight_swarm(params, c, n, tracer):
+    """
+    Check and tune every bee, then share c concurrent requests (and n
+    requests) between the bees within what each can hold, warning of
+    what was changed.  Bees which could not be checked take an even share,
+    and bees which can hold nothing are left out.
+
+    @return: (checks, params): what was found on each bee (see
+        L{preflight.print_preflight}), and the params of the bees taking
+        part
+    """
+    import preflight
+
+    reports = _run_swarm([dict(p) for p in params], False, tracer, worker=_preflight)
+    limits = [r['limits'] for r in sorted(reports, key=lambda r: r['i'])]
+    capacities = [l and preflight.get_capacity(l) for l in limits]
+    shares = preflight.fit(capacities, c)
+    if sum(shares) < c:
+        logging.warning('The bees can only hold %i of the %i concurrent requests.' % (sum(shares), c))
+
+    checks = []
+    fitted = []
+    for p, bee_limits, share in zip(params, limits, shares):
+        checks.append({
+            'instance_id': p['instance_id'],
+            'limits': bee_limits,
+            'changed': (bee_limits and bee_limits['changed']) or [],
+            'failed': (bee_limits and bee_limits['failed']) or [],
+            'concurrency': share,
+            'asked': p['concurrent_requests'],
+        })
+        if checks[-1]['changed']:
+            logging.info('Bee %s tuned %s.' % (p['instance_id'], '; '.join(checks[-1]['changed'])))
+        if checks[-1]['failed']:
+            logging.warning('Bee %s could not tune: %s.' % (p['instance_id'], '; '.join(checks[-1]['failed'])))
+        if share != p['concurrent_requests']:
+            logging.warning('Bee %s will fire %i concurrent requests instead of %i.' % (
+                p['instance_id'], share, p['concurrent_requests']))
+        if share <= 0:
+            continue
+        p['concurrent_requests'] = share
+        p['num_requests'] = int(float(n) * share / c)
+        if bee_limits and bee_limits['nofile'] < bee_limits['nofile_hard']:
+            p['nofile'] = bee_limits['nofile_hard']
+        fitted.append(p)
+
+    for i, p in enumerate(fitted):
+        p['i'] = i
+    return (checks, fitted)
+
+
+def _start_soak(params):
+    """
+    Stage a bee and start its soak in the background.
+
+    Intended for use with multiprocessing, like L{_attack}.  The report's
+    'offset' is the bee's clock offset, or None if the soak did not start.
+    """
+    ident = '%s/%s' % (params['i'], params['instance_id'])
+
+    if params.get('trace'):
+        tracer = Tracer(pid=params['i'] + 1)
+    else:
+        tracer = NullTracer()
+
+    report = {
+        'i': params['i'],
+        'instance_id': params['instance_id'],
+        'offset': None,
+        'spans': tracer.spans,
+    }
+
+    try:
+        with tracer.span('ssh_connect', bee=ident):
+            client = _connect(params)
+        try:
+            _stage(client, params, tracer, ident)
+
+            with tracer.span('clock_sync'):
+                offset, rtt = _measure_clock_offset(client)
+
+            orders = dict((k, params[k]) for k in ('engine', 'num_requests', 'concurrent_requests',
+                                                   'keepalive', 'url', 'connection'))
+            orders.update(params['soak'])
+            cmd = soak.get_run_command(orders)
+            if params.get('nofile'):
+                from preflight import get_limited_command
+                cmd = get_limited_command(cmd, params['nofile'])
+            with tracer.span('start_soak'):
+                _exec_command_blocking(client, cmd, ident)
+            report['offset'] = offset
+        finally:
+            client.close()
+
+    except Exception, e:
+        # the bee is left out of the checkpoint, the others soak on
+        logging.error('could not start the soak (%s):' % ident)
+        logging.exception(e)
+
+    return report
+
+
+def _pull_soak(params):
+    """
+    Pull a bee's new soak segments, after deleting those already acked.
+
+    @return: dict of the bee's 'segments' and its soak's 'state' (None if
+        the bee could not be reached)
+    """
+    ident = '%s/%s' % (params['i'], params['instance_id'])
+    report = {'i': params['i'], 'segments': [], 'state': None}
+    try:
+        client = _connect(params)
+        try:
+            stdin, stdout, stderr = _exec_command_blocking(client, soak.get_pull_command(params['acked']), ident)
+            report['segments'], report['state'] = soak.parse_pull(stdout.read())
+        finally:
+            client.close()
+    except Exception, e:
+        # the next round tries again
+        logging.warning('Could not pull the soak from %s: %s' % (ident, e))
+    return report
+
+
+def _soak_attack(params, duration, soak_options, tracer):
+    """
+    Start a soak on every bee, then follow it.
+
+    @param duration: seconds the bees fire for
+    @return: the soak's summary (see L{soak.Checkpoint.summary}), or None
+        if it could not start or was no longer followed
+    """
+    segment = soak_options.get('segment') or soak.SEGMENT
+    filename = soak_options.get('checkpoint') or SOAK_FILENAME
+    for p in params:
+        p['soak'] = {'duration': duration, 'segment': segment}
+
+    reports = _run_swarm(params, False, tracer, worker=_start_soak)
+
+    bees = []
+    for p, report in zip(params, reports):
+        bees.append({
+            'instance_id': p['instance_id'],
+            'instance_name': p['instance_name'],
+            'region': p['region'],
+            'username': p['username'],
+            'key_name': p['key_name'],
+            'offset': report['offset'] or 0.0,
+            'acked': 0,
+            'state': (report['offset'] is None and soak.GONE) or soak.RUNNING,
+        })
+    if all(bee['state'] == soak.GONE for bee in bees):
+        logging.error('No bees started the soak.')
+        return None
+
+    checkpoint = soak.Checkpoint(bees, time.time(), duration, segment,
+                                 sum(p['concurrent_requests'] for p in params))
+    checkpoint.save(filename)
+    logging.info('The bees are soaking the target for %i seconds, checkpointing to %s.' % (duration, filename))
+    return _follow_soak(checkpoint, filename)
+
+
+def _follow_soak(checkpoint, filename):
+    """
+    Pull the bees' segments into the checkpoint, saving it after every
+    round, until every bee's soak has finished.  Once saved, segments are
+    deleted from the bees by the next round's pulls.
+
+    @return: the soak's summary, or None if the controller was interrupted
+    """
+    from multiprocessing.pool import ThreadPool
+    deadline = checkpoint.started + checkpoint.duration + SOAK_GRACE
+    try:
+        while not checkpoint.finished:
+            started = time.time()
+            params = [dict(bee, i=i) for i, bee in enumerate(checkpoint.bees) if bee['state'] == soak.RUNNING]
+            pool = ThreadPool(len(params))
+            # with a timeout, so that it can be interrupted
+            pulls = pool.map_async(_pull_soak, params).get(PULL_TIMEOUT)
+            pool.close()
+
+            backlog = False
+            for pull in pulls:
+                for segment in pull['segments']:
+                    checkpoint.add(pull['i'], segment)
+                backlog = backlog or len(pull['segments']) >= soak.PULL_LIMIT
+                if pull['state']:
+                    checkpoint.set_state(pull['i'], pull['state'])
+                elif time.time() > deadline:
+                    logging.warning('Giving up on %s, which could not be reached.' % checkpoint.bees[pull['i']]['instance_id'])
+                    checkpoint.set_state(pull['i'], soak.GONE)
+            checkpoint.settle()
+            checkpoint.save(filename)
+
+            if not (checkpoint.finished or backlog):
+                time.sleep(max(0.0, checkpoint.segment - (time.time() - started)))
+    except KeyboardInterrupt:
+        logging.warning('Stopped following the soak, which carries on on the bees; "bees reattach" picks it up from %s.' % filename)
+        return None
+    return checkpoint.summary()
+
+
+def _get_timeline(summary):
+    """
+    The attack's time buckets: an autoscaled attack's buckets, a capacity
+    search's stages, or else the swarm's whole firing window.
+
+    @return: list of dicts with each bucket's 'start' and 'end' (epoch
+        seconds), and the swarm's 'rps' and 'p99' over it
+    """
+    buckets = summary.get('buckets') or summary.get('stages')
+    if buckets:
+        return [{'start': b['start'], 'end': b['end'], 'rps': b['rps'], 'p99': b['p99']}
+                for b in buckets if b['start'] is not None]
+
+    windows, result = summary['windows'], summary['result']
+    if not windows or result is None:
+        return []
+    return [{
+        'start': min(w[0] for w in windows),
+        'end': max(w[1] for w in windows),
+        'rps': result.requests_per_second,
+        'p99': result.pctile_99,
+    }]
+
+
+def _print_stages(stages, best, slo, out):
+    """
+    Print a capacity search's stages and what it found.
+    """
+    print >> out, 'Objective:\t\t99%% time <= %i [ms], errors <= %.3f%%' % (slo['p99'], slo['errors'] * 100)
+    print >> out, 'Stages:'
+    for s in stages:
+        print >> out, '  %i concurrent\t%s in %is, 99%% %i [ms], %i errors in %i requests' % (
+            s['level'], s['passed'] and 'passed' or 'failed', s['seconds'], s['p99'], s['errors'], s['requests'])
+    if best:
+        print >> out, 'Capacity:\t\t%i concurrent requests' % best
     else:
-        aggregate_result.print_text(sys.stdout)
+        print >> out, 'Capacity:\t\tno load level met the objective'
+
 
+def _print_buckets(buckets, target_rps, out):
+    """
+    Print an autoscaled attack's timeline.
+    """
+    print >> out, 'Target rate:\t\t%.2f [#/sec]' % target_rps
+    print >> out, 'Buckets:'
+    first = buckets[0]['start']
+    for b in buckets:
+        print >> out, '  %s\t%i bees x %i, %.2f [#/sec], CPU %s' % (
+            (b['start'] is not None and first is not None and '+%.0fs' % (b['start'] - first)) or '-',
+            b['bees'], b['concurrency'], b['rps'],
+            (b['busy'] is None and '-') or '%i%%' % (b['busy'] * 100))
+
+
+def _plan_relays(instances, relays):
+    """
+    Split the swarm into relay bees and the bees each relay commands.
+
+    @return: list of (relay instance, list of indices into the rest)
+    """
+    relay_instances = instances[:relays]
+    bees = range(len(instances) - relays)
+    return [(relay, bees[k::relays]) for k, relay in enumerate(relay_instances)]
+
+
+class AttackResult(object):
+    """
+    What an attack found: the swarm's aggregate L{TesterResult} in
+    'result' (None if no bee completed the attack), with its merged
+    'histogram', 'breakdown', 'exemplars' and 'warmup' (None if the bees
+    did not report them), the bees' firing 'windows', how many 'bees'
+    attacked and how many 'failed', and, for autoscaled attacks and
+    capacity searches, the 'buckets' or the 'stages' and 'capacity' found.
+    Scenario attacks have the latencies of each step in 'steps', soaks
+    their timeline in 'segments' (see L{soak.Checkpoint}), and attacks
+    holding connections the timeline of those held in 'hold' (see
+    L{hold.merge_all}).
+    With a pre-flight, what it found and changed on each bee is in
+    'preflight' (see L{preflight.print_preflight}).  If the bees were
+    calibrated, the most they can fire with the engine is in 'ceiling'
+    (see L{calibrate.get_ceiling}).  Attacks replaying seeded schedules
+    have their 'seed', 'digest', the 'requests' scheduled, the number of
+    'late' requests and 'max_lag_ms' (None without a rate) and the number
+    of bees which replayed another schedule ('mismatched') in 'schedule'.
+    If the target's metrics were scraped, their samples are in 'metrics'
+    and their summary over the attack's time buckets in 'timeline' (see
+    L{metrics.align}).
+    """
 
-    logging.info('The swarm is awaiting new orders.')
+    def __init__(self, summary, autoscaling=None, slo=None):
+        self.bees = summary['bees']
+        self.failed = summary['failed']
+        self.result = summary['result']
+        self.histogram = summary['histogram']
+        self.breakdown = summary['breakdown']
+        self.exemplars = summary['exemplars']
+        self.steps = summary.get('steps')
+        self.segments = summary.get('segments')
+        self.hold = summary.get('hold')
+        self.preflight = summary.get('preflight')
+        self.ceiling = summary.get('ceiling')
+        self.schedule = summary.get('schedule')
+        self.windows = summary['windows']
+        self.warmup = summary['warmup']
+        self.buckets = summary.get('buckets')
+        self.stages = summary.get('stages')
+        self.capacity = summary.get('capacity')
+        self.metrics = summary.get('metrics')
+        self.timeline = summary.get('timeline')
+        self.autoscaling = autoscaling
+        self.slo = slo
+
+
+    @property
+    def start_skew(self):
+        """
+        @return: seconds between the first and last bee starting to fire,
+            or None if the bees did not report their windows
+        """
+        if not self.windows:
+            return None
+        return max(w[0] for w in self.windows) - min(w[0] for w in self.windows)
+
+
+    def print_text(self, out):
+        """
+        Print the attack's results.
+
+        @param out: file-like, open for writing, into which output will be printed.
+        """
+        if self.preflight:
+            import preflight
+            preflight.print_preflight(self.preflight, out)
+        if self.stages is not None:
+            _print_stages(self.stages, self.capacity, self.slo, out)
+        if self.result is None:
+            return
+        self.result.print_text(out)
+        if self.windows:
+            print >> out, 'Start skew:\t\t%.3f [s]' % self.start_skew
+            window = clock.shared_window(self.windows)
+            print >> out, 'Shared window:\t\t%.3f [s]' % ((window and window[1] - window[0]) or 0.0)
+        if self.ceiling and self.result.requests_per_second is not None:
+            print >> out, 'Calibrated ceiling:\t%.0f [#/sec] (%.0f%% fired)' % (
+                self.ceiling, 100.0 * self.result.requests_per_second / self.ceiling)
+        if self.schedule:
+            print >> out, 'Schedule seed:\t\t%s' % self.schedule['seed']
+            print >> out, 'Schedule digest:\t%s' % self.schedule['digest']
+            if self.schedule['late'] is not None:
+                print >> out, 'Late requests:\t\t%i (%i [ms] late at most)' % (self.schedule['late'], self.schedule['max_lag_ms'])
+            if self.schedule['mismatched']:
+                print >> out, 'Off schedule:\t\t%i bees replayed another schedule' % self.schedule['mismatched']
+        if self.breakdown:
+            self.breakdown.print_text(out)
+        if self.steps:
+            import scenario
+            scenario.print_steps(self.steps, out)
+        if self.exemplars:
+            self.exemplars.print_text(out)
+        if self.hold:
+            import hold
+            hold.print_timeline(self.hold, out)
+        if self.buckets:
+            _print_buckets(self.buckets, self.autoscaling['target_rps'], out)
+        if self.segments:
+            soak.print_segments(self.segments, out)
+        if self.timeline:
+            metrics.print_timeline(self.timeline, out)
+        if self.warmup:
+            warmed = self.warmup
+            print >> out, 'Warm-up requests:\t%i (not included above)' % warmed['requests']
+            print >> out, 'Warm-up failed:\t\t%i' % warmed['failed']
+            print >> out, 'Warm-up non-2xx:\t%i' % warmed['non_2xx']
+            print >> out, 'Warm-up 99%% time:\t%i [ms]' % warmed['histogram'].quantile(0.99)
+
+
+    def print_csv(self, out, header=False):
+        """
+        Print the aggregate result as a csv row, after a row of field
+        names if header is set.
+        """
+        if header:
+            print >> out, ','.join(self.result._fields)
+        print >> out, ','.join(map(str, self.result))
+
+
+    def write_exemplars(self, filename):
+        """
+        Write the swarm's slowest and failed requests to filename as JSON,
+        with their start times on the controller's clock.
+        """
+        with open(filename, 'w') as f:
+            json.dump(self.exemplars.to_dict(), f, indent=2)
+
+
+    def write_metrics(self, filename):
+        """
+        Write the target's metric samples and timeline to filename as JSON.
+        """
+        with open(filename, 'w') as f:
+            json.dump({'samples': self.metrics, 'timeline': self.timeline}, f, indent=2)
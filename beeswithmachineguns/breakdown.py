@@ -0,0 +1,239 @@
+"""
+Per-url and per-status latency breakdown in bounded memory.
+
+A bee sees every request's url, status and timing, but shipping them all
+back does not scale.  Instead it keeps a Space-Saving heavy hitters sketch
+of the url patterns it hit, with a small L{Histogram} and status counts for
+each tracked pattern, plus a histogram per status code.  Memory stays
+bounded however many distinct urls there are; requests to patterns which
+fall out of the sketch are still counted under 'other'.  Breakdowns merge
+like histograms do, so relays and the controller can combine them.
+"""
+
+import json
+import re
+import urlparse
+
+from histogram import Histogram
+
+
+# prefix of the line on which bee-side helpers print the run's breakdown
+BREAKDOWN_MARKER = 'bees-breakdown:'
+
+# url patterns tracked per breakdown
+CAPACITY = 50
+
+# path segments which look like ids: numbers, uuids and long hex strings
+_ID_SEGMENT = re.compile(r'^(\d+|[0-9a-fA-F-]{8,})$')
+
+
+def _is_id(segment):
+    return _ID_SEGMENT.match(segment) is not None and re.search(r'\d', segment) is not None
+
+
+def url_pattern(url):
+    """
+    Reduce a url to its pattern: the path, with id-like segments replaced
+    by ':id' and the query string dropped.
+    """
+    path = urlparse.urlparse(url).path or '/'
+    return '/'.join((_is_id(s) and ':id') or s for s in path.split('/'))
+
+
+def _new_entry(count=0):
+    # count overestimates the pattern's requests by at most error
+    return {'count': count, 'error': count, 'histogram': Histogram(), 'statuses': {}}
+
+
+class Breakdown(object):
+    """
+    Latencies by url pattern and by status code.
+    """
+
+    def __init__(self, capacity=CAPACITY):
+        self.capacity = capacity
+        # url pattern -> entry (see _new_entry)
+        self.patterns = {}
+        # latencies of requests whose pattern is not tracked
+        self.other = Histogram()
+        # status code (as a string) -> L{Histogram}
+        self.statuses = {}
+
+
+    def record(self, url, status, ms, pattern=None):
+        """
+        Count one request.
+
+        @param url: the url or path requested, or None if unknown
+        @param status: the response's HTTP status code
+        @param ms: the request's latency
+        @param pattern: if given, count the request under this key as it
+            is, instead of the url's pattern
+        """
+        status = str(status)
+        self.statuses.setdefault(status, Histogram()).record(ms)
+
+        if pattern is None:
+            if url is None:
+                self.other.record(ms)
+                return
+            pattern = url_pattern(url)
+
+        entry = self.patterns.get(pattern)
+        if entry is None:
+            if len(self.patterns) < self.capacity:
+                entry = _new_entry()
+            else:
+                # the new pattern takes over the least counted one's count
+                evicted = self.patterns.pop(self._min_pattern())
+                self.other.merge(evicted['histogram'])
+                entry = _new_entry(evicted['count'])
+            self.patterns[pattern] = entry
+
+        entry['count'] += 1
+        entry['histogram'].record(ms)
+        entry['statuses'][status] = entry['statuses'].get(status, 0) + 1
+
+
+    def _min_pattern(self):
+        return min(self.patterns, key=lambda p: self.patterns[p]['count'])
+
+
+    def _floor(self):
+        """
+        @return: the most requests an untracked pattern could have had
+        """
+        if len(self.patterns) < self.capacity:
+            return 0
+        return self.patterns[self._min_pattern()]['count']
+
+
+    def merge(self, other):
+        """
+        Add another breakdown to this one, keeping the capacity of this one.
+
+        @return: self
+        """
+        floors = (self._floor(), other._floor())
+        merged = {}
+        for pattern in set(self.patterns) | set(other.patterns):
+            entry = _new_entry()
+            for breakdown, floor in zip((self, other), floors):
+                part = breakdown.patterns.get(pattern)
+                if part is None:
+                    entry['count'] += floor
+                    entry['error'] += floor
+                    continue
+                entry['count'] += part['count']
+                entry['error'] += part['error']
+                entry['histogram'].merge(part['histogram'])
+                for status, count in part['statuses'].items():
+                    entry['statuses'][status] = entry['statuses'].get(status, 0) + count
+            merged[pattern] = entry
+
+        self.other.merge(other.other)
+        kept = sorted(merged, key=lambda p: merged[p]['count'], reverse=True)[:self.capacity]
+        for pattern in set(merged) - set(kept):
+            self.other.merge(merged[pattern]['histogram'])
+        self.patterns = dict((p, merged[p]) for p in kept)
+
+        for status, histogram in other.statuses.items():
+            self.statuses.setdefault(status, Histogram()).merge(histogram)
+        return self
+
+
+    @property
+    def count(self):
+        return sum(h.count for h in self.statuses.values())
+
+
+    def non_2xx(self):
+        return sum(h.count for s, h in self.statuses.items() if not s.startswith('2'))
+
+
+    def rows(self, threshold):
+        """
+        The tracked patterns, those with the most requests at least as slow
+        as threshold (e.g. the overall 99th percentile) first.
+
+        @return: list of (pattern, entry, requests at least that slow)
+        """
+        rows = [(p, e, e['histogram'].count_at_least(threshold)) for p, e in self.patterns.items()]
+        return sorted(rows, key=lambda r: (r[2], r[1]['histogram'].quantile(0.99)), reverse=True)
+
+
+    def print_text(self, out, limit=10):
+        """
+        Print the status codes and the url patterns driving the 99th
+        percentile.
+
+        @param out: file-like, open for writing, into which output will be printed.
+        @param limit: the most url patterns to print
+        """
+        overall = Histogram()
+        for histogram in self.statuses.values():
+            overall.merge(histogram)
+        p99 = overall.quantile(0.99)
+
+        print >> out, 'Status codes:'
+        for status in sorted(self.statuses):
+            h = self.statuses[status]
+            print >> out, '  %s\t%i requests, 50%% %i [ms], 99%% %i [ms]' % (
+                status, h.count, h.quantile(0.5), h.quantile(0.99))
+
+        if len(self.patterns) < 2:
+            return
+
+        print >> out, 'Slowest url patterns (requests at the 99%% time of %i [ms] or slower):' % p99
+        for pattern, entry, slow in self.rows(p99)[:limit]:
+            h = entry['histogram']
+            non_2xx = sum(c for s, c in entry['statuses'].items() if not s.startswith('2'))
+            print >> out, '  %s\t%i that slow, %i requests%s, 50%% %i [ms], 99%% %i [ms], %i non-2xx' % (
+                pattern, slow, h.count,
+                entry['error'] and ' (of up to %i)' % entry['count'] or '',
+                h.quantile(0.5), h.quantile(0.99), non_2xx)
+        if self.other.count:
+            print >> out, '  (other)\t%i requests, 99%% %i [ms]' % (self.other.count, self.other.quantile(0.99))
+
+
+    def to_dict(self):
+        return {
+            'capacity': self.capacity,
+            'patterns': dict((p, dict(e, histogram=e['histogram'].to_dict()))
+                             for p, e in self.patterns.items()),
+            'other': self.other.to_dict(),
+            'statuses': dict((s, h.to_dict()) for s, h in self.statuses.items()),
+        }
+
+
+    @classmethod
+    def from_dict(cls, d):
+        b = cls(d['capacity'])
+        for pattern, entry in d['patterns'].items():
+            b.patterns[pattern] = dict(entry, histogram=Histogram.from_dict(entry['histogram']))
+        b.other = Histogram.from_dict(d['other'])
+        b.statuses = dict((s, Histogram.from_dict(h)) for s, h in d['statuses'].items())
+        return b
+
+
+    def to_json(self):
+        return json.dumps(self.to_dict(), separators=(',', ':'))
+
+
+    @classmethod
+    def from_json(cls, s):
+        return cls.from_dict(json.loads(s))
+
+
+def merge_all(breakdowns):
+    """
+    Merge a sequence of breakdowns (or their dicts) into a new breakdown.
+    """
+    merged = None
+    for b in breakdowns:
+        if isinstance(b, dict):
+            b = Breakdown.from_dict(b)
+        if merged is None:
+            merged = Breakdown(b.capacity)
+        merged.merge(b)
+    return merged
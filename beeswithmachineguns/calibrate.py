@@ -0,0 +1,341 @@
+"""
+Calibrating the engines against a local sink.
+
+Each engine has its own ceiling on how much load one bee can generate,
+and adds its own latency as it nears it.  'bees calibrate' has every bee
+run
+
+    PYTHONPATH=bees.zip python -m beeswithmachineguns.calibrate [-t SECONDS] [-l LEVELS] [-k]
+
+which starts a sink on the bee itself (forked processes answering every
+request at once, on half of the bee's CPUs) and fires each engine found
+on the bee at it for a few seconds at each of several concurrency
+levels.  As the sink answers at once, the rate is the engine's own
+ceiling and the latency its own overhead, give or take what the sink
+costs.  The engines write their url file and scenario plan as for an
+attack.
+
+The bee prints its results after CALIBRATE_MARKER; the controller keeps
+them as a profile for each instance type (the worst of its bees at each
+level) in PROFILE_FILENAME, which attacks check their load against.
+"""
+
+import errno
+import json
+import os
+import select
+import signal
+import socket
+import subprocess
+import sys
+import time
+from optparse import OptionParser
+
+
+CALIBRATE_MARKER = 'bees-calibrate:'
+
+PROFILE_FILENAME = os.path.expanduser('~/.bees-profiles')
+
+# concurrency levels each engine is tried at
+LEVELS = (1, 10, 50, 200)
+
+# seconds at each level
+SECONDS = 5
+
+# requests per concurrent request, for engines which cannot run for a time
+ROUNDS = 200
+
+# the binary each engine needs on the bee, if any
+BINARIES = {
+    'ab': 'ab',
+    'siege': 'siege',
+    'wideload': 'wideload_wrap',
+    'h2load': 'h2load',
+    'scenario': None,
+}
+
+# the share of an engine's ceiling past which an attack is the swarm's
+# limit as much as the target's
+NEAR_CEILING = 0.9
+
+_RESPONSE = 'HTTP/1.1 200 OK\r\nContent-Type: text/plain\r\nContent-Length: 2\r\n%s\r\nok'
+
+
+def _respond(head):
+    """
+    @return: (response, whether to keep the connection open)
+    """
+    lines = head.lower().split('\r\n')
+    keep = lines[0].endswith('http/1.1')
+    for line in lines[1:]:
+        if line.startswith('connection:'):
+            keep = 'keep-alive' in line
+    return (_RESPONSE % ((not keep and 'Connection: close\r\n') or ''), keep)
+
+
+def _serve(listener):
+    """
+    Answer every request on the listener's connections, until killed.
+    """
+    poller = select.epoll()
+    poller.register(listener.fileno(), select.EPOLLIN)
+    conns, bufs = {}, {}
+    while True:
+        try:
+            events = poller.poll(1.0)
+        except IOError, e:
+            if e.errno == errno.EINTR:
+                continue
+            raise
+        for fd, event in events:
+            if fd == listener.fileno():
+                while True:
+                    try:
+                        conn, address = listener.accept()
+                    except socket.error:
+                        # another worker took it, or none are left
+                        break
+                    conn.setblocking(0)
+                    conns[conn.fileno()] = conn
+                    bufs[conn.fileno()] = ''
+                    poller.register(conn.fileno(), select.EPOLLIN)
+                continue
+            conn = conns[fd]
+            try:
+                data = conn.recv(65536)
+            except socket.error, e:
+                if e.errno in (errno.EAGAIN, errno.EWOULDBLOCK):
+                    continue
+                data = ''
+            keep = bool(data)
+            buf = bufs[fd] + data
+            out = []
+            while keep and '\r\n\r\n' in buf:
+                head, buf = buf.split('\r\n\r\n', 1)
+                response, keep = _respond(head)
+                out.append(response)
+            bufs[fd] = buf
+            try:
+                if out:
+                    conn.sendall(''.join(out))
+            except socket.error:
+                keep = False
+            if not keep:
+                poller.unregister(fd)
+                del conns[fd], bufs[fd]
+                conn.close()
+
+
+def start_sink(workers):
+    """
+    Fork workers sharing one listening socket on the loopback interface.
+
+    @return: (port, the workers' pids)
+    """
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    listener.bind(('127.0.0.1', 0))
+    listener.listen(1024)
+    listener.setblocking(0)
+    pids = []
+    for k in range(workers):
+        pid = os.fork()
+        if pid == 0:
+            try:
+                _serve(listener)
+            finally:
+                os._exit(0)
+        pids.append(pid)
+    port = listener.getsockname()[1]
+    listener.close()
+    return (port, pids)
+
+
+def stop_sink(pids):
+    for pid in pids:
+        try:
+            os.kill(pid, signal.SIGKILL)
+            os.waitpid(pid, 0)
+        except OSError:
+            pass
+
+
+def _which(binary):
+    for directory in os.environ.get('PATH', '').split(os.pathsep):
+        if os.access(os.path.join(directory, binary), os.X_OK):
+            return True
+    return False
+
+
+def get_engines():
+    """
+    @return: the engines which can run on this bee
+    """
+    engines = [engine for engine, binary in sorted(BINARIES.items()) if binary is None or _which(binary)]
+    if 'siege' in engines and not os.path.exists('siege_calc'):
+        engines.remove('siege')
+    return engines
+
+
+def get_key(engine, keepalive):
+    """
+    @return: the name of the engine's profile, which depends on keep-alive
+    """
+    return (keepalive and '%s keepalive' % engine) or engine
+
+
+def _get_profile(rows):
+    best = max(rows, key=lambda row: row['rps'])
+    return {'levels': rows, 'max_rps': best['rps'], 'best_concurrency': best['concurrency']}
+
+
+def calibrate(engines, levels=LEVELS, seconds=SECONDS, keepalive=False, workers=None):
+    """
+    Fire each engine at a sink at each level.
+
+    @return: dict of the bee's 'cpus' and, in 'engines', the profile of
+        each engine which ran (see L{merge_profiles}) by its key (see
+        L{get_key})
+    """
+    from beeswithmachineguns.scenario import compile_scenario
+    from beeswithmachineguns.tester import ENGINES, ScenarioTester
+
+    cpus = os.sysconf('SC_NPROCESSORS_ONLN')
+    port, pids = start_sink(workers or max(1, cpus / 2))
+    url = 'http://127.0.0.1:%i/' % port
+    profiles = {}
+    try:
+        with open('urls.txt', 'w') as f:
+            f.write(url + '\n')
+        with open(ScenarioTester.plan_file, 'w') as f:
+            json.dump(compile_scenario({'flows': [{'steps': [{'url': url}]}]}), f)
+
+        for engine in engines:
+            t = ENGINES[engine]()
+            rows = []
+            for concurrency in levels:
+                cmd = t.get_command(concurrency * ROUNDS, concurrency, keepalive,
+                                    (engine != 'wideload' and url) or None, '%iS' % seconds)
+                output = subprocess.Popen(cmd, shell=True, stdout=subprocess.PIPE,
+                                          stderr=subprocess.STDOUT).communicate()[0]
+                result = t.parse_output(output)
+                if result is None or not result.complete_requests:
+                    continue
+                rows.append({
+                    'concurrency': concurrency,
+                    'rps': result.requests_per_second,
+                    'ms': result.ms_per_request,
+                    'p99': result.pctile_99,
+                })
+            if rows:
+                profiles[get_key(engine, keepalive)] = _get_profile(rows)
+    finally:
+        stop_sink(pids)
+    return {'cpus': cpus, 'engines': profiles}
+
+
+def parse(output):
+    """
+    @return: the results printed by a bee (see L{main}), or None
+    """
+    for line in output.splitlines():
+        if line.startswith(CALIBRATE_MARKER):
+            return json.loads(line[len(CALIBRATE_MARKER):])
+    return None
+
+
+def merge_profiles(results):
+    """
+    Merge the results of bees of one instance type, keeping each
+    engine's worst rate and latencies at each level.
+
+    @return: dict of the 'cpus', the number of 'bees', when it was
+        'calibrated' and each engine's profile in 'engines': its 'levels'
+        (each a dict of the 'concurrency', 'rps', mean 'ms' and 'p99'),
+        'max_rps' and the 'best_concurrency' at which it was reached
+    """
+    engines = {}
+    for result in results:
+        for key, profile in result['engines'].items():
+            levels = engines.setdefault(key, {})
+            for row in profile['levels']:
+                worst = levels.get(row['concurrency'])
+                if worst is None:
+                    levels[row['concurrency']] = dict(row)
+                else:
+                    worst['rps'] = min(worst['rps'], row['rps'])
+                    worst['ms'] = max(worst['ms'], row['ms'])
+                    worst['p99'] = max(worst['p99'], row['p99'])
+    return {
+        'cpus': min(r['cpus'] for r in results),
+        'bees': len(results),
+        'calibrated': time.time(),
+        'engines': dict((key, _get_profile([levels[c] for c in sorted(levels)]))
+                        for key, levels in engines.items()),
+    }
+
+
+def load_profiles(filename=PROFILE_FILENAME):
+    """
+    @return: the saved profiles by instance type, or {} if there are none
+    """
+    try:
+        with open(filename) as f:
+            return json.load(f)
+    except (IOError, ValueError):
+        return {}
+
+
+def save_profiles(profiles, filename=PROFILE_FILENAME):
+    with open(filename, 'w') as f:
+        json.dump(profiles, f, indent=2)
+
+
+def get_ceiling(profiles, instance_types, key):
+    """
+    @param instance_types: the instance type of each bee
+    @return: the most requests per second the bees can generate with the
+        engine (by its key), or None unless every type was calibrated
+    """
+    ceiling = 0.0
+    for instance_type in instance_types:
+        engine = profiles.get(instance_type, {}).get('engines', {}).get(key)
+        if engine is None:
+            return None
+        ceiling += engine['max_rps']
+    return ceiling
+
+
+def print_profiles(profiles, out):
+    """
+    Print each instance type's engine profiles.
+
+    @param out: file-like, open for writing, into which output will be printed.
+    """
+    for instance_type in sorted(profiles):
+        profile = profiles[instance_type]
+        print >> out, '%s (%i cpus, %i bees):' % (instance_type, profile['cpus'], profile['bees'])
+        for key in sorted(profile['engines']):
+            engine = profile['engines'][key]
+            print >> out, '  %s\tat most %.0f [#/sec] per bee, at concurrency %i' % (
+                key, engine['max_rps'], engine['best_concurrency'])
+            for row in engine['levels']:
+                print >> out, '    -c %i\t%.0f [#/sec], mean %.3f [ms], 99%% %i [ms]' % (
+                    row['concurrency'], row['rps'], row['ms'], row['p99'])
+
+
+def main():
+    parser = OptionParser(usage='%prog [-t SECONDS] [-l LEVELS] [-k]')
+    parser.add_option('-t', dest='seconds', type='int', default=SECONDS)
+    parser.add_option('-l', dest='levels', type='string', default=','.join(map(str, LEVELS)),
+                      help='comma separated concurrency levels')
+    parser.add_option('-k', dest='keepalive', action='store_true', default=False)
+    options, args = parser.parse_args()
+
+    levels = [int(level) for level in options.levels.split(',')]
+    results = calibrate(get_engines(), levels, options.seconds, options.keepalive)
+    print >> sys.stdout, '%s %s' % (CALIBRATE_MARKER, json.dumps(results))
+
+
+if __name__ == '__main__':
+    main()
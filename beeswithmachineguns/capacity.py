@@ -0,0 +1,112 @@
+"""
+Searching for the most load a target takes while meeting an objective.
+
+A capacity search probes load levels (total concurrency across the
+swarm) with short stages: exponentially upwards until a stage fails the
+objective, then by bisection between the last pass and the first fail.
+Each stage runs in chunks, and stops early as soon as the merged
+histogram's confidence intervals put the 99th percentile and the error
+rate clearly on one side of the objective.
+"""
+
+import math
+
+
+# confidence level of the intervals, as a normal quantile (95%)
+Z = 1.96
+
+
+def quantile_interval(histogram, q, z=Z):
+    """
+    Confidence interval for a quantile, from the order statistics around it.
+
+    @param histogram: L{Histogram} of the latencies seen
+    @param q: quantile, between 0.0 and 1.0
+    @return: (low, high) latency in ms, or None if the histogram is empty
+    """
+    n = histogram.count
+    if not n:
+        return None
+    spread = z * math.sqrt(n * q * (1 - q))
+    low = max(1, int(math.floor(n * q - spread)))
+    high = min(n, int(math.ceil(n * q + spread)) + 1)
+    return (histogram.quantile(float(low) / n), histogram.quantile(float(high) / n))
+
+
+def wilson_interval(k, n, z=Z):
+    """
+    Wilson score interval for a proportion of k in n.
+
+    @return: (low, high), or None if n is 0
+    """
+    if not n:
+        return None
+    p = float(k) / n
+    center = (p + z * z / (2 * n)) / (1 + z * z / n)
+    spread = z * math.sqrt(p * (1 - p) / n + z * z / (4 * n * n)) / (1 + z * z / n)
+    return (max(0.0, center - spread), min(1.0, center + spread))
+
+
+def judge(histogram, requests, errors, p99_ms, error_rate, final=False):
+    """
+    Decide whether a stage meets the objective.
+
+    @param histogram: L{Histogram} of the stage's latencies, or None
+    @param requests: requests made
+    @param errors: requests which failed or got a non-2xx response
+    @param p99_ms: the objective for the 99th percentile
+    @param error_rate: the objective for the fraction of errors
+    @param final: if set, decide on the point estimates when the
+        intervals are not conclusive, instead of returning None
+    @return: True if it passes, False if it fails, None if it is too soon
+        to tell
+    """
+    errors_ci = wilson_interval(min(errors, requests), requests)
+    p99_ci = histogram is not None and quantile_interval(histogram, 0.99)
+
+    if errors_ci and errors_ci[0] > error_rate:
+        return False
+    if p99_ci and p99_ci[0] > p99_ms:
+        return False
+    if errors_ci and p99_ci and errors_ci[1] <= error_rate and p99_ci[1] <= p99_ms:
+        return True
+
+    if not final:
+        return None
+    if not requests:
+        return False
+    p99 = (histogram is not None and histogram.quantile(0.99)) or 0.0
+    return float(errors) / requests <= error_rate and p99 <= p99_ms
+
+
+def search(probe, start, maximum, precision=0.1):
+    """
+    Find the highest load level that passes.
+
+    @param probe: callable taking a load level and returning whether it
+        passed
+    @param start: the first level to try
+    @param maximum: the highest level to try
+    @param precision: stop bisecting once the bracket is within this
+        fraction of the best passing level
+    @return: the highest passing level found, or 0 if none passed
+    """
+    passed, failed = 0, None
+    level = max(1, start)
+    while True:
+        if probe(level):
+            passed = level
+            if level >= maximum:
+                break
+            level = min(maximum, level * 2)
+        else:
+            failed = level
+            break
+
+    while failed is not None and failed - passed > max(1, passed * precision):
+        level = (passed + failed) // 2
+        if probe(level):
+            passed = level
+        else:
+            failed = level
+    return passed
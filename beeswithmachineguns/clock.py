@@ -0,0 +1,80 @@
+"""
+Clock offset estimation and synchronized firing for the bees.
+
+The controller measures each bee's clock offset over its ssh channel,
+picks a common fire time on its own clock and hands every bee that time
+translated to the bee's clock.  The bee sleeps until then and prints the
+moment it actually fired, so the controller can line up the windows
+during which each bee was generating load.
+"""
+
+import re
+
+
+# printed by the bee on stderr the moment it starts firing
+FIRED_AT_MARKER = 'bees-fired-at:'
+
+# reads lines on stdin and answers each with the local time, so a single
+# exec channel can be used for several round trips.
+CLOCK_ECHO_COMMAND = """python -u -c 'import sys, time
+for line in iter(sys.stdin.readline, ""):
+    sys.stdout.write("%.6f\\n" % time.time())
+'"""
+
+
+def estimate_offset(samples):
+    """
+    Estimate a remote clock's offset from a set of round trip samples.
+
+    Uses the sample with the smallest round trip time, assuming the remote
+    timestamp was taken halfway through it (as NTP does).
+
+    @param samples: sequence of (sent, remote, received) epoch seconds, where
+        sent/received are local times and remote is the remote clock's
+        reading in between.
+    @return: (offset, rtt) where remote time = local time + offset
+    """
+    if not samples:
+        raise ValueError('no clock samples')
+
+    sent, remote, received = min(samples, key=lambda s: s[2] - s[0])
+    rtt = received - sent
+    return (remote - (sent + rtt / 2.0), rtt)
+
+
+def get_fire_command(command, fire_at):
+    """
+    Wrap a tester command so it only starts at a given time.
+
+    @param command: the tester command line
+    @param fire_at: epoch seconds, on the bee's clock
+    @return: command line which waits, reports the fire time on stderr and
+        then runs the tester command
+    """
+    wait = ("python -c 'import sys, time; time.sleep(max(0, %.6f - time.time())); "
+            "sys.stderr.write(\"%s %%.6f\\n\" %% time.time())'") % (fire_at, FIRED_AT_MARKER)
+    return '%s && %s' % (wait, command)
+
+
+def parse_fired_at(output):
+    """
+    @return: the bee's fire time (on its own clock) from its output, or None
+    """
+    m = re.search(re.escape(FIRED_AT_MARKER) + r'\s+([0-9.]+)', output)
+    return (m and float(m.group(1))) or None
+
+
+def shared_window(windows):
+    """
+    The interval during which every bee was firing.
+
+    @param windows: sequence of (start, end) epoch seconds
+    @return: (start, end), or None if the windows do not overlap
+    """
+    if not windows:
+        return None
+    start = max(w[0] for w in windows)
+    end = min(w[1] for w in windows)
+    if end <= start:
+        return None
+    return (start, end)
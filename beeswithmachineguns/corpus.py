@@ -0,0 +1,325 @@
+"""
+Compact, indexed url corpora.
+
+A url file of tens of millions of lines is too much for siege, wideload
+or h2load to load on a small bee.  A corpus holds the same urls in one
+file which the bees memory-map and read an entry at a time, so picking
+a url costs the same however large the corpus is.  It is built on the
+controller by streaming through a plain or gzipped url file:
+
+    bees corpus [--weighted] URL_FILE CORPUS_FILE
+
+and given to an attack with -f like any url file.  Each bee then writes
+its own bounded sample of the corpus to urls.txt for the engine, in
+weighted, random or sequential order (each bee taking the next stretch
+of the corpus), with
+
+    PYTHONPATH=bees.zip python -m beeswithmachineguns.corpus sample -n COUNT [-o ORDER] [-s START] CORPUS_FILE
+
+The file, all little-endian, is a header (L{HEADER}) followed by:
+
+  - the string table: every distinct url once, each ending in a newline
+  - the string index: an 8 byte offset into the file of each string,
+    and one past the last
+  - the entries: the 4 byte string number of each line of the url file,
+    in order, so repeated urls keep their share of the corpus
+  - with weights, the entries' alias table: an 8 byte probability and a
+    4 byte alias for each entry (see L{_alias_table})
+
+With --weighted, the last field of each line of the url file is its
+weight.
+"""
+
+import gzip
+import hashlib
+import mmap
+import os
+import random
+import shutil
+import struct
+import sys
+import tempfile
+from array import array
+from optparse import OptionParser
+
+
+MAGIC = 'BEESURLS'
+
+VERSION = 1
+
+# the corpus has an alias table
+WEIGHTED = 1
+
+# magic, version, flags, entries, strings, and the offsets of the string
+# table, string index, entries and alias table
+HEADER = struct.Struct('<8sIIQQQQQQ')
+
+_OFFSET = struct.Struct('<Q')
+
+_ENTRY = struct.Struct('<I')
+
+_ALIAS = struct.Struct('<dI')
+
+ORDERS = ('random', 'weighted', 'sequential')
+
+# urls each bee samples from a corpus for its engine
+SAMPLE = 100000
+
+SUFFIX = '.corpus'
+
+
+def is_corpus(filename):
+    return filename.endswith(SUFFIX)
+
+
+def read_lines(filename):
+    """
+    Stream the urls of a plain or gzipped url file, skipping blank lines
+    and comments.
+    """
+    if filename.endswith('.gz'):
+        f = gzip.open(filename, 'rb')
+    else:
+        f = open(filename, 'rb')
+    try:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith('#'):
+                yield line
+    finally:
+        f.close()
+
+
+def _split_weight(line, number):
+    try:
+        url, weight = line.rsplit(None, 1)
+        weight = float(weight)
+    except ValueError:
+        raise ValueError('line %i has no weight: %s' % (number, line))
+    if weight < 0 or weight != weight:
+        raise ValueError('line %i has a bad weight: %s' % (number, line))
+    return (url, weight)
+
+
+def _alias_table(weights):
+    """
+    Vose's alias method: each of n columns holds a probability of keeping
+    its own entry, and the entry it passes to otherwise, so a weighted
+    pick is one uniform column and one coin toss.
+
+    @return: (probabilities, aliases) as arrays
+    """
+    n = len(weights)
+    total = sum(weights)
+    if total <= 0:
+        raise ValueError('the weights add up to nothing')
+    prob = array('d', (w * n / total for w in weights))
+    alias = array('I', [0]) * n
+    small, large = array('I'), array('I')
+    for i, p in enumerate(prob):
+        if p < 1.0:
+            small.append(i)
+        else:
+            large.append(i)
+    while small and large:
+        s, l = small.pop(), large.pop()
+        alias[s] = l
+        prob[l] -= 1.0 - prob[s]
+        if prob[l] < 1.0:
+            small.append(l)
+        else:
+            large.append(l)
+    # what is left is 1.0, give or take rounding
+    for i in large:
+        prob[i] = 1.0
+    for i in small:
+        prob[i] = 1.0
+    return (prob, alias)
+
+
+def build(lines, filename, weighted=False):
+    """
+    Write the corpus of the url lines to filename, streaming the urls to
+    disk as they come.  Only a digest of each distinct url (and, with
+    weights, the weights) is kept in memory.
+
+    @return: (entries, distinct urls)
+    """
+    seen = {}
+    weights = array('d')
+    tmp = filename + '.tmp'
+    out = open(tmp, 'wb')
+    index = tempfile.TemporaryFile()
+    entries = tempfile.TemporaryFile()
+    try:
+        out.write('\0' * HEADER.size)
+        strings_at = at = HEADER.size
+        n = 0
+        for n, line in enumerate(lines, 1):
+            if weighted:
+                line, weight = _split_weight(line, n)
+                weights.append(weight)
+            key = hashlib.md5(line).digest()[:12]
+            number = seen.get(key)
+            if number is None:
+                number = seen[key] = len(seen)
+                index.write(_OFFSET.pack(at))
+                out.write(line + '\n')
+                at += len(line) + 1
+            entries.write(_ENTRY.pack(number))
+        if not n:
+            raise ValueError('there are no urls')
+        index.write(_OFFSET.pack(at))
+
+        index_at = at
+        index.seek(0)
+        shutil.copyfileobj(index, out)
+        entries_at = index_at + (len(seen) + 1) * _OFFSET.size
+        entries.seek(0)
+        shutil.copyfileobj(entries, out)
+
+        alias_at = 0
+        if weighted:
+            alias_at = entries_at + n * _ENTRY.size
+            prob, alias = _alias_table(weights)
+            for i in xrange(n):
+                out.write(_ALIAS.pack(prob[i], alias[i]))
+
+        out.seek(0)
+        out.write(HEADER.pack(MAGIC, VERSION, (weighted and WEIGHTED) or 0, n, len(seen),
+                              strings_at, index_at, entries_at, alias_at))
+        out.close()
+        os.rename(tmp, filename)
+    finally:
+        out.close()
+        index.close()
+        entries.close()
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    return (n, len(seen))
+
+
+def convert(url_file, corpus_file, weighted=False):
+    """
+    Build a corpus from a plain or gzipped url file.
+    """
+    return build(read_lines(url_file), corpus_file, weighted)
+
+
+class Corpus(object):
+    """
+    A memory-mapped corpus.  Reading an entry touches only the pages
+    holding it, so the corpus is never loaded as a whole.
+    """
+
+    def __init__(self, filename):
+        self._file = open(filename, 'rb')
+        try:
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except (ValueError, mmap.error):
+            self._file.close()
+            raise ValueError('%s is not a url corpus' % filename)
+        if len(self._map) < HEADER.size:
+            self.close()
+            raise ValueError('%s is not a url corpus' % filename)
+        (magic, version, flags, self.entries, self.strings,
+         strings_at, self._index_at, self._entries_at, self._alias_at) = HEADER.unpack_from(self._map)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError('%s is not a url corpus' % filename)
+        self.weighted = bool(flags & WEIGHTED)
+
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+
+    def __len__(self):
+        return self.entries
+
+
+    def get_string(self, number):
+        start, end = struct.unpack_from('<QQ', self._map, self._index_at + number * _OFFSET.size)
+        return self._map[start:end - 1]
+
+
+    def __getitem__(self, i):
+        if not 0 <= i < self.entries:
+            raise IndexError(i)
+        return self.get_string(_ENTRY.unpack_from(self._map, self._entries_at + i * _ENTRY.size)[0])
+
+
+    def pick(self, rng=random):
+        """
+        @return: a url, each entry being as likely as any other
+        """
+        return self[rng.randrange(self.entries)]
+
+
+    def pick_weighted(self, rng=random):
+        """
+        @return: a url, by the entries' weights (or as L{pick} if the
+            corpus has none)
+        """
+        if not self.weighted:
+            return self.pick(rng)
+        i = rng.randrange(self.entries)
+        prob, alias = _ALIAS.unpack_from(self._map, self._alias_at + i * _ALIAS.size)
+        if rng.random() >= prob:
+            i = alias
+        return self[i]
+
+
+    def sample(self, count, order='weighted', start=0, rng=random):
+        """
+        Yield count urls in the given order: weighted, random (ignoring
+        any weights), or sequential from entry start, wrapping around the
+        end.
+        """
+        if order == 'sequential':
+            for k in xrange(count):
+                yield self[(start + k) % self.entries]
+        elif order == 'weighted':
+            for k in xrange(count):
+                yield self.pick_weighted(rng)
+        else:
+            for k in xrange(count):
+                yield self.pick(rng)
+
+
+def get_sample_command(corpus_file, count, order, start=0):
+    """
+    @return: the command which writes a bee's sample of the corpus to
+        urls.txt
+    """
+    return 'PYTHONPATH=bees.zip python -m beeswithmachineguns.corpus sample -n %i -o %s -s %i %s > urls.txt' % (
+        count, order, start, corpus_file)
+
+
+def main():
+    parser = OptionParser(usage='%prog build [--weighted] URL_FILE CORPUS_FILE | sample [options] CORPUS_FILE')
+    parser.add_option('--weighted', dest='weighted', action='store_true', default=False,
+                      help='the last field of each line is its weight')
+    parser.add_option('-n', '--count', dest='count', type='int', default=SAMPLE)
+    parser.add_option('-o', '--order', dest='order', type='choice', choices=ORDERS, default='weighted')
+    parser.add_option('-s', '--start', dest='start', type='int', default=0,
+                      help='the entry a sequential sample starts from')
+    (options, args) = parser.parse_args()
+
+    if args[:1] == ['build'] and len(args) == 3:
+        entries, strings = convert(args[1], args[2], options.weighted)
+        print >> sys.stdout, '%i urls, %i distinct' % (entries, strings)
+    elif args[:1] == ['sample'] and len(args) == 2:
+        corpus = Corpus(args[1])
+        try:
+            for url in corpus.sample(options.count, options.order, options.start):
+                sys.stdout.write(url + '\n')
+        finally:
+            corpus.close()
+    else:
+        parser.error('expected build and a url file and corpus file, or sample and a corpus file')
+
+
+if __name__ == '__main__':
+    main()
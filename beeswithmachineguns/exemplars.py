@@ -0,0 +1,188 @@
+"""
+Exemplars of the slowest and of failed requests.
+
+Percentiles say that the tail got worse but not which requests were in
+it.  Each bee keeps the K slowest requests it made in a heap and a
+reservoir sample of its failed ones, so memory stays constant however
+long it runs.  Every exemplar records the url, status and start time,
+and the timing phases of the engines which measure them (the scenario
+engine's connect and time to first byte), so it can be lined up with the
+target's own traces; the controller merges them into a swarm-wide top K.
+"""
+
+import heapq
+import json
+import random
+
+
+# prefix of the line on which bee-side helpers print their exemplars
+EXEMPLARS_MARKER = 'bees-exemplars:'
+
+# slowest requests kept
+SLOWEST = 20
+
+# failed requests sampled
+FAILURES = 20
+
+
+def is_failure(status):
+    """
+    @param status: HTTP status code, or None if there was no response
+    """
+    return status is None or int(status) >= 400
+
+
+class Exemplars(object):
+    """
+    The slowest requests, and a uniform sample of the failed ones.
+    """
+
+    def __init__(self, slowest=SLOWEST, failures=FAILURES, rng=random):
+        self.k = slowest
+        self.failures_k = failures
+        self.rng = rng
+        # min-heap of (ms, sequence, exemplar)
+        self._heap = []
+        self._sequence = 0
+        self.failures = []
+        # failed requests seen, of which self.failures is a sample
+        self.failures_seen = 0
+
+
+    def record(self, url, status, start, ms, phases=None):
+        """
+        Consider one request.
+
+        @param url: the url requested, or None if unknown
+        @param status: HTTP status code, or None if there was no response
+        @param start: epoch seconds at which the request started
+        @param ms: the request's latency
+        @param phases: optional dict of timing phase -> ms
+        """
+        exemplar = {'url': url, 'status': status, 'start': start, 'ms': ms,
+                    'phases': phases or {}}
+        self._push(exemplar)
+        if is_failure(status):
+            self._sample_failure(exemplar)
+
+
+    def _push(self, exemplar):
+        self._sequence += 1
+        item = (exemplar['ms'], self._sequence, exemplar)
+        if len(self._heap) < self.k:
+            heapq.heappush(self._heap, item)
+        elif item[0] > self._heap[0][0]:
+            heapq.heapreplace(self._heap, item)
+
+
+    def _sample_failure(self, exemplar):
+        self.failures_seen += 1
+        if len(self.failures) < self.failures_k:
+            self.failures.append(exemplar)
+        else:
+            j = self.rng.randint(0, self.failures_seen - 1)
+            if j < self.failures_k:
+                self.failures[j] = exemplar
+
+
+    @property
+    def slowest(self):
+        """
+        @return: the slowest requests, slowest first
+        """
+        return [item[2] for item in sorted(self._heap, reverse=True)]
+
+
+    def entries(self):
+        """
+        @return: every exemplar held, slowest and failed
+        """
+        held = []
+        for e in self.slowest + self.failures:
+            if not any(e is h for h in held):
+                held.append(e)
+        return held
+
+
+    def merge(self, other):
+        """
+        Add another bee's exemplars to these.  The failures stay a uniform
+        sample of both bees' failures.
+
+        @return: self
+        """
+        for exemplar in other.slowest:
+            self._push(exemplar)
+
+        # weighted sampling without replacement (Efraimidis-Spirakis), each
+        # sampled failure standing for its share of its bee's failures
+        pool = []
+        for e in (self, other):
+            if e.failures:
+                weight = e.failures_seen / float(len(e.failures))
+                pool.extend((self.rng.random() ** (1.0 / weight), f) for f in e.failures)
+        self.failures = [f for key, f in heapq.nlargest(self.failures_k, pool, key=lambda p: p[0])]
+        self.failures_seen += other.failures_seen
+        return self
+
+
+    def to_dict(self):
+        return {
+            'capacity': [self.k, self.failures_k],
+            'slowest': self.slowest,
+            'failures': self.failures,
+            'failures_seen': self.failures_seen,
+        }
+
+
+    @classmethod
+    def from_dict(cls, d):
+        e = cls(*d['capacity'])
+        for exemplar in d['slowest']:
+            e._push(exemplar)
+        e.failures = list(d['failures'])
+        e.failures_seen = d['failures_seen']
+        return e
+
+
+    def to_json(self):
+        return json.dumps(self.to_dict(), separators=(',', ':'))
+
+
+    @classmethod
+    def from_json(cls, s):
+        return cls.from_dict(json.loads(s))
+
+
+    def print_text(self, out, limit=5):
+        """
+        Print the slowest requests.
+
+        @param out: file-like, open for writing, into which output will be printed.
+        @param limit: the most requests to print
+        """
+        print >> out, 'Slowest requests:'
+        for e in self.slowest[:limit]:
+            phases = ', '.join('%s %i' % (name, ms) for name, ms in sorted(e['phases'].items()))
+            print >> out, '  %i [ms]\t%s %s at %.3f%s%s' % (
+                e['ms'], e['status'] or '-', e['url'] or '(url unknown)', e['start'],
+                e.get('bee') and ' on %s' % e['bee'] or '',
+                phases and ' (%s [ms])' % phases or '')
+        if self.failures_seen:
+            # failed requests and error responses alike (see is_failure),
+            # unlike the tester's 'Failed requests'
+            print >> out, 'Failed or error responses sampled:\t%i of %i' % (len(self.failures), self.failures_seen)
+
+
+def merge_all(exemplars):
+    """
+    Merge a sequence of exemplars (or their dicts) into a new one.
+    """
+    merged = None
+    for e in exemplars:
+        if isinstance(e, dict):
+            e = Exemplars.from_dict(e)
+        if merged is None:
+            merged = Exemplars(e.k, e.failures_k)
+        merged.merge(e)
+    return merged
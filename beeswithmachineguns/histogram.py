@@ -0,0 +1,155 @@
+"""
+Mergeable latency histogram.
+
+Latencies (in ms) are counted in logarithmic buckets, each about 2% wider
+than the last, so a histogram of any run fits in a few hundred integers,
+two histograms merge by adding counts and any percentile can be read back
+within about 2% of the true value.  This is what lets bees, relays and the
+controller combine results without shipping every request's timing.
+"""
+
+import json
+import math
+
+
+GROWTH = 1.02
+
+_LOG_GROWTH = math.log(GROWTH)
+
+
+class Histogram(object):
+    """
+    Counts of latencies by logarithmic bucket.
+    """
+
+    def __init__(self, counts=None):
+        # bucket index -> count
+        self.counts = dict(counts or {})
+
+
+    @staticmethod
+    def bucket(ms):
+        """
+        @return: index of the bucket holding a latency
+        """
+        return int(math.ceil(math.log(max(ms, 0.0) + 1.0) / _LOG_GROWTH))
+
+
+    @staticmethod
+    def bucket_value(index):
+        """
+        @return: the latency represented by a bucket (its geometric middle)
+        """
+        return max(0.0, GROWTH ** (index - 0.5) - 1.0)
+
+
+    def record(self, ms, count=1):
+        """
+        Count one or more requests which took ms milliseconds.
+        """
+        index = self.bucket(ms)
+        self.counts[index] = self.counts.get(index, 0) + count
+
+
+    def merge(self, other):
+        """
+        Add another histogram's counts to this one.
+
+        @return: self
+        """
+        for index, count in other.counts.items():
+            self.counts[index] = self.counts.get(index, 0) + count
+        return self
+
+
+    @property
+    def count(self):
+        return sum(self.counts.values())
+
+
+    def count_at_least(self, ms):
+        """
+        @return: approximate number of latencies of ms or more
+        """
+        index = self.bucket(ms)
+        return sum(c for i, c in self.counts.items() if i >= index)
+
+
+    def mean(self):
+        """
+        @return: approximate mean latency, or 0.0 if empty
+        """
+        n = self.count
+        if not n:
+            return 0.0
+        return sum(self.bucket_value(i) * c for i, c in self.counts.items()) / float(n)
+
+
+    def quantile(self, q):
+        """
+        @param q: quantile, between 0.0 and 1.0
+        @return: approximate latency at the quantile, or 0.0 if empty
+        """
+        n = self.count
+        if not n:
+            return 0.0
+        rank = max(1, int(math.ceil(q * n)))
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= rank:
+                return self.bucket_value(index)
+        return self.bucket_value(max(self.counts))
+
+
+    def to_dict(self):
+        return {'growth': GROWTH, 'counts': dict((str(i), c) for i, c in self.counts.items())}
+
+
+    @classmethod
+    def from_dict(cls, d):
+        if d.get('growth', GROWTH) != GROWTH:
+            raise ValueError('incompatible histogram growth %s' % d['growth'])
+        return cls(dict((int(i), c) for i, c in d['counts'].items()))
+
+
+    def to_json(self):
+        return json.dumps(self.to_dict(), separators=(',', ':'))
+
+
+    @classmethod
+    def from_json(cls, s):
+        return cls.from_dict(json.loads(s))
+
+
+    @classmethod
+    def from_percentiles(cls, pctiles, count):
+        """
+        Approximate a histogram from a percentile table such as ab prints.
+
+        Requests below the lowest listed percentile are counted at that
+        percentile's latency, so only quantiles at or above it are reliable.
+
+        @param pctiles: dict of percentile (0-100) -> ms
+        @param count: total number of requests
+        """
+        h = cls()
+        placed = 0
+        for pctile in sorted(pctiles):
+            upto = int(round(count * pctile / 100.0))
+            if upto > placed:
+                h.record(pctiles[pctile], upto - placed)
+                placed = upto
+        return h
+
+
+def merge_all(histograms):
+    """
+    Merge a sequence of histograms (or their dicts) into a new histogram.
+    """
+    merged = Histogram()
+    for h in histograms:
+        if isinstance(h, dict):
+            h = Histogram.from_dict(h)
+        merged.merge(h)
+    return merged
@@ -0,0 +1,421 @@
+"""
+Holding very many connections open.
+
+To find how many concurrent connections a target (a load balancer, say)
+can hold, the hold engine has each bee open connections at a steady
+rate, up to -c of them, and keep them open for the attack's time:
+
+  - by default idle, sending nothing
+  - with keep-alive, sending a request on each and another every
+    REFRESH seconds
+  - with a trickle, sending a request's head one header line every so
+    many seconds, never finishing it
+
+A bee runs every connection in one event loop, needing only a socket
+(with small buffers) and a small object for each, as
+
+    PYTHONPATH=bees.zip python -m beeswithmachineguns.hold -c CONNECTIONS -t SECONDS [-r RATE] [-k | --trickle SECONDS] URL
+
+Each connection takes an ephemeral port, so with the port range which
+'bees up' sets a bee can hold about 63000 connections to one address.
+Like the scenario runner it prints its results as 'key: value' lines:
+each connection set up counts as a complete request, one which could
+not be set up or which the target dropped as a failed request, and the
+latency histogram holds the connect times.  After HOLD_MARKER it prints
+its timeline (see L{Holder.to_dict}).
+"""
+
+import errno
+import heapq
+import json
+import socket
+import ssl
+import sys
+import time
+import urlparse
+from optparse import OptionParser
+
+from beeswithmachineguns.histogram import Histogram
+from beeswithmachineguns.scenario import _Poller, _raise_file_limit
+from beeswithmachineguns.tester import HOLD_MARKER
+
+
+# connections opened per second on each bee, unless told otherwise
+RATE = 1000.0
+
+# seconds a connection may take to set up
+TIMEOUT = 10.0
+
+# seconds between the requests on a kept-alive connection
+REFRESH = 30.0
+
+# the most rows in a bee's timeline
+MAX_ROWS = 300
+
+# socket buffer sizes, kept small as the connections carry next to nothing
+BUFFER = 4096
+
+CONNECTING, HANDSHAKING, OPEN = range(3)
+
+
+class _Connection(object):
+
+    __slots__ = ('sock', 'state', 'started', 'due', 'sent')
+
+    def __init__(self, sock, started):
+        self.sock = sock
+        self.state = CONNECTING
+        self.started = started
+        self.due = None
+        self.sent = 0
+
+
+class Holder(object):
+    """
+    Opens and holds connections to a url in one event loop.
+
+    The timeline's rows are taken every 'step' seconds, each the seconds
+    since the start, then how many connections were open, and how many
+    had been established, had failed and had been dropped by then.
+    """
+
+    def __init__(self, url, connections, duration, rate=RATE, keepalive=False, trickle=None,
+                 timeout=TIMEOUT, refresh=REFRESH):
+        parts = urlparse.urlparse(url)
+        self.tls = parts.scheme == 'https'
+        self.host = parts.hostname
+        self.port = parts.port or (self.tls and 443) or 80
+        path = parts.path or '/'
+        if parts.query:
+            path += '?' + parts.query
+        host = self.host
+        if parts.port:
+            host = '%s:%i' % (host, parts.port)
+        head = 'GET %s HTTP/1.1\r\nHost: %s\r\nUser-Agent: beeswithmachineguns\r\n' % (path, host)
+        self.request = head + 'Connection: keep-alive\r\n\r\n'
+        self.head = head
+
+        self.connections = connections
+        self.duration = float(duration)
+        self.rate = float(rate or RATE)
+        self.keepalive = keepalive
+        self.trickle = trickle
+        self.timeout = timeout
+        self.refresh = refresh
+        self.step = max(1.0, self.duration / MAX_ROWS)
+
+        self.attempted = 0
+        self.established = 0
+        self.failed = 0
+        self.dropped = 0
+        self.open = 0
+        self.peak = 0
+        self.transferred = 0
+        self.elapsed = 0.0
+        self.rows = []
+        self.histogram = Histogram()
+
+        self.by_fd = {}
+        self.timers = []
+        self.poller = None
+        self._ssl_context = None
+
+
+    def _open(self, address, now):
+        self.attempted += 1
+        try:
+            sock = socket.socket(address[0], socket.SOCK_STREAM)
+        except socket.error:
+            # out of file descriptors
+            self.failed += 1
+            return
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, BUFFER)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, BUFFER)
+        sock.setblocking(0)
+        try:
+            err = sock.connect_ex(address[1])
+        except socket.error, e:
+            err = e.errno
+        if err not in (0, errno.EINPROGRESS):
+            # e.g. out of ephemeral ports
+            sock.close()
+            self.failed += 1
+            return
+        conn = _Connection(sock, now)
+        self.by_fd[sock.fileno()] = conn
+        self.poller.register(sock.fileno(), self.poller.OUT)
+
+
+    def _close(self, conn):
+        fd = conn.sock.fileno()
+        self.by_fd.pop(fd, None)
+        try:
+            self.poller.unregister(fd)
+        except (IOError, ValueError):
+            pass
+        conn.sock.close()
+        if conn.state == OPEN:
+            self.open -= 1
+
+
+    def _fail(self, conn):
+        if conn.state == OPEN:
+            self.dropped += 1
+        else:
+            self.failed += 1
+        self._close(conn)
+
+
+    def _connected(self, conn, now):
+        if conn.sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR):
+            self._fail(conn)
+            return
+        if not self.tls:
+            self._opened(conn, now)
+            return
+        if self._ssl_context is None:
+            # load testing, not checking certificates
+            self._ssl_context = ssl.SSLContext(ssl.PROTOCOL_SSLv23)
+            self._ssl_context.verify_mode = ssl.CERT_NONE
+        conn.sock = self._ssl_context.wrap_socket(conn.sock, server_hostname=self.host,
+                                                  do_handshake_on_connect=False)
+        conn.state = HANDSHAKING
+        self._handshake(conn, now)
+
+
+    def _handshake(self, conn, now):
+        try:
+            conn.sock.do_handshake()
+        except ssl.SSLWantReadError:
+            self.poller.modify(conn.sock.fileno(), self.poller.IN)
+            return
+        except ssl.SSLWantWriteError:
+            self.poller.modify(conn.sock.fileno(), self.poller.OUT)
+            return
+        except (ssl.SSLError, socket.error):
+            self._fail(conn)
+            return
+        self._opened(conn, now)
+
+
+    def _opened(self, conn, now):
+        conn.state = OPEN
+        self.established += 1
+        self.open += 1
+        self.peak = max(self.peak, self.open)
+        self.histogram.record((now - conn.started) * 1000.0)
+        self.poller.modify(conn.sock.fileno(), self.poller.IN)
+        if self.trickle:
+            if self._send(conn, self.head):
+                self._schedule(conn, now + self.trickle)
+        elif self.keepalive:
+            if self._send(conn, self.request):
+                self._schedule(conn, now + self.refresh)
+
+
+    def _schedule(self, conn, at):
+        conn.due = at
+        heapq.heappush(self.timers, (at, conn.sock.fileno()))
+
+
+    def _send(self, conn, data):
+        """
+        Send a little, on a connection whose buffer is all but empty; what
+        does not fit is not worth keeping.
+        """
+        try:
+            conn.sock.send(data)
+        except (ssl.SSLWantWriteError, ssl.SSLWantReadError):
+            pass
+        except socket.error, e:
+            if e.errno not in (errno.EAGAIN, errno.EWOULDBLOCK):
+                self._fail(conn)
+                return False
+        return True
+
+
+    def _tick(self, conn, now):
+        if self.trickle:
+            conn.sent += 1
+            if self._send(conn, 'X-Bees-%i: %i\r\n' % (conn.sent, conn.sent)):
+                self._schedule(conn, now + self.trickle)
+        elif self._send(conn, self.request):
+            self._schedule(conn, now + self.refresh)
+
+
+    def _receive(self, conn):
+        try:
+            data = conn.sock.recv(BUFFER)
+        except (ssl.SSLWantReadError, ssl.SSLWantWriteError):
+            return
+        except socket.error, e:
+            if e.errno in (errno.EAGAIN, errno.EWOULDBLOCK):
+                return
+            data = ''
+        if not data:
+            # the target let go of it
+            self._fail(conn)
+            return
+        self.transferred += len(data)
+
+
+    def _check_timeouts(self, now):
+        for conn in [c for c in self.by_fd.values() if c.state != OPEN and now - c.started > self.timeout]:
+            self._fail(conn)
+
+
+    def run(self):
+        """
+        Ramp up to the connections and hold them until the time is up.
+        """
+        family, socktype, proto, canonname, address = socket.getaddrinfo(
+            self.host, self.port, 0, socket.SOCK_STREAM)[0]
+        address = (family, address)
+        self.poller = _Poller()
+        start = time.time()
+        end = start + self.duration
+        next_row = start + self.step
+        next_check = start + 1.0
+
+        while True:
+            now = time.time()
+            if now >= end:
+                break
+            while self.attempted < min(self.connections, int((now - start) * self.rate) + 1):
+                self._open(address, now)
+            while self.timers and self.timers[0][0] <= now:
+                at, fd = heapq.heappop(self.timers)
+                conn = self.by_fd.get(fd)
+                # not a connection which has since taken its fd
+                if conn is not None and conn.due == at:
+                    self._tick(conn, now)
+            if now >= next_check:
+                self._check_timeouts(now)
+                next_check = now + 1.0
+            while now >= next_row:
+                self._record(next_row - start)
+                next_row += self.step
+
+            wait = min(1.0, end - now, next_row - now)
+            if self.attempted < self.connections:
+                wait = min(wait, start + self.attempted / self.rate - now)
+            if self.timers:
+                wait = min(wait, self.timers[0][0] - now)
+            for fd, events in self.poller.poll(max(0.0, wait)):
+                conn = self.by_fd.get(fd)
+                if conn is None:
+                    continue
+                if conn.state == CONNECTING:
+                    self._connected(conn, time.time())
+                elif conn.state == HANDSHAKING:
+                    self._handshake(conn, time.time())
+                else:
+                    self._receive(conn)
+
+        self.elapsed = time.time() - start
+        self._record(self.elapsed)
+        for conn in self.by_fd.values():
+            self._close(conn)
+
+
+    def _record(self, at):
+        self.rows.append([round(at, 3), self.open, self.established, self.failed, self.dropped])
+
+
+    def to_dict(self):
+        """
+        @return: dict of the timeline's 'step' and 'rows', and the 'peak'
+            number of connections open at once
+        """
+        return {'step': self.step, 'rows': self.rows, 'peak': self.peak}
+
+
+    def print_results(self, out):
+        """
+        Print the results as 'key: value' lines, then the histogram and the
+        timeline.
+        """
+        results = [
+            ('concurrency', self.peak),
+            ('time_taken', self.elapsed),
+            ('complete_requests', self.established),
+            ('failed_requests', self.failed + self.dropped),
+            ('non_2xx_responses', 0),
+            ('total_transferred', self.transferred),
+            ('requests_per_second', self.established / max(self.elapsed, 0.001)),
+            ('ms_per_request', self.histogram.mean()),
+        ]
+        results.extend(('pctile_%i' % p, self.histogram.quantile(p / 100.0)) for p in (50, 75, 90, 95, 99))
+        results.append(('ms_connect', self.histogram.mean()))
+        for key, value in results:
+            print >> out, '%s: %f' % (key, value)
+        print >> out, 'bees-histogram: %s' % self.histogram.to_json()
+        print >> out, '%s %s' % (HOLD_MARKER, json.dumps(self.to_dict()))
+
+
+def merge_all(holds):
+    """
+    Merge bees' timelines (see L{Holder.to_dict}), adding up their rows
+    taken at the same time.
+
+    @return: the merged timeline, or None if there are none
+    """
+    holds = [h for h in holds if h]
+    if not holds:
+        return None
+    rows = []
+    for hold in holds:
+        for k, row in enumerate(hold['rows']):
+            if k == len(rows):
+                rows.append([row[0], 0, 0, 0, 0])
+            rows[k][0] = max(rows[k][0], row[0])
+            for j in range(1, 5):
+                rows[k][j] += row[j]
+    return {
+        'step': max(h['step'] for h in holds),
+        'rows': rows,
+        'peak': max([r[1] for r in rows] + [0]),
+    }
+
+
+def print_timeline(hold, out, most=12):
+    """
+    Print how many connections the swarm held over time, in at most most
+    rows.
+
+    @param out: file-like, open for writing, into which output will be printed.
+    """
+    rows = hold['rows']
+    print >> out, 'Connections held:\t%i at most' % hold['peak']
+    if len(rows) > most:
+        rows = [rows[(len(rows) - 1) * k / (most - 1)] for k in range(most)]
+    for at, held, established, failed, dropped in rows:
+        print >> out, '  +%is\t%i open, %i established, %i failed, %i dropped' % (
+            at, held, established, failed, dropped)
+
+
+def main():
+    parser = OptionParser(usage='%prog -c CONNECTIONS -t SECONDS [-r RATE] [-k | --trickle SECONDS] URL')
+    parser.add_option('-c', dest='connections', type='int', default=1)
+    parser.add_option('-t', dest='duration', type='float', default=None)
+    parser.add_option('-r', dest='rate', type='float', default=RATE,
+                      help='connections to open per second')
+    parser.add_option('-k', dest='keepalive', action='store_true', default=False,
+                      help='send a request on each connection every %i seconds' % REFRESH)
+    parser.add_option('--trickle', dest='trickle', type='float', default=None,
+                      help="send a request's head one header line every so many seconds")
+    options, args = parser.parse_args()
+    if len(args) != 1:
+        parser.error('Please give the url.')
+    if options.duration is None:
+        parser.error('Please give -t, the seconds to hold the connections for.')
+
+    _raise_file_limit(options.connections)
+    holder = Holder(args[0], options.connections, options.duration, options.rate,
+                    options.keepalive, options.trickle)
+    holder.run()
+    holder.print_results(sys.stdout)
+
+
+if __name__ == '__main__':
+    main()
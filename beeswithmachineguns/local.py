@@ -0,0 +1,228 @@
+"""
+Local process provider.
+
+Runs "bees" as processes on the controller's own machine, each in its own
+working directory under ~/.bees-local.  L{LocalClient} stands in for a
+paramiko SSHClient, so everything that drives a bee over ssh (staging,
+clock sync, relays, the testers themselves) can be exercised without EC2.
+"""
+
+import logging
+import os
+import shutil
+import subprocess
+import threading
+
+
+# region recorded in the roster for local swarms
+LOCAL_REGION = 'local'
+
+LOCAL_ROOT = os.path.expanduser('~/.bees-local')
+
+# present in a parked bee's working directory
+PARKED_FILENAME = 'parked'
+
+
+class LocalInstance(object):
+    """
+    Quacks enough like a boto instance for the bees.
+    """
+
+    def __init__(self, instance_id, root=None):
+        self.id = instance_id
+        self.public_dns_name = os.path.join(root or LOCAL_ROOT, instance_id)
+        self.ip_address = '127.0.0.1'
+        self.instance_type = 'local'
+
+    @property
+    def state(self):
+        if not os.path.isdir(self.public_dns_name):
+            return 'terminated'
+        if os.path.isfile(os.path.join(self.public_dns_name, PARKED_FILENAME)):
+            return 'stopped'
+        return 'running'
+
+
+def up(count, root=None, exclude=()):
+    """
+    Create working directories for count local bees.
+
+    @param exclude: ids not to use, such as those of bees already in a roster
+    @return: list of L{LocalInstance}
+    """
+    root = root or LOCAL_ROOT
+    instances = []
+    i = 0
+    while len(instances) < count:
+        instance = LocalInstance('local-%i' % i, root)
+        i += 1
+        if instance.id in exclude:
+            continue
+        if not os.path.isdir(instance.public_dns_name):
+            os.makedirs(instance.public_dns_name)
+        open(os.path.join(instance.public_dns_name, 'ready'), 'w').close()
+        instances.append(instance)
+    return instances
+
+
+def get_instances(instance_ids, root=None):
+    return [LocalInstance(instance_id, root) for instance_id in instance_ids]
+
+
+def down(instance_ids, root=None):
+    """
+    Remove the local bees' working directories.
+
+    @return: ids of the bees that were removed
+    """
+    removed = []
+    for instance in get_instances(instance_ids, root):
+        if os.path.isdir(instance.public_dns_name):
+            shutil.rmtree(instance.public_dns_name)
+            removed.append(instance.id)
+    return removed
+
+
+def park(instance_ids, root=None):
+    """
+    Mark running local bees as parked (stopped).
+
+    @return: ids of the bees that were parked
+    """
+    parked = []
+    for instance in get_instances(instance_ids, root):
+        if instance.state == 'running':
+            open(os.path.join(instance.public_dns_name, PARKED_FILENAME), 'w').close()
+            parked.append(instance.id)
+    return parked
+
+
+def unpark(instance_ids, root=None):
+    """
+    Start parked local bees again.
+
+    @return: ids of the bees that were started
+    """
+    started = []
+    for instance in get_instances(instance_ids, root):
+        if instance.state == 'stopped':
+            os.remove(os.path.join(instance.public_dns_name, PARKED_FILENAME))
+            started.append(instance.id)
+    return started
+
+
+class _LocalChannel(object):
+
+    def __init__(self, process, readers):
+        self.process = process
+        self.readers = readers
+
+    def recv_exit_status(self):
+        status = self.process.wait()
+        for reader in self.readers:
+            reader.join()
+        return status
+
+
+class _LocalOutput(object):
+    """
+    Buffers a process' output stream in a background thread, like paramiko
+    buffers a channel, so callers can wait for exit before reading.
+    """
+
+    def __init__(self, stream):
+        self.channel = None
+        self._buffer = []
+        self._done = False
+        self._cond = threading.Condition()
+        self._thread = threading.Thread(target=self._pump, args=(stream,))
+        self._thread.daemon = True
+        self._thread.start()
+
+    def _pump(self, stream):
+        for line in iter(stream.readline, ''):
+            with self._cond:
+                self._buffer.append(line)
+                self._cond.notify_all()
+        with self._cond:
+            self._done = True
+            self._cond.notify_all()
+
+    def join(self):
+        self._thread.join()
+
+    def readline(self):
+        with self._cond:
+            while not self._buffer and not self._done:
+                self._cond.wait()
+            if self._buffer:
+                return self._buffer.pop(0)
+            return ''
+
+    def read(self):
+        self.join()
+        with self._cond:
+            data = ''.join(self._buffer)
+            self._buffer = []
+        return data
+
+    def __iter__(self):
+        return iter(self.readline, '')
+
+
+class _LocalSFTP(object):
+
+    def __init__(self, root):
+        self.root = root
+
+    def _path(self, path):
+        return os.path.join(self.root, path)
+
+    def put(self, localpath, remotepath):
+        shutil.copyfile(localpath, self._path(remotepath))
+
+    def get(self, remotepath, localpath):
+        shutil.copyfile(self._path(remotepath), localpath)
+
+    def chmod(self, path, mode):
+        os.chmod(self._path(path), mode)
+
+    def close(self):
+        pass
+
+
+class LocalClient(object):
+    """
+    Runs commands in a local bee's working directory with the same calling
+    conventions as paramiko.SSHClient.
+    """
+
+    def __init__(self):
+        self.root = None
+
+    def set_missing_host_key_policy(self, policy):
+        pass
+
+    def connect(self, hostname, **kwargs):
+        if not os.path.isdir(hostname):
+            raise IOError('no local bee at %s' % hostname)
+        if os.path.isfile(os.path.join(hostname, PARKED_FILENAME)):
+            raise IOError('the local bee at %s is parked' % hostname)
+        self.root = hostname
+
+    def exec_command(self, command, bufsize=-1):
+        logging.debug('[local %s] %s' % (self.root, command))
+        process = subprocess.Popen(command, shell=True, cwd=self.root,
+                                   stdin=subprocess.PIPE,
+                                   stdout=subprocess.PIPE,
+                                   stderr=subprocess.PIPE)
+        stdout = _LocalOutput(process.stdout)
+        stderr = _LocalOutput(process.stderr)
+        stdout.channel = stderr.channel = _LocalChannel(process, [stdout, stderr])
+        return (process.stdin, stdout, stderr)
+
+    def open_sftp(self):
+        return _LocalSFTP(self.root)
+
+    def close(self):
+        pass
@@ -24,7 +24,8 @@ OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
 THE SOFTWARE.
 """
 
-import bees
+from tracing import Tracer
+import logging
 import os
 import re
 import sys
@@ -48,12 +49,19 @@ A utility for arming (creating) many bees (small EC2 instances) to attack
 commands:
   up      Start a batch of load testing servers.
   attack  Begin the attack on a specific url.
+  capacity  Search for the most concurrent requests the target takes within a latency and error objective.
   down    Shutdown and deactivate the load testing servers.
+  park    Stop the load testing servers, keeping them for next time.
+  unpark  Start parked load testing servers again, replacing any that are gone.
   report  Report the status of the load testing servers.
+  reattach  Carry on following a soak attack after the controller stopped.
+  corpus  Build a url corpus (to attack with -f) from URL_FILE: bees corpus URL_FILE CORPUS_FILE.
+  calibrate  Measure the most each engine can fire from the bees, which attacks are checked against.
+  plan    Plan the cheapest swarm which can hold --target-rps and -c for the time (-w), from the calibration and past attacks.
     """)
 
     up_group = OptionGroup(parser, "up",
-        """In order to spin up new servers you will need to specify at least the -k command, which is the name of the EC2 keypair to use for creating and connecting to the new servers. The bees will expect to find a .pem file with this name in ~/.ssh/.""")
+        """In order to spin up new servers you will need to specify at least the -k command, which is the name of the EC2 keypair to use for creating and connecting to the new servers. The bees will expect to find a .pem file with this name in ~/.ssh/.  unpark uses the same options for any fresh bees it has to call up.""")
 
     # Required
     up_group.add_option('-k', '--key',  metavar="KEY",  nargs=1,
@@ -78,6 +86,21 @@ commands:
     up_group.add_option('-l', '--login',  metavar="LOGIN",  nargs=1,
                         action='store', dest='login', type='string', default='ubuntu',
                         help="The ssh username name to use to connect to the new servers (default: ubuntu).")
+    up_group.add_option('--fallback-zones', metavar="ZONES", nargs=1,
+                        action='store', dest='fallback_zones', type='string', default='',
+                        help="Zones to call up bees in, in turn, when a zone lacks the capacity for them, comma separated.")
+    up_group.add_option('--fallback-types', metavar="INSTANCE_TYPES", nargs=1,
+                        action='store', dest='fallback_types', type='string', default='',
+                        help="Instance types to call up, in turn, when no zone has the capacity for the instance type, comma separated.")
+    up_group.add_option('--batch', metavar="BATCH", nargs=1,
+                        action='store', dest='batch', type='int', default=50,
+                        help="The most bees to ask for in one request; batches are requested at once (default: 50).")
+    up_group.add_option('--quorum', metavar="PERCENT", nargs=1,
+                        action='store', dest='quorum', type='float', default=100,
+                        help="Assemble the swarm once this many percent of the bees are running, the rest joining as they come up (default: 100).")
+    up_group.add_option('--local', metavar="LOCAL",
+                        action='store_true', dest='local', default=False,
+                        help="Run the bees as local processes instead of EC2 instances, for trying things out.")
 
     parser.add_option_group(up_group)
 
@@ -90,7 +113,16 @@ commands:
                         help="URL of the target to attack.")
     attack_group.add_option('-f', '--url-file', metavar="URL_FILE", nargs=1,
                         action='store', dest='url_file', type='string',
-                        help="file containing URLs of the targets to attack.")
+                        help="file containing URLs of the targets to attack, or a url corpus built with 'bees corpus'.")
+    attack_group.add_option('--corpus-sample', metavar="COUNT", nargs=1,
+                        action='store', dest='corpus_sample', type='int', default=100000,
+                        help="With a url corpus, how many of its urls each bee fires at (default: 100000).")
+    attack_group.add_option('--corpus-order', metavar="ORDER", nargs=1,
+                        action='store', dest='corpus_order', type='choice', choices=['random', 'weighted', 'sequential'], default='weighted',
+                        help="With a url corpus, how each bee picks its urls: by their weights (the same as random for a corpus without weights), random, or sequential with each bee taking the next stretch of the corpus (default: weighted).")
+    attack_group.add_option('--weighted', metavar="WEIGHTED",
+                        action='store_true', dest='weighted', default=False,
+                        help="For corpus, the last field of each line of the url file is the url's weight.")
 
     attack_group.add_option('-n', '--number', metavar="NUMBER", nargs=1,
                         action='store', dest='number', type='int', default=1000,
@@ -107,12 +139,147 @@ commands:
                             help='Use siege to generate load.')
     attack_group.add_option('--use-ab', action='store_const', dest='engine', const='ab',
                             help='Use ab to generate load (default).')
+    attack_group.add_option('--use-h2load', action='store_const', dest='engine', const='h2load',
+                            help='Use h2load to generate load, over HTTP/2 with --h2-streams or HTTP/1.1 otherwise.')
+    attack_group.add_option('--hold', action='store_const', dest='engine', const='hold',
+                            help="Open -c connections across the swarm and hold them for the attack's time (-w): idle, with a request every 30 seconds with --keepalive, or trickling with --trickle.")
+    attack_group.add_option('--ramp-rate', metavar="RATE", nargs=1,
+                            action='store', dest='ramp_rate', type='float',
+                            help="How many connections the swarm opens per second (default: 1000 per bee; hold only).")
+    attack_group.add_option('--trickle', metavar="SECONDS", nargs=1,
+                            action='store', dest='trickle', type='float',
+                            help="Send a request's head one header line every SECONDS, never finishing it (hold only).")
+    attack_group.add_option('--scenario', metavar="SCENARIO_FILE", nargs=1,
+                            action='store', dest='scenario_file', type='string',
+                            help="Run the multi-step user sessions in SCENARIO_FILE (JSON, see the README) instead of -u or -f, with -c virtual users.")
+    attack_group.add_option('--template', metavar="TEMPLATE_FILE", nargs=1,
+                            action='store', dest='template_file', type='string',
+                            help="Send the method, headers and body in TEMPLATE_FILE (JSON, see the README) to -u, with variables drawn from its data file by the scenario engine (the default), or the same request every time with --use-ab, --use-siege or --use-h2load.")
+    attack_group.add_option('--pool-size', metavar="POOL_SIZE", nargs=1,
+                            action='store', dest='pool_size', type='int',
+                            help="The number of connections each bee opens to the target (default: one per concurrent request; h2load only).")
+    attack_group.add_option('--h2-streams', metavar="H2_STREAMS", nargs=1,
+                            action='store', dest='h2_streams', type='int',
+                            help="Speak HTTP/2 with up to this many concurrent streams per connection (h2load only).")
     attack_group.add_option('-w', '--time', metavar="TIME", nargs=1,
                             action='store', dest='time', type='string',
                             help="the time to run the test 60S, 1M, 5H")
+    attack_group.add_option('--no-sync', action='store_false', dest='sync', default=True,
+                            help="Let each bee start firing as soon as it is staged instead of arming the whole swarm and firing together.")
+    attack_group.add_option('--preflight', action='store_true', dest='preflight', default=False,
+                            help="Check each bee's open file, port and connection tracking limits before the attack, tune them where the bee allows, and share -c between the bees within what each can hold.")
+    attack_group.add_option('--relays', metavar="RELAYS", nargs=1,
+                            action='store', dest='relays', type='int', default=0,
+                            help="Use this many bees as relays, each commanding its share of the rest of the swarm, for very large swarms (default: 0).")
+
+    attack_group.add_option('--target-rps', metavar="TARGET_RPS", nargs=1,
+                            action='store', dest='target_rps', type='float',
+                            help="Hold this many requests per second for the attack's time (-w), resizing the swarm and each bee's concurrency as needed.")
+    attack_group.add_option('--bucket', metavar="BUCKET", nargs=1,
+                            action='store', dest='bucket', type='int', default=30,
+                            help="With --target-rps, how often in seconds the swarm is resized (default: 30).")
+    attack_group.add_option('--max-bees', metavar="MAX_BEES", nargs=1,
+                            action='store', dest='max_bees', type='int', default=0,
+                            help="With --target-rps, call up fresh bees (with the up options) to grow the swarm to at most this many (default: only the bees already up).")
+
+    attack_group.add_option('--soak', metavar="SOAK",
+                            action='store_true', dest='soak', default=False,
+                            help="Soak the target for the attack's time (-w): the bees fire in the background and the results are checkpointed as they come in, so the controller can stop and 'bees reattach' later.")
+    attack_group.add_option('--segment', metavar="SECONDS", nargs=1,
+                            action='store', dest='segment', type='int', default=60,
+                            help="With --soak, how often in seconds the bees save their results, and the controller pulls them (default: 60).")
+    attack_group.add_option('--checkpoint', metavar="CHECKPOINT_FILE", nargs=1,
+                            action='store', dest='checkpoint', type='string',
+                            help="With --soak or reattach, the soak's checkpoint file (default: ~/.bees-soak).")
+
+    attack_group.add_option('--scrape', metavar="SOURCE", nargs=1,
+                            action='append', dest='scrape', type='string', default=[],
+                            help="Scrape the target's metrics in Prometheus text format during the attack, from an http(s) url or from '[user@]host:command' run over ssh. May be given more than once.")
+    attack_group.add_option('--scrape-interval', metavar="SECONDS", nargs=1,
+                            action='store', dest='scrape_interval', type='float', default=5,
+                            help="How often the metrics are scraped (default: 5).")
+    attack_group.add_option('--cpu-metric', metavar="NAME", nargs=1,
+                            action='store', dest='cpu_metric', type='string', default='node_cpu_seconds_total',
+                            help="The target's CPU metric; counters by mode give the busy fraction (default: node_cpu_seconds_total).")
+    attack_group.add_option('--queue-metric', metavar="NAME", nargs=1,
+                            action='store', dest='queue_metric', type='string', default='node_load1',
+                            help="The target's queue depth metric (default: node_load1).")
+
+    attack_group.add_option('--warmup', metavar="WARMUP", nargs=1,
+                            action='store', dest='warmup', type='int', default=0,
+                            help="Have each bee send this many warm-up requests over keep-alive connections before the attack; they are reported separately (default: 0).")
+    attack_group.add_option('--warmup-sample', metavar="WARMUP_SAMPLE", nargs=1,
+                            action='store', dest='warmup_sample', type='int', default=0,
+                            help="Warm the target's caches with a random sample of this many urls from the url file, instead of repeating the first url.")
+    attack_group.add_option('--pin-dns', metavar="PIN_DNS",
+                            action='store_true', dest='pin_dns', default=False,
+                            help="Resolve the target hosts once on each bee during the warm-up and pin them in /etc/hosts for the attack (needs sudo).")
 
     parser.add_option_group(attack_group)
 
+    schedule_group = OptionGroup(parser, "schedule",
+            """A seeded schedule deals each bee its exact requests from the url file (-f), in --corpus-order, so that attacks with the same seed, swarm and url file send the same traffic.""")
+
+    schedule_group.add_option('--seed', metavar="SEED", nargs=1,
+                        action='store', dest='seed', type='string',
+                        help="Replay the requests scheduled from SEED on each bee, with -c connections across the swarm.")
+    schedule_group.add_option('--schedule-rate', metavar="RPS", nargs=1,
+                        action='store', dest='schedule_rate', type='float',
+                        help="Pace the schedule at RPS requests per second across the swarm, as Poisson arrivals, for -w if given (default: as fast as the connections go, for -n requests).")
+    schedule_group.add_option('--expect-digest', metavar="DIGEST", nargs=1,
+                        action='store', dest='expect_digest', type='string',
+                        help="Only fire if the schedule's digest is DIGEST, as reported by an earlier attack.")
+
+    parser.add_option_group(schedule_group)
+
+    capacity_group = OptionGroup(parser, "capacity",
+            """A capacity search takes the attack options, starting at -c concurrent requests across the swarm.""")
+
+    capacity_group.add_option('--slo-p99', metavar="MS", nargs=1,
+                        action='store', dest='slo_p99', type='float', default=250,
+                        help="The most the 99th percentile response time may be, in ms (default: 250).")
+    capacity_group.add_option('--slo-errors', metavar="PERCENT", nargs=1,
+                        action='store', dest='slo_errors', type='float', default=0.1,
+                        help="The most failed or non-2xx responses may be, in percent (default: 0.1).")
+    capacity_group.add_option('--stage', metavar="SECONDS", nargs=1,
+                        action='store', dest='stage', type='int', default=60,
+                        help="The longest a load level is tried for (default: 60).")
+    capacity_group.add_option('--min-stage', metavar="SECONDS", nargs=1,
+                        action='store', dest='min_stage', type='int', default=10,
+                        help="Stages stop after any multiple of this once the verdict is clear (default: 10).")
+    capacity_group.add_option('--max-concurrent', metavar="MAX_CONCURRENT", nargs=1,
+                        action='store', dest='max_concurrent', type='int', default=10000,
+                        help="The most concurrent requests to try (default: 10000).")
+    capacity_group.add_option('--precision', metavar="PERCENT", nargs=1,
+                        action='store', dest='precision', type='float', default=10,
+                        help="Stop once the capacity is known to within this percentage (default: 10).")
+
+    parser.add_option_group(capacity_group)
+
+    calibrate_group = OptionGroup(parser, "calibrate",
+            """Calibration fires each engine on each bee at a sink on the bee itself, with keep-alive if -k is given.""")
+
+    calibrate_group.add_option('--levels', metavar="LEVELS", nargs=1,
+                        action='store', dest='levels', type='string', default='1,10,50,200',
+                        help="The concurrency levels each engine is tried at, comma separated (default: 1,10,50,200).")
+    calibrate_group.add_option('--calibrate-time', metavar="SECONDS", nargs=1,
+                        action='store', dest='calibrate_time', type='int', default=5,
+                        help="How long each engine is tried at each level (default: 5).")
+
+    parser.add_option_group(calibrate_group)
+
+    plan_group = OptionGroup(parser, "plan",
+            """Planning takes the engine, --keepalive, --target-rps, -c and -w of the attack to plan for, and at most --max-bees bees.""")
+
+    plan_group.add_option('--plan', metavar="PLAN",
+                        action='store_true', dest='plan', default=False,
+                        help="With up, call up the cheapest planned swarm instead of -s bees of -t in -z.")
+    plan_group.add_option('--zones', metavar="ZONES", nargs=1,
+                        action='store', dest='zones', type='string',
+                        help="The zones the bees may be spread over, comma separated (default: the available zones of -z's region).")
+
+    parser.add_option_group(plan_group)
+
     output_group = OptionGroup(parser, "output")
 
     output_group.add_option('-o', '--output', metavar="OUTPUT_TYPE", nargs=1,
@@ -121,6 +288,18 @@ commands:
     output_group.add_option('-v', '--verbose', metavar="VERBOSE",
                         action='store_true', dest='verbose', default=False,
                         help="whether to log verbosely to stderr.")
+    output_group.add_option('--exemplars', metavar="EXEMPLARS_FILE", nargs=1,
+                        action='store', dest='exemplars_file', type='string',
+                        help="write the slowest requests and a sample of the failed ones, with their start times, to EXEMPLARS_FILE as JSON.")
+    output_group.add_option('--metrics', metavar="METRICS_FILE", nargs=1,
+                        action='store', dest='metrics_file', type='string',
+                        help="with --scrape, write the target's metric samples and their summary over the attack's time buckets to METRICS_FILE as JSON.")
+    output_group.add_option('--trace', metavar="TRACE_FILE", nargs=1,
+                        action='store', dest='trace_file', type='string',
+                        help="write per-bee phase timings to TRACE_FILE as Chrome trace JSON.")
+    output_group.add_option('--profile', metavar="PROFILE",
+                        action='store_true', dest='profile', default=False,
+                        help="also run cProfile on the controller; stats are written next to the trace file (default trace file: bees-trace.json).")
 
     parser.add_option_group(output_group)
 
@@ -131,25 +310,97 @@ commands:
 
     command = args[0]
 
-    import logging
     if options.verbose:
         level=logging.DEBUG
     else:
         level=logging.WARNING
     logging.basicConfig(level=level)
 
+    tracer = None
+    if options.trace_file or options.profile:
+        tracer = Tracer()
+        trace_file = options.trace_file or 'bees-trace.json'
+
+    profiler = None
+    if options.profile:
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+
+    try:
+        _run_command(parser, command, options, tracer, args[1:])
+    finally:
+        if profiler:
+            profiler.disable()
+            profiler.dump_stats(trace_file + '.pstats')
+            logging.info('Wrote controller profile to %s.pstats' % trace_file)
+        if tracer:
+            tracer.write(trace_file)
+
+
+def _run_command(parser, command, options, tracer, args=()):
+    """
+    Dispatch a parsed command to the swarm in ~/.bees.
+    """
+    if command == 'corpus':
+        if len(args) != 2:
+            parser.error('To build a url corpus you need to give the url file and the corpus file to write.')
+        import corpus
+        try:
+            entries, strings = corpus.convert(args[0], args[1], options.weighted)
+        except (IOError, ValueError), e:
+            parser.error('Could not build the url corpus: %s' % e)
+        print 'Wrote %i urls (%i distinct) to %s.' % (entries, strings, args[1])
+        return
+
+    # only once the options are good, to keep errors and help quick
+    import bees
+    from tester import ConnectionModel
+
+    swarm = bees.Swarm.load()
+
     if command == 'up':
-        if not options.key:
+        if not options.key and not options.local:
             parser.error('To spin up new instances you need to specify a key-pair name with -k')
 
         #if options.group == 'default':
         #    print 'New bees will use the "default" EC2 security group. Please note that port 22 (SSH) is not normally open on this group. You will need to use to the EC2 tools to open it before you will be able to attack.'
 
-        bees.up(options.servers, options.group, options.zone, options.instance, options.instance_type, options.login, options.key, options.keepalive)
-    elif command == 'attack':
-
-        url, url_file = None, None
-        if options.url_file:
+        provisioning = {
+            'fallback_zones': [z for z in options.fallback_zones.split(',') if z],
+            'fallback_types': [t for t in options.fallback_types.split(',') if t],
+            'batch': options.batch,
+            'quorum': options.quorum / 100.0,
+        }
+        if options.plan:
+            plans = _plan_swarm(parser, options)
+            if not plans:
+                return
+            import planner
+            planner.print_plans(plans, sys.stdout, limit=1)
+            best = plans[0]
+            swarm.up(best.count, options.group, options.zone, options.instance, best.instance_type, options.login, options.key, options.keepalive, tracer=tracer, local_bees=options.local, zones=best.zones, **provisioning)
+        else:
+            swarm.up(options.servers, options.group, options.zone, options.instance, options.instance_type, options.login, options.key, options.keepalive, tracer=tracer, local_bees=options.local, **provisioning)
+    elif command == 'unpark':
+        swarm.unpark(options.group, options.zone, options.instance, options.instance_type, options.keepalive, tracer=tracer)
+    elif command in ('attack', 'capacity'):
+        import calibrate
+        import planner
+        swarm.history_filename = planner.HISTORY_FILENAME
+        swarm.profile_filename = calibrate.PROFILE_FILENAME
+
+        url, url_file, plan = None, None, None
+        if options.scenario_file:
+            import scenario
+            try:
+                plan = scenario.load(options.scenario_file)
+            except (IOError, ValueError), e:
+                parser.error('Could not read the scenario %s: %s' % (options.scenario_file, e))
+            if options.warmup:
+                parser.error('--warmup does not work with --scenario.')
+            options.engine = 'scenario'
+        elif options.url_file:
             if not options.url_file.startswith('s3://'):
                 url_file = os.path.realpath(options.url_file)
                 assert os.path.isfile(url_file)
@@ -162,14 +413,216 @@ commands:
             else:
                 url = options.url
         else:
-            parser.error('To run an attack you need to specify either a url with -u or a file with -f.')
-
-
-        bees.attack(url, url_file, options.number, options.concurrent, options.keepalive, options.output_type, options.engine, options.time)
+            parser.error('To run an attack you need to specify either a url with -u, a file with -f or a --scenario.')
+
+        request = None
+        if options.template_file:
+            if not url:
+                parser.error('A request template needs a url (-u) to send to.')
+            import template
+            try:
+                compiled = template.load(options.template_file, url)
+            except (IOError, ValueError), e:
+                parser.error('Could not read the template %s: %s' % (options.template_file, e))
+            if (options.engine or 'scenario') == 'scenario':
+                if options.warmup:
+                    parser.error('--warmup does not work with the scenario engine, which --template uses by default.')
+                plan = compiled
+                options.engine = 'scenario'
+            else:
+                if template.has_variables(compiled):
+                    logging.warning('%s sends the same request every time, with the variables of the first row of the data; the scenario engine (the default with --template) varies them.' % options.engine)
+                request = template.get_request(compiled)
+
+        warmup = None
+        if options.warmup:
+            warmup = {
+                'requests': options.warmup,
+                'sample': options.warmup_sample,
+                'pin_dns': options.pin_dns,
+            }
+        elif options.warmup_sample or options.pin_dns:
+            parser.error('--warmup-sample and --pin-dns are part of the warm-up, please also give --warmup.')
+
+        slo = None
+        if command == 'capacity':
+            if options.stage < 1 or options.min_stage < 1:
+                parser.error('--stage and --min-stage must be at least 1 second.')
+            slo = {
+                'p99': options.slo_p99,
+                'errors': options.slo_errors / 100.0,
+                'stage': options.stage,
+                'min_stage': min(options.min_stage, options.stage),
+                'start': options.concurrent,
+                'max': options.max_concurrent,
+                'precision': options.precision / 100.0,
+            }
+
+        autoscaling = None
+        if options.target_rps:
+            if not options.time:
+                parser.error('--target-rps needs a time to hold the rate for, please also give -w.')
+            autoscaling = {
+                'target_rps': options.target_rps,
+                'bucket': options.bucket,
+                'max_bees': options.max_bees,
+                'up': {
+                    'group': options.group,
+                    'zone': options.zone,
+                    'image_id': options.instance,
+                    'instance_type': options.instance_type,
+                    'siege_keepalive': options.keepalive,
+                },
+            }
+
+        soak = None
+        if options.soak:
+            if not options.time:
+                parser.error('--soak needs a time to soak the target for, please also give -w.')
+            soak = {
+                'segment': options.segment,
+                'checkpoint': options.checkpoint,
+            }
+
+        scrape = None
+        if options.scrape:
+            scrape = {
+                'sources': options.scrape,
+                'interval': options.scrape_interval,
+                'cpu': options.cpu_metric,
+                'queue': options.queue_metric,
+            }
+        elif options.metrics_file:
+            parser.error('--metrics writes the scraped metrics, please also give --scrape.')
+
+        corpus = None
+        if url_file and url_file.endswith('.corpus'):
+            corpus = {
+                'sample': options.corpus_sample,
+                'order': options.corpus_order,
+            }
+
+        schedule = None
+        if options.seed is not None:
+            if not url_file:
+                parser.error('A seeded schedule needs a url file (-f) to draw the requests from.')
+            if options.engine not in (None, 'schedule'):
+                parser.error('A seeded schedule is replayed by its own engine, not %s.' % options.engine)
+            schedule = {
+                'seed': options.seed,
+                'rate': options.schedule_rate,
+                'order': options.corpus_order,
+                'digest': options.expect_digest,
+            }
+            options.engine = 'schedule'
+            corpus = None
+        elif options.schedule_rate or options.expect_digest:
+            parser.error('--schedule-rate and --expect-digest pace and check a seeded schedule, please also give --seed.')
+
+        if options.engine == 'hold' and not options.time:
+            parser.error('--hold needs a time to hold the connections for, please also give -w.')
+
+        connection = ConnectionModel(options.keepalive, options.pool_size, options.h2_streams, options.ramp_rate,
+                                     options.trickle)
+
+        outcome = swarm.attack(url, url_file, options.number, options.concurrent, options.keepalive, options.engine, options.time, sync=options.sync, tracer=tracer, relays=options.relays, warmup=warmup, connection=connection, autoscaling=autoscaling, slo=slo, scrape=scrape, scenario=plan, soak=soak, corpus=corpus, preflight=options.preflight, request=request, schedule=schedule)
+        if outcome:
+            _print_attack(outcome, options.output_type, options.exemplars_file, options.metrics_file)
+    elif command == 'reattach':
+        outcome = swarm.reattach(options.checkpoint or bees.SOAK_FILENAME)
+        if outcome:
+            _print_attack(outcome, options.output_type, options.exemplars_file, options.metrics_file)
+    elif command == 'calibrate':
+        import calibrate
+        swarm.profile_filename = calibrate.PROFILE_FILENAME
+        try:
+            levels = [int(level) for level in options.levels.split(',')]
+        except ValueError:
+            parser.error('The concurrency levels must be whole numbers, comma separated.')
+        profiles = swarm.calibrate(levels, options.calibrate_time, options.keepalive, tracer=tracer)
+        if profiles:
+            calibrate.print_profiles(profiles, sys.stdout)
+    elif command == 'plan':
+        plans = _plan_swarm(parser, options)
+        if plans:
+            import planner
+            planner.print_plans(plans, sys.stdout)
     elif command == 'down':
-        bees.down()
+        swarm.down()
+    elif command == 'park':
+        swarm.park()
     elif command == 'report':
-        bees.report()
+        swarm.report()
+
+
+def _plan_swarm(parser, options):
+    """
+    Plan the swarm for the attack the options describe (see
+    L{planner.plan}).
+
+    @return: list of the plans, cheapest first
+    """
+    import bees
+    import calibrate
+    import planner
+    from tester import get_seconds
+
+    if not options.time or not (options.target_rps or options.concurrent):
+        parser.error('To plan a swarm you need to give the time (-w) to plan for, and a --target-rps or -c to hold.')
+
+    if options.local:
+        zones, types = [], ['local']
+    elif options.zones:
+        zones, types = options.zones.split(','), None
+    else:
+        types = None
+        try:
+            zones = bees.get_zones(options.zone[:-1])
+        except Exception, e:
+            logging.warning('Could not list the zones of %s, planning for %s alone: %s' % (options.zone[:-1], options.zone, e))
+            zones = [options.zone]
+
+    plans = planner.plan(calibrate.load_profiles(), planner.load_history(), options.engine or 'ab', options.keepalive,
+                         get_seconds(options.time), rps=options.target_rps, concurrency=options.concurrent,
+                         zones=zones, types=types, max_bees=options.max_bees)
+    if not plans:
+        logging.error('No instance type was calibrated or used in an attack with %s that can hold the load; run "bees calibrate" on some bees first.' % (options.engine or 'ab'))
+    return plans
+
+
+def _print_attack(outcome, output_type, exemplars_file, metrics_file):
+    """
+    Print an attack's L{bees.AttackResult} as text or csv, and write its
+    exemplars and the target's metrics to exemplars_file and metrics_file
+    if given.
+    """
+    if output_type not in ('csv', 'csvh'):
+        outcome.print_text(sys.stdout)
+
+    if outcome.result is None:
+        # a capacity search which found no passing level has its stages only
+        if outcome.stages is None:
+            logging.error('No bees completed the attack.')
+        return
+
+    if output_type in ('csv', 'csvh'):
+        # it is presumed that csv output should be suppressed when some
+        # workers failed.
+        if not outcome.failed:
+            outcome.print_csv(sys.stdout, header=output_type == 'csvh')
+        else:
+            logging.warning('test results invalid - one or more clients failed')
+
+    if exemplars_file:
+        if outcome.exemplars:
+            outcome.write_exemplars(exemplars_file)
+        else:
+            logging.warning('The bees did not report any exemplars (only siege, wideload, h2load, scenario and schedule do).')
+
+    if metrics_file:
+        outcome.write_metrics(metrics_file)
+
+    logging.info('The swarm is awaiting new orders.')
 
 
 def main():
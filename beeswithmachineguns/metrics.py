@@ -0,0 +1,256 @@
+"""
+Scraping the target's own metrics during an attack.
+
+While the bees fire, the controller scrapes one or more sources on a
+fixed interval: a Prometheus text format endpoint over HTTP, or a
+command run over ssh on a target host which prints the same format
+(e.g. a node exporter's textfile).  The samples are kept with the
+attack's results and summarized over each of its time buckets, so the
+target's CPU and queue depth can be read next to the swarm's rate and
+99th percentile.
+"""
+
+import logging
+import re
+import threading
+import time
+
+
+# seconds between scrapes
+INTERVAL = 5.0
+
+# seconds a scrape may take
+TIMEOUT = 10.0
+
+# counter of CPU seconds by mode, as exported by node_exporter
+CPU_METRIC = 'node_cpu_seconds_total'
+
+# CPU modes in which the CPU is not busy
+IDLE_MODES = ('idle', 'iowait')
+
+# the run queue length, averaged over a minute
+QUEUE_METRIC = 'node_load1'
+
+_SAMPLE_RE = re.compile(r'^([a-zA-Z_:][a-zA-Z0-9_:]*)(?:\{(.*)\})?\s+(\S+)')
+
+_LABEL_RE = re.compile(r'([a-zA-Z_][a-zA-Z0-9_]*)\s*=\s*"((?:[^"\\]|\\.)*)"')
+
+
+def parse_prometheus(text):
+    """
+    Parse the Prometheus text exposition format.
+
+    @return: (types, values): a dict of metric name -> type ('counter',
+        'gauge', ...) for the metrics with a TYPE line, and a list of
+        (name, labels dict, value) for every sample
+    """
+    types = {}
+    values = []
+    for line in text.splitlines():
+        line = line.strip()
+        if line.startswith('#'):
+            fields = line.split()
+            if len(fields) >= 4 and fields[1] == 'TYPE':
+                types[fields[2]] = fields[3]
+            continue
+        m = _SAMPLE_RE.match(line)
+        if not m:
+            continue
+        name, labels, value = m.groups()
+        try:
+            value = float(value)
+        except ValueError:
+            continue
+        values.append((name, dict(_LABEL_RE.findall(labels or '')), value))
+    return (types, values)
+
+
+def fetch(source, timeout=TIMEOUT):
+    """
+    Read a source's metrics.
+
+    @param source: an http(s) url, or '[user@]host:command' to run the
+        command over ssh (with the user's ssh agent or default keys)
+    @return: the metrics, in Prometheus text format
+    """
+    if source.startswith('http://') or source.startswith('https://'):
+        import urllib2
+        return urllib2.urlopen(source, timeout=timeout).read()
+
+    import paramiko
+    target, command = source.split(':', 1)
+    username, _, host = target.rpartition('@')
+    client = paramiko.SSHClient()
+    client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+    client.connect(host, username=username or None, timeout=timeout)
+    try:
+        stdin, stdout, stderr = client.exec_command(command, timeout=timeout)
+        return stdout.read()
+    finally:
+        client.close()
+
+
+class Scraper(object):
+    """
+    Scrapes sources on a background thread until stopped.
+
+    Each sample is a dict of the scrape's 'time' (epoch seconds), its
+    'source', and the 'types' and 'values' from L{parse_prometheus}.
+    """
+
+    def __init__(self, sources, interval=INTERVAL, fetch=fetch):
+        self.sources = list(sources)
+        self.interval = interval
+        self.fetch = fetch
+        self.samples = []
+        # sources already warned about
+        self._failing = set()
+        self._stopped = threading.Event()
+        self._thread = None
+
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+
+    def stop(self):
+        """
+        Take a last round of samples and stop.
+
+        @return: the samples, in the order they were taken
+        """
+        self._stopped.set()
+        if self._thread:
+            self._thread.join()
+        return self.samples
+
+
+    def scrape(self):
+        """
+        Take one sample of every source.
+        """
+        for source in self.sources:
+            t = time.time()
+            try:
+                types, values = parse_prometheus(self.fetch(source))
+            except Exception, e:
+                if source not in self._failing:
+                    logging.warning('Could not scrape %s: %s' % (source, e))
+                self._failing.add(source)
+                continue
+            self.samples.append({'time': t, 'source': source, 'types': types, 'values': values})
+
+
+    def _run(self):
+        while True:
+            started = time.time()
+            self.scrape()
+            if self._stopped.wait(max(0.0, self.interval - (time.time() - started))):
+                break
+        self.scrape()
+
+
+def _total(sample, name, modes=None):
+    """
+    @return: the sum of a sample's series of the named metric (only those
+        whose mode label is in modes, if given), or None if it has none
+    """
+    matching = [value for n, labels, value in sample['values']
+                if n == name and (modes is None or labels.get('mode') in modes)]
+    if not matching:
+        return None
+    return sum(matching)
+
+
+def _bracket(samples, start, end):
+    """
+    @return: the samples taken between start and end, with the last one
+        taken before start, for rates over the window
+    """
+    before = [s for s in samples if s['time'] < start]
+    within = [s for s in samples if start <= s['time'] <= end]
+    return before[-1:] + within
+
+
+def _rate(samples, name, modes=None):
+    points = [(s['time'], _total(s, name, modes)) for s in samples]
+    points = [p for p in points if p[1] is not None]
+    if len(points) < 2 or points[-1][0] <= points[0][0]:
+        return None
+    # counters reset when the target restarts
+    return max(0.0, points[-1][1] - points[0][1]) / (points[-1][0] - points[0][0])
+
+
+def summarize(samples, start, end, name):
+    """
+    Summarize a metric over a window, for each source and then averaged
+    over the sources.
+
+    Counters of CPU seconds by mode give the busy fraction; other
+    counters their rate per second, and gauges their mean.
+
+    @return: the summary, or None if the samples do not cover the metric
+    """
+    per_source = []
+    for source in sorted(set(s['source'] for s in samples)):
+        bracketed = _bracket([s for s in samples if s['source'] == source], start, end)
+        if not bracketed:
+            continue
+        kind = bracketed[-1]['types'].get(name) or (name.endswith('_total') and 'counter') or 'gauge'
+        has_modes = any(n == name and 'mode' in labels for n, labels, v in bracketed[-1]['values'])
+        if kind == 'counter' and has_modes:
+            total = _rate(bracketed, name)
+            idle = _rate(bracketed, name, IDLE_MODES)
+            value = None
+            if total and idle is not None:
+                value = 1.0 - idle / total
+        elif kind == 'counter':
+            value = _rate(bracketed, name)
+        else:
+            within = [_total(s, name) for s in bracketed if s['time'] >= start]
+            within = [v for v in within if v is not None]
+            value = None
+            if within:
+                value = sum(within) / len(within)
+        if value is not None:
+            per_source.append(value)
+    if not per_source:
+        return None
+    return sum(per_source) / len(per_source)
+
+
+def align(samples, timeline, cpu_metric=CPU_METRIC, queue_metric=QUEUE_METRIC):
+    """
+    Add the target's 'cpu' and 'queue' over each of the timeline's
+    (start, end) windows to its rows, in place.
+    """
+    for row in timeline:
+        row['cpu'] = summarize(samples, row['start'], row['end'], cpu_metric)
+        row['queue'] = summarize(samples, row['start'], row['end'], queue_metric)
+    return timeline
+
+
+def print_timeline(timeline, out):
+    """
+    Print the swarm's rate and 99th percentile next to the target's CPU
+    and queue depth, for each of the timeline's windows.
+
+    @param out: file-like, open for writing, into which output will be printed.
+    """
+    print >> out, 'Target metrics:'
+    first = timeline[0]['start']
+    for row in timeline:
+        cpu, queue = row['cpu'], row['queue']
+        if cpu is None:
+            cpu = '-'
+        elif cpu <= 1.0:
+            # a busy fraction
+            cpu = '%i%%' % (cpu * 100)
+        else:
+            cpu = '%.2f' % cpu
+        print >> out, '  +%.0fs\t%s [#/sec], 99%% %s [ms], target CPU %s, queue %s' % (
+            row['start'] - first, (row['rps'] is None and '-') or '%.2f' % row['rps'],
+            (row['p99'] is None and '-') or '%i' % row['p99'], cpu, (queue is None and '-') or '%.2f' % queue)
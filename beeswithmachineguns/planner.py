@@ -0,0 +1,234 @@
+"""
+Planning the swarm for an attack.
+
+How many bees of which instance type an attack needs depends on how much
+each can fire with the engine, which 'bees calibrate' measures (see
+L{calibrate}), and on how much bees like them held in past attacks,
+which every attack records in HISTORY_FILENAME.  L{plan} turns a target
+rate or concurrency held for a time into the cheapest swarms which can
+hold it, spread over availability zones.
+
+Burstable instances only fire at their calibrated rate while they have
+CPU credits: t2 bees start with launch credits and drop to their
+baseline once those are spent, so attacks longer than that are planned
+at the baseline; t3 bees run unlimited by default, at full speed but
+paying for the surplus credits.
+"""
+
+import json
+import math
+import os
+import time
+from collections import namedtuple
+
+
+HISTORY_FILENAME = os.path.expanduser('~/.bees-history')
+
+# vCPUs, on-demand dollars per hour (us-east-1, Linux), the baseline share
+# of the CPU for burstable types (None for the others) and their launch
+# credits (vCPU-minutes at full speed)
+INSTANCE_TYPES = {
+    't2.nano': (1, 0.0058, 0.05, 30),
+    't2.micro': (1, 0.0116, 0.1, 30),
+    't2.small': (1, 0.023, 0.2, 30),
+    't2.medium': (2, 0.0464, 0.2, 60),
+    't2.large': (2, 0.0928, 0.3, 60),
+    't3.micro': (2, 0.0104, 0.1, 0),
+    't3.small': (2, 0.0208, 0.2, 0),
+    't3.medium': (2, 0.0416, 0.2, 0),
+    't3.large': (2, 0.0832, 0.3, 0),
+    'm5.large': (2, 0.096, None, 0),
+    'm5.xlarge': (4, 0.192, None, 0),
+    'c5.large': (2, 0.085, None, 0),
+    'c5.xlarge': (4, 0.17, None, 0),
+    'c5.2xlarge': (8, 0.34, None, 0),
+    'c6i.large': (2, 0.085, None, 0),
+    'c6i.xlarge': (4, 0.17, None, 0),
+    'c6i.2xlarge': (8, 0.34, None, 0),
+}
+
+# dollars per vCPU-hour of surplus credits for unlimited (t3) bees
+SURPLUS_CREDIT_PRICE = 0.05
+
+# seconds a bee is paid for before it fires, booting and provisioning
+BOOT_SECONDS = 300
+
+# the most bees to call up in any one zone, past which the swarm is
+# spread, as a zone may lack the capacity for a large batch of a type
+BEES_PER_ZONE = 20
+
+# plans leave this much headroom on the bees' rate, so that attacks stay
+# clear of their ceiling (see L{calibrate.NEAR_CEILING})
+HEADROOM = 1.1
+
+
+class Plan(namedtuple('Plan', ['instance_type', 'count', 'zones', 'rps', 'concurrency', 'cost', 'source', 'note'])):
+    """
+    A swarm for an attack: count bees of instance_type, spread over
+    zones (a list of (zone, count)), each of which can fire rps requests
+    per second and hold concurrency concurrent requests.  The cost of the
+    attack is in dollars (None for types without a known price), source
+    is where what the bees can do came from ('calibrated' or 'history')
+    and note says what limited them, if anything.
+    """
+
+
+def record(entry, filename=HISTORY_FILENAME):
+    """
+    Append an attack's entry to the history: a dict of its 'engine',
+    'keepalive', the count of bees of each instance type in 'types', the
+    'rps' and 'concurrency' of the whole swarm and how many 'seconds' it
+    fired for.
+    """
+    entry = dict(entry, time=time.time())
+    with open(filename, 'a') as f:
+        f.write(json.dumps(entry) + '\n')
+
+
+def load_history(filename=HISTORY_FILENAME):
+    """
+    @return: list of the recorded attacks, [] if there are none
+    """
+    history = []
+    try:
+        with open(filename) as f:
+            for line in f:
+                try:
+                    history.append(json.loads(line))
+                except ValueError:
+                    # a line cut short
+                    continue
+    except IOError:
+        pass
+    return history
+
+
+def get_capabilities(profiles, history, engine, keepalive):
+    """
+    Find what a bee of each instance type can do with the engine: its
+    calibrated ceiling or, for types which were not calibrated, the most
+    a bee fired in past attacks by swarms of only that type, and the
+    most concurrent requests it held at full rate in calibration or in
+    any past attack.
+
+    @return: dict of dicts of the 'rps', 'concurrency' and 'source' of
+        each type
+    """
+    from calibrate import NEAR_CEILING, get_key
+
+    capabilities = {}
+    key = get_key(engine, keepalive)
+    for instance_type, profile in profiles.items():
+        calibrated = profile['engines'].get(key)
+        if calibrated is None:
+            continue
+        full = [row['concurrency'] for row in calibrated['levels']
+                if row['rps'] >= NEAR_CEILING * calibrated['max_rps']]
+        capabilities[instance_type] = {
+            'rps': calibrated['max_rps'],
+            'concurrency': max(full),
+            'source': 'calibrated',
+        }
+
+    for entry in history:
+        if entry['engine'] != engine or bool(entry['keepalive']) != bool(keepalive) or len(entry['types']) != 1:
+            continue
+        instance_type, bees = entry['types'].items()[0]
+        capability = capabilities.setdefault(instance_type, {'rps': 0.0, 'concurrency': 0, 'source': 'history'})
+        if capability['source'] == 'history':
+            capability['rps'] = max(capability['rps'], float(entry['rps']) / bees)
+        capability['concurrency'] = max(capability['concurrency'], entry['concurrency'] / bees)
+    return capabilities
+
+
+def get_sustained(instance_type, rps, seconds):
+    """
+    @return: (the rate a bee of the type can hold for seconds, given it
+        fires rps at full speed, and a note of why it is less, or None)
+    """
+    vcpus, price, baseline, credits = INSTANCE_TYPES.get(instance_type, (1, None, None, 0))
+    if baseline is None or not instance_type.startswith('t2.'):
+        return (rps, None)
+    burst = credits * 60.0 / (vcpus * (1 - baseline))
+    if seconds <= burst:
+        return (rps, None)
+    return (rps * baseline, 'out of CPU credits after %im, held at its %i%% baseline' % (burst / 60, baseline * 100))
+
+
+def get_cost(instance_type, count, seconds):
+    """
+    @return: the dollars count bees of the type cost for an attack of
+        seconds, or None if the type's price is not known
+    """
+    if instance_type not in INSTANCE_TYPES:
+        return None
+    vcpus, price, baseline, credits = INSTANCE_TYPES[instance_type]
+    hours = (seconds + BOOT_SECONDS) / 3600.0
+    cost = price * count * hours
+    if baseline is not None and instance_type.startswith('t3.'):
+        # unlimited bees pay for running past their baseline
+        cost += SURPLUS_CREDIT_PRICE * vcpus * (1 - baseline) * count * seconds / 3600.0
+    return cost
+
+
+def spread(count, zones):
+    """
+    @return: list of (zone, count) sharing count bees between as few of
+        the zones as keep them within L{BEES_PER_ZONE} each (all of the
+        zones if they cannot)
+    """
+    zones = list(zones)
+    used = min(len(zones), max(1, int(math.ceil(float(count) / BEES_PER_ZONE))))
+    return [(zone, count / used + (k < count % used)) for k, zone in enumerate(zones[:used])]
+
+
+def plan(profiles, history, engine, keepalive, seconds, rps=None, concurrency=None, zones=(), types=None, max_bees=0):
+    """
+    Plan the swarms which can hold rps requests per second and
+    concurrency concurrent requests (either may be None) for seconds.
+
+    @param profiles: the calibrated profiles (see L{calibrate.load_profiles})
+    @param history: the recorded attacks (see L{load_history})
+    @param zones: the zones the bees may be spread over
+    @param types: the instance types to consider, default all but local
+        bees
+    @param max_bees: the most bees a plan may have, 0 for no limit
+    @return: list of L{Plan}, cheapest first
+    """
+    plans = []
+    for instance_type, capability in get_capabilities(profiles, history, engine, keepalive).items():
+        if types is not None and instance_type not in types:
+            continue
+        if types is None and instance_type == 'local':
+            continue
+        per_bee, note = get_sustained(instance_type, capability['rps'], seconds)
+        counts = [1]
+        if rps:
+            if not per_bee:
+                continue
+            counts.append(int(math.ceil(rps * HEADROOM / per_bee)))
+        if concurrency:
+            if not capability['concurrency']:
+                continue
+            counts.append(int(math.ceil(float(concurrency) / capability['concurrency'])))
+        count = max(counts)
+        if max_bees and count > max_bees:
+            continue
+        plans.append(Plan(instance_type, count, spread(count, zones), per_bee, capability['concurrency'],
+                          get_cost(instance_type, count, seconds), capability['source'], note))
+    # types without a price last, then the fewest bees
+    return sorted(plans, key=lambda p: (p.cost is None, p.cost, p.count))
+
+
+def print_plans(plans, out, limit=5):
+    """
+    Print the cheapest plans.
+
+    @param out: file-like, open for writing, into which output will be printed.
+    """
+    for k, p in enumerate(plans[:limit]):
+        print >> out, '%i. %i x %s in %s: %s' % (
+            k + 1, p.count, p.instance_type, ', '.join('%s (%i)' % z for z in p.zones) or 'any zone',
+            (p.cost is not None and '$%.2f' % p.cost) or 'price unknown')
+        print >> out, '   %.0f [#/sec] and %i concurrent requests per bee (%s)%s' % (
+            p.rps, p.concurrency, p.source, (p.note and ', %s' % p.note) or '')
@@ -0,0 +1,264 @@
+"""
+Checking and tuning the bees' limits before an attack.
+
+'bees up' tunes the kernel when a bee boots, but nothing checks that the
+tuning took, and the bees' limits on open files, ephemeral ports and
+tracked connections still bound how many connections each can keep
+open.  Before an attack with --preflight each bee runs
+
+    PYTHONPATH=bees.zip python -m beeswithmachineguns.preflight [--tune]
+
+which, with --tune, raises what it can (with sudo, where the bee allows
+it) to the values in L{WANTED}, then prints the bee's limits after
+PREFLIGHT_MARKER: see L{collect}.  The controller then fits each bee's
+share of the concurrency within its limits (see L{fit}), and raises the
+soft open file limit to the hard one for the engine.
+"""
+
+import json
+import os
+import resource
+import subprocess
+import sys
+from optparse import OptionParser
+
+
+PREFLIGHT_MARKER = 'bees-preflight:'
+
+# the tuning 'bees up' applies, which --tune repairs where it fell short
+WANTED = [
+    ('net.ipv4.ip_local_port_range', '2000 65000'),
+    ('net.core.somaxconn', '65535'),
+    ('net.netfilter.nf_conntrack_max', '1048576'),
+    ('fs.file-max', '2097152'),
+]
+
+# the hard open file limit --tune sets for new sessions
+NOFILE = 1048576
+
+# open files kept for the engine itself
+RESERVED_FILES = 64
+
+_LIMITS_FILE = '/etc/security/limits.d/beeswithmachineguns.conf'
+
+
+def _read(path):
+    try:
+        with open(path) as f:
+            return f.read().strip()
+    except (IOError, OSError):
+        return None
+
+
+def _read_sysctl(name):
+    return _read('/proc/sys/' + name.replace('.', '/'))
+
+
+def _get_nic():
+    """
+    @return: dict of the 'name', 'speed' (Mb/s, None if unknown) and 'mtu'
+        of the interface with the default route, or None
+    """
+    routes = (_read('/proc/net/route') or '').splitlines()[1:]
+    for line in routes:
+        fields = line.split()
+        if len(fields) > 1 and fields[1] == '00000000':
+            name = fields[0]
+            speed = _read('/sys/class/net/%s/speed' % name)
+            mtu = _read('/sys/class/net/%s/mtu' % name)
+            return {
+                'name': name,
+                # virtual interfaces report -1
+                'speed': (speed and speed.lstrip('-').isdigit() and int(speed) > 0 and int(speed)) or None,
+                'mtu': (mtu and int(mtu)) or None,
+            }
+    return None
+
+
+def collect():
+    """
+    @return: dict of the bee's limits: the soft and hard open file limits
+        ('nofile', 'nofile_hard'), the number of ephemeral 'ports', the
+        size and use of its connection tracking table ('conntrack_max',
+        'conntrack_count', None without connection tracking),
+        'somaxconn', 'cpus' and its 'nic' (see L{_get_nic})
+    """
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if hard == resource.RLIM_INFINITY:
+        hard = NOFILE
+    ports = None
+    port_range = _read_sysctl('net.ipv4.ip_local_port_range')
+    if port_range:
+        low, high = map(int, port_range.split())
+        ports = high - low + 1
+    conntrack_max = _read_sysctl('net.netfilter.nf_conntrack_max')
+    conntrack_count = _read_sysctl('net.netfilter.nf_conntrack_count')
+    somaxconn = _read_sysctl('net.core.somaxconn')
+    return {
+        'nofile': soft,
+        'nofile_hard': hard,
+        'ports': ports,
+        'conntrack_max': conntrack_max and int(conntrack_max),
+        'conntrack_count': (conntrack_count and int(conntrack_count)) or 0,
+        'somaxconn': somaxconn and int(somaxconn),
+        'cpus': os.sysconf('SC_NPROCESSORS_ONLN'),
+        'nic': _get_nic(),
+    }
+
+
+def _falls_short(current, wanted):
+    """
+    @return: whether a sysctl's current value is below the wanted one
+    """
+    if current is None:
+        # not on this kernel, or not loaded
+        return False
+    current, wanted = map(int, current.split()), map(int, wanted.split())
+    if len(current) == 2:
+        # a range, which should be at least as wide
+        return current[1] - current[0] < wanted[1] - wanted[0]
+    return current[0] < wanted[0]
+
+
+def _sudo(command):
+    """
+    Run a command as root without prompting.
+
+    @return: whether it succeeded
+    """
+    with open(os.devnull, 'w') as devnull:
+        try:
+            return subprocess.call(['sudo', '-n'] + command, stdout=devnull, stderr=devnull) == 0
+        except OSError:
+            # no sudo
+            return False
+
+
+def tune(sudo=_sudo):
+    """
+    Raise the sysctls which fall short of L{WANTED}, and the hard open
+    file limit of new sessions to L{NOFILE}.
+
+    @return: (changed, failed): lists of what was and could not be changed
+    """
+    changed, failed = [], []
+    for name, wanted in WANTED:
+        current = _read_sysctl(name)
+        if not _falls_short(current, wanted):
+            continue
+        current = ' '.join(current.split())
+        if sudo(['sysctl', '-w', '%s=%s' % (name, wanted)]):
+            changed.append('%s %s -> %s' % (name, current, wanted))
+        else:
+            failed.append('%s is %s' % (name, current))
+
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if hard != resource.RLIM_INFINITY and hard < NOFILE:
+        line = '* - nofile %i' % NOFILE
+        if sudo(['sh', '-c', "echo '%s' > %s" % (line, _LIMITS_FILE)]):
+            changed.append('open files %i -> %i (for new sessions)' % (hard, NOFILE))
+        else:
+            failed.append('open files is %i' % hard)
+    return (changed, failed)
+
+
+def get_capacity(limits):
+    """
+    @return: how many connections a bee can keep open at once, as far as
+        its limits on open files, ephemeral ports (to any one target
+        address) and tracked connections go
+    """
+    bounds = [limits['nofile_hard'] - RESERVED_FILES]
+    if limits.get('ports'):
+        bounds.append(limits['ports'])
+    if limits.get('conntrack_max'):
+        bounds.append(limits['conntrack_max'] - limits.get('conntrack_count', 0))
+    return max(0, min(bounds))
+
+
+def fit(capacities, total):
+    """
+    Share total concurrency between bees as evenly as their capacities
+    allow, the bees which cannot take an even share taking what they can
+    and the others making up the difference.
+
+    @param capacities: each bee's capacity, None where it is not known
+    @return: each bee's share, which add up to less than total only if
+        the bees cannot take it all
+    """
+    shares = [0] * len(capacities)
+    remaining = total
+    # the tightest first, so the rest can make up their shortfall
+    order = sorted(range(len(capacities)),
+                   key=lambda i: (capacities[i] is None, capacities[i]))
+    for k, i in enumerate(order):
+        share = remaining / (len(order) - k)
+        if capacities[i] is not None:
+            share = min(share, capacities[i])
+        shares[i] = share
+        remaining -= share
+    return shares
+
+
+def get_limited_command(command, nofile):
+    """
+    Wrap a command so it runs with the soft open file limit raised.
+    """
+    return 'ulimit -n %i 2>/dev/null; %s' % (nofile, command)
+
+
+def parse(output):
+    """
+    @return: the limits printed by a bee (see L{main}), or None
+    """
+    for line in output.splitlines():
+        if line.startswith(PREFLIGHT_MARKER):
+            return json.loads(line[len(PREFLIGHT_MARKER):])
+    return None
+
+
+def print_preflight(checks, out):
+    """
+    Print what the pre-flight found and changed on each bee.
+
+    @param checks: list of dicts of each bee's 'instance_id', 'limits'
+        (None if it could not be checked), 'changed' and 'failed' tuning,
+        and its 'concurrency' after fitting, as against its even share,
+        'asked'
+    @param out: file-like, open for writing, into which output will be printed.
+    """
+    print >> out, 'Pre-flight:'
+    for check in checks:
+        limits = check['limits']
+        if limits is None:
+            print >> out, '  %s\tcould not be checked' % check['instance_id']
+            continue
+        nic = limits.get('nic') or {}
+        print >> out, '  %s\t%i cpus, %s, %i open files, %s ports, conntrack %s, concurrency %i%s' % (
+            check['instance_id'], limits['cpus'],
+            (nic.get('speed') and '%s %i Mb/s' % (nic['name'], nic['speed'])) or nic.get('name') or 'no nic',
+            limits['nofile_hard'], limits.get('ports') or '-', limits.get('conntrack_max') or '-',
+            check['concurrency'],
+            (check['concurrency'] != check['asked'] and ' (asked %i)' % check['asked']) or '')
+        if check['changed']:
+            print >> out, '    tuned %s' % '; '.join(check['changed'])
+        if check['failed']:
+            print >> out, '    could not tune: %s' % '; '.join(check['failed'])
+
+
+def main():
+    parser = OptionParser(usage='%prog [--tune]')
+    parser.add_option('--tune', dest='tune', action='store_true', default=False)
+    options, args = parser.parse_args()
+
+    changed, failed = [], []
+    if options.tune:
+        changed, failed = tune()
+    limits = collect()
+    limits['changed'] = changed
+    limits['failed'] = failed
+    print >> sys.stdout, '%s %s' % (PREFLIGHT_MARKER, json.dumps(limits))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+"""
+Calling up large swarms.
+
+A single request for hundreds of instances of one type in one zone fails
+outright if the zone lacks the capacity for all of them.  Instead the
+swarm is called up in batches of at most BATCH bees, requested at once,
+each of which takes what it can get (EC2 launches part of a batch if it
+can) and asks the next placement, an alternative zone or instance type,
+for the rest.  Placements which ran short are not asked again.  The
+swarm is usable once a quorum of it is running; the rest join as they
+come up.
+"""
+
+import math
+
+
+# the most bees asked for in one request
+BATCH = 50
+
+# the share of the swarm that must be running before it is usable
+QUORUM = 1.0
+
+# EC2 error codes for a placement without the capacity for a request,
+# after which the next one is asked instead
+CAPACITY_ERRORS = (
+    'InsufficientInstanceCapacity',
+    'InsufficientCapacity',
+    'InsufficientHostCapacity',
+    'InsufficientReservedInstanceCapacity',
+    'InstanceLimitExceeded',
+    'Unsupported',
+)
+
+
+class CapacityError(Exception):
+    """
+    Raised by a launch function when a placement has no capacity left.
+    """
+
+
+def get_batches(count, batch=BATCH):
+    """
+    @return: list of the sizes of the batches count bees are called up in,
+        as even as they can be
+    """
+    batches = max(1, int(math.ceil(float(count) / batch)))
+    return [count / batches + (k < count % batches) for k in range(batches)]
+
+
+def get_placements(zone, instance_type, fallback_zones=(), fallback_types=()):
+    """
+    @return: list of the (zone, instance_type) to ask in turn: the
+        instance type in the zone and then the fallback zones, then each
+        fallback type likewise
+    """
+    zones = [zone] + [z for z in fallback_zones if z != zone]
+    types = [instance_type] + [t for t in fallback_types if t != instance_type]
+    return [(z, t) for t in types for z in zones]
+
+
+def launch_batch(count, placements, launch, exhausted):
+    """
+    Call up count bees, asking each placement in turn for what is still
+    missing.
+
+    @param launch: function of (zone, instance_type, count) which launches
+        up to count bees and returns them, or raises L{CapacityError}
+    @param exhausted: set of the placements which ran short, shared by the
+        batches and added to
+    @return: list of the bees launched, fewer than count if every
+        placement ran short
+    """
+    instances = []
+    for placement in placements:
+        if len(instances) >= count:
+            break
+        if placement in exhausted:
+            continue
+        try:
+            launched = launch(placement[0], placement[1], count - len(instances))
+        except CapacityError:
+            launched = []
+        instances.extend(launched)
+        if len(instances) < count:
+            exhausted.add(placement)
+    return instances
+
+
+def get_needed(count, quorum=QUORUM):
+    """
+    @return: how many of count bees must be running for the swarm to be
+        usable
+    """
+    return min(count, max(1, int(math.ceil(count * quorum))))
@@ -0,0 +1,59 @@
+"""
+Entry point for relay bees.
+
+The controller stages this package on a relay as bees.zip and runs
+
+    PYTHONPATH=bees.zip python -m beeswithmachineguns.relay
+
+The relay reads its plan (a json line holding its bees' attack params) on
+stdin and attacks with those bees exactly as the controller would.  When
+the attack is synchronized it prints 'armed <bees> <worst rtt>' once its
+bees are armed and waits for a 'fire <time>' line giving the fire time on
+its own clock (0 calls the attack off).  Finally it prints its bees'
+merged result on a line starting with bees.RELAY_RESULT_MARKER.
+"""
+
+import json
+import logging
+import sys
+
+from beeswithmachineguns import bees
+from beeswithmachineguns.tracing import NullTracer, Tracer
+
+
+def _get_fire_at(armed, rtt):
+    """
+    Report to the controller that our bees are armed and wait for its
+    order to fire.
+    """
+    print >> sys.stdout, 'armed %i %.6f' % (armed, rtt)
+    sys.stdout.flush()
+    order = sys.stdin.readline().split()
+    return (order and float(order[1])) or None
+
+
+def main():
+    plan = json.loads(sys.stdin.readline())
+
+    if plan.get('verbose'):
+        level = logging.DEBUG
+    else:
+        level = logging.WARNING
+    logging.basicConfig(level=level, stream=sys.stderr)
+
+    if plan.get('trace'):
+        tracer = Tracer(pid=plan['pid'])
+    else:
+        tracer = NullTracer()
+
+    reports = bees._run_swarm(plan['children'], plan['sync'], tracer,
+                              get_fire_at=plan['sync'] and _get_fire_at or None)
+
+    with tracer.span('aggregate', bees=len(reports)):
+        summary = bees._aggregate_reports(reports)
+
+    print >> sys.stdout, bees.format_relay_result(summary, tracer.spans)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+"""
+Bee-side summary of a per-request log.
+
+Run on a bee (with the package staged as bees.zip) as
+
+    PYTHONPATH=bees.zip python -m beeswithmachineguns.reqlog LOG_FILE
+
+where LOG_FILE is in h2load's --log-file format: one tab separated line
+per request holding its start time (microseconds since the epoch), its
+HTTP status and its duration in microseconds.  Prints the latency
+histogram (see tester.HISTOGRAM_MARKER), the breakdown by status (see
+breakdown.BREAKDOWN_MARKER), the slowest and failed requests (see
+exemplars.EXEMPLARS_MARKER) and, like ab, a table of percentiles in ms.
+"""
+
+import sys
+
+from beeswithmachineguns.breakdown import Breakdown
+from beeswithmachineguns.exemplars import Exemplars
+from beeswithmachineguns.histogram import Histogram
+
+
+def read_log(lines, breakdown=None, exemplars=None):
+    """
+    @param breakdown: optional L{Breakdown} in which to also record every
+        request by status (the log does not say which url it was for)
+    @param exemplars: optional L{Exemplars} to offer every request to
+    @return: L{Histogram} of the logged requests' durations
+    """
+    histogram = Histogram()
+    for line in lines:
+        fields = line.split('\t')
+        if len(fields) < 3:
+            continue
+        try:
+            start = int(fields[0]) / 1000000.0
+            ms = int(fields[2]) / 1000.0
+            status = int(fields[1])
+        except ValueError:
+            continue
+        histogram.record(ms)
+        if breakdown is not None:
+            breakdown.record(None, status, ms)
+        if exemplars is not None:
+            exemplars.record(None, status, start, ms)
+    return histogram
+
+
+def main():
+    breakdown = Breakdown()
+    exemplars = Exemplars()
+    histogram = read_log(open(sys.argv[1]), breakdown, exemplars)
+    print >> sys.stdout, 'Percentage of the requests served within a certain time (ms)'
+    for pctile in (50, 66, 75, 80, 90, 95, 98, 99, 100):
+        print >> sys.stdout, '  %s%%\t%i' % (pctile, histogram.quantile(pctile / 100.0))
+    print >> sys.stdout, 'bees-histogram: %s' % histogram.to_json()
+    print >> sys.stdout, 'bees-breakdown: %s' % breakdown.to_json()
+    print >> sys.stdout, 'bees-exemplars: %s' % exemplars.to_json()
+
+
+if __name__ == '__main__':
+    main()
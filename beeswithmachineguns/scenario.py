@@ -0,0 +1,715 @@
+"""
+Multi-step user sessions.
+
+A scenario is a JSON file of weighted flows, each a sequence of steps
+which a virtual user takes in one session, with its own cookies and
+variables:
+
+    {"flows": [
+        {"name": "checkout", "weight": 3, "steps": [
+            {"name": "login", "method": "POST", "url": "http://shop.example.com/login",
+             "headers": {"Content-Type": "application/x-www-form-urlencoded"},
+             "body": "user=bee${user}&password=secret",
+             "extract": {"cart": "/cart/(\\d+)"},
+             "think": [0.5, 2]},
+            {"name": "cart", "url": "http://shop.example.com/cart/${cart}", "think": 1},
+            {"name": "checkout", "method": "POST", "url": "http://shop.example.com/cart/${cart}/checkout"}]},
+        {"name": "browse", "weight": 7, "steps": [
+            {"url": "http://shop.example.com/products?page=${session}"}]}]}
+
+${name} is replaced by a variable: one extracted (by the first group of
+a regular expression, or the whole match) from an earlier response in
+the session, or 'user' (the virtual user's number on its bee) or
+'session' (its session count).  A session whose extraction finds
+nothing is abandoned.  Cookies set by responses are sent for the rest
+of the session.  After a step the user thinks for the given seconds, or
+for a uniformly random time in the given range.
+
+The controller compiles the scenario once (L{compile_scenario}) into a
+compact plan, which is staged on the bees and run as
+
+    PYTHONPATH=bees.zip python -m beeswithmachineguns.scenario -c USERS [-t SECONDS | -n REQUESTS] [-k] PLAN_FILE
+
+A scenario may also name a "data" file, drawn from in an "order", as
+templates do (see L{template}): each session draws a row of it, whose
+columns are variables too.
+
+Every virtual user runs in one event loop, needing only a socket and a
+few small objects, so a bee can keep thousands of them going.  Each
+step's request is compiled once (see L{template.Renderer}).  Like
+wideload_calc it prints the results as 'key: value' lines, with the
+latency histogram, breakdown and exemplars (see reqlog), and the
+latencies per step after STEPS_MARKER.
+"""
+
+import bisect
+import errno
+import heapq
+import json
+import os
+import random
+import re
+import select
+import socket
+import ssl
+import sys
+import time
+import urlparse
+from optparse import OptionParser
+
+from beeswithmachineguns.breakdown import Breakdown
+from beeswithmachineguns.exemplars import Exemplars
+from beeswithmachineguns.histogram import Histogram
+from beeswithmachineguns.template import VARIABLE_RE, Renderer, compile_data, compile_text, render
+from beeswithmachineguns.tester import STEPS_MARKER
+
+
+
+# seconds a request may take before it counts as failed
+TIMEOUT = 30.0
+
+# what a virtual user's connection is doing
+(IDLE, CONNECTING, HANDSHAKING, SENDING, RECEIVING) = range(5)
+
+# the plan's step fields
+(_KEY, _METHOD, _SCHEME, _HOST, _PORT, _PATH, _HEADERS, _BODY, _EXTRACT, _THINK_MIN, _THINK_MAX) = range(11)
+
+
+def compile_scenario(spec, base=None):
+    """
+    Check a scenario and compile it into a plan.
+
+    @param spec: the scenario, as loaded from its JSON
+    @param base: the directory its data file's path is relative to
+    @return: the plan, a dict of 'flows' (cumulative weight, step
+        indices), 'steps' (lists of the fields above) and 'data' (see
+        L{template.compile_data})
+    @raise ValueError: if the scenario is not valid
+    """
+    flows = spec.get('flows') if isinstance(spec, dict) else None
+    if not flows:
+        raise ValueError('a scenario needs a list of "flows"')
+
+    plan = {'flows': [], 'steps': [], 'data': compile_data(spec, base)}
+    total = 0.0
+    for i, flow in enumerate(flows):
+        name = flow.get('name') or 'flow %i' % (i + 1)
+        weight = float(flow.get('weight', 1))
+        if weight <= 0:
+            raise ValueError('flow %s needs a positive weight' % name)
+        if not flow.get('steps'):
+            raise ValueError('flow %s has no steps' % name)
+
+        indices = []
+        for j, step in enumerate(flow['steps']):
+            key = '%s/%s' % (name, step.get('name') or 'step %i' % (j + 1))
+            url = urlparse.urlsplit(step.get('url') or '')
+            if url.scheme not in ('http', 'https') or not url.hostname:
+                raise ValueError('step %s needs an absolute http or https url' % key)
+            if VARIABLE_RE.search(url.netloc):
+                raise ValueError('step %s may only use variables in its path and query' % key)
+
+            extract = []
+            for variable, expression in sorted((step.get('extract') or {}).items()):
+                try:
+                    groups = re.compile(expression).groups
+                except re.error, e:
+                    raise ValueError('step %s cannot extract %s: %s' % (key, variable, e))
+                extract.append([variable, expression, min(1, groups)])
+
+            think = step.get('think') or 0
+            if not isinstance(think, list):
+                think = [think, think]
+            if len(think) != 2 or not 0 <= float(think[0]) <= float(think[1]):
+                raise ValueError('step %s needs a think time in seconds, or a [min, max] range' % key)
+
+            path = url.path or '/'
+            if url.query:
+                path += '?' + url.query
+            body = step.get('body')
+            indices.append(len(plan['steps']))
+            plan['steps'].append([
+                key,
+                (step.get('method') or (body is not None and 'POST') or 'GET').upper(),
+                url.scheme,
+                url.hostname,
+                url.port or (url.scheme == 'https' and 443) or 80,
+                compile_text(path),
+                [[header, compile_text(value)] for header, value in sorted((step.get('headers') or {}).items())],
+                body is not None and compile_text(body) or None,
+                extract,
+                float(think[0]),
+                float(think[1]),
+            ])
+
+        total += weight
+        plan['flows'].append([total, indices])
+    return plan
+
+
+def load(filename):
+    """
+    Read and compile a scenario file.
+
+    @raise ValueError: if it is not a valid scenario
+    """
+    with open(filename) as f:
+        return compile_scenario(json.load(f), os.path.dirname(filename))
+
+
+def print_steps(steps, out):
+    """
+    Print the latencies of each step.
+
+    @param steps: L{Breakdown} keyed by 'flow/step'
+    @param out: file-like, open for writing, into which output will be printed.
+    """
+    print >> out, 'Steps:'
+    for key in sorted(steps.patterns):
+        entry = steps.patterns[key]
+        h = entry['histogram']
+        non_2xx = sum(c for s, c in entry['statuses'].items() if not s.startswith('2'))
+        print >> out, '  %s\t%i requests, 50%% %i [ms], 99%% %i [ms], %i non-2xx' % (
+            key, h.count, h.quantile(0.5), h.quantile(0.99), non_2xx)
+
+
+class _User(object):
+    """
+    A virtual user: its session and its one connection.
+    """
+
+    __slots__ = ('id', 'sessions', 'steps', 'variables', 'cookies', 'sock', 'address', 'reused',
+                 'state', 'request', 'out', 'buf', 'started', 'connected', 'first_byte')
+
+    def __init__(self, id):
+        self.id = id
+        self.sessions = 0
+        # indices of the session's steps still to take
+        self.steps = []
+        self.variables = {}
+        self.cookies = {}
+        self.sock = None
+        # (scheme, host, port) the connection is to
+        self.address = None
+        self.reused = False
+        self.state = IDLE
+        # the request in flight, what is left of it to send, and the response so far
+        self.request = None
+        self.out = None
+        self.buf = None
+        self.started = None
+        self.connected = None
+        self.first_byte = None
+
+
+def _parse_head(buf):
+    """
+    @return: (status, headers as a list of (lower case name, value), body
+        offset), or None if the head is not all there yet
+    """
+    end = buf.find('\r\n\r\n')
+    if end < 0:
+        return None
+    lines = buf[:end].split('\r\n')
+    status = int(lines[0].split(None, 2)[1])
+    headers = []
+    for line in lines[1:]:
+        name, _, value = line.partition(':')
+        headers.append((name.strip().lower(), value.strip()))
+    return (status, headers, end + 4)
+
+
+def _dechunk(data):
+    """
+    @return: the decoded body, or None if data does not hold all of it
+    """
+    body = []
+    offset = 0
+    while True:
+        eol = data.find('\r\n', offset)
+        if eol < 0:
+            return None
+        size = int(data[offset:eol].split(';')[0], 16)
+        if size == 0:
+            if data.find('\r\n\r\n', eol) < 0 and data.find('\r\n', eol + 2) != eol + 2:
+                return None
+            return ''.join(body)
+        if len(data) < eol + 2 + size + 2:
+            return None
+        body.append(data[eol + 2:eol + 2 + size])
+        offset = eol + 2 + size + 2
+
+
+def _get_body(buf, closed):
+    """
+    @return: (status, headers, body) once the response in buf is
+        complete, else None
+    """
+    head = _parse_head(buf)
+    if head is None:
+        return None
+    status, headers, offset = head
+    names = dict(headers)
+    if status in (204, 304) or 100 <= status < 200:
+        return (status, headers, '')
+    if 'chunked' in names.get('transfer-encoding', '').lower():
+        body = _dechunk(buf[offset:])
+        return body is not None and (status, headers, body) or None
+    if 'content-length' in names:
+        length = int(names['content-length'])
+        if len(buf) - offset >= length:
+            return (status, headers, buf[offset:offset + length])
+        return None
+    # the body runs until the server closes the connection
+    return closed and (status, headers, buf[offset:]) or None
+
+
+class _Poller(object):
+    """
+    epoll where there is one, else poll, with poll's interface.
+    """
+
+    def __init__(self):
+        if hasattr(select, 'epoll'):
+            self._poller = select.epoll()
+            self.IN, self.OUT, self._scale = select.EPOLLIN, select.EPOLLOUT, 1.0
+        else:
+            self._poller = select.poll()
+            self.IN, self.OUT, self._scale = select.POLLIN, select.POLLOUT, 1000.0
+        self.register = self._poller.register
+        self.modify = self._poller.modify
+        self.unregister = self._poller.unregister
+
+
+    def poll(self, seconds):
+        return self._poller.poll(seconds * self._scale)
+
+
+class Runner(object):
+    """
+    Runs virtual users through a plan's flows in one event loop.
+    """
+
+    def __init__(self, plan, users, duration=None, requests=None, keepalive=True, timeout=TIMEOUT, rng=random):
+        self.plan = plan
+        self.users = [_User(i) for i in range(users)]
+        self.duration = duration
+        self.requests = requests
+        self.keepalive = keepalive
+        self.timeout = timeout
+        self.rng = rng
+        self.addresses = {}
+        # each step's request, compiled once
+        self.renderers = [Renderer(step[_METHOD], step[_PATH], step[_HOST], step[_HEADERS], step[_BODY], keepalive)
+                          for step in plan['steps']]
+        self.data = plan.get('data')
+        # sequential rows start from a random one, so bees draw different rows
+        self._row = (self.data and rng.randrange(len(self.data['rows']))) or 0
+        self.poller = _Poller()
+        # fd -> user
+        self.by_fd = {}
+        # (time, sequence, user) at which users take their next step
+        self.timers = []
+        self._sequence = 0
+        self._ssl_context = None
+        self.in_flight = 0
+        self.start = self.end = self.elapsed = None
+
+        self.histogram = Histogram()
+        self.breakdown = Breakdown()
+        self.exemplars = Exemplars()
+        self.steps = Breakdown(capacity=len(plan['steps']))
+        self.issued = 0
+        self.completed = 0
+        self.failed = 0
+        self.non_2xx = 0
+        self.transferred = 0
+        self.connect_ms = 0.0
+        self.ttfb_ms = 0.0
+        self.sessions = 0
+        self.abandoned = 0
+
+
+    def _schedule(self, at, user):
+        self._sequence += 1
+        heapq.heappush(self.timers, (at, self._sequence, user))
+
+
+    def _resolve(self, host, port):
+        key = (host, port)
+        if key not in self.addresses:
+            self.addresses[key] = socket.getaddrinfo(host, port, socket.AF_INET, socket.SOCK_STREAM)[0][4]
+        return self.addresses[key]
+
+
+    def _wants_more(self):
+        if self.duration is not None and time.time() >= self.end:
+            return False
+        return self.requests is None or self.issued < self.requests
+
+
+    def _start_session(self, user):
+        user.sessions += 1
+        self.sessions += 1
+        flows = self.plan['flows']
+        pick = self.rng.random() * flows[-1][0]
+        user.steps = list(flows[bisect.bisect_right([f[0] for f in flows], pick)][1])
+        user.variables = {'user': str(user.id), 'session': str(user.sessions)}
+        if self.data:
+            rows = self.data['rows']
+            if self.data['order'] == 'random':
+                row = rows[self.rng.randrange(len(rows))]
+            else:
+                row = rows[self._row % len(rows)]
+                self._row += 1
+            user.variables.update(zip(self.data['columns'], row))
+        user.cookies = {}
+
+
+    def _next_step(self, user):
+        if not self._wants_more():
+            self._close(user)
+            return
+        if not user.steps:
+            self._start_session(user)
+        step = self.plan['steps'][user.steps[0]]
+        user.request = self.renderers[user.steps[0]].render(user.variables, user.cookies)
+        user.started = time.time()
+        user.first_byte = None
+        self.issued += 1
+        self.in_flight += 1
+
+        address = (step[_SCHEME], step[_HOST], step[_PORT])
+        if user.sock is not None and user.address == address:
+            user.reused = True
+            user.connected = None
+            self._send(user, user.request)
+        else:
+            self._close(user)
+            self._connect(user, address)
+
+
+    def _connect(self, user, address):
+        user.address = address
+        user.reused = False
+        user.connected = None
+        user.out = user.request
+        user.buf = ''
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock.setblocking(0)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        user.sock = sock
+        user.state = CONNECTING
+        self.by_fd[sock.fileno()] = user
+        self.poller.register(sock.fileno(), self.poller.OUT)
+        try:
+            err = sock.connect_ex(self._resolve(address[1], address[2]))
+        except socket.error, e:
+            err = e.errno
+        if err not in (0, errno.EINPROGRESS):
+            self._fail(user)
+
+
+    def _close(self, user):
+        if user.sock is None:
+            return
+        fd = user.sock.fileno()
+        self.by_fd.pop(fd, None)
+        try:
+            self.poller.unregister(fd)
+        except (IOError, ValueError):
+            pass
+        user.sock.close()
+        user.sock = None
+        user.address = None
+        user.state = IDLE
+
+
+    def _finish(self, user, status):
+        """
+        Count the request in flight.
+        """
+        self.in_flight -= 1
+        ms = (time.time() - user.started) * 1000.0
+        step = self.plan['steps'][user.steps[0]]
+        host = step[_HOST]
+        if step[_PORT] != {'http': 80, 'https': 443}[step[_SCHEME]]:
+            host = '%s:%i' % (host, step[_PORT])
+        url = '%s://%s%s' % (step[_SCHEME], host, render(step[_PATH], user.variables))
+        if status is None:
+            self.failed += 1
+            self.exemplars.record(url, None, user.started, ms)
+            return
+        self.completed += 1
+        if not 200 <= status < 300:
+            self.non_2xx += 1
+        self.histogram.record(ms)
+        self.breakdown.record(url, status, ms)
+        self.steps.record(None, status, ms, pattern=step[_KEY])
+        phases = {}
+        if user.connected is not None:
+            phases['connect'] = (user.connected - user.started) * 1000.0
+            self.connect_ms += phases['connect']
+        if user.first_byte is not None:
+            phases['ttfb'] = (user.first_byte - user.started) * 1000.0
+            self.ttfb_ms += phases['ttfb']
+        self.exemplars.record(url, status, user.started, ms, phases)
+
+
+    def _fail(self, user):
+        """
+        The request in flight failed: count it and abandon the session.
+        """
+        self._finish(user, None)
+        self._close(user)
+        user.steps = []
+        self.abandoned += 1
+        self._schedule(time.time(), user)
+
+
+    def _retry_or_fail(self, user):
+        """
+        A kept-alive connection which the server had already closed gets
+        one more try, on a new connection.
+        """
+        if user.reused and not user.buf:
+            address = user.address
+            self._close(user)
+            self._connect(user, address)
+        else:
+            self._fail(user)
+
+
+    def _connected(self, user):
+        if user.sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR):
+            self._fail(user)
+            return
+        user.connected = time.time()
+        if user.address[0] != 'https':
+            self._send(user, user.out)
+            return
+        if self._ssl_context is None:
+            # load testing, not checking certificates
+            self._ssl_context = ssl.SSLContext(ssl.PROTOCOL_SSLv23)
+            self._ssl_context.verify_mode = ssl.CERT_NONE
+        user.sock = self._ssl_context.wrap_socket(user.sock, server_hostname=user.address[1],
+                                                  do_handshake_on_connect=False)
+        user.state = HANDSHAKING
+        self._handshake(user)
+
+
+    def _handshake(self, user):
+        try:
+            user.sock.do_handshake()
+        except ssl.SSLWantReadError:
+            self.poller.modify(user.sock.fileno(), self.poller.IN)
+            return
+        except ssl.SSLWantWriteError:
+            self.poller.modify(user.sock.fileno(), self.poller.OUT)
+            return
+        except (ssl.SSLError, socket.error):
+            self._fail(user)
+            return
+        # the connection counts as set up once TLS is
+        user.connected = time.time()
+        self._send(user, user.out)
+
+
+    def _send(self, user, out):
+        user.state = SENDING
+        user.buf = ''
+        try:
+            sent = user.sock.send(out)
+        except ssl.SSLWantWriteError:
+            sent = 0
+        except socket.error, e:
+            if e.errno not in (errno.EAGAIN, errno.EWOULDBLOCK):
+                self._retry_or_fail(user)
+                return
+            sent = 0
+        # what is left is sent from the same string, without copying it
+        user.out = (sent < len(out) and memoryview(out)[sent:]) or ''
+        if not user.out:
+            user.state = RECEIVING
+        self.poller.modify(user.sock.fileno(), (user.out and self.poller.OUT) or self.poller.IN)
+
+
+    def _receive(self, user):
+        try:
+            data = user.sock.recv(65536)
+            while isinstance(user.sock, ssl.SSLSocket) and user.sock.pending():
+                data += user.sock.recv(65536)
+        except ssl.SSLWantReadError:
+            return
+        except socket.error, e:
+            if e.errno in (errno.EAGAIN, errno.EWOULDBLOCK):
+                return
+            data = ''
+        if not data and not user.buf:
+            self._retry_or_fail(user)
+            return
+        if user.first_byte is None:
+            user.first_byte = time.time()
+        user.buf += data
+        self.transferred += len(data)
+
+        try:
+            response = _get_body(user.buf, not data)
+        except ValueError:
+            response = None
+        if response is not None:
+            self._complete(user, *response)
+        elif not data:
+            self._fail(user)
+
+
+    def _complete(self, user, status, headers, body):
+        self._finish(user, status)
+        step = self.plan['steps'][user.steps.pop(0)]
+        user.buf = user.out = None
+
+        for name, value in headers:
+            if name == 'set-cookie':
+                cookie = value.split(';', 1)[0]
+                if '=' in cookie:
+                    k, v = cookie.split('=', 1)
+                    user.cookies[k.strip()] = v.strip()
+        if not self.keepalive or dict(headers).get('connection', '').lower() == 'close':
+            self._close(user)
+        else:
+            user.state = IDLE
+            self.poller.modify(user.sock.fileno(), self.poller.IN)
+
+        for variable, expression, group in step[_EXTRACT]:
+            m = re.search(expression, body)
+            if m is None:
+                user.steps = []
+                self.abandoned += 1
+                break
+            user.variables[variable] = m.group(group)
+
+        think = 0.0
+        if user.steps:
+            think = step[_THINK_MIN]
+            if step[_THINK_MAX] > think:
+                think = self.rng.uniform(think, step[_THINK_MAX])
+        self._schedule(time.time() + think, user)
+
+
+    def _check_timeouts(self, now):
+        for user in self.users:
+            if user.state != IDLE and now - user.started > self.timeout:
+                self._fail(user)
+
+
+    def run(self):
+        """
+        Run until the requests are issued and have finished, or until the
+        time is up; like ab, requests still in flight then are not counted.
+        """
+        self.start = time.time()
+        self.end = self.start + (self.duration or 0)
+        for user in self.users:
+            self._schedule(self.start, user)
+        next_check = self.start + 1.0
+
+        while self.in_flight or (self.timers and self._wants_more()):
+            now = time.time()
+            if self.duration is not None and now >= self.end:
+                break
+            while self.timers and self.timers[0][0] <= now:
+                at, sequence, user = heapq.heappop(self.timers)
+                self._next_step(user)
+            if now >= next_check:
+                self._check_timeouts(now)
+                next_check = now + 1.0
+
+            wait = 1.0
+            if self.duration is not None:
+                wait = min(wait, self.end - now)
+            if self.timers:
+                wait = min(wait, max(0.0, self.timers[0][0] - time.time()))
+            for fd, events in self.poller.poll(wait):
+                user = self.by_fd.get(fd)
+                if user is None:
+                    continue
+                if user.state == IDLE:
+                    # the server closed a kept-alive connection
+                    self._close(user)
+                elif user.state == CONNECTING:
+                    self._connected(user)
+                elif user.state == HANDSHAKING:
+                    self._handshake(user)
+                elif user.state == SENDING:
+                    self._send(user, user.out)
+                else:
+                    self._receive(user)
+
+        for user in self.users:
+            self._close(user)
+        self.elapsed = time.time() - self.start
+
+
+    def print_results(self, out):
+        """
+        Print the results as 'key: value' lines, then the percentiles and
+        the markers.
+        """
+        results = [
+            ('concurrency', len(self.users)),
+            ('time_taken', self.elapsed),
+            ('complete_requests', self.completed),
+            ('failed_requests', self.failed),
+            ('non_2xx_responses', self.non_2xx),
+            ('total_transferred', self.transferred),
+            ('requests_per_second', self.completed / max(self.elapsed, 0.001)),
+            ('ms_per_request', self.histogram.mean()),
+        ]
+        results.extend(('pctile_%i' % p, self.histogram.quantile(p / 100.0)) for p in (50, 75, 90, 95, 99))
+        results.append(('ms_connect', self.connect_ms / (self.completed or 1)))
+        results.append(('ms_ttfb', self.ttfb_ms / (self.completed or 1)))
+        for key, value in results:
+            print >> out, '%s: %f' % (key, value)
+        print >> out, 'sessions: %i' % self.sessions
+        print >> out, 'abandoned_sessions: %i' % self.abandoned
+        print >> out, 'bees-histogram: %s' % self.histogram.to_json()
+        print >> out, 'bees-breakdown: %s' % self.breakdown.to_json()
+        print >> out, 'bees-exemplars: %s' % self.exemplars.to_json()
+        print >> out, '%s %s' % (STEPS_MARKER, self.steps.to_json())
+
+
+def _raise_file_limit(users):
+    """
+    Every virtual user needs a file descriptor.
+    """
+    try:
+        import resource
+        soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        if soft < users + 64 and (hard == resource.RLIM_INFINITY or soft < hard):
+            resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    except (ImportError, ValueError):
+        pass
+
+
+def main():
+    parser = OptionParser(usage='%prog [-c USERS] [-t SECONDS | -n REQUESTS] [-k] PLAN_FILE')
+    parser.add_option('-c', dest='users', type='int', default=1)
+    parser.add_option('-t', dest='duration', type='float', default=None)
+    parser.add_option('-n', dest='requests', type='int', default=None)
+    parser.add_option('-k', dest='keepalive', action='store_true', default=False)
+    options, args = parser.parse_args()
+    if len(args) != 1:
+        parser.error('Please give the plan file.')
+    if options.duration is None and options.requests is None:
+        parser.error('Please give either -t or -n.')
+
+    with open(args[0]) as f:
+        plan = json.load(f)
+    _raise_file_limit(options.users)
+    runner = Runner(plan, options.users, options.duration, options.requests, options.keepalive)
+    runner.run()
+    runner.print_results(sys.stdout)
+
+
+if __name__ == '__main__':
+    main()
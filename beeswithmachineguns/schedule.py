@@ -0,0 +1,245 @@
+"""
+Seeded request schedules.
+
+Consecutive attacks from a url file differ in which urls each bee fires,
+in what order and when, so that the variance between runs hides small
+changes in the target.  With a seed, L{deal} deals every bee its exact
+sequence of requests from the url file (or corpus, see L{corpus}): each
+entry a url and the offset, in seconds from the moment the bees fire
+together, at which it is sent.  The urls are drawn in the corpus orders
+and dealt to the bees in turn; with a rate, the offsets are Poisson
+arrivals at that rate, else every entry is due at once and the requests
+go out as fast as the connections take them.  Everything is drawn from
+random generators seeded with the seed, so equal seeds, swarms and url
+files make equal schedules.
+
+Each bee replays its schedule, staged as a text file of 'offset url'
+lines, in order, with
+
+    PYTHONPATH=bees.zip python -m beeswithmachineguns.schedule -c CONNECTIONS [-t SECONDS] [-k] SCHEDULE_FILE
+
+through the scenario engine's event loop (see L{scenario.Runner}): an
+entry goes out at its offset on the first connection free by then, late
+if none was; the entries of a paced schedule (one with a rate) sent late
+are counted.  The bee prints the digest of the schedule it replayed,
+which the controller checks against the one it dealt; the digest of the
+whole swarm's schedules (see L{get_digest}) is reported and recorded
+with the result, so that reruns can be checked as identical.
+"""
+
+import hashlib
+import random
+import sys
+import time
+import urlparse
+from optparse import OptionParser
+
+from beeswithmachineguns.scenario import TIMEOUT, Runner, compile_scenario
+from beeswithmachineguns.tester import SCHEDULE_MARKER
+
+
+# requests sent more than this many seconds after their offset are late
+LATE = 0.01
+
+
+def get_rng(seed, *keys):
+    """
+    @return: a random generator seeded with the seed and keys alone, the
+        same on every run and platform
+    """
+    key = ':'.join(map(str, (seed,) + keys))
+    return random.Random(long(hashlib.sha256(key).hexdigest(), 16))
+
+
+def draw(urls, count, order, rng):
+    """
+    Draw count urls in the given order (see L{corpus.ORDERS}): weighted
+    (only a corpus has weights, others are drawn at random), random, or
+    sequential from a random start.
+    """
+    start = rng.randrange(len(urls))
+    if hasattr(urls, 'sample'):
+        return list(urls.sample(count, order, start, rng))
+    if order == 'sequential':
+        return [urls[(start + k) % len(urls)] for k in xrange(count)]
+    return [urls[rng.randrange(len(urls))] for k in xrange(count)]
+
+
+def get_offsets(count, rate, rng):
+    """
+    @return: the offsets of count Poisson arrivals at rate requests per
+        second, to the microsecond the bees read them to, or all 0
+        without a rate
+    """
+    if not rate:
+        return [0.0] * count
+    offsets = []
+    at = 0.0
+    for k in xrange(count):
+        at += rng.expovariate(rate)
+        offsets.append(round(at, 6))
+    return offsets
+
+
+def build(urls, seed, bees, requests, rate=None, order='random'):
+    """
+    Deal the swarm its schedules.
+
+    @param urls: the urls, a list or a L{corpus.Corpus}
+    @param requests: the requests of the whole swarm
+    @param rate: the requests per second of the whole swarm, None to fire
+        as fast as the bees can
+    @return: list of each bee's schedule, a list of (offset, url)
+    """
+    drawn = draw(urls, requests, order, get_rng(seed, 'urls'))
+    schedules = []
+    for i in range(bees):
+        mine = drawn[i::bees]
+        offsets = get_offsets(len(mine), rate and float(rate) / bees, get_rng(seed, 'pacing', i))
+        schedules.append(zip(offsets, mine))
+    return schedules
+
+
+def deal(filename, seed, bees, requests, rate=None, order='random'):
+    """
+    Deal the swarm its schedules (see L{build}) from a plain or gzipped
+    url file, or a corpus.
+    """
+    from beeswithmachineguns import corpus
+    if not corpus.is_corpus(filename):
+        urls = list(corpus.read_lines(filename))
+        if not urls:
+            raise ValueError('%s has no urls' % filename)
+        return build(urls, seed, bees, requests, rate, order)
+    urls = corpus.Corpus(filename)
+    try:
+        return build(urls, seed, bees, requests, rate, order)
+    finally:
+        urls.close()
+
+
+def dumps(entries):
+    """
+    @return: a schedule as text, which is what its digest is of
+    """
+    return ''.join('%.6f %s\n' % entry for entry in entries)
+
+
+def loads(text):
+    """
+    @return: the schedule the text holds, a list of (offset, url)
+    """
+    entries = []
+    for line in text.splitlines():
+        if line:
+            offset, url = line.split(' ', 1)
+            entries.append((float(offset), url))
+    return entries
+
+
+def get_bee_digest(text):
+    """
+    @return: the digest of a bee's schedule, as text (see L{dumps})
+    """
+    return hashlib.sha256(text).hexdigest()
+
+
+def get_digest(texts):
+    """
+    @param texts: the swarm's schedules as text, in bee order
+    @return: the digest of the swarm's schedules
+    """
+    return hashlib.sha256('\n'.join(get_bee_digest(text) for text in texts)).hexdigest()
+
+
+def compile_entries(entries):
+    """
+    Compile a schedule for L{Player}: a scenario plan with a step for each
+    origin, whose path is the 'path' variable.
+
+    @return: (the plan, list of (offset, step index, path))
+    """
+    origins = {}
+    steps = []
+    compiled = []
+    for offset, url in entries:
+        parts = urlparse.urlsplit(url)
+        origin = '%s://%s' % (parts.scheme, parts.netloc)
+        if origin not in origins:
+            origins[origin] = len(steps)
+            steps.append({'name': origin, 'url': origin + '/${path}'})
+        path = parts.path.lstrip('/')
+        if parts.query:
+            path += '?' + parts.query
+        compiled.append((offset, origins[origin], path))
+    plan = compile_scenario({'flows': [{'name': 'schedule', 'steps': steps or [{'url': 'http://localhost/'}]}]})
+    return (plan, compiled)
+
+
+class Player(Runner):
+    """
+    Replays a schedule on a number of connections, each taking the next
+    entry once it is free, and sending it at its offset.  A schedule
+    without a rate has every entry due at once, so none is late.
+    """
+
+    def __init__(self, entries, connections, duration=None, keepalive=True, timeout=TIMEOUT):
+        plan, self.entries = compile_entries(entries)
+        Runner.__init__(self, plan, connections, duration, len(entries), keepalive, timeout)
+        self._next = 0
+        # user id -> when its entry is due
+        self._due = {}
+        self.paced = any(offset for offset, url in entries)
+        self.late = 0
+        self.max_lag = 0.0
+
+
+    def _schedule(self, at, user):
+        if not user.steps:
+            if self._next >= len(self.entries):
+                return
+            offset, step, path = self.entries[self._next]
+            self._next += 1
+            user.steps = [step]
+            user.variables = {'path': path}
+            user.cookies = {}
+            self._due[user.id] = self.start + offset
+            at = max(at, self.start + offset)
+        Runner._schedule(self, at, user)
+
+
+    def _next_step(self, user):
+        if self.paced:
+            lag = time.time() - self._due[user.id]
+            if lag > LATE:
+                self.late += 1
+            self.max_lag = max(self.max_lag, lag)
+        Runner._next_step(self, user)
+
+
+    def print_results(self, out):
+        Runner.print_results(self, out)
+        if self.paced:
+            print >> out, 'late_requests: %i' % self.late
+            print >> out, 'max_lag_ms: %f' % (self.max_lag * 1000.0)
+
+
+def main():
+    parser = OptionParser(usage='%prog -c CONNECTIONS [-t SECONDS] [-k] SCHEDULE_FILE')
+    parser.add_option('-c', dest='connections', type='int', default=1)
+    parser.add_option('-t', dest='duration', type='float', default=None)
+    parser.add_option('-k', dest='keepalive', action='store_true', default=False)
+    options, args = parser.parse_args()
+    if len(args) != 1:
+        parser.error('Please give the schedule file.')
+
+    with open(args[0], 'rb') as f:
+        text = f.read()
+    player = Player(loads(text), max(1, options.connections), options.duration, options.keepalive)
+    player.run()
+    player.print_results(sys.stdout)
+    print >> sys.stdout, '%s %s' % (SCHEDULE_MARKER, get_bee_digest(text))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,435 @@
+"""
+Long-running soak attacks, checkpointed as they go.
+
+A soak attack does not keep a whole run's output in memory on the bees or
+on the controller.  Each bee runs
+
+    PYTHONPATH=bees.zip python -m beeswithmachineguns.soak run soak/orders.json
+
+in the background, which fires in segments of a few minutes and writes
+each segment's compact result (the engine's parsed result, histogram,
+breakdown and exemplars) to a file of its own under soak/.  The
+controller pulls the new segments every so often with
+
+    PYTHONPATH=bees.zip python -m beeswithmachineguns.soak pull ACKED [LIMIT]
+
+which deletes the segments up to ACKED, the last one the controller has
+saved, and prints up to LIMIT newer ones and the run's state.  The
+controller merges them into a L{Checkpoint} on disk, so if it stops
+following the soak (or loses its connection) nothing is lost: the bees
+carry on, and 'bees reattach' picks up from the checkpoint.
+
+Memory stays flat on both sides: a bee only holds one segment's output,
+and the checkpoint holds merged histograms and a timeline which is made
+coarser as it grows.
+"""
+
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+
+from beeswithmachineguns.breakdown import Breakdown
+from beeswithmachineguns.exemplars import Exemplars
+from beeswithmachineguns.histogram import Histogram
+from beeswithmachineguns.tester import ENGINES, ConnectionModel, TesterResult
+
+
+# where a bee keeps its soak, relative to its home
+SOAK_DIR = 'soak'
+
+# seconds a bee fires for in each segment
+SEGMENT = 60
+
+# the most segments one pull returns
+PULL_LIMIT = 60
+
+# the most rows the checkpoint's timeline keeps before it is made coarser
+MAX_ROWS = 720
+
+# prefix of the line on which a pull reports the soak's state
+STATE_MARKER = 'bees-soak-state:'
+
+# a bee's soak is 'running', 'done', or 'gone' if it stopped without finishing
+(RUNNING, DONE, GONE) = ('running', 'done', 'gone')
+
+_SEGMENT_RE = re.compile(r'^segment-(\d+)\.json$')
+
+
+def get_run_command(orders):
+    """
+    @param orders: dict of the soak's 'engine', 'num_requests' (per
+        segment, for engines which cannot run for a time),
+        'concurrent_requests', 'keepalive', 'url', 'connection', 'duration'
+        and 'segment' seconds
+    @return: the command which starts the soak in the background on a bee,
+        stopping any soak it was already running
+    """
+    return ("(kill $(cat %(dir)s/pid) 2>/dev/null; true) && rm -rf %(dir)s && mkdir %(dir)s && echo '%(orders)s' > %(dir)s/orders.json && "
+            "(PYTHONPATH=bees.zip nohup python -m beeswithmachineguns.soak run %(dir)s/orders.json "
+            "> %(dir)s/log 2>&1 < /dev/null &)") % {
+                'dir': SOAK_DIR, 'orders': json.dumps(orders).replace("'", "'\\''")}
+
+
+def get_pull_command(acked, limit=PULL_LIMIT):
+    return 'PYTHONPATH=bees.zip python -m beeswithmachineguns.soak pull %i %i' % (acked, limit)
+
+
+def parse_pull(output):
+    """
+    @return: (segments, state) printed by a pull; state is None if the
+        output has none
+    """
+    segments = []
+    state = None
+    for line in output.splitlines():
+        if line.startswith('{'):
+            segments.append(json.loads(line))
+        elif line.startswith(STATE_MARKER):
+            state = line[len(STATE_MARKER):].strip()
+    return (segments, state)
+
+
+def parse_segment(tester, output, index, start, end):
+    """
+    Reduce one segment's engine output to its compact result.
+    """
+    result = tester.parse_output(output)
+    histogram = tester.parse_histogram(output)
+    requests = tester.parse_breakdown(output)
+    samples = tester.parse_exemplars(output)
+    steps = hasattr(tester, 'parse_steps') and tester.parse_steps(output) or None
+    return {
+        'index': index,
+        'start': start,
+        'end': end,
+        'result': result is not None and dict(result._asdict()) or None,
+        'histogram': histogram is not None and histogram.to_dict() or None,
+        'breakdown': requests is not None and requests.to_dict() or None,
+        'exemplars': samples is not None and samples.to_dict() or None,
+        'steps': steps is not None and steps.to_dict() or None,
+    }
+
+
+def _write_segment(directory, segment):
+    # written aside and renamed, so a pull never sees half a segment
+    path = os.path.join(directory, 'segment-%06i.json' % segment['index'])
+    with open(path + '.tmp', 'w') as f:
+        json.dump(segment, f, separators=(',', ':'))
+    os.rename(path + '.tmp', path)
+
+
+def run(orders, directory=SOAK_DIR):
+    """
+    Fire segment after segment until the soak's time is up, writing each
+    one's result as it finishes, then mark the soak done.
+    """
+    with open(os.path.join(directory, 'pid'), 'w') as f:
+        f.write(str(os.getpid()))
+
+    t = ENGINES[orders['engine']]()
+    connection = orders.get('connection') and ConnectionModel(*orders['connection'])
+    end = time.time() + orders['duration']
+    index = 0
+    while end - time.time() > 0.5:
+        seconds = max(1, int(round(min(orders['segment'], end - time.time()))))
+        cmd = t.get_command(orders['num_requests'], orders['concurrent_requests'], orders['keepalive'],
+                            orders['url'], '%iS' % seconds, connection)
+        start = time.time()
+        output = subprocess.Popen(cmd, shell=True, stdout=subprocess.PIPE,
+                                  stderr=subprocess.STDOUT).communicate()[0]
+        index += 1
+        _write_segment(directory, parse_segment(t, output, index, start, time.time()))
+        # an engine which gives up early (or cannot run) waits out its segment
+        time.sleep(max(0.0, start + seconds - time.time()))
+
+    open(os.path.join(directory, DONE), 'w').close()
+
+
+def _get_state(directory):
+    if os.path.exists(os.path.join(directory, DONE)):
+        return DONE
+    try:
+        with open(os.path.join(directory, 'pid')) as f:
+            os.kill(int(f.read()), 0)
+    except (IOError, OSError, ValueError):
+        return GONE
+    return RUNNING
+
+
+def pull(acked, limit, out, directory=SOAK_DIR):
+    """
+    Delete the segments the controller has saved, and print the next ones
+    and the soak's state.
+    """
+    # before listing, so a soak seen to be done has written every segment
+    state = _get_state(directory)
+    printed = 0
+    for name in sorted(os.listdir(directory)):
+        m = _SEGMENT_RE.match(name)
+        if m is None:
+            continue
+        if int(m.group(1)) <= acked:
+            os.remove(os.path.join(directory, name))
+        elif printed < limit:
+            with open(os.path.join(directory, name)) as f:
+                print >> out, f.read().strip()
+            printed += 1
+    if printed == limit:
+        # more to come
+        state = RUNNING
+    print >> out, '%s %s' % (STATE_MARKER, state)
+
+
+def _new_row(index):
+    return {'index': index, 'start': None, 'end': None, 'requests': 0, 'errors': 0, 'histogram': Histogram()}
+
+
+def coarsen(rows, most):
+    """
+    Merge neighbouring timeline rows until there are at most 'most'.  A
+    merged row's 99th percentile is the worse of the two.
+
+    @return: a new list of rows
+    """
+    while len(rows) > most:
+        merged = []
+        for a, b in zip(rows[0::2], rows[1::2]):
+            row = {
+                'start': a['start'],
+                'end': b['end'],
+                'requests': a['requests'] + b['requests'],
+                'errors': a['errors'] + b['errors'],
+                'p99': max(a['p99'], b['p99']),
+            }
+            row['rps'] = row['requests'] / max(row['end'] - row['start'], 0.001)
+            merged.append(row)
+        rows = merged + rows[len(merged) * 2:]
+    return rows
+
+
+class Checkpoint(object):
+    """
+    A soak's merged results so far, and how to reach its bees.
+
+    'bees' lists a dict per bee of what L{bees._connect} needs, its clock
+    'offset' (bee time = controller time + offset), the last segment
+    'acked' into the checkpoint and its soak's 'state'.  The merged
+    'histogram', 'breakdown', 'exemplars' and 'steps' cover every segment
+    so far, 'totals' sums their results and 'timeline' has a row per
+    segment (see L{coarsen}) with its 'start', 'end', 'requests',
+    'errors', 'rps' and 'p99'.
+    """
+
+    def __init__(self, bees, started, duration, segment, concurrency):
+        self.bees = bees
+        self.started = started
+        self.duration = duration
+        self.segment = segment
+        self.concurrency = concurrency
+        self.histogram = None
+        self.breakdown = None
+        self.exemplars = None
+        self.steps = None
+        self.totals = {}
+        self.first = self.last = None
+        # segments which failed to parse
+        self.failed_segments = 0
+        # segment index -> row, until every running bee has reported it
+        self.pending = {}
+        self.timeline = []
+
+
+    def add(self, i, segment):
+        """
+        Merge bee i's next segment, whose times are on the bee's clock.
+        """
+        bee = self.bees[i]
+        if segment['index'] <= bee['acked']:
+            # already merged before the controller went away
+            return
+        bee['acked'] = segment['index']
+        offset = bee['offset']
+        start, end = segment['start'] - offset, segment['end'] - offset
+        self.first = min(start, self.first or start)
+        self.last = max(end, self.last or end)
+
+        result = segment['result']
+        if result is None:
+            self.failed_segments += 1
+            return
+        result = TesterResult(**result)
+        requests = result.complete_requests
+        for key in ('complete_requests', 'failed_requests', 'non_2xx_responses', 'total_transferred'):
+            self.totals[key] = self.totals.get(key, 0.0) + getattr(result, key)
+        for key in result._fields:
+            if key.startswith('ms_') or key.startswith('pctile'):
+                # weighted by requests, for the mean
+                self.totals[key] = self.totals.get(key, 0.0) + getattr(result, key) * requests
+
+        histogram = segment['histogram'] and Histogram.from_dict(segment['histogram'])
+        if histogram:
+            self.histogram = (self.histogram or Histogram()).merge(histogram)
+        if segment['breakdown']:
+            self.breakdown = (self.breakdown or Breakdown()).merge(Breakdown.from_dict(segment['breakdown']))
+        if segment['steps']:
+            steps = Breakdown.from_dict(segment['steps'])
+            self.steps = (self.steps or Breakdown(steps.capacity)).merge(steps)
+        if segment['exemplars']:
+            samples = Exemplars.from_dict(segment['exemplars'])
+            for e in samples.entries():
+                # on the controller's clock
+                e['start'] -= offset
+                e['bee'] = bee['instance_id']
+            self.exemplars = (self.exemplars or Exemplars(samples.k, samples.failures_k)).merge(samples)
+
+        row = self.pending.setdefault(segment['index'], _new_row(segment['index']))
+        row['start'] = min(start, row['start'] or start)
+        row['end'] = max(end, row['end'] or end)
+        row['requests'] += requests
+        row['errors'] += min(requests, result.failed_requests + result.non_2xx_responses)
+        if histogram:
+            row['histogram'].merge(histogram)
+        elif requests:
+            row['histogram'].record(result.pctile_99, int(requests))
+
+
+    def set_state(self, i, state):
+        self.bees[i]['state'] = state
+
+
+    @property
+    def finished(self):
+        return all(bee['state'] != RUNNING for bee in self.bees)
+
+
+    def settle(self):
+        """
+        Move the segments every running bee has reported into the timeline.
+        """
+        running = [bee['acked'] for bee in self.bees if bee['state'] == RUNNING]
+        settled = min(running or [max(self.pending or [0])])
+        for index in sorted(i for i in self.pending if i <= settled):
+            row = self.pending.pop(index)
+            histogram = row.pop('histogram')
+            row.pop('index')
+            row['p99'] = histogram.quantile(0.99)
+            row['rps'] = row['requests'] / max(row['end'] - row['start'], 0.001)
+            self.timeline.append(row)
+        self.timeline = coarsen(self.timeline, MAX_ROWS)
+
+
+    def summary(self):
+        """
+        @return: the soak's summary, like L{bees._aggregate_reports}'s, with
+            its timeline in 'segments'
+        """
+        totals = self.totals
+        result = None
+        requests = totals.get('complete_requests')
+        if requests:
+            ar = {'concurrency': self.concurrency, 'time_taken': self.last - self.first}
+            for key in TesterResult._fields:
+                if key.startswith('ms_') or key.startswith('pctile'):
+                    ar[key] = totals[key] / requests
+                elif key in totals:
+                    ar[key] = totals[key]
+            ar['requests_per_second'] = requests / max(ar['time_taken'], 0.001)
+            if self.histogram is not None and self.histogram.count:
+                for pctile in (50, 75, 90, 95, 99):
+                    ar['pctile_%s' % pctile] = self.histogram.quantile(pctile / 100.0)
+            result = TesterResult(**ar)
+        return {
+            'bees': len(self.bees),
+            'failed': len([bee for bee in self.bees if bee['state'] == GONE]),
+            'result': result,
+            'histogram': self.histogram,
+            'breakdown': self.breakdown,
+            'exemplars': self.exemplars,
+            'steps': self.steps,
+            'windows': None,
+            'warmup': None,
+            'segments': self.timeline,
+        }
+
+
+    def to_dict(self):
+        return {
+            'bees': self.bees,
+            'started': self.started,
+            'duration': self.duration,
+            'segment': self.segment,
+            'concurrency': self.concurrency,
+            'histogram': self.histogram is not None and self.histogram.to_dict() or None,
+            'breakdown': self.breakdown is not None and self.breakdown.to_dict() or None,
+            'exemplars': self.exemplars is not None and self.exemplars.to_dict() or None,
+            'steps': self.steps is not None and self.steps.to_dict() or None,
+            'totals': self.totals,
+            'first': self.first,
+            'last': self.last,
+            'failed_segments': self.failed_segments,
+            'pending': [dict(row, histogram=row['histogram'].to_dict()) for row in self.pending.values()],
+            'timeline': self.timeline,
+        }
+
+
+    @classmethod
+    def from_dict(cls, d):
+        c = cls(d['bees'], d['started'], d['duration'], d['segment'], d['concurrency'])
+        c.histogram = d['histogram'] and Histogram.from_dict(d['histogram'])
+        c.breakdown = d['breakdown'] and Breakdown.from_dict(d['breakdown'])
+        c.exemplars = d['exemplars'] and Exemplars.from_dict(d['exemplars'])
+        c.steps = d['steps'] and Breakdown.from_dict(d['steps'])
+        c.totals = d['totals']
+        c.first, c.last = d['first'], d['last']
+        c.failed_segments = d['failed_segments']
+        c.pending = dict((row['index'], dict(row, histogram=Histogram.from_dict(row['histogram'])))
+                         for row in d['pending'])
+        c.timeline = d['timeline']
+        return c
+
+
+    def save(self, filename):
+        # written aside and renamed, so a crash never leaves half a checkpoint
+        with open(filename + '.tmp', 'w') as f:
+            json.dump(self.to_dict(), f)
+        os.rename(filename + '.tmp', filename)
+
+
+    @classmethod
+    def load(cls, filename):
+        with open(filename) as f:
+            return cls.from_dict(json.load(f))
+
+
+def print_segments(segments, out, most=12):
+    """
+    Print the soak's timeline, made coarser to at most 'most' rows.
+
+    @param out: file-like, open for writing, into which output will be printed.
+    """
+    if not segments:
+        return
+    print >> out, 'Soak timeline:'
+    first = segments[0]['start']
+    for row in coarsen(segments, most):
+        print >> out, '  +%ih%02im\t%.2f [#/sec], 99%% %i [ms], %i errors' % (
+            divmod(int(row['start'] - first) // 60, 60) + (row['rps'], row['p99'], row['errors']))
+
+
+def main():
+    if sys.argv[1:2] == ['run']:
+        with open(sys.argv[2]) as f:
+            run(json.load(f), os.path.dirname(sys.argv[2]) or '.')
+    elif sys.argv[1:2] == ['pull']:
+        limit = len(sys.argv) > 3 and int(sys.argv[3]) or PULL_LIMIT
+        pull(int(sys.argv[2]), limit, sys.stdout)
+    else:
+        print >> sys.stderr, 'usage: python -m beeswithmachineguns.soak (run ORDERS_FILE | pull ACKED [LIMIT])'
+        sys.exit(2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,255 @@
+"""
+Request templates.
+
+An attack with --template sends the requests a JSON template describes
+to the url given with -u, instead of plain GETs:
+
+    {"method": "POST",
+     "headers": {"Content-Type": "application/json", "X-Order": "${order}"},
+     "body": "{\"customer\": \"${customer}\", \"amount\": ${amount}}",
+     "data": "orders.csv",
+     "order": "sequential"}
+
+${name} is replaced by a variable, as in scenarios (see L{scenario}):
+the columns of the data file (a CSV file, with the column names in its
+first row, and a path relative to the template's), drawn a row per
+request in 'sequential' (from a random row on each bee) or 'random'
+order, and 'user' and 'session'.  The body may be given as a file
+instead, with "body_file".
+
+The controller compiles the template, data and all, into a scenario
+plan of one step (see L{load}), which the scenario engine runs.  On the
+bee each step's request is compiled once into a L{Renderer}, so that
+rendering a request only fills in the variables' slots and joins them
+once.  ab, siege and h2load can send a template's method, headers and
+body too, but always the same request (see L{get_request}).
+"""
+
+import csv
+import json
+import os
+import re
+from collections import namedtuple
+
+
+VARIABLE_RE = re.compile(r'\$\{([A-Za-z_][A-Za-z0-9_]*)\}')
+
+# how the rows of a data file are drawn
+ORDERS = ('sequential', 'random')
+
+# the most rows of a data file shipped to the bees
+MAX_ROWS = 100000
+
+# where a static request's body is staged on the bees
+BODY_FILE = 'request.body'
+
+# slots the renderer fills in itself, which templates cannot name
+LENGTH = '#length'
+COOKIE = '#cookie'
+
+
+class Request(namedtuple('Request', ['method', 'headers', 'body'])):
+    """
+    A static request for the engines which send the same one every time:
+    its method, a list of (name, value) headers and its body (None for
+    none), which is staged on the bees as L{BODY_FILE}.
+    """
+
+
+def compile_text(s):
+    """
+    @return: a list whose even items are literal text and odd items
+        variable names
+    """
+    return VARIABLE_RE.split(s)
+
+
+def render(template, variables):
+    """
+    Render a compiled text (see L{compile_text}).
+    """
+    parts = list(template)
+    parts[1::2] = [str(variables.get(name, '')) for name in template[1::2]]
+    return ''.join(parts)
+
+
+def read_data(filename, limit=MAX_ROWS):
+    """
+    Read a data file: CSV, with the column names in its first row.
+
+    @return: (the column names, the rows, as lists of strings)
+    @raise ValueError: if it has no columns or rows, or rows of the wrong
+        length
+    """
+    with open(filename, 'rb') as f:
+        reader = csv.reader(f)
+        columns = next(reader, None)
+        if not columns:
+            raise ValueError('%s has no column names' % filename)
+        for name in columns:
+            if not VARIABLE_RE.match('${%s}' % name):
+                raise ValueError('%s has a column which cannot be a variable: %r' % (filename, name))
+        rows = []
+        for line, row in enumerate(reader):
+            if not row:
+                continue
+            if len(row) != len(columns):
+                raise ValueError('line %i of %s has %i fields, not %i' % (line + 2, filename, len(row), len(columns)))
+            rows.append(row)
+            if len(rows) >= limit:
+                break
+    if not rows:
+        raise ValueError('%s has no rows' % filename)
+    return (columns, rows)
+
+
+def compile_data(spec, base=None):
+    """
+    Read the data file a template or scenario names.
+
+    @param base: the directory the file's path is relative to
+    @return: dict of the 'columns', 'rows' and 'order' of the data, or
+        None if there is none
+    @raise ValueError: if the data cannot be read
+    """
+    filename = spec.get('data')
+    if not filename:
+        return None
+    order = spec.get('order') or 'sequential'
+    if order not in ORDERS:
+        raise ValueError('data is drawn in %s order, not %s' % (' or '.join(ORDERS), order))
+    try:
+        columns, rows = read_data(os.path.join(base or '', filename))
+    except (IOError, csv.Error), e:
+        raise ValueError('cannot read the data %s: %s' % (filename, e))
+    return {'columns': columns, 'rows': rows, 'order': order}
+
+
+def load(filename, url):
+    """
+    Read a template and compile it, for the url, into a scenario plan of
+    one step (see L{scenario.compile_scenario}).
+
+    @raise ValueError: if it is not a valid template
+    """
+    from beeswithmachineguns.scenario import compile_scenario
+
+    with open(filename) as f:
+        spec = json.load(f)
+    if not isinstance(spec, dict):
+        raise ValueError('a template is a JSON object')
+    base = os.path.dirname(filename)
+    step = {'name': 'template', 'url': url}
+    for key in ('method', 'headers', 'body'):
+        if spec.get(key) is not None:
+            step[key] = spec[key]
+    if spec.get('body_file'):
+        with open(os.path.join(base, spec['body_file']), 'rb') as f:
+            step['body'] = f.read()
+    return compile_scenario({'flows': [{'name': 'template', 'steps': [step]}],
+                             'data': spec.get('data'), 'order': spec.get('order')}, base)
+
+
+def get_request(plan, row=0):
+    """
+    Render the first step of a plan into a static request, with the
+    variables of a row of its data.
+
+    @return: L{Request}
+    """
+    from beeswithmachineguns.scenario import _METHOD, _HEADERS, _BODY
+
+    step = plan['steps'][0]
+    variables = {'user': '0', 'session': '1'}
+    data = plan.get('data')
+    if data:
+        variables.update(zip(data['columns'], data['rows'][row % len(data['rows'])]))
+    return Request(step[_METHOD],
+                   [(header, render(value, variables)) for header, value in step[_HEADERS]],
+                   (step[_BODY] is not None and render(step[_BODY], variables)) or None)
+
+
+def has_variables(plan):
+    """
+    @return: whether the plan's first step varies from request to request
+    """
+    from beeswithmachineguns.scenario import _PATH, _HEADERS, _BODY
+
+    step = plan['steps'][0]
+    texts = [step[_PATH]] + [value for header, value in step[_HEADERS]] + [step[_BODY] or ['']]
+    return any(len(text) > 1 for text in texts)
+
+
+class Renderer(object):
+    """
+    A request compiled once, to be rendered many times.
+
+    The request is a list of parts: runs of literal text, merged, and
+    slots for the variables, the Content-Length (worked out from the
+    lengths of the body's parts) and any cookies.  Rendering fills the
+    slots of that one list and joins it, a single copy, however many
+    variables there are.
+    """
+
+    def __init__(self, method, path, host, headers, body=None, keepalive=True):
+        """
+        @param path, body: compiled texts (see L{compile_text}), the body
+            None for none
+        @param headers: list of (name, compiled text) pairs
+        """
+        texts = [[method + ' '], path, [' HTTP/1.1\r\nHost: %s\r\n' % host]]
+        for name, value in headers:
+            texts.extend([[name + ': '], value, ['\r\n']])
+        texts.append(['', COOKIE, ''])
+        if body is not None:
+            texts.append(['Content-Length: ', LENGTH, '\r\n'])
+        if not keepalive:
+            texts.append(['Connection: close\r\n'])
+        texts.append(['\r\n'])
+        body_start = len(texts)
+        if body is not None:
+            texts.append(body)
+
+        self.parts = ['']
+        # (part index, variable name)
+        self.slots = []
+        self.body_slots = []
+        self.body_literal = 0
+        for k, text in enumerate(texts):
+            for j, part in enumerate(text):
+                if isinstance(part, unicode):
+                    part = part.encode('utf-8')
+                if j % 2:
+                    self.parts.append(None)
+                    self.slots.append((len(self.parts) - 1, part))
+                    if k >= body_start:
+                        self.body_slots.append(len(self.parts) - 1)
+                    self.parts.append('')
+                else:
+                    self.parts[-1] += part
+                    if k >= body_start:
+                        self.body_literal += len(part)
+        special = dict((name, index) for index, name in self.slots)
+        self.length_slot = special.get(LENGTH)
+        self.cookie_slot = special[COOKIE]
+        self.slots = [(index, name) for index, name in self.slots if name not in (LENGTH, COOKIE)]
+
+
+    def render(self, variables, cookies=None):
+        """
+        @param variables: dict of the variables, whose values are strings
+        @param cookies: dict of the cookies to send, if any
+        @return: the request
+        """
+        parts = self.parts
+        get = variables.get
+        for index, name in self.slots:
+            parts[index] = get(name, '')
+        parts[self.cookie_slot] = (cookies and 'Cookie: %s\r\n' % '; '.join(
+            '%s=%s' % c for c in sorted(cookies.items()))) or ''
+        if self.length_slot is not None:
+            length = self.body_literal
+            for index in self.body_slots:
+                length += len(parts[index])
+            parts[self.length_slot] = str(length)
+        return ''.join(parts)
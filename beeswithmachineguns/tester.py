@@ -2,9 +2,55 @@
 """
 
 from collections import namedtuple
+import json
 import logging
+import pipes
 import re
 
+from breakdown import BREAKDOWN_MARKER, Breakdown
+from exemplars import EXEMPLARS_MARKER, Exemplars
+from histogram import Histogram
+from template import BODY_FILE
+
+
+# prefix of the line on which bee-side helpers (siege_calc, wideload_calc)
+# print the run's latency histogram
+HISTOGRAM_MARKER = 'bees-histogram:'
+
+# prefix of the line on which the scenario runner prints its latencies by
+# step
+STEPS_MARKER = 'bees-steps:'
+
+# prefix of the line on which the hold engine prints its timeline
+HOLD_MARKER = 'bees-hold:'
+
+# prefix of the line on which the schedule player prints the digest of
+# the schedule it replayed
+SCHEDULE_MARKER = 'bees-schedule:'
+
+
+def _get_header_options(headers):
+    """
+    @return: the -H options which send the (name, value) headers, for
+        the engines which take them so
+    """
+    return ['-H %s' % pipes.quote('%s: %s' % header) for header in headers]
+
+
+class ConnectionModel(namedtuple('ConnectionModel', ['keepalive', 'pool_size', 'h2_streams', 'ramp_rate',
+                                                     'trickle'])):
+    """
+    How a tester should manage its connections.
+
+    keepalive: reuse HTTP/1.1 connections
+    pool_size: number of connections per bee (default: one per concurrent request)
+    h2_streams: speak HTTP/2 with up to this many concurrent streams per connection
+    ramp_rate: connections to open per second on each bee (default: the tool's own)
+    trickle: send a request's head one header line every this many seconds, never finishing it
+    """
+
+    def __new__(cls, keepalive=False, pool_size=None, h2_streams=None, ramp_rate=None, trickle=None):
+        return super(ConnectionModel, cls).__new__(cls, keepalive, pool_size, h2_streams, ramp_rate, trickle)
 
 
 class Tester(object):
@@ -12,7 +58,28 @@ class Tester(object):
     Abstract base class for tester implementations.
     """
 
-    def get_command(self, num_requests, concurrent_requests, is_keepalive, url):
+    # the L{ConnectionModel} settings this tester can apply
+    connection_options = ('keepalive',)
+
+    # whether this tester can send a static L{template.Request}, whose
+    # body is staged on the bee as L{template.BODY_FILE}
+    supports_request = False
+
+
+    def get_unsupported(self, connection):
+        """
+        @param connection: L{ConnectionModel}, or None
+        @return: names of the connection settings which were asked for but
+            which this tester cannot apply
+        """
+        if connection is None:
+            return []
+        # keepalive is a plain flag, for the others None means the default
+        asked = [k for k, v in connection._asdict().items()
+                 if (v if k == 'keepalive' else v is not None)]
+        return [k for k in asked if k not in self.connection_options]
+
+    def get_command(self, num_requests, concurrent_requests, is_keepalive, url, time=None, connection=None, request=None):
         """
         Generate a command line to run a test using this tester.
 
@@ -24,6 +91,13 @@ class Tester(object):
         @type is_keepalive: boolean
         @param url: the url to issue requests to
         @type url: str
+        @param time: how long to run for (e.g. 60S, 1M, 5H), where supported
+        @type time: str
+        @param connection: further connection settings, where supported
+        @type connection: L{ConnectionModel}
+        @param request: the method, headers and body to send instead of a
+            plain GET, where supported (see L{supports_request})
+        @type request: L{template.Request}
         @return: the assembled command line
         @rtype: str
         """
@@ -45,6 +119,41 @@ class Tester(object):
         raise NotImplementedError
 
 
+    def parse_histogram(self, output):
+        """
+        Extract the latency histogram printed by the bee-side helpers.
+
+        @param output: the captured output from the tester command
+        @return: L{Histogram}, or None if the output has none
+        """
+        s = re.search(re.escape(HISTOGRAM_MARKER) + r'\s*(\{.*\})', output)
+        return (s is not None and Histogram.from_json(s.group(1))) or None
+
+
+    def parse_breakdown(self, output):
+        """
+        Extract the per-url and per-status breakdown printed by the bee-side
+        helpers.
+
+        @param output: the captured output from the tester command
+        @return: L{Breakdown}, or None if the output has none
+        """
+        s = re.search(re.escape(BREAKDOWN_MARKER) + r'\s*(\{.*\})', output)
+        return (s is not None and Breakdown.from_json(s.group(1))) or None
+
+
+    def parse_exemplars(self, output):
+        """
+        Extract the slowest and failed requests printed by the bee-side
+        helpers.
+
+        @param output: the captured output from the tester command
+        @return: L{Exemplars}, or None if the output has none
+        """
+        s = re.search(re.escape(EXEMPLARS_MARKER) + r'\s*(\{.*\})', output)
+        return (s is not None and Exemplars.from_json(s.group(1))) or None
+
+
     def _parse_measure(self, expression, content, default=''):
         """
         Regular expression scraping helper
@@ -71,6 +180,8 @@ _result_keys = [
   , 'pctile_90'
   , 'pctile_95'
   , 'pctile_99'
+  , 'ms_connect'
+  , 'ms_ttfb'
 ]
 
 class TesterResult(namedtuple('TesterResult', _result_keys)):
@@ -78,6 +189,9 @@ class TesterResult(namedtuple('TesterResult', _result_keys)):
     Test result container, which works for both individual and aggregated
     results.  The individual fields map directly to ab results.  All values
     are stored as floats.
+
+    ms_connect (connection set-up, including any TLS handshake) and ms_ttfb
+    (time to first byte) default to 0.0 for testers which do not report them.
     """
 
     def print_text(self, out):
@@ -92,24 +206,51 @@ class TesterResult(namedtuple('TesterResult', _result_keys)):
         print >> out, 'Failed requests:\t%i' % self.failed_requests
         print >> out, 'Non-2xx responses:\t%i' % self.non_2xx_responses
         print >> out, 'Total Transferred:\t%i bytes' % self.total_transferred
-        print >> out, 'Requests per second:\t%.2f [#/sec] (mean)' % self.requests_per_second
+        if self.requests_per_second is None:
+            print >> out, 'Requests per second:\t- (unavailable)'
+        else:
+            print >> out, 'Requests per second:\t%.2f [#/sec] (mean)' % self.requests_per_second
         print >> out, 'Time per request:\t%.3f [ms] (mean)' % self.ms_per_request
         print >> out, '50%% response time:\t%i [ms] (mean)' % self.pctile_50
         print >> out, '75%% response time:\t%i [ms] (mean)' % self.pctile_75
         print >> out, '90%% response time:\t%i [ms] (mean)' % self.pctile_90
         print >> out, '95%% response time:\t%i [ms] (mean)' % self.pctile_95
         print >> out, '99%% response time:\t%i [ms] (mean)' % self.pctile_99
+        print >> out, 'Connect time:\t\t%.3f [ms] (mean)' % self.ms_connect
+        print >> out, 'Time to first byte:\t%.3f [ms] (mean)' % self.ms_ttfb
 
+TesterResult.__new__.__defaults__ = (0.0, 0.0)
 
-def get_aggregate_result(results):
+
+def get_aggregate_result(results, windows=None, histogram=None):
     """
     Given a sequence of TestResults, generate a single aggregate TestResult.
+
+    @param histogram: optional L{Histogram} merged from every result's bee.
+        When given the percentiles are read from it instead of being
+        averaged across bees.
+
+    @param windows: optional (start, end) epoch seconds, on a common clock,
+        during which each result's bee was firing (same order as results).
+        When given, time_taken covers the whole swarm's firing period and
+        requests_per_second is measured over the shared window in which
+        all bees were firing, assuming each bee's rate was uniform over
+        its own window (None if the windows take no time at all).
     """
 
+    if histogram is not None and histogram.count:
+        ar = get_aggregate_result(results, windows)._asdict()
+        for pctile in (50, 75, 90, 95, 99):
+            ar['pctile_%s' % pctile] = histogram.quantile(pctile / 100.0)
+        return TesterResult(**ar)
+
+    if windows:
+        return _get_windowed_aggregate_result(results, windows)
+
     ar = {}
 
     for k in _result_keys:
-        if k=='ms_per_request' or k.startswith('pctile'):
+        if k.startswith('ms_') or k.startswith('pctile'):
             # weighted mean.
             ar[k] = sum([(getattr(r,k) * r.complete_requests) for r in results]) /  sum([r.complete_requests for r in results])
             continue
@@ -125,24 +266,74 @@ def get_aggregate_result(results):
     return TesterResult(**ar)
 
 
+def _get_windowed_aggregate_result(results, windows):
+    """
+    Aggregate results whose bees fired during known windows.
+    """
+    ar = get_aggregate_result(results)._asdict()
+
+    ar['time_taken'] = max(w[1] for w in windows) - min(w[0] for w in windows)
+
+    start = max(w[0] for w in windows)
+    end = min(w[1] for w in windows)
+    if end > start:
+        # requests each bee issued inside the shared window
+        in_window = sum([r.complete_requests * (end - start) / (w[1] - w[0])
+                         for r, w in zip(results, windows)])
+        ar['requests_per_second'] = in_window / (end - start)
+    elif ar['time_taken'] > 0:
+        logging.warning('bees never fired all at once, using the whole attack for requests per second')
+        ar['requests_per_second'] = ar['complete_requests'] / ar['time_taken']
+    else:
+        logging.warning('bees fired for no measurable time, the requests per second are unavailable')
+        ar['requests_per_second'] = None
+
+    return TesterResult(**ar)
+
+
+# requests ab may make in a timed run
+AB_MAX_REQUESTS = 100000000
+
+
 class ABTester(Tester):
     """
     Tester implementation for ab (apache benchmarking tool).
     """
 
+    supports_request = True
+
 
-    def get_command(self, num_requests, concurrent_requests, is_keepalive, url):
+    def get_command(self, num_requests, concurrent_requests, is_keepalive, url, time=None, connection=None, request=None):
         """
         """
         cmd = []
         cmd.append('ab')
         cmd.append('-r')
-        cmd.append('-n %s' % num_requests)
+        if time:
+            # -t resets -n, which then only caps the requests
+            cmd.append('-t %s' % get_seconds(time))
+            cmd.append('-n %s' % AB_MAX_REQUESTS)
+        else:
+            cmd.append('-n %s' % num_requests)
         cmd.append('-c %s' % concurrent_requests)
 
         if is_keepalive:
             cmd.append('-k')
 
+        if request:
+            # ab sends a body with -p (POSTing) or -u (PUTting), and its
+            # content type with -T
+            headers = [h for h in request.headers if h[0].lower() != 'content-type']
+            implied = 'GET'
+            if request.body is not None:
+                implied = (request.method == 'PUT' and 'PUT') or 'POST'
+                cmd.append('%s %s' % ((implied == 'PUT' and '-u') or '-p', BODY_FILE))
+                content_type = [v for h, v in request.headers if h.lower() == 'content-type']
+                cmd.append('-T %s' % pipes.quote((content_type and content_type[0]) or 'text/plain'))
+            if request.method != implied:
+                cmd.append('-m %s' % request.method)
+            cmd.extend(_get_header_options(headers))
+
         cmd.append('"%s"' % url)
 
         cmd_line = ' '.join(cmd)
@@ -188,22 +379,56 @@ class ABTester(Tester):
         trd['total_transferred'] = \
             float(m('Total\ transferred:\s+([0-9]+)', output))
 
+        # mean column of the "Connection Times (ms)" table
+        trd['ms_connect'] = \
+            float(m('Connect:\s+[0-9]+\s+([0-9]+)', output, 0))
+
+        trd['ms_ttfb'] = \
+            float(m('Waiting:\s+[0-9]+\s+([0-9]+)', output, 0))
+
         return TesterResult(**trd)
 
 
+    def parse_histogram(self, output):
+        """
+        Approximate a histogram from ab's percentile table.
+        """
+        m = self._parse_measure
+
+        count = int(m('Complete\ requests:\s+([0-9]+)', output, 0))
+        pctiles = {}
+        for pctile in (50, 66, 75, 80, 90, 95, 98, 99, 100):
+            ms = m('\s+%s\%%\s+([0-9]+)' % pctile, output)
+            if ms:
+                pctiles[pctile] = float(ms)
+
+        if not count or not pctiles:
+            return None
+        return Histogram.from_percentiles(pctiles, count)
+
+
 class SiegeTester(Tester):
     """
     """
 
+    rc_file = '.bees-siegerc'
+
+    supports_request = True
 
-    def get_command(self, num_requests, concurrent_requests, is_keepalive, url, time):
+
+    def get_command(self, num_requests, concurrent_requests, is_keepalive, url, time=None, connection=None, request=None):
         """
-        is_keepalive is currently ignored here, you instead have to specify
-        it in 'bees up'.
+        With is_keepalive, siege is run with its own rc file asking for
+        keep-alive connections (this used to only be possible with
+        'bees up --keepalive', which writes ~/.siegerc).
         """
 
         cmd = []
+        if is_keepalive:
+            cmd.append("printf 'connection = keep-alive\\n' > %s &&" % self.rc_file)
         cmd.append('siege')
+        if is_keepalive:
+            cmd.append('-R %s' % self.rc_file)
         cmd.append('-v')
         cmd.append('-i')
         cmd.append('-b')
@@ -215,6 +440,13 @@ class SiegeTester(Tester):
             # which is different from how ab works, so we divide them pre-emptively
             cmd.append('-r %s' % max(1, (num_requests / concurrent_requests)))
 
+        if request:
+            cmd.extend(_get_header_options(request.headers))
+            if url and request.body is not None:
+                url = '%s %s <%s' % (url, request.method, BODY_FILE)
+            elif url and request.method != 'GET':
+                url = '%s %s' % (url, request.method)
+
         if url:
             cmd.append('"%s"' % url)
         else:
@@ -258,9 +490,9 @@ class SiegeTester(Tester):
         trd['failed_requests'] = \
             float(m('Failed\ transactions:\s+([0-9]+)', output))
 
-        # note - may not be present - default to 0
-        # this isnt implemented yet either
-        trd['non_2xx_responses'] = 0.0
+        # counted by siege_calc, when it could
+        breakdown = self.parse_breakdown(output)
+        trd['non_2xx_responses'] = float((breakdown and breakdown.non_2xx()) or 0)
 
         xferred_mb = m('Data\ transferred:\s+([0-9.]+) MB', output)
         trd['total_transferred'] = \
@@ -274,7 +506,7 @@ class WideloadTester(Tester):
     Tester implementation for wideload.
     """
 
-    def get_command(self, num_requests, concurrent_requests, is_keepalive, url):
+    def get_command(self, num_requests, concurrent_requests, is_keepalive, url, time=None, connection=None, request=None):
         """
         """
         cmd = []
@@ -307,6 +539,295 @@ class WideloadTester(Tester):
         return TesterResult(**trd)
 
 
+class H2LoadTester(Tester):
+    """
+    Tester implementation for h2load (from nghttp2), which can speak
+    HTTP/2 with several streams per connection as well as HTTP/1.1, and
+    reports connection set-up and time to first byte separately.
+
+    The bee-side reqlog module turns h2load's per-request log into the
+    latency histogram and percentiles.
+    """
+
+    connection_options = ('keepalive', 'pool_size', 'h2_streams')
+
+    log_file = 'h2load.log'
+
+    supports_request = True
+
+
+    def get_command(self, num_requests, concurrent_requests, is_keepalive, url, time=None, connection=None, request=None):
+        """
+        Without h2_streams h2load is run in HTTP/1.1 mode.  pool_size sets
+        the number of connections (h2load clients), which otherwise is the
+        concurrency.
+        """
+        connection = connection or ConnectionModel(keepalive=is_keepalive)
+        clients = connection.pool_size or concurrent_requests
+
+        cmd = []
+        cmd.append('h2load')
+        cmd.append('-c %s' % clients)
+        if connection.h2_streams:
+            cmd.append('-m %s' % connection.h2_streams)
+        else:
+            cmd.append('--h1')
+            if not is_keepalive:
+                cmd.append("-H 'Connection: close'")
+        if time:
+            cmd.append('-D %s' % get_seconds(time))
+        else:
+            cmd.append('-n %s' % max(num_requests, clients))
+        cmd.append('--log-file=%s' % self.log_file)
+
+        if request:
+            # h2load POSTs a body given with -d, and takes other methods
+            # as the :method pseudo-header
+            if request.body is not None:
+                cmd.append('-d %s' % BODY_FILE)
+            if request.method != ((request.body is not None and 'POST') or 'GET'):
+                cmd.append("-H ':method: %s'" % request.method)
+            cmd.extend(_get_header_options(request.headers))
+
+        if url:
+            cmd.append('"%s"' % url)
+        else:
+            cmd.append('-i urls.txt')
+
+        cmd_line = ' '.join(cmd) + ' && PYTHONPATH=bees.zip python -m beeswithmachineguns.reqlog %s' % self.log_file
+        return cmd_line
+
+
+    def _parse_ms(self, expression, content):
+        """
+        Scrape a duration such as 725us, 1.12ms or 3.2s, in ms.
+        """
+        s = re.search(expression + r'([0-9.]+)(us|ms|s)\b', content)
+        if s is None:
+            return 0.0
+        return float(s.group(1)) * {'us': 0.001, 'ms': 1.0, 's': 1000.0}[s.group(2)]
+
+
+    def parse_output(self, output):
+        """
+        """
+        trd = {}
+        m = self._parse_measure
+
+        if not re.search(r'finished\ in\ ', output):
+            return None
+
+        trd['time_taken'] = self._parse_ms(r'finished\ in\ ', output) / 1000.0
+
+        trd['requests_per_second'] = \
+            float(m('finished\ in\ [^,]+,\ ([0-9.]+)\ req/s', output, 0))
+
+        trd['concurrency'] = \
+            float(m('([0-9]+)\ total\ client', output, 0))
+
+        trd['complete_requests'] = \
+            float(m('requests:.*\ ([0-9]+)\ done', output, 0))
+
+        trd['failed_requests'] = \
+            float(m('([0-9]+)\ failed', output, 0)) + \
+            float(m('([0-9]+)\ errored', output, 0)) + \
+            float(m('([0-9]+)\ timeout', output, 0))
+
+        trd['non_2xx_responses'] = \
+            float(m('([0-9]+)\ 3xx', output, 0)) + \
+            float(m('([0-9]+)\ 4xx', output, 0)) + \
+            float(m('([0-9]+)\ 5xx', output, 0))
+
+        trd['total_transferred'] = \
+            float(m('traffic:\ [^(]+\(([0-9]+)\)\ total', output, 0))
+
+        # mean column of the timing table
+        trd['ms_per_request'] = self._parse_ms(r'time\ for\ request:\s+\S+\s+\S+\s+', output)
+        trd['ms_connect'] = self._parse_ms(r'time\ for\ connect:\s+\S+\s+\S+\s+', output)
+        trd['ms_ttfb'] = self._parse_ms(r'time\ to\ 1st\ byte:\s+\S+\s+\S+\s+', output)
+
+        # printed by reqlog
+        for pctile in (50, 75, 90, 95, 99):
+            trd['pctile_%s' % pctile] = \
+                float(m('\s+%s\%%\s+([0-9]+)' % pctile, output, 0))
+
+        return TesterResult(**trd)
+
+
+class ScenarioTester(Tester):
+    """
+    Tester implementation for multi-step scenarios, run by the bee-side
+    scenario module from a plan staged on the bee (see scenario).  The
+    concurrency is the number of virtual users, and the requests are
+    counted across every step.
+    """
+
+    plan_file = 'scenario.json'
+
+
+    def get_command(self, num_requests, concurrent_requests, is_keepalive, url, time=None, connection=None, request=None):
+        """
+        The url is not used, the plan's steps have their own.
+        """
+        cmd = []
+        cmd.append('PYTHONPATH=bees.zip python -m beeswithmachineguns.scenario')
+        cmd.append('-c %s' % concurrent_requests)
+        if time:
+            cmd.append('-t %s' % get_seconds(time))
+        else:
+            cmd.append('-n %s' % num_requests)
+        if is_keepalive:
+            cmd.append('-k')
+        cmd.append(self.plan_file)
+
+        cmd_line = ' '.join(cmd)
+        return cmd_line
+
+
+    def parse_output(self, output):
+        """
+        """
+        trd = {}
+        m = self._parse_measure
+
+        if not re.search(r'complete_requests:', output):
+            return None
+
+        for key in _result_keys:
+            pattern = '%s:\s+([0-9\.]+)' % key
+            trd[key] = float(m(pattern, output, 0))
+
+        return TesterResult(**trd)
+
+
+    def parse_steps(self, output):
+        """
+        Extract the latencies by step printed by the scenario runner.
+
+        @param output: the captured output from the tester command
+        @return: L{Breakdown} keyed by 'flow/step', or None if the output
+            has none
+        """
+        s = re.search(re.escape(STEPS_MARKER) + r'\s*(\{.*\})', output)
+        return (s is not None and Breakdown.from_json(s.group(1))) or None
+
+
+class ScheduleTester(ScenarioTester):
+    """
+    Tester implementation for seeded schedules, replayed by the bee-side
+    schedule module from the bee's schedule staged on it (see schedule).
+    The concurrency is the number of connections, and the requests are
+    the schedule's.
+    """
+
+    schedule_file = 'schedule.txt'
+
+
+    def get_command(self, num_requests, concurrent_requests, is_keepalive, url, time=None, connection=None, request=None):
+        """
+        The url and number of requests are not used, the schedule has its
+        own; a time cuts the schedule short.
+        """
+        cmd = []
+        cmd.append('PYTHONPATH=bees.zip python -m beeswithmachineguns.schedule')
+        cmd.append('-c %s' % concurrent_requests)
+        if time:
+            cmd.append('-t %s' % get_seconds(time))
+        if is_keepalive:
+            cmd.append('-k')
+        cmd.append(self.schedule_file)
+
+        cmd_line = ' '.join(cmd)
+        return cmd_line
+
+
+    def parse_schedule(self, output):
+        """
+        @return: dict of the 'digest' of the schedule the bee replayed, the
+            number of 'late' requests and the 'max_lag_ms' (both None if
+            the schedule was not paced), or None if the output has none
+        """
+        s = re.search(re.escape(SCHEDULE_MARKER) + r'\s*([0-9a-f]+)', output)
+        if s is None:
+            return None
+        replayed = {'digest': s.group(1), 'late': None, 'max_lag_ms': None}
+        if re.search(r'late_requests:', output):
+            replayed['late'] = int(self._parse_measure(r'late_requests:\s+([0-9]+)', output, 0))
+            replayed['max_lag_ms'] = float(self._parse_measure(r'max_lag_ms:\s+([0-9.]+)', output, 0))
+        return replayed
+
+
+class HoldTester(ScenarioTester):
+    """
+    Tester implementation for holding connections open, run by the
+    bee-side hold module (see hold), which prints its results as the
+    scenario runner does.  The concurrency is the number of connections
+    each bee opens, a complete request is a connection set up and a failed
+    one a connection which could not be set up or was dropped.
+    """
+
+    connection_options = ('keepalive', 'ramp_rate', 'trickle')
+
+
+    def get_command(self, num_requests, concurrent_requests, is_keepalive, url, time=None, connection=None, request=None):
+        """
+        The connections are held for the time, which is needed, rather than
+        for a number of requests.
+        """
+        if not url:
+            raise Exception("hold only works with a single URL")
+        connection = connection or ConnectionModel(keepalive=is_keepalive)
+
+        cmd = []
+        cmd.append('PYTHONPATH=bees.zip python -m beeswithmachineguns.hold')
+        cmd.append('-c %s' % concurrent_requests)
+        cmd.append('-t %s' % get_seconds(time))
+        if connection.ramp_rate:
+            cmd.append('-r %s' % connection.ramp_rate)
+        if connection.trickle:
+            cmd.append('--trickle %s' % connection.trickle)
+        elif is_keepalive:
+            cmd.append('-k')
+        cmd.append('"%s"' % url)
+
+        cmd_line = ' '.join(cmd)
+        return cmd_line
+
+
+    def parse_hold(self, output):
+        """
+        Extract the timeline of connections held printed by the hold
+        engine.
+
+        @param output: the captured output from the tester command
+        @return: dict (see hold.Holder.to_dict), or None if the output has
+            none
+        """
+        s = re.search(re.escape(HOLD_MARKER) + r'\s*(\{.*\})', output)
+        return (s is not None and json.loads(s.group(1))) or None
+
+
+def get_seconds(time):
+    """
+    Convert a siege-style duration (60S, 1M, 5H) to seconds.
+    """
+    units = {'S': 1, 'M': 60, 'H': 3600}
+    time = str(time).strip().upper()
+    if time[-1:] in units:
+        return int(float(time[:-1]) * units[time[-1]])
+    return int(float(time))
+
+
+ENGINES = {
+    'ab': ABTester,
+    'siege': SiegeTester,
+    'wideload': WideloadTester,
+    'h2load': H2LoadTester,
+    'scenario': ScenarioTester,
+    'schedule': ScheduleTester,
+    'hold': HoldTester,
+}
+
 
 if __name__=='__main__':
     import sys
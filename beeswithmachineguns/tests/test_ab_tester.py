@@ -1,5 +1,6 @@
 """
 """
+import StringIO
 import os
 import unittest
 
@@ -25,6 +26,12 @@ class AbTesterTestCase(unittest.TestCase):
             t.get_command(10, 100, True, 'http://www.example.com/')
             )
 
+        # timed runs
+        self.assertEqual(
+            "ab -r -t 90 -n 100000000 -c 100 \"http://www.example.com/\"",
+            t.get_command(10, 100, False, 'http://www.example.com/', '90S')
+            )
+
 
     def test_parse_output(self):
         """
@@ -49,6 +56,8 @@ class AbTesterTestCase(unittest.TestCase):
               , pctile_90=93.0
               , pctile_95=121.0
               , pctile_99=175.0
+              , ms_connect=0.0
+              , ms_ttfb=39.0
               ),
             t.parse_output(read_file('ab-output-1.txt'))
             )
@@ -68,6 +77,8 @@ class AbTesterTestCase(unittest.TestCase):
               , pctile_90=83.0
               , pctile_95=107.0
               , pctile_99=139.0
+              , ms_connect=0.0
+              , ms_ttfb=72.0
               ),
             t.parse_output(read_file('ab-output-2.txt'))
             )
@@ -124,6 +135,46 @@ class AbTesterTestCase(unittest.TestCase):
         self.assertAlmostEqual(169.0, a.pctile_99) # weighted mean
 
 
+    def test_get_windowed_aggregate_result(self):
+        """
+        """
+        r = tester.TesterResult(
+                concurrency=10.0
+              , time_taken=10.0
+              , complete_requests=1000.0
+              , failed_requests=0.0
+              , non_2xx_responses=0.0
+              , total_transferred=1000.0
+              , requests_per_second=100.0
+              , ms_per_request=100.0
+              , pctile_50=90.0
+              , pctile_75=95.0
+              , pctile_90=110.0
+              , pctile_95=120.0
+              , pctile_99=150.0
+              )
+
+        a = tester.get_aggregate_result([r, r], [(100.0, 110.0), (105.0, 115.0)])
+
+        self.assertAlmostEqual(15.0, a.time_taken) # whole swarm
+        self.assertAlmostEqual(2000.0, a.complete_requests) # sum
+        self.assertAlmostEqual(200.0, a.requests_per_second) # over shared window
+        self.assertAlmostEqual(150.0, a.pctile_99) # weighted mean
+
+        # the bees never overlapped
+        a = tester.get_aggregate_result([r, r], [(100.0, 110.0), (120.0, 130.0)])
+        self.assertAlmostEqual(30.0, a.time_taken)
+        self.assertAlmostEqual(2000.0 / 30.0, a.requests_per_second)
+
+        # the bees fired for no time at all
+        a = tester.get_aggregate_result([r, r], [(100.0, 100.0), (100.0, 100.0)])
+        self.assertEqual(0.0, a.time_taken)
+        self.assertEqual(None, a.requests_per_second)
+        out = StringIO.StringIO()
+        a.print_text(out)
+        self.assertTrue('Requests per second:\t- (unavailable)\n' in out.getvalue())
+
+
 if __name__=='__main__':
     unittest.main()
 
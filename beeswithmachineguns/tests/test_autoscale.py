@@ -0,0 +1,51 @@
+"""
+"""
+import unittest
+
+from beeswithmachineguns import autoscale
+
+
+class AutoscaleTestCase(unittest.TestCase):
+    """
+    """
+
+    def test_parse_cpu_busy(self):
+        """
+        """
+        output = '\n'.join([
+            'bees-cpu: 100 0 100 700 100 0 0 0 0 0',
+            'Complete requests:      10',
+            'bees-cpu: 400 0 200 1000 200 0 0 0 0 0',
+        ])
+        # 400 busy of 800
+        self.assertAlmostEqual(0.5, autoscale.parse_cpu_busy(output))
+        self.assertEqual(None, autoscale.parse_cpu_busy('bees-cpu: 1 2 3 4 5 6 7 8'))
+
+
+    def test_plan(self):
+        """
+        """
+        # on target
+        self.assertEqual((4, 10), autoscale.plan(1000, 1020, 4, 10, 0.5, 10))
+        # short, with headroom: the same bees work harder
+        self.assertEqual((4, 15), autoscale.plan(1500, 1000, 4, 10, 0.5, 10))
+        # short and saturated: more bees
+        self.assertEqual((8, 8), autoscale.plan(1500, 1000, 4, 10, 0.95, 10))
+        # but no more than allowed, and never so hard they saturate
+        self.assertEqual((5, 8), autoscale.plan(1500, 1000, 4, 10, 0.95, 5))
+        # too many bees, idling: fewer of them, but at most halved
+        self.assertEqual((2, 14), autoscale.plan(1000, 1000 * 1.5, 4, 10, 0.1, 10))
+        # nothing got through: try twice as hard
+        self.assertEqual((8, 10), autoscale.plan(1000, 0, 4, 10, None, 10))
+
+
+    def test_next_boundary(self):
+        """
+        """
+        self.assertEqual(100.0, autoscale.next_boundary(100.0, 30, 90.0))
+        self.assertEqual(130.0, autoscale.next_boundary(100.0, 30, 101.0))
+        self.assertEqual(160.0, autoscale.next_boundary(100.0, 30, 130.5))
+
+
+if __name__=='__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+"""
+"""
+import unittest
+
+from beeswithmachineguns import tester
+from beeswithmachineguns.breakdown import BREAKDOWN_MARKER, Breakdown, merge_all, url_pattern
+
+
+class BreakdownTestCase(unittest.TestCase):
+    """
+    """
+
+    def test_url_pattern(self):
+        """
+        """
+        self.assertEqual('/users/:id/posts', url_pattern('http://example.com/users/1234/posts?page=2'))
+        self.assertEqual('/a/:id', url_pattern('/a/0f8c2d1e-aaaa-bbbb-cccc-0123456789ab'))
+        self.assertEqual('/about/deadbeef', url_pattern('/about/deadbeef'))
+        self.assertEqual('/', url_pattern('http://example.com'))
+
+
+    def test_record(self):
+        """
+        """
+        b = Breakdown(capacity=3)
+        for n in range(100):
+            b.record('/hot/%i' % n, 200, 10)
+            b.record('/slow', 200, 500)
+        for n in range(50):
+            b.record('/once/%s' % ('x' * n), 404, 1)
+
+        self.assertEqual(250, b.count)
+        self.assertEqual(50, b.non_2xx())
+        self.assertTrue(len(b.patterns) <= 3)
+        # heavy hitters survive the churn
+        self.assertEqual(100, b.patterns['/hot/:id']['histogram'].count)
+        self.assertEqual(100, b.patterns['/slow']['histogram'].count)
+        # nothing is lost from the totals
+        self.assertEqual(250, sum(e['histogram'].count for e in b.patterns.values()) + b.other.count)
+
+        pattern, entry, slow = b.rows(b.statuses['200'].quantile(0.5))[0]
+        self.assertEqual('/slow', pattern)
+        self.assertEqual(100, slow)
+
+
+    def test_merge(self):
+        """
+        """
+        a = Breakdown(capacity=2)
+        b = Breakdown(capacity=2)
+        for n in range(10):
+            a.record('/a', 200, 10)
+            b.record('/a', 500, 20)
+            b.record('/b', 200, 30)
+        a.record('/c', 200, 40)
+        b.record('/b', 200, 30)
+
+        merged = merge_all([a, b.to_dict()])
+        self.assertEqual(32, merged.count)
+        self.assertEqual(10, merged.non_2xx())
+        self.assertEqual(['/a', '/b'], sorted(merged.patterns))
+        self.assertEqual({'200': 10, '500': 10}, merged.patterns['/a']['statuses'])
+        self.assertEqual(1, merged.other.count)
+
+
+    def test_parse(self):
+        """
+        """
+        b = Breakdown()
+        b.record('/a', 200, 10)
+        b.record('/a', 503, 10)
+        output = 'Transactions: 2 hits\n%s %s\n' % (BREAKDOWN_MARKER, b.to_json())
+
+        parsed = tester.SiegeTester().parse_breakdown(output)
+        self.assertEqual(b.to_dict(), parsed.to_dict())
+        self.assertEqual(None, tester.SiegeTester().parse_breakdown('Transactions: 2 hits'))
+
+
+if __name__=='__main__':
+    unittest.main()
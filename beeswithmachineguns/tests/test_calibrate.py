@@ -0,0 +1,129 @@
+"""
+"""
+import StringIO
+import json
+import os
+import socket
+import tempfile
+import unittest
+
+from paramiko import AuthenticationException
+
+from beeswithmachineguns import bees, calibrate
+from beeswithmachineguns.tracing import NullTracer
+
+
+def _result(cpus, rows):
+    engines = {}
+    for key, levels in rows.items():
+        engines[key] = calibrate._get_profile([{'concurrency': c, 'rps': rps, 'ms': ms, 'p99': p99}
+                                               for c, rps, ms, p99 in levels])
+    return {'cpus': cpus, 'engines': engines}
+
+
+class CalibrateTestCase(unittest.TestCase):
+    """
+    """
+
+    def test_sink(self):
+        """
+        """
+        port, pids = calibrate.start_sink(2)
+        try:
+            # keep-alive, with the requests pipelined
+            conn = socket.create_connection(('127.0.0.1', port))
+            conn.sendall('GET / HTTP/1.1\r\nHost: a\r\n\r\nGET /b HTTP/1.1\r\nHost: a\r\n\r\n')
+            data = ''
+            while data.count('ok') < 2:
+                data += conn.recv(4096)
+            self.assertEqual(2, data.count('HTTP/1.1 200 OK\r\n'))
+            self.assertFalse('Connection: close' in data)
+            conn.close()
+
+            conn = socket.create_connection(('127.0.0.1', port))
+            conn.sendall('GET / HTTP/1.0\r\n\r\n')
+            data = ''
+            while True:
+                chunk = conn.recv(4096)
+                if not chunk:
+                    break
+                data += chunk
+            self.assertTrue(data.startswith('HTTP/1.1 200 OK\r\n'))
+            self.assertTrue('Connection: close\r\n' in data)
+            self.assertTrue(data.endswith('\r\n\r\nok'))
+            conn.close()
+        finally:
+            calibrate.stop_sink(pids)
+
+
+    def test_merge_profiles(self):
+        """
+        """
+        a = _result(2, {'ab': [(1, 1000.0, 1.0, 2), (10, 5000.0, 2.0, 9)]})
+        b = _result(4, {'ab': [(1, 1200.0, 0.8, 3), (10, 4000.0, 2.5, 7)],
+                        'scenario': [(10, 3000.0, 3.0, 12)]})
+        profile = calibrate.merge_profiles([a, b])
+        self.assertEqual((2, 2), (profile['cpus'], profile['bees']))
+        ab = profile['engines']['ab']
+        self.assertEqual([{'concurrency': 1, 'rps': 1000.0, 'ms': 1.0, 'p99': 3},
+                          {'concurrency': 10, 'rps': 4000.0, 'ms': 2.5, 'p99': 9}], ab['levels'])
+        self.assertEqual((4000.0, 10), (ab['max_rps'], ab['best_concurrency']))
+        self.assertEqual(3000.0, profile['engines']['scenario']['max_rps'])
+
+
+    def test_ceiling(self):
+        """
+        """
+        profiles = {
+            't2.micro': calibrate.merge_profiles([_result(1, {'ab': [(10, 2000.0, 5.0, 20)]})]),
+            'c5.large': calibrate.merge_profiles([_result(2, {'ab': [(50, 9000.0, 5.0, 20)],
+                                                              'ab keepalive': [(50, 20000.0, 2.0, 8)]})]),
+        }
+        self.assertEqual(13000.0, calibrate.get_ceiling(profiles, ['t2.micro', 'c5.large', 't2.micro'], 'ab'))
+        self.assertEqual(20000.0, calibrate.get_ceiling(profiles, ['c5.large'], calibrate.get_key('ab', True)))
+        # not every type was calibrated
+        self.assertEqual(None, calibrate.get_ceiling(profiles, ['t2.micro', 'm5.large'], 'ab'))
+        self.assertEqual(None, calibrate.get_ceiling(profiles, ['t2.micro'], 'ab keepalive'))
+
+        filename = os.path.join(tempfile.mkdtemp(), 'profiles')
+        self.assertEqual({}, calibrate.load_profiles(filename))
+        calibrate.save_profiles(profiles, filename)
+        self.assertEqual(json.loads(json.dumps(profiles)), calibrate.load_profiles(filename))
+
+
+    def test_output(self):
+        """
+        """
+        result = _result(2, {'ab': [(1, 1000.0, 1.0, 2)]})
+        self.assertEqual(result, calibrate.parse('noise\n%s %s\n' % (calibrate.CALIBRATE_MARKER, json.dumps(result))))
+        self.assertEqual(None, calibrate.parse('Traceback (most recent call last):'))
+
+        out = StringIO.StringIO()
+        calibrate.print_profiles({'local': calibrate.merge_profiles([result])}, out)
+        text = out.getvalue()
+        self.assertTrue('local (2 cpus, 1 bees):' in text)
+        self.assertTrue('ab\tat most 1000 [#/sec] per bee, at concurrency 1' in text)
+        self.assertTrue('-c 1\t1000 [#/sec], mean 1.000 [ms], 99% 2 [ms]' in text)
+
+
+    def test_unreachable(self):
+        """
+        """
+        def connect(params):
+            if params['instance_id'] == 'i-1':
+                raise AuthenticationException('Authentication failed.')
+            raise socket.error('Connection refused')
+
+        original = bees._connect
+        bees._connect = connect
+        try:
+            reports = bees._run_swarm([{'i': i, 'instance_id': 'i-%i' % i} for i in range(2)], False, NullTracer(),
+                                      worker=bees._calibrate)
+        finally:
+            bees._connect = original
+        # the bees' measurements are dropped, not the run
+        self.assertEqual([None, None], [r['calibration'] for r in reports])
+
+
+if __name__=='__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+"""
+"""
+import unittest
+
+from beeswithmachineguns import bees, capacity
+from beeswithmachineguns.histogram import Histogram
+from beeswithmachineguns.tracing import NullTracer
+
+
+class CapacityTestCase(unittest.TestCase):
+    """
+    """
+
+    def test_wilson_interval(self):
+        """
+        """
+        low, high = capacity.wilson_interval(0, 1000)
+        self.assertEqual(0.0, low)
+        self.assertTrue(0.003 < high < 0.004)
+        low, high = capacity.wilson_interval(50, 100)
+        self.assertTrue(0.40 < low < 0.5 < high < 0.60)
+        self.assertEqual(None, capacity.wilson_interval(0, 0))
+
+
+    def test_quantile_interval(self):
+        """
+        """
+        h = Histogram()
+        for ms in range(1, 1001):
+            h.record(ms)
+        low, high = capacity.quantile_interval(h, 0.99)
+        self.assertTrue(low <= h.quantile(0.99) <= high)
+        self.assertTrue(high - low < 50)
+        self.assertEqual(None, capacity.quantile_interval(Histogram(), 0.99))
+
+
+    def test_judge(self):
+        """
+        """
+        fast = Histogram()
+        fast.record(20, 10000)
+        slow = Histogram()
+        slow.record(20, 9000)
+        slow.record(900, 1000)
+
+        self.assertEqual(True, capacity.judge(fast, 10000, 0, 250, 0.001))
+        self.assertEqual(False, capacity.judge(slow, 10000, 0, 250, 0.001))
+        self.assertEqual(False, capacity.judge(fast, 10000, 100, 250, 0.001))
+        # too few requests to tell either way
+        few = Histogram()
+        few.record(20, 50)
+        self.assertEqual(None, capacity.judge(few, 50, 0, 250, 0.001))
+        self.assertEqual(True, capacity.judge(few, 50, 0, 250, 0.001, final=True))
+        self.assertEqual(False, capacity.judge(None, 0, 0, 250, 0.001, final=True))
+
+
+    def test_search(self):
+        """
+        """
+        probed = []
+        def probe(level):
+            probed.append(level)
+            return level <= 300
+
+        best = capacity.search(probe, 10, 10000, 0.1)
+        self.assertTrue(270 <= best <= 300)
+        self.assertEqual([10, 20, 40, 80, 160, 320], probed[:6])
+
+        self.assertEqual(0, capacity.search(lambda level: False, 10, 10000))
+        self.assertEqual(500, capacity.search(lambda level: True, 10, 500))
+
+
+    def test_empty_stages(self):
+        """
+        """
+        # stages with no time to run fail without firing
+        slo = {'p99': 250, 'errors': 0.001, 'stage': 0, 'min_stage': 0, 'start': 10, 'max': 40, 'precision': 0.1}
+        summary = bees._capacity_search([{}, {}], slo, NullTracer())
+        self.assertEqual(0, summary['capacity'])
+        self.assertEqual(None, summary['result'])
+        self.assertEqual(10, summary['stages'][0]['level'])
+        self.assertEqual([(0, 0, None)], list(set((s['seconds'], s['requests'], s['passed']) for s in summary['stages'])))
+
+
+if __name__=='__main__':
+    unittest.main()
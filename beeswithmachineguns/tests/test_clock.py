@@ -0,0 +1,57 @@
+"""
+"""
+import subprocess
+import time
+import unittest
+
+from beeswithmachineguns import clock
+
+
+class ClockTestCase(unittest.TestCase):
+    """
+    """
+
+    def test_estimate_offset(self):
+        """
+        """
+        # the fastest round trip wins
+        offset, rtt = clock.estimate_offset([
+            (100.0, 105.3, 100.4),
+            (101.0, 106.05, 101.1),
+            (102.0, 107.5, 102.8),
+            ])
+        self.assertAlmostEqual(5.0, offset)
+        self.assertAlmostEqual(0.1, rtt)
+
+        self.assertRaises(ValueError, clock.estimate_offset, [])
+
+
+    def test_fire_command(self):
+        """
+        """
+        fire_at = time.time() + 0.2
+        p = subprocess.Popen(clock.get_fire_command('echo fired', fire_at),
+                             shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        out, err = p.communicate()
+
+        self.assertEqual('fired', out.strip())
+        self.assertTrue(clock.parse_fired_at(err) >= fire_at)
+
+
+    def test_parse_fired_at(self):
+        """
+        """
+        self.assertEqual(1400000000.25, clock.parse_fired_at('bees-fired-at: 1400000000.250000\nThis is ApacheBench'))
+        self.assertEqual(None, clock.parse_fired_at('This is ApacheBench'))
+
+
+    def test_shared_window(self):
+        """
+        """
+        self.assertEqual((2.0, 9.0), clock.shared_window([(1.0, 10.0), (2.0, 9.5), (1.5, 9.0)]))
+        self.assertEqual(None, clock.shared_window([(1.0, 2.0), (3.0, 4.0)]))
+        self.assertEqual(None, clock.shared_window([]))
+
+
+if __name__=='__main__':
+    unittest.main()
@@ -0,0 +1,99 @@
+"""
+"""
+import gzip
+import os
+import random
+import shutil
+import tempfile
+import unittest
+
+from beeswithmachineguns import corpus
+
+
+URLS = ['http://example.com/a', 'http://example.com/b', 'http://example.com/a',
+        'http://example.com/c?q=1 POST x=1']
+
+
+class CorpusTestCase(unittest.TestCase):
+    """
+    """
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.filename = os.path.join(self.root, 'urls.corpus')
+
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+
+    def test_build(self):
+        """
+        """
+        url_file = os.path.join(self.root, 'urls.txt.gz')
+        f = gzip.open(url_file, 'wb')
+        f.write('# comment\n\n' + '\n'.join(URLS) + '\n')
+        f.close()
+
+        self.assertEqual((4, 3), corpus.convert(url_file, self.filename))
+        c = corpus.Corpus(self.filename)
+        try:
+            self.assertEqual(4, len(c))
+            self.assertEqual(3, c.strings)
+            self.assertFalse(c.weighted)
+            self.assertEqual(URLS, [c[i] for i in range(len(c))])
+            self.assertRaises(IndexError, c.__getitem__, 4)
+            self.assertEqual(URLS[1:] + URLS[:2], list(c.sample(5, 'sequential', start=1)))
+            self.assertTrue(set(c.sample(20, 'weighted', rng=random.Random(1))) <= set(URLS))
+        finally:
+            c.close()
+
+        self.assertRaises(ValueError, corpus.build, [], self.filename)
+        self.assertFalse(os.path.exists(self.filename + '.tmp'))
+        self.assertRaises(ValueError, corpus.Corpus, url_file)
+
+
+    def test_weighted(self):
+        """
+        """
+        corpus.build(['http://example.com/a 1', 'http://example.com/b 3', 'http://example.com/c 0'],
+                     self.filename, weighted=True)
+        c = corpus.Corpus(self.filename)
+        try:
+            self.assertTrue(c.weighted)
+            self.assertEqual('http://example.com/b', c[1])
+            picks = list(c.sample(4000, 'weighted', rng=random.Random(1)))
+            self.assertEqual(0, picks.count('http://example.com/c'))
+            self.assertAlmostEqual(0.75, picks.count('http://example.com/b') / 4000.0, delta=0.03)
+            # random ignores the weights
+            picks = list(c.sample(3000, 'random', rng=random.Random(1)))
+            self.assertAlmostEqual(1 / 3.0, picks.count('http://example.com/c') / 3000.0, delta=0.03)
+        finally:
+            c.close()
+
+        self.assertRaises(ValueError, corpus.build, ['http://example.com/a'], self.filename, True)
+        self.assertRaises(ValueError, corpus.build, ['http://example.com/a 0'], self.filename, True)
+
+
+    def test_alias_table(self):
+        """
+        """
+        weights = [1.0, 2.0, 3.0, 4.0]
+        prob, alias = corpus._alias_table(weights)
+        # each entry's share of the columns adds up to its weight
+        shares = [p / len(weights) for p in prob]
+        for i, (p, a) in enumerate(zip(prob, alias)):
+            shares[a] += (1.0 - p) / len(weights)
+        for share, weight in zip(shares, weights):
+            self.assertAlmostEqual(weight / sum(weights), share)
+
+
+    def test_sample_command(self):
+        """
+        """
+        self.assertEqual('PYTHONPATH=bees.zip python -m beeswithmachineguns.corpus sample -n 100 -o sequential -s 200 urls.corpus > urls.txt',
+                         corpus.get_sample_command('urls.corpus', 100, 'sequential', 200))
+
+
+if __name__=='__main__':
+    unittest.main()
@@ -0,0 +1,89 @@
+"""
+"""
+import StringIO
+import random
+import unittest
+
+from beeswithmachineguns import tester
+from beeswithmachineguns.exemplars import EXEMPLARS_MARKER, Exemplars, merge_all
+
+
+class ExemplarsTestCase(unittest.TestCase):
+    """
+    """
+
+    def test_slowest(self):
+        """
+        """
+        e = Exemplars(slowest=3)
+        for n in range(100):
+            e.record('/%i' % n, 200, 1000.0 + n, (n * 37) % 100)
+
+        self.assertEqual([99, 98, 97], [x['ms'] for x in e.slowest])
+        self.assertEqual('/%i' % ((99 * 73) % 100), e.slowest[0]['url'])
+        self.assertEqual([], e.failures)
+
+
+    def test_failures(self):
+        """
+        """
+        e = Exemplars(slowest=1, failures=5, rng=random.Random(1))
+        for n in range(1000):
+            e.record('/%i' % n, n % 2 and 503 or 200, 1000.0 + n, 10)
+        e.record('/timeout', None, 2000.0, 30000)
+
+        self.assertEqual(501, e.failures_seen)
+        self.assertEqual(5, len(e.failures))
+        self.assertTrue(all(x['status'] != 200 for x in e.failures))
+        # the sample is spread over the run
+        self.assertTrue(max(x['start'] for x in e.failures) - min(x['start'] for x in e.failures) > 100)
+        self.assertEqual('/timeout', e.slowest[0]['url'])
+
+
+    def test_merge(self):
+        """
+        """
+        a = Exemplars(slowest=2, failures=4)
+        b = Exemplars(slowest=2, failures=4)
+        for n in range(10):
+            a.record('/a', 500, 1000.0 + n, n)
+            b.record('/b', 200, 1000.0 + n, n + 5)
+        b.record('/b', 404, 2000.0, 1)
+
+        merged = merge_all([a, b.to_dict()])
+        self.assertEqual([14, 13], [x['ms'] for x in merged.slowest])
+        self.assertEqual(11, merged.failures_seen)
+        self.assertEqual(4, len(merged.failures))
+        # the inputs are left alone
+        self.assertEqual(10, a.failures_seen)
+
+
+    def test_parse(self):
+        """
+        """
+        e = Exemplars()
+        e.record('/a', 502, 1000.0, 10, {'connect': 1.5})
+        output = 'Transactions: 1 hits\n%s %s\n' % (EXEMPLARS_MARKER, e.to_json())
+
+        parsed = tester.SiegeTester().parse_exemplars(output)
+        self.assertEqual(e.to_dict(), parsed.to_dict())
+        self.assertEqual(1, len(e.entries()))
+        self.assertEqual(None, tester.SiegeTester().parse_exemplars('Transactions: 1 hits'))
+
+
+    def test_print_text(self):
+        """
+        """
+        e = Exemplars()
+        e.record('/a', 200, 1000.0, 40, {'ttfb': 35.2, 'connect': 1.5})
+        e.record('/b', None, 1001.0, 30)
+        out = StringIO.StringIO()
+        e.print_text(out)
+        self.assertEqual('Slowest requests:\n'
+                         '  40 [ms]\t200 /a at 1000.000 (connect 1, ttfb 35 [ms])\n'
+                         '  30 [ms]\t- /b at 1001.000\n'
+                         'Failed or error responses sampled:\t1 of 1\n', out.getvalue())
+
+
+if __name__=='__main__':
+    unittest.main()
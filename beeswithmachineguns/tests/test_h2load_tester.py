@@ -0,0 +1,89 @@
+"""
+"""
+import os
+import unittest
+
+from beeswithmachineguns import reqlog
+from beeswithmachineguns import tester
+
+
+def read_file(name):
+    return open(os.path.join(os.path.dirname(__file__), name),'rb').read()
+
+
+class H2LoadTesterTestCase(unittest.TestCase):
+    """
+    """
+
+    def test_get_command(self):
+        """
+        """
+        t = tester.H2LoadTester()
+
+        self.assertEqual(
+            "h2load -c 10 --h1 -H 'Connection: close' -n 100 --log-file=h2load.log \"http://www.example.com/\""
+            " && PYTHONPATH=bees.zip python -m beeswithmachineguns.reqlog h2load.log",
+            t.get_command(100, 10, False, 'http://www.example.com/')
+            )
+
+        connection = tester.ConnectionModel(keepalive=True, pool_size=4, h2_streams=25)
+        self.assertEqual(
+            "h2load -c 4 -m 25 -D 60 --log-file=h2load.log -i urls.txt"
+            " && PYTHONPATH=bees.zip python -m beeswithmachineguns.reqlog h2load.log",
+            t.get_command(100, 10, True, None, '1M', connection)
+            )
+
+
+    def test_get_unsupported(self):
+        """
+        """
+        connection = tester.ConnectionModel(keepalive=True, pool_size=4, h2_streams=25, ramp_rate=5.0)
+
+        self.assertEqual(['ramp_rate'], tester.H2LoadTester().get_unsupported(connection))
+        self.assertEqual(['pool_size', 'h2_streams', 'ramp_rate'],
+                         tester.ABTester().get_unsupported(connection))
+        self.assertEqual([], tester.ABTester().get_unsupported(tester.ConnectionModel(keepalive=True)))
+
+
+    def test_parse_output(self):
+        """
+        """
+        t = tester.H2LoadTester()
+
+        self.assertEqual(
+            tester.TesterResult(
+                concurrency=10.0
+              , time_taken=2.52
+              , complete_requests=9990.0
+              , failed_requests=20.0
+              , non_2xx_responses=20.0
+              , total_transferred=3302480.0
+              , requests_per_second=3968.25
+              , ms_per_request=24.87
+              , pctile_50=23.0
+              , pctile_75=30.0
+              , pctile_90=39.0
+              , pctile_95=44.0
+              , pctile_99=57.0
+              , ms_connect=9.93
+              , ms_ttfb=21.40
+              ),
+            t.parse_output(read_file('h2load-output-1.txt'))
+            )
+
+        self.assertEqual(None, t.parse_output('h2load: command not found'))
+        self.assertEqual(1, t.parse_histogram(read_file('h2load-output-1.txt')).count)
+
+
+    def test_read_log(self):
+        """
+        """
+        h = reqlog.read_log(open(os.path.join(os.path.dirname(__file__), 'h2load-log-1.txt')))
+
+        self.assertEqual(3, h.count)
+        self.assertTrue(abs(h.quantile(1.0) - 95.12) < 95.12 * 0.02)
+        self.assertTrue(abs(h.quantile(0.5) - 24.87) < 24.87 * 0.02)
+
+
+if __name__=='__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+"""
+"""
+import unittest
+
+from beeswithmachineguns.histogram import Histogram, merge_all
+
+
+class HistogramTestCase(unittest.TestCase):
+    """
+    """
+
+    def test_quantile(self):
+        """
+        """
+        h = Histogram()
+        for ms in range(1, 1001):
+            h.record(ms)
+
+        self.assertEqual(1000, h.count)
+        for q, expected in ((0.5, 500), (0.9, 900), (0.99, 990), (1.0, 1000)):
+            self.assertTrue(abs(h.quantile(q) - expected) <= expected * 0.02,
+                            '%s: %s' % (q, h.quantile(q)))
+        self.assertTrue(abs(h.mean() - 500.5) <= 10)
+
+        self.assertEqual(0.0, Histogram().quantile(0.5))
+
+
+    def test_merge(self):
+        """
+        """
+        a = Histogram()
+        b = Histogram()
+        for ms in range(100):
+            a.record(10)
+            b.record(1000)
+
+        merged = merge_all([a, b.to_dict()])
+        self.assertEqual(200, merged.count)
+        self.assertTrue(abs(merged.quantile(0.25) - 10) < 0.5)
+        self.assertTrue(abs(merged.quantile(0.75) - 1000) < 20)
+        # the inputs are left alone
+        self.assertEqual(100, a.count)
+
+
+    def test_json(self):
+        """
+        """
+        h = Histogram()
+        h.record(0)
+        h.record(12.5, 3)
+        self.assertEqual(h.counts, Histogram.from_json(h.to_json()).counts)
+
+        self.assertRaises(ValueError, Histogram.from_dict, {'growth': 1.5, 'counts': {}})
+
+
+    def test_from_percentiles(self):
+        """
+        """
+        h = Histogram.from_percentiles({50: 26, 66: 40, 75: 57, 80: 64, 90: 93,
+                                        95: 121, 98: 148, 99: 175, 100: 324}, 62500)
+        self.assertEqual(62500, h.count)
+        for q, expected in ((0.5, 26), (0.75, 57), (0.99, 175)):
+            self.assertTrue(abs(h.quantile(q) - expected) <= expected * 0.02,
+                            '%s: %s' % (q, h.quantile(q)))
+
+
+if __name__=='__main__':
+    unittest.main()
@@ -0,0 +1,140 @@
+"""
+"""
+import StringIO
+import socket
+import threading
+import unittest
+
+from beeswithmachineguns import hold
+from beeswithmachineguns.tester import ABTester, ConnectionModel, HoldTester
+
+
+def _listen(backlog=128):
+    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server.bind(('127.0.0.1', 0))
+    server.listen(backlog)
+    return server
+
+
+def _serve(server, handle):
+    def run():
+        while True:
+            try:
+                conn, address = server.accept()
+            except socket.error:
+                return
+            handle(conn)
+    thread = threading.Thread(target=run)
+    thread.daemon = True
+    thread.start()
+
+
+class HoldTestCase(unittest.TestCase):
+    """
+    """
+
+    def test_hold(self):
+        """
+        """
+        # the kernel sets up the connections without them being accepted
+        server = _listen()
+        try:
+            holder = hold.Holder('http://127.0.0.1:%i/' % server.getsockname()[1], 50, 1.5, rate=200)
+            holder.run()
+        finally:
+            server.close()
+
+        self.assertEqual((50, 50, 0, 0), (holder.established, holder.peak, holder.failed, holder.dropped))
+        self.assertEqual(50, holder.histogram.count)
+        rows = holder.rows
+        self.assertEqual(2, len(rows))
+        self.assertTrue(0 < rows[0][1] <= 50)
+        self.assertEqual([50, 50, 0, 0], rows[-1][1:])
+
+
+    def test_dropped(self):
+        """
+        """
+        server = _listen()
+        url = 'http://127.0.0.1:%i/' % server.getsockname()[1]
+        _serve(server, lambda conn: conn.close())
+        try:
+            holder = hold.Holder(url, 10, 1, rate=100)
+            holder.run()
+        finally:
+            server.close()
+        self.assertEqual(10, holder.established)
+        self.assertEqual(10, holder.dropped)
+        self.assertEqual(0, holder.open)
+
+        # nothing listening
+        unused = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        unused.bind(('127.0.0.1', 0))
+        url = 'http://127.0.0.1:%i/' % unused.getsockname()[1]
+        unused.close()
+        holder = hold.Holder(url, 5, 1, rate=100)
+        holder.run()
+        self.assertEqual((0, 5), (holder.established, holder.failed))
+
+
+    def test_trickle(self):
+        """
+        """
+        received = []
+        server = _listen()
+        _serve(server, lambda conn: received.append(conn))
+        try:
+            holder = hold.Holder('http://127.0.0.1:%i/slow?x=1' % server.getsockname()[1], 1, 1, trickle=0.2)
+            holder.run()
+            head = received[0].recv(4096)
+        finally:
+            server.close()
+        self.assertTrue(head.startswith('GET /slow?x=1 HTTP/1.1\r\nHost: 127.0.0.1:'))
+        self.assertTrue('X-Bees-1: 1\r\n' in head)
+        self.assertFalse('\r\n\r\n' in head)
+
+
+    def test_output(self):
+        """
+        """
+        server = _listen()
+        try:
+            holder = hold.Holder('http://127.0.0.1:%i/' % server.getsockname()[1], 20, 1, rate=100)
+            holder.run()
+        finally:
+            server.close()
+        out = StringIO.StringIO()
+        holder.print_results(out)
+
+        t = HoldTester()
+        result = t.parse_output(out.getvalue())
+        self.assertEqual((20, 20, 0), (result.concurrency, result.complete_requests, result.failed_requests))
+        self.assertEqual(holder.to_dict(), t.parse_hold(out.getvalue()))
+        self.assertEqual(20, t.parse_histogram(out.getvalue()).count)
+
+        self.assertEqual('PYTHONPATH=bees.zip python -m beeswithmachineguns.hold -c 20 -t 60 -r 50.0 --trickle 5.0 "http://a/"',
+                         t.get_command(100, 20, True, 'http://a/', '1M', ConnectionModel(True, ramp_rate=50.0, trickle=5.0)))
+        self.assertEqual('PYTHONPATH=bees.zip python -m beeswithmachineguns.hold -c 20 -t 60 -k "http://a/"',
+                         t.get_command(100, 20, True, 'http://a/', '1M'))
+        self.assertEqual([], t.get_unsupported(ConnectionModel(True, ramp_rate=5.0, trickle=1.0)))
+        self.assertEqual(['ramp_rate'], ABTester().get_unsupported(ConnectionModel(ramp_rate=5.0)))
+
+
+    def test_merge_all(self):
+        """
+        """
+        a = {'step': 1.0, 'rows': [[1.0, 10, 10, 0, 0], [2.0, 20, 20, 1, 0]], 'peak': 20}
+        b = {'step': 1.0, 'rows': [[1.001, 5, 5, 0, 0], [2.0, 3, 8, 0, 5], [2.5, 3, 8, 0, 5]], 'peak': 8}
+        merged = hold.merge_all([a, None, b])
+        self.assertEqual([[1.001, 15, 15, 0, 0], [2.0, 23, 28, 1, 5], [2.5, 3, 8, 0, 5]], merged['rows'])
+        self.assertEqual(23, merged['peak'])
+        self.assertEqual(None, hold.merge_all([None]))
+
+        out = StringIO.StringIO()
+        hold.print_timeline(merged, out)
+        self.assertTrue('23 at most' in out.getvalue())
+        self.assertTrue('+2s\t23 open, 28 established, 1 failed, 5 dropped' in out.getvalue())
+
+
+if __name__=='__main__':
+    unittest.main()
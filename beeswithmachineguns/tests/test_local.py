@@ -0,0 +1,98 @@
+"""
+"""
+import os
+import shutil
+import tempfile
+import unittest
+
+from beeswithmachineguns import local
+
+
+class LocalProviderTestCase(unittest.TestCase):
+    """
+    """
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+
+    def test_up_down(self):
+        """
+        """
+        instances = local.up(2, self.root)
+
+        self.assertEqual(['local-0', 'local-1'], [i.id for i in instances])
+        self.assertEqual(['running', 'running'],
+                         [i.state for i in local.get_instances(['local-0', 'local-1'], self.root)])
+        self.assertTrue(os.path.isfile(os.path.join(instances[0].public_dns_name, 'ready')))
+
+        self.assertEqual(['local-1'], local.down(['local-1'], self.root))
+        self.assertEqual('terminated', local.get_instances(['local-1'], self.root)[0].state)
+
+
+    def test_park_unpark(self):
+        """
+        """
+        local.up(2, self.root)
+
+        self.assertEqual(['local-0', 'local-1'], local.park(['local-0', 'local-1'], self.root))
+        self.assertEqual('stopped', local.get_instances(['local-0'], self.root)[0].state)
+        client = local.LocalClient()
+        self.assertRaises(IOError, client.connect, os.path.join(self.root, 'local-0'))
+
+        self.assertEqual(['local-0'], local.unpark(['local-0', 'local-9'], self.root))
+        self.assertEqual('running', local.get_instances(['local-0'], self.root)[0].state)
+        client.connect(os.path.join(self.root, 'local-0'))
+
+        # replacements keep clear of the roster's bees
+        self.assertEqual(['local-2'], [i.id for i in local.up(1, self.root, exclude=['local-0', 'local-1'])])
+
+
+    def test_exec_command(self):
+        """
+        """
+        instance = local.up(1, self.root)[0]
+        client = local.LocalClient()
+        client.connect(instance.public_dns_name)
+
+        stdin, stdout, stderr = client.exec_command('ls; echo oops >&2; exit 3')
+        self.assertEqual(3, stdout.channel.recv_exit_status())
+        self.assertEqual('ready\n', stdout.read())
+        self.assertEqual('oops\n', stderr.read())
+
+        # interactive use, as when measuring clock offsets
+        stdin, stdout, stderr = client.exec_command('while read line; do echo "got $line"; done')
+        stdin.write('a\n')
+        stdin.flush()
+        self.assertEqual('got a\n', stdout.readline())
+        stdin.close()
+        self.assertEqual(0, stdout.channel.recv_exit_status())
+        self.assertEqual('', stdout.readline())
+
+        self.assertRaises(IOError, client.connect, os.path.join(self.root, 'local-9'))
+
+
+    def test_sftp(self):
+        """
+        """
+        instance = local.up(1, self.root)[0]
+        client = local.LocalClient()
+        client.connect(instance.public_dns_name)
+
+        source = os.path.join(self.root, 'siege_calc')
+        open(source, 'w').write('#!/bin/sh\n')
+        sftp = client.open_sftp()
+        sftp.put(source, 'siege_calc')
+        sftp.chmod('siege_calc', 0774)
+        sftp.close()
+
+        stdin, stdout, stderr = client.exec_command('test -x siege_calc && echo yes')
+        self.assertEqual('yes\n', stdout.read())
+
+
+if __name__=='__main__':
+    unittest.main()
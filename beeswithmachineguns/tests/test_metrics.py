@@ -0,0 +1,112 @@
+"""
+"""
+import BaseHTTPServer
+import StringIO
+import threading
+import time
+import unittest
+
+from beeswithmachineguns import metrics
+
+
+EXPOSITION = """# HELP node_cpu_seconds_total Seconds the CPUs spent in each mode.
+# TYPE node_cpu_seconds_total counter
+node_cpu_seconds_total{cpu="0",mode="idle"} %(idle)s
+node_cpu_seconds_total{cpu="0",mode="user"} %(user)s
+# TYPE node_load1 gauge
+node_load1 %(load)s
+# TYPE http_requests_total counter
+http_requests_total{code="200",path="/a b"} %(requests)s
+"""
+
+
+class MetricsHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """
+    Stands in for a node exporter whose CPU is a quarter busy.
+    """
+
+    scrapes = 0
+
+    def do_GET(self):
+        MetricsHandler.scrapes += 1
+        n = MetricsHandler.scrapes
+        body = EXPOSITION % {'idle': 3.0 * n, 'user': 1.0 * n, 'load': 2.5, 'requests': 100 * n}
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4')
+        self.end_headers()
+        self.wfile.write(body)
+
+
+    def log_message(self, *args):
+        pass
+
+
+def _sample(t, text, source='a'):
+    types, values = metrics.parse_prometheus(text)
+    return {'time': t, 'source': source, 'types': types, 'values': values}
+
+
+class MetricsTestCase(unittest.TestCase):
+    """
+    """
+
+    def test_parse_prometheus(self):
+        """
+        """
+        types, values = metrics.parse_prometheus(EXPOSITION % {'idle': 10, 'user': '2.5e1', 'load': 'NaN', 'requests': 7})
+        self.assertEqual('counter', types['node_cpu_seconds_total'])
+        self.assertEqual('gauge', types['node_load1'])
+        self.assertEqual(('node_cpu_seconds_total', {'cpu': '0', 'mode': 'user'}, 25.0), values[1])
+        self.assertEqual(('http_requests_total', {'code': '200', 'path': '/a b'}, 7.0), values[3])
+
+
+    def test_summarize(self):
+        """
+        """
+        samples = [_sample(100.0 + 10 * n, EXPOSITION % {'idle': 30 * n, 'user': 10 * n, 'load': n, 'requests': 50 * n})
+                   for n in range(5)]
+
+        self.assertAlmostEqual(0.25, metrics.summarize(samples, 115.0, 140.0, 'node_cpu_seconds_total'))
+        self.assertAlmostEqual(5.0, metrics.summarize(samples, 115.0, 140.0, 'http_requests_total'))
+        # the gauge's mean over the samples within the window
+        self.assertAlmostEqual(3.0, metrics.summarize(samples, 115.0, 140.0, 'node_load1'))
+        self.assertEqual(None, metrics.summarize(samples, 115.0, 140.0, 'node_missing'))
+
+        timeline = metrics.align(samples, [{'start': 100.0, 'end': 120.0, 'rps': 1.0, 'p99': 10}])
+        self.assertAlmostEqual(0.25, timeline[0]['cpu'])
+        self.assertAlmostEqual(1.0, timeline[0]['queue'])
+
+        # a bucket no bee reported a percentile for
+        timeline = metrics.align(samples, [{'start': 100.0, 'end': 120.0, 'rps': 1.0, 'p99': 10},
+                                           {'start': 120.0, 'end': 140.0, 'rps': 0.0, 'p99': None}], queue_metric='node_missing')
+        out = StringIO.StringIO()
+        metrics.print_timeline(timeline, out)
+        self.assertEqual('Target metrics:\n'
+                         '  +0s\t1.00 [#/sec], 99% 10 [ms], target CPU 25%, queue -\n'
+                         '  +20s\t0.00 [#/sec], 99% - [ms], target CPU 25%, queue -\n', out.getvalue())
+
+
+    def test_scraper(self):
+        """
+        """
+        server = BaseHTTPServer.HTTPServer(('127.0.0.1', 0), MetricsHandler)
+        thread = threading.Thread(target=server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        try:
+            source = 'http://127.0.0.1:%i/metrics' % server.server_address[1]
+            scraper = metrics.Scraper([source, 'http://127.0.0.1:1/metrics'], interval=0.05).start()
+            time.sleep(0.3)
+            samples = scraper.stop()
+        finally:
+            server.shutdown()
+
+        self.assertTrue(len(samples) >= 3)
+        self.assertEqual(set([source]), set(s['source'] for s in samples))
+        busy = metrics.summarize(samples, samples[0]['time'], samples[-1]['time'], metrics.CPU_METRIC)
+        self.assertAlmostEqual(0.25, busy)
+        self.assertAlmostEqual(2.5, metrics.summarize(samples, samples[0]['time'], samples[-1]['time'], metrics.QUEUE_METRIC))
+
+
+if __name__=='__main__':
+    unittest.main()
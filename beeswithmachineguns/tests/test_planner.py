@@ -0,0 +1,118 @@
+"""
+"""
+import StringIO
+import os
+import tempfile
+import unittest
+
+from beeswithmachineguns import calibrate, planner
+
+
+def _profiles(**rows):
+    profiles = {}
+    for instance_type, levels in rows.items():
+        result = {'cpus': 2, 'engines': {'ab': calibrate._get_profile(
+            [{'concurrency': c, 'rps': rps, 'ms': 1.0, 'p99': 5} for c, rps in levels])}}
+        profiles[instance_type.replace('_', '.')] = calibrate.merge_profiles([result])
+    return profiles
+
+
+class PlannerTestCase(unittest.TestCase):
+    """
+    """
+
+    def test_capabilities(self):
+        """
+        """
+        profiles = _profiles(c5_large=[(10, 5000.0), (50, 9000.0), (200, 8500.0)])
+        history = [
+            {'engine': 'ab', 'keepalive': False, 'types': {'c5.large': 4}, 'rps': 20000.0, 'concurrency': 1000},
+            {'engine': 'ab', 'keepalive': False, 'types': {'m5.large': 2}, 'rps': 6000.0, 'concurrency': 100},
+            {'engine': 'ab', 'keepalive': False, 'types': {'m5.large': 1}, 'rps': 2000.0, 'concurrency': 300},
+            # mixed swarms, other engines and keep-alive do not count
+            {'engine': 'ab', 'keepalive': False, 'types': {'m5.large': 1, 'c5.large': 1}, 'rps': 90000.0, 'concurrency': 9000},
+            {'engine': 'siege', 'keepalive': False, 'types': {'m5.large': 1}, 'rps': 90000.0, 'concurrency': 9000},
+            {'engine': 'ab', 'keepalive': True, 'types': {'m5.large': 1}, 'rps': 90000.0, 'concurrency': 9000},
+        ]
+        capabilities = planner.get_capabilities(profiles, history, 'ab', False)
+        # calibrated rates win over history, which still shows the concurrency held
+        self.assertEqual({'rps': 9000.0, 'concurrency': 250, 'source': 'calibrated'}, capabilities['c5.large'])
+        self.assertEqual({'rps': 3000.0, 'concurrency': 300, 'source': 'history'}, capabilities['m5.large'])
+
+
+    def test_burstable(self):
+        """
+        """
+        self.assertEqual((1000.0, None), planner.get_sustained('t2.micro', 1000.0, 600))
+        rps, note = planner.get_sustained('t2.micro', 1000.0, 3600)
+        self.assertEqual(100.0, rps)
+        self.assertTrue('after 33m' in note)
+        # unlimited, but paying for it
+        self.assertEqual((1000.0, None), planner.get_sustained('t3.micro', 1000.0, 3600))
+        self.assertTrue(planner.get_cost('t3.micro', 1, 3600) > planner.get_cost('t3.micro', 1, 0) + 0.0104)
+        self.assertEqual((1000.0, None), planner.get_sustained('x9.huge', 1000.0, 3600))
+        self.assertEqual(None, planner.get_cost('x9.huge', 1, 3600))
+        self.assertAlmostEqual(0.085 * 3 * (3600 + planner.BOOT_SECONDS) / 3600.0, planner.get_cost('c5.large', 3, 3600))
+
+
+    def test_spread(self):
+        """
+        """
+        zones = ['us-east-1a', 'us-east-1b', 'us-east-1c']
+        self.assertEqual([('us-east-1a', 5)], planner.spread(5, zones))
+        self.assertEqual([('us-east-1a', 17), ('us-east-1b', 17), ('us-east-1c', 16)], planner.spread(50, zones))
+        self.assertEqual([('us-east-1a', 50), ('us-east-1b', 50)], planner.spread(100, zones[:2]))
+        self.assertEqual([], planner.spread(5, []))
+
+
+    def test_plan(self):
+        """
+        """
+        profiles = _profiles(t2_micro=[(10, 1500.0)], c5_large=[(50, 9000.0)], c5_xlarge=[(50, 19000.0)],
+                             local=[(10, 500.0)])
+        zones = ['us-east-1a', 'us-east-1b']
+        plans = planner.plan(profiles, [], 'ab', False, 600, rps=20000, zones=zones)
+        self.assertEqual(['t2.micro', 'c5.large', 'c5.xlarge'], [p.instance_type for p in plans])
+        self.assertEqual(15, plans[0].count)
+        self.assertEqual(3, plans[1].count)
+        self.assertEqual([('us-east-1a', 3)], plans[1].zones)
+
+        # an hour outlasts the t2 bees' credits
+        plans = planner.plan(profiles, [], 'ab', False, 3600, rps=20000, zones=zones)
+        self.assertEqual('c5.large', plans[0].instance_type)
+        micro = [p for p in plans if p.instance_type == 't2.micro'][0]
+        self.assertEqual((147, 150.0), (micro.count, micro.rps))
+        self.assertEqual([('us-east-1a', 74), ('us-east-1b', 73)], micro.zones)
+        self.assertEqual(['c5.large', 'c5.xlarge'],
+                         [p.instance_type for p in planner.plan(profiles, [], 'ab', False, 3600, rps=20000, max_bees=10)])
+
+        # each bee held at most 50 at full rate
+        plans = planner.plan(profiles, [], 'ab', False, 600, concurrency=1000, types=['c5.large'])
+        self.assertEqual([20], [p.count for p in plans])
+        plans = planner.plan(profiles, [], 'ab', False, 600, rps=1000, types=['local'])
+        self.assertEqual([('local', 3, None)], [(p.instance_type, p.count, p.cost) for p in plans])
+        self.assertEqual([], planner.plan(profiles, [], 'siege', False, 600, rps=1000))
+
+
+    def test_history(self):
+        """
+        """
+        filename = os.path.join(tempfile.mkdtemp(), 'history')
+        self.assertEqual([], planner.load_history(filename))
+        entry = {'engine': 'ab', 'keepalive': False, 'types': {'c5.large': 2}, 'rps': 100.0, 'concurrency': 10, 'seconds': 5.0}
+        planner.record(entry, filename)
+        with open(filename, 'a') as f:
+            f.write('{"engine": "a')
+        history = planner.load_history(filename)
+        self.assertEqual(1, len(history))
+        self.assertEqual(entry, dict((k, v) for k, v in history[0].items() if k != 'time'))
+
+        out = StringIO.StringIO()
+        planner.print_plans(planner.plan(_profiles(c5_large=[(50, 9000.0)]), [], 'ab', False, 600, rps=20000,
+                                         zones=['us-east-1a']), out)
+        self.assertEqual('1. 3 x c5.large in us-east-1a (3): $0.06\n'
+                         '   9000 [#/sec] and 50 concurrent requests per bee (calibrated)\n', out.getvalue())
+
+
+if __name__=='__main__':
+    unittest.main()
@@ -0,0 +1,117 @@
+"""
+"""
+import StringIO
+import json
+import socket
+import unittest
+
+from paramiko import SSHException
+
+from beeswithmachineguns import bees, preflight
+from beeswithmachineguns.tracing import NullTracer
+
+
+def _limits(**kwargs):
+    limits = {'nofile': 1024, 'nofile_hard': 4096, 'ports': 63001, 'conntrack_max': None,
+              'conntrack_count': 0, 'somaxconn': 128, 'cpus': 2,
+              'nic': {'name': 'eth0', 'speed': 1000, 'mtu': 9001}, 'changed': [], 'failed': []}
+    limits.update(kwargs)
+    return limits
+
+
+class PreflightTestCase(unittest.TestCase):
+    """
+    """
+
+    def test_collect(self):
+        """
+        """
+        limits = preflight.collect()
+        self.assertTrue(limits['nofile'] <= limits['nofile_hard'])
+        self.assertTrue(limits['cpus'] >= 1)
+        self.assertTrue(preflight.get_capacity(limits) > 0)
+
+
+    def test_capacity(self):
+        """
+        """
+        self.assertEqual(4096 - preflight.RESERVED_FILES, preflight.get_capacity(_limits()))
+        self.assertEqual(1000, preflight.get_capacity(_limits(nofile_hard=100000, ports=1000)))
+        self.assertEqual(500, preflight.get_capacity(_limits(nofile_hard=100000, conntrack_max=2000,
+                                                             conntrack_count=1500)))
+        self.assertEqual(0, preflight.get_capacity(_limits(nofile_hard=10)))
+
+
+    def test_fit(self):
+        """
+        """
+        self.assertEqual([34, 33, 33], sorted(preflight.fit([None, None, None], 100), reverse=True))
+        # the tight bee takes what it can and the others make up the rest
+        self.assertEqual([10, 45, 45], preflight.fit([10, 1000, None], 100))
+        self.assertEqual([10, 20, 30], preflight.fit([10, 20, 30], 100))
+        self.assertEqual([0, 50, 50], preflight.fit([0, 60, 60], 100))
+
+
+    def test_tune(self):
+        """
+        """
+        self.assertTrue(preflight._falls_short('32768 60999', '2000 65000'))
+        self.assertFalse(preflight._falls_short('1024 65535', '2000 65000'))
+        self.assertTrue(preflight._falls_short('128', '65535'))
+        self.assertFalse(preflight._falls_short(None, '65535'))
+
+        commands = []
+        changed, failed = preflight.tune(sudo=lambda command: commands.append(command) or True)
+        self.assertEqual(len(commands), len(changed))
+        self.assertEqual([], failed)
+        changed, failed = preflight.tune(sudo=lambda command: False)
+        self.assertEqual([], changed)
+        self.assertEqual(len(commands), len(failed))
+
+
+    def test_output(self):
+        """
+        """
+        limits = _limits(changed=['net.core.somaxconn 128 -> 65535'], failed=['open files is 4096'])
+        self.assertEqual(limits, preflight.parse('noise\n%s %s\n' % (preflight.PREFLIGHT_MARKER, json.dumps(limits))))
+        self.assertEqual(None, preflight.parse('sudo: a password is required'))
+
+        out = StringIO.StringIO()
+        preflight.print_preflight([
+            {'instance_id': 'i-1', 'limits': limits, 'changed': limits['changed'], 'failed': limits['failed'],
+             'concurrency': 4032, 'asked': 5000},
+            {'instance_id': 'i-2', 'limits': None, 'changed': [], 'failed': [], 'concurrency': 5968, 'asked': 5000},
+        ], out)
+        text = out.getvalue()
+        self.assertTrue('i-1\t2 cpus, eth0 1000 Mb/s, 4096 open files, 63001 ports, conntrack -, concurrency 4032 (asked 5000)' in text)
+        self.assertTrue('tuned net.core.somaxconn 128 -> 65535' in text)
+        self.assertTrue('could not tune: open files is 4096' in text)
+        self.assertTrue('i-2\tcould not be checked' in text)
+
+        self.assertEqual('ulimit -n 4096 2>/dev/null; ab -c 10 "http://a/"',
+                         preflight.get_limited_command('ab -c 10 "http://a/"', 4096))
+
+
+    def test_unreachable(self):
+        """
+        """
+        def connect(params):
+            if params['instance_id'] == 'i-1':
+                raise SSHException('No existing session')
+            raise socket.error('Connection refused')
+
+        params = [{'i': i, 'instance_id': 'i-%i' % i, 'concurrent_requests': 10, 'num_requests': 100}
+                  for i in range(3)]
+        original = bees._connect
+        bees._connect = connect
+        try:
+            checks, fitted = bees._preflight_swarm(params, 30, 300, NullTracer())
+        finally:
+            bees._connect = original
+        # bees which could not be checked still take their share
+        self.assertEqual([None, None, None], [c['limits'] for c in checks])
+        self.assertEqual([10, 10, 10], [p['concurrent_requests'] for p in fitted])
+
+
+if __name__=='__main__':
+    unittest.main()
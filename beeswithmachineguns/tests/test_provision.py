@@ -0,0 +1,187 @@
+"""
+"""
+import threading
+import unittest
+
+from boto.exception import EC2ResponseError
+
+from beeswithmachineguns import bees, provision
+from beeswithmachineguns.tracing import NullTracer
+
+
+_CAPACITY_ERROR = ('<Response><Errors><Error><Code>InsufficientInstanceCapacity</Code>'
+                   '<Message>none left</Message></Error></Errors></Response>')
+
+
+class FakeInstance(object):
+
+    def __init__(self, instance_id, zone, instance_type):
+        self.id = instance_id
+        self.zone = zone
+        self.instance_type = instance_type
+        self.state = 'pending'
+
+
+class FakeRegion(object):
+    name = 'us-east-1'
+
+
+class FakeEC2(object):
+    """
+    Launches up to the capacity left in each (zone, instance type), and
+    brings the instances up one describe after another.
+    """
+
+    region = FakeRegion()
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.instances = {}
+        self.requests = []
+        self.tagged = []
+        self.terminated = []
+        self.lock = threading.Lock()
+
+
+    def run_instances(self, image_id, min_count, max_count, key_name, security_groups, instance_type, user_data, placement):
+        with self.lock:
+            self.requests.append((placement, instance_type, max_count))
+            left = self.capacity.get((placement, instance_type), 0)
+            if left < min_count:
+                raise EC2ResponseError(500, 'Server Error', _CAPACITY_ERROR)
+            launched = min(left, max_count)
+            self.capacity[(placement, instance_type)] = left - launched
+            instances = []
+            for k in range(launched):
+                instance = FakeInstance('i-%i' % len(self.instances), placement, instance_type)
+                self.instances[instance.id] = instance
+                instances.append(instance)
+
+        class Reservation(object):
+            pass
+        reservation = Reservation()
+        reservation.instances = instances
+        return reservation
+
+
+    def create_tags(self, instance_ids, tags):
+        self.tagged.extend(instance_ids)
+
+
+    def terminate_instances(self, instance_ids):
+        self.terminated.extend(instance_ids)
+
+
+    def get_only_instances(self, instance_ids):
+        for instance_id in instance_ids:
+            instance = self.instances[instance_id]
+            if instance.state == 'pending':
+                instance.state = 'running'
+                # one at a time
+                break
+        return [self.instances[i] for i in instance_ids]
+
+
+class ProvisionTestCase(unittest.TestCase):
+    """
+    """
+
+    def setUp(self):
+        self.connect_ec2 = bees._connect_ec2
+        self.sleep = bees.time.sleep
+        bees.time.sleep = lambda seconds: None
+
+
+    def tearDown(self):
+        bees._connect_ec2 = self.connect_ec2
+        bees.time.sleep = self.sleep
+
+
+    def _call_up(self, ec2, count, **kwargs):
+        bees._connect_ec2 = lambda region: ec2
+        return bees._call_up(ec2, count, 'default', 'us-east-1a', 'ami-1', 'c5.large', 'ubuntu', 'key',
+                             False, NullTracer(), **kwargs)
+
+
+    def test_batches(self):
+        """
+        """
+        self.assertEqual([50, 50], provision.get_batches(100))
+        self.assertEqual([41, 40, 40], provision.get_batches(121))
+        self.assertEqual([3], provision.get_batches(3))
+        self.assertEqual([(None, 't2.micro')], provision.get_placements(None, 't2.micro'))
+        self.assertEqual([('a', 'c5.large'), ('b', 'c5.large'), ('a', 'm5.large'), ('b', 'm5.large')],
+                         provision.get_placements('a', 'c5.large', ['b', 'a'], ['m5.large']))
+        self.assertEqual(9, provision.get_needed(10, 0.9))
+        self.assertEqual(1, provision.get_needed(10, 0))
+        self.assertEqual(10, provision.get_needed(10))
+
+
+    def test_launch_batch(self):
+        """
+        """
+        capacity = {'a': 3, 'b': 10}
+        asked = []
+
+        def launch(zone, instance_type, count):
+            asked.append((zone, count))
+            if not capacity[zone]:
+                raise provision.CapacityError('InsufficientInstanceCapacity')
+            launched = min(count, capacity[zone])
+            capacity[zone] -= launched
+            return [zone] * launched
+
+        exhausted = set()
+        placements = [('a', 't'), ('b', 't')]
+        self.assertEqual(['a'] * 3 + ['b'] * 2, provision.launch_batch(5, placements, launch, exhausted))
+        self.assertEqual(set([('a', 't')]), exhausted)
+        # the zone which ran short is not asked again
+        self.assertEqual(['b'] * 5, provision.launch_batch(5, placements, launch, exhausted))
+        self.assertEqual(['b'] * 3, provision.launch_batch(5, placements, launch, exhausted))
+        self.assertEqual([], provision.launch_batch(5, placements, launch, exhausted))
+        self.assertEqual([('a', 5), ('b', 2), ('b', 5), ('b', 5)], asked)
+
+
+    def test_call_up(self):
+        """
+        """
+        ec2 = FakeEC2({('us-east-1a', 'c5.large'): 70, ('us-east-1b', 'c5.large'): 20, ('us-east-1b', 'm5.large'): 100})
+        instances = self._call_up(ec2, 120, fallback_zones=['us-east-1b'], fallback_types=['m5.large'], batch=40)
+        self.assertEqual(120, len(instances))
+        self.assertEqual(['running'] * 120, [i.state for i in instances])
+        placed = {}
+        for i in instances:
+            placed[(i.zone, i.instance_type)] = placed.get((i.zone, i.instance_type), 0) + 1
+        self.assertEqual({('us-east-1a', 'c5.large'): 70, ('us-east-1b', 'c5.large'): 20,
+                          ('us-east-1b', 'm5.large'): 30}, placed)
+        self.assertEqual(sorted(i.id for i in instances), sorted(ec2.tagged))
+        self.assertTrue(all(count <= 40 for zone, instance_type, count in ec2.requests))
+
+
+    def test_quorum(self):
+        """
+        """
+        ec2 = FakeEC2({('us-east-1a', 'c5.large'): 10})
+        instances = self._call_up(ec2, 12, quorum=0.5)
+        # what there was, with the stragglers still starting
+        self.assertEqual(10, len(instances))
+        self.assertEqual(5, len([i for i in instances if i.state == 'running']))
+
+        ec2 = FakeEC2({})
+        self.assertEqual([], self._call_up(ec2, 5))
+
+
+    def test_stand_down_unready(self):
+        """
+        """
+        ec2 = FakeEC2({})
+        instances = [FakeInstance('i-%i' % k, 'us-east-1a', 'c5.large') for k in range(3)]
+        bees._stand_down_unready(ec2, instances, instances)
+        self.assertEqual([], ec2.terminated)
+        # bees dropped from the roster are not left running
+        bees._stand_down_unready(ec2, instances, instances[1:2])
+        self.assertEqual(['i-0', 'i-2'], ec2.terminated)
+
+
+if __name__=='__main__':
+    unittest.main()
@@ -0,0 +1,122 @@
+"""
+"""
+import os
+import shutil
+import stat
+import sys
+import tempfile
+import unittest
+
+from beeswithmachineguns import bees, local
+from beeswithmachineguns.tracing import NullTracer
+
+
+class RelayTestCase(unittest.TestCase):
+    """
+    Runs a relay tree on local bees, with a stand-in for ab.
+    """
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.path = os.environ['PATH']
+
+        # the bees run `python` and `ab` from the PATH
+        bin_dir = os.path.join(self.root, 'bin')
+        os.mkdir(bin_dir)
+        os.symlink(sys.executable, os.path.join(bin_dir, 'python'))
+        ab = os.path.join(bin_dir, 'ab')
+        output = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'ab-output-2.txt')
+        open(ab, 'w').write('#!/bin/sh\ncat %s\n' % output)
+        os.chmod(ab, stat.S_IRWXU)
+        os.environ['PATH'] = '%s:%s' % (bin_dir, self.path)
+
+        self.package_zip = bees._build_package_zip(os.path.join(self.root, 'bees.zip'))
+
+
+    def tearDown(self):
+        os.environ['PATH'] = self.path
+        shutil.rmtree(self.root)
+
+
+    def _params(self, instances):
+        return [{
+            'i': i,
+            'region': local.LOCAL_REGION,
+            'package_zip': 'bees.zip',
+            'instance_id': instance.id,
+            'instance_name': instance.public_dns_name,
+            'url': 'http://www.example.com/',
+            'url_file': None,
+            'url_file_bucket': None,
+            'concurrent_requests': 10,
+            'num_requests': 100,
+            'username': 'ubuntu',
+            'key_name': '',
+            'keepalive': False,
+            'engine': 'ab',
+            'time': None,
+            'trace': False,
+        } for i, instance in enumerate(instances)]
+
+
+    def test_plan_relays(self):
+        """
+        """
+        plan = bees._plan_relays(['r0', 'r1', 'a', 'b', 'c', 'd', 'e'], 2)
+        self.assertEqual([('r0', [0, 2, 4]), ('r1', [1, 3])], plan)
+
+
+    def test_relay_tree(self):
+        """
+        """
+        instances = local.up(6, self.root)
+        relay_plan = bees._plan_relays(instances, 2)
+        params = self._params(instances[2:])
+
+        relay_params = [{
+            'i': k,
+            'region': local.LOCAL_REGION,
+            'package_zip': self.package_zip,
+            'instance_id': relay.id,
+            'instance_name': relay.public_dns_name,
+            'username': 'ubuntu',
+            'key_name': '',
+            'engine': 'ab',
+            'trace': False,
+            'children': [params[j] for j in children],
+        } for k, (relay, children) in enumerate(relay_plan)]
+
+        reports = bees._run_swarm(relay_params, True, NullTracer(), worker=bees._relay_attack)
+        self.assertEqual([2, 2], [r['bees'] for r in reports])
+        self.assertEqual([0, 0], [r['failed'] for r in reports])
+
+        summary = bees._aggregate_reports(reports)
+        self.assertEqual(4, summary['bees'])
+        self.assertEqual(0, summary['failed'])
+        self.assertEqual(4 * 12500, summary['histogram'].count)
+        self.assertEqual(2, len(summary['windows']))
+
+        result = summary['result']
+        self.assertAlmostEqual(4 * 12500.0, result.complete_requests)
+        self.assertAlmostEqual(4 * 12500 / 9.663, result.requests_per_second, places=3) # over each window
+        self.assertTrue(abs(result.pctile_99 - 139.0) <= 3)
+
+
+    def test_failing_bee(self):
+        """
+        """
+        instances = local.up(3, self.root)
+        # the bee is gone by the time the swarm attacks
+        open(os.path.join(instances[1].public_dns_name, local.PARKED_FILENAME), 'w').close()
+        params = [dict(p, package_zip=self.package_zip) for p in self._params(instances)]
+
+        reports = bees._run_swarm(params, True, NullTracer())
+        self.assertTrue(isinstance(reports[1]['result'], IOError))
+
+        summary = bees._aggregate_reports(reports)
+        self.assertEqual((3, 1), (summary['bees'], summary['failed']))
+        self.assertAlmostEqual(2 * 12500.0, summary['result'].complete_requests)
+
+
+if __name__=='__main__':
+    unittest.main()
@@ -0,0 +1,184 @@
+"""
+"""
+import BaseHTTPServer
+import SocketServer
+import StringIO
+import random
+import threading
+import unittest
+
+from beeswithmachineguns import scenario
+from beeswithmachineguns.tester import ScenarioTester
+
+
+SCENARIO = {'flows': [
+    {'name': 'shop', 'weight': 3, 'steps': [
+        {'name': 'login', 'method': 'POST', 'url': 'http://127.0.0.1:%(port)i/login',
+         'body': 'user=bee${user}', 'extract': {'cart': r'cart=(\d+)'}},
+        {'name': 'cart', 'url': 'http://127.0.0.1:%(port)i/cart/${cart}'}]},
+    {'name': 'browse', 'steps': [
+        {'url': 'http://127.0.0.1:%(port)i/products?page=${session}', 'think': [0, 0.01]}]}]}
+
+
+def _spec(port):
+    return {'flows': [dict(f, steps=[dict(s, url=s['url'] % {'port': port}) for s in f['steps']])
+                      for f in SCENARIO['flows']]}
+
+
+class ShopHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """
+    Stands in for a shop which only shows a cart to the user who logged in
+    to it.
+    """
+
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        cart = body.split('bee')[1]
+        self._respond(200, 'cart=%s' % cart, [('Set-Cookie', 'sid=s%s; Path=/' % cart)])
+
+
+    def do_GET(self):
+        if self.path.startswith('/products'):
+            self._respond(200, 'products', chunked=True)
+        elif self.headers.get('Cookie') == 'sid=s%s' % self.path.split('/')[-1]:
+            self._respond(200, 'your cart')
+        else:
+            self._respond(403, 'not your cart')
+
+
+    def _respond(self, status, body, headers=(), chunked=False):
+        self.send_response(status)
+        for header in headers:
+            self.send_header(*header)
+        if chunked:
+            self.send_header('Transfer-Encoding', 'chunked')
+            self.end_headers()
+            self.wfile.write('%x\r\n%s\r\n0\r\n\r\n' % (len(body), body))
+        else:
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+
+    def log_message(self, *args):
+        pass
+
+
+class ShopServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+    # every virtual user connects at once
+    request_queue_size = 64
+
+
+class ScenarioTestCase(unittest.TestCase):
+    """
+    """
+
+    def test_compile(self):
+        """
+        """
+        plan = scenario.compile_scenario(_spec(8080))
+        login, cart, browse = plan['steps']
+        self.assertEqual([[3.0, [0, 1]], [4.0, [2]]], plan['flows'])
+        self.assertEqual(['shop/login', 'POST', 'http', '127.0.0.1'], login[:4])
+        self.assertEqual('GET', cart[scenario._METHOD])
+        self.assertEqual('browse/step 1', browse[scenario._KEY])
+        self.assertEqual([['cart', r'cart=(\d+)', 1]], login[scenario._EXTRACT])
+        self.assertEqual((0.0, 0.01), (browse[scenario._THINK_MIN], browse[scenario._THINK_MAX]))
+
+        path = browse[scenario._PATH]
+        self.assertEqual('/products?page=2', scenario.render(path, {'session': 2}))
+        self.assertEqual('/products?page=', scenario.render(path, {}))
+
+
+    def test_invalid(self):
+        """
+        """
+        for spec in ({}, {'flows': []},
+                     {'flows': [{'steps': []}]},
+                     {'flows': [{'weight': 0, 'steps': [{'url': 'http://a/'}]}]},
+                     {'flows': [{'steps': [{'url': '/relative'}]}]},
+                     {'flows': [{'steps': [{'url': 'http://${host}/'}]}]},
+                     {'flows': [{'steps': [{'url': 'http://a/', 'extract': {'x': '('}}]}]},
+                     {'flows': [{'steps': [{'url': 'http://a/', 'think': [2, 1]}]}]}):
+            self.assertRaises(ValueError, scenario.compile_scenario, spec)
+
+
+    def test_get_body(self):
+        """
+        """
+        head = 'HTTP/1.1 200 OK\r\nContent-Length: 5\r\n\r\n'
+        self.assertEqual(None, scenario._get_body(head + 'ab', False))
+        self.assertEqual((200, [('content-length', '5')], 'abcde'), scenario._get_body(head + 'abcde', False))
+
+        head = 'HTTP/1.1 200 OK\r\nTransfer-Encoding: chunked\r\n\r\n'
+        self.assertEqual(None, scenario._get_body(head + '3\r\nabc\r\n', False))
+        self.assertEqual('abcde', scenario._get_body(head + '3\r\nabc\r\n2\r\nde\r\n0\r\n\r\n', False)[2])
+
+        head = 'HTTP/1.0 500 Oops\r\n\r\n'
+        self.assertEqual(None, scenario._get_body(head + 'until', False))
+        self.assertEqual((500, [], 'until closed'), scenario._get_body(head + 'until closed', True))
+
+
+    def _run(self, keepalive):
+        server = ShopServer(('127.0.0.1', 0), ShopHandler)
+        thread = threading.Thread(target=server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        try:
+            runner = scenario.Runner(scenario.compile_scenario(_spec(server.server_address[1])), 20, requests=200,
+                                     keepalive=keepalive, rng=random.Random(1))
+            runner.run()
+        finally:
+            server.shutdown()
+        return runner
+
+
+    def test_runner(self):
+        """
+        """
+        for keepalive in (True, False):
+            runner = self._run(keepalive)
+            self.assertEqual(200, runner.issued)
+            self.assertEqual(200, runner.completed)
+            self.assertEqual(0, runner.failed)
+            # every cart was the logged in user's own
+            self.assertEqual(0, runner.non_2xx)
+            self.assertEqual(0, runner.abandoned)
+
+            steps = runner.steps.patterns
+            self.assertEqual(set(['shop/login', 'shop/cart', 'browse/step 1']), set(steps))
+            self.assertEqual(200, sum(e['count'] for e in steps.values()))
+            self.assertTrue(steps['shop/cart']['count'] <= steps['shop/login']['count'] <= steps['shop/cart']['count'] + 20)
+
+
+    def test_output(self):
+        """
+        """
+        runner = self._run(True)
+        out = StringIO.StringIO()
+        runner.print_results(out)
+
+        t = ScenarioTester()
+        result = t.parse_output(out.getvalue())
+        self.assertEqual(20, result.concurrency)
+        self.assertEqual(200, result.complete_requests)
+        self.assertEqual(200, t.parse_histogram(out.getvalue()).count)
+        steps = t.parse_steps(out.getvalue())
+        self.assertEqual(200, sum(e['count'] for e in steps.patterns.values()))
+        slowest = t.parse_exemplars(out.getvalue()).slowest[0]
+        self.assertTrue(0 <= slowest['phases']['ttfb'] <= slowest['ms'])
+
+        self.assertEqual('PYTHONPATH=bees.zip python -m beeswithmachineguns.scenario -c 20 -t 60 -k scenario.json',
+                         t.get_command(200, 20, True, None, '1M'))
+        self.assertEqual(None, t.parse_output('Traceback (most recent call last):'))
+
+        out = StringIO.StringIO()
+        scenario.print_steps(steps, out)
+        self.assertTrue('shop/cart\t' in out.getvalue())
+
+
+if __name__=='__main__':
+    unittest.main()
@@ -0,0 +1,167 @@
+"""
+"""
+import BaseHTTPServer
+import SocketServer
+import StringIO
+import os
+import tempfile
+import threading
+import time
+import unittest
+
+from beeswithmachineguns import corpus, schedule
+from beeswithmachineguns.tester import ScheduleTester
+
+
+URLS = ['http://example.com/%i' % k for k in range(50)]
+
+
+class RecordingHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """
+    Records the paths asked for, and when.
+    """
+
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self.server.seen.append((time.time(), self.path))
+        self.send_response(200)
+        self.send_header('Content-Length', '2')
+        self.end_headers()
+        self.wfile.write('ok')
+
+
+    def log_message(self, *args):
+        pass
+
+
+class RecordingServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+    request_queue_size = 64
+
+
+class ScheduleTestCase(unittest.TestCase):
+    """
+    """
+
+    def test_build(self):
+        """
+        """
+        schedules = schedule.build(URLS, 42, 3, 30, rate=300, order='sequential')
+        self.assertEqual(schedules, schedule.build(URLS, 42, 3, 30, rate=300, order='sequential'))
+        self.assertNotEqual(schedules, schedule.build(URLS, 43, 3, 30, rate=300, order='sequential'))
+        self.assertEqual([10, 10, 10], map(len, schedules))
+        # a stretch of the urls dealt in turn, so no two bees share one
+        urls = [url for s in schedules for offset, url in s]
+        self.assertEqual(30, len(set(urls)))
+        start = URLS.index(schedules[0][0][1])
+        self.assertEqual(URLS[(start + 1) % 50], schedules[1][0][1])
+        for s in schedules:
+            offsets = [offset for offset, url in s]
+            self.assertEqual(sorted(offsets), offsets)
+            # 100 a second on each bee
+            self.assertTrue(0.02 < offsets[-1] < 0.5)
+
+        schedules = schedule.build(URLS, 'abc', 2, 5)
+        self.assertEqual([3, 2], map(len, schedules))
+        self.assertEqual([0.0] * 5, [offset for s in schedules for offset, url in s])
+
+
+    def test_deal(self):
+        """
+        """
+        directory = tempfile.mkdtemp()
+        url_file = os.path.join(directory, 'urls.txt')
+        with open(url_file, 'w') as f:
+            f.write('# urls\n' + '\n'.join(URLS) + '\n')
+        corpus_file = os.path.join(directory, 'urls.corpus')
+        corpus.convert(url_file, corpus_file)
+
+        for order in ('random', 'sequential'):
+            plain = schedule.deal(url_file, 7, 2, 20, 10, order)
+            self.assertEqual(plain, schedule.build(URLS, 7, 2, 20, 10, order))
+            # a corpus of the same urls deals the same schedules
+            self.assertEqual(plain, schedule.deal(corpus_file, 7, 2, 20, 10, order))
+
+        empty = os.path.join(directory, 'empty.txt')
+        open(empty, 'w').close()
+        self.assertRaises(ValueError, schedule.deal, empty, 7, 2, 20)
+
+
+    def test_digest(self):
+        """
+        """
+        texts = map(schedule.dumps, schedule.build(URLS, 42, 3, 30, rate=300))
+        self.assertEqual(schedule.build(URLS, 42, 3, 30, rate=300), map(schedule.loads, texts))
+        digest = schedule.get_digest(texts)
+        self.assertEqual(64, len(digest))
+        self.assertEqual(digest, schedule.get_digest(map(schedule.dumps, schedule.build(URLS, 42, 3, 30, rate=300))))
+        # the same requests dealt to another swarm are another schedule
+        self.assertNotEqual(digest, schedule.get_digest(map(schedule.dumps, schedule.build(URLS, 42, 2, 30, rate=300))))
+        self.assertEqual('0.500000 http://a/?b=c d\n', schedule.dumps([(0.5, 'http://a/?b=c d')]))
+
+
+    def _play(self, entries, connections):
+        server = RecordingServer(('127.0.0.1', 0), RecordingHandler)
+        server.seen = []
+        thread = threading.Thread(target=server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        try:
+            origin = 'http://127.0.0.1:%i' % server.server_address[1]
+            player = schedule.Player([(offset, origin + path) for offset, path in entries], connections)
+            player.run()
+        finally:
+            server.shutdown()
+        return player, server.seen
+
+
+    def test_player(self):
+        """
+        """
+        entries = [(0.0, '/a'), (0.1, '/b?x=1'), (0.2, '/c'), (0.2, '/'), (0.3, '/d')]
+        player, seen = self._play(entries, 1)
+        self.assertEqual(5, player.completed)
+        self.assertEqual(0, player.non_2xx)
+        # in order, and at their offsets
+        self.assertEqual(['/a', '/b?x=1', '/c', '/', '/d'], [path for at, path in seen])
+        self.assertTrue(seen[-1][0] - seen[0][0] >= 0.29)
+        self.assertTrue(player.elapsed >= 0.3)
+        out = StringIO.StringIO()
+        player.print_results(out)
+        self.assertTrue('late_requests: ' in out.getvalue())
+
+
+    def test_unpaced(self):
+        """
+        """
+        # everything is due at once, so the requests queued behind the
+        # first wave are not late
+        player, seen = self._play([(0.0, '/%i' % k) for k in range(40)], 4)
+        self.assertEqual(40, player.completed)
+        self.assertEqual(set('/%i' % k for k in range(40)), set(path for at, path in seen))
+        self.assertFalse(player.paced)
+        self.assertEqual((0, 0.0), (player.late, player.max_lag))
+
+        out = StringIO.StringIO()
+        player.print_results(out)
+        self.assertTrue('late_requests: ' not in out.getvalue())
+        self.assertTrue('max_lag_ms: ' not in out.getvalue())
+
+
+    def test_command(self):
+        """
+        """
+        t = ScheduleTester()
+        self.assertEqual('PYTHONPATH=bees.zip python -m beeswithmachineguns.schedule -c 10 -t 60 -k schedule.txt',
+                         t.get_command(100, 10, True, None, '1M'))
+        output = ('complete_requests: 5.000000\nlate_requests: 2\nmax_lag_ms: 12.500000\n'
+                  'bees-schedule: 0123abcd\n')
+        self.assertEqual({'digest': '0123abcd', 'late': 2, 'max_lag_ms': 12.5}, t.parse_schedule(output))
+        self.assertEqual({'digest': '0123abcd', 'late': None, 'max_lag_ms': None},
+                         t.parse_schedule('complete_requests: 5.000000\nbees-schedule: 0123abcd\n'))
+        self.assertEqual(None, t.parse_schedule('complete_requests: 5.000000\n'))
+
+
+if __name__=='__main__':
+    unittest.main()
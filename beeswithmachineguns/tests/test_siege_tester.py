@@ -20,7 +20,14 @@ class SiegeTesterTestCase(unittest.TestCase):
         # since siege multiplies requests by concurrency, the tester 
         # divides the reps pre-emptively to achieve the desired number  
         self.assertEqual(
-            "siege -v -i -b -r 10 -c 10 \"http://www.example.com/\" | siege_calc", 
+            "siege -v -i -b -c 10 -r 10 \"http://www.example.com/\" | ./siege_calc",
+            t.get_command(100, 10, False, 'http://www.example.com/')
+            )
+
+        # keep-alive is asked for through siege's own rc file
+        self.assertEqual(
+            "printf 'connection = keep-alive\\n' > .bees-siegerc && "
+            "siege -R .bees-siegerc -v -i -b -c 10 -r 10 \"http://www.example.com/\" | ./siege_calc",
             t.get_command(100, 10, True, 'http://www.example.com/')
             )
 
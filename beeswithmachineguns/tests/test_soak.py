@@ -0,0 +1,164 @@
+"""
+"""
+import StringIO
+import os
+import shutil
+import socket
+import tempfile
+import unittest
+
+from paramiko import SSHException
+
+from beeswithmachineguns import bees, soak, tester
+from beeswithmachineguns.tracing import NullTracer
+
+
+def _read_file(name):
+    return open(os.path.join(os.path.dirname(__file__), name), 'rb').read()
+
+
+def _segment(index, start):
+    return soak.parse_segment(tester.ABTester(), _read_file('ab-output-1.txt'), index, start, start + 10.0)
+
+
+def _bee(instance_id, offset=0.0):
+    return {'instance_id': instance_id, 'offset': offset, 'acked': 0, 'state': soak.RUNNING}
+
+
+class SoakTestCase(unittest.TestCase):
+    """
+    """
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+
+
+    def tearDown(self):
+        shutil.rmtree(self.root)
+
+
+    def test_pull(self):
+        """
+        """
+        for index in (1, 2, 3):
+            soak._write_segment(self.root, _segment(index, 100.0 * index))
+
+        out = StringIO.StringIO()
+        soak.pull(1, 10, out, self.root)
+        segments, state = soak.parse_pull(out.getvalue())
+        self.assertEqual([2, 3], [s['index'] for s in segments])
+        self.assertEqual(soak.GONE, state)
+        self.assertEqual(['segment-000002.json', 'segment-000003.json'], sorted(os.listdir(self.root)))
+
+        with open(os.path.join(self.root, 'pid'), 'w') as f:
+            f.write(str(os.getpid()))
+        open(os.path.join(self.root, soak.DONE), 'w').close()
+        out = StringIO.StringIO()
+        soak.pull(2, 10, out, self.root)
+        self.assertEqual(([_segment(3, 300.0)], soak.DONE), soak.parse_pull(out.getvalue()))
+
+        # a done soak with segments still to pull is not finished
+        soak._write_segment(self.root, _segment(4, 400.0))
+        out = StringIO.StringIO()
+        soak.pull(2, 1, out, self.root)
+        segments, state = soak.parse_pull(out.getvalue())
+        self.assertEqual(([3], soak.RUNNING), ([s['index'] for s in segments], state))
+
+
+    def test_run(self):
+        """
+        """
+        bin_dir = os.path.join(self.root, 'bin')
+        os.mkdir(bin_dir)
+        with open(os.path.join(bin_dir, 'ab'), 'w') as f:
+            f.write('#!/bin/sh\ncat %s\n' % os.path.join(os.path.dirname(os.path.abspath(__file__)), 'ab-output-1.txt'))
+        os.chmod(os.path.join(bin_dir, 'ab'), 0755)
+
+        path = os.environ['PATH']
+        os.environ['PATH'] = bin_dir + os.pathsep + path
+        try:
+            soak.run({'engine': 'ab', 'num_requests': 100, 'concurrent_requests': 10, 'keepalive': False,
+                      'url': 'http://www.example.com/', 'connection': None, 'duration': 2, 'segment': 1}, self.root)
+        finally:
+            os.environ['PATH'] = path
+
+        out = StringIO.StringIO()
+        soak.pull(0, 10, out, self.root)
+        segments, state = soak.parse_pull(out.getvalue())
+        self.assertEqual(soak.DONE, state)
+        self.assertEqual([1, 2], [s['index'] for s in segments])
+        self.assertEqual(62500, segments[0]['result']['complete_requests'])
+        self.assertTrue(segments[1]['start'] >= segments[0]['start'] + 1.0)
+
+
+    def test_checkpoint(self):
+        """
+        """
+        checkpoint = soak.Checkpoint([_bee('a'), _bee('b', 5.0)], 100.0, 30, 10, 20)
+        checkpoint.add(0, _segment(1, 100.0))
+        checkpoint.add(0, _segment(2, 110.0))
+        checkpoint.add(1, _segment(1, 105.0))
+        # pulled again after the controller went away
+        checkpoint.add(0, _segment(1, 100.0))
+        checkpoint.settle()
+
+        # only the segment both bees reported is settled
+        self.assertEqual(1, len(checkpoint.timeline))
+        self.assertEqual([2], checkpoint.pending.keys())
+        row = checkpoint.timeline[0]
+        self.assertEqual((100.0, 110.0, 125000), (row['start'], row['end'], row['requests']))
+        self.assertAlmostEqual(12500.0, row['rps'])
+
+        filename = os.path.join(self.root, 'checkpoint')
+        checkpoint.save(filename)
+        checkpoint = soak.Checkpoint.load(filename)
+        checkpoint.add(1, _segment(2, 115.0))
+        checkpoint.set_state(0, soak.DONE)
+        checkpoint.set_state(1, soak.GONE)
+        self.assertTrue(checkpoint.finished)
+        checkpoint.settle()
+
+        summary = checkpoint.summary()
+        result = summary['result']
+        self.assertEqual((2, 1), (summary['bees'], summary['failed']))
+        self.assertEqual(250000, result.complete_requests)
+        self.assertEqual(20, result.concurrency)
+        self.assertEqual(20.0, result.time_taken)
+        self.assertAlmostEqual(12500.0, result.requests_per_second)
+        self.assertEqual(250000, summary['histogram'].count)
+        self.assertEqual(2, len(summary['segments']))
+
+
+    def test_coarsen(self):
+        """
+        """
+        rows = [{'start': 10.0 * i, 'end': 10.0 * (i + 1), 'requests': 100, 'errors': i, 'p99': i, 'rps': 10.0}
+                for i in range(5)]
+        coarse = soak.coarsen(rows, 2)
+        self.assertEqual(2, len(coarse))
+        self.assertEqual((0.0, 40.0, 400, 6, 3), tuple(coarse[0][k] for k in ('start', 'end', 'requests', 'errors', 'p99')))
+        self.assertEqual(rows[4]['start'], coarse[1]['start'])
+        self.assertEqual(rows, soak.coarsen(rows, 5))
+
+
+    def test_start_unreachable(self):
+        """
+        """
+        def connect(params):
+            if params['instance_id'] == 'i-1':
+                raise SSHException('No existing session')
+            raise socket.error('Connection refused')
+
+        original = bees._connect
+        bees._connect = connect
+        try:
+            reports = bees._run_swarm([{'i': i, 'instance_id': 'i-%i' % i} for i in range(2)], False, NullTracer(),
+                                      worker=bees._start_soak)
+        finally:
+            bees._connect = original
+        # neither bee started, and neither took the other down
+        self.assertEqual([None, None], [r['offset'] for r in reports])
+
+
+if __name__=='__main__':
+    unittest.main()
@@ -0,0 +1,44 @@
+"""
+"""
+import os
+import subprocess
+import sys
+import unittest
+
+
+# modules only the commands which talk to EC2, ssh or the bees need
+HEAVY_MODULES = ['boto', 'paramiko', 'multiprocessing', 'httplib', 'urllib2']
+
+# best-of-five seconds to import the command line; importing the heavy
+# modules alone takes about 0.25s
+IMPORT_BUDGET = 0.15
+
+
+def _run_python(code):
+    root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    env = dict(os.environ, PYTHONPATH=root, PYTHONWARNINGS='ignore')
+    return subprocess.check_output([sys.executable, '-c', code], env=env)
+
+
+class StartupTestCase(unittest.TestCase):
+    """
+    """
+
+    def test_light_imports(self):
+        """
+        """
+        for module in ('beeswithmachineguns.main', 'beeswithmachineguns.bees'):
+            loaded = _run_python('import sys, %s; print " ".join(sorted(sys.modules))' % module).split()
+            self.assertEqual([], [m for m in HEAVY_MODULES if m in loaded], module)
+
+
+    def test_import_time(self):
+        """
+        """
+        timings = [float(_run_python('import time; t = time.time(); import beeswithmachineguns.main; print time.time() - t'))
+                   for i in range(5)]
+        self.assertTrue(min(timings) < IMPORT_BUDGET, 'importing the command line took %.3fs' % min(timings))
+
+
+if __name__=='__main__':
+    unittest.main()
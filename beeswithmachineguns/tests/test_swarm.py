@@ -0,0 +1,129 @@
+"""
+"""
+import json
+import os
+import shutil
+import stat
+import sys
+import tempfile
+import unittest
+
+from beeswithmachineguns import bees, calibrate, local, planner
+
+
+class SwarmTestCase(unittest.TestCase):
+    """
+    """
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.local_root = local.LOCAL_ROOT
+        local.LOCAL_ROOT = os.path.join(self.root, 'local')
+        self.path = os.environ['PATH']
+        self.record = planner.record
+
+
+    def tearDown(self):
+        local.LOCAL_ROOT = self.local_root
+        os.environ['PATH'] = self.path
+        planner.record = self.record
+        shutil.rmtree(self.root)
+
+
+    def _fake_ab(self):
+        # the bees run `python` and `ab` from the PATH
+        bin_dir = os.path.join(self.root, 'bin')
+        os.mkdir(bin_dir)
+        os.symlink(sys.executable, os.path.join(bin_dir, 'python'))
+        ab = os.path.join(bin_dir, 'ab')
+        output = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'ab-output-1.txt')
+        open(ab, 'w').write('#!/bin/sh\ncat %s\n' % output)
+        os.chmod(ab, stat.S_IRWXU)
+        os.environ['PATH'] = '%s:%s' % (bin_dir, self.path)
+
+
+    def test_roster(self):
+        """
+        """
+        state_filename = os.path.join(self.root, 'bees')
+        swarm = bees.Swarm.load(state_filename)
+        self.assertEqual([], swarm.instance_ids)
+
+        swarm.up(2, None, None, None, None, 'ubuntu', None, False, local_bees=True)
+        loaded = bees.Swarm.load(state_filename)
+        self.assertEqual(['local-0', 'local-1'], loaded.instance_ids)
+        self.assertEqual((local.LOCAL_REGION, 'ubuntu', ''), (loaded.region, loaded.username, loaded.key_name))
+        self.assertEqual(['running', 'running'], [i.state for i in loaded.report()])
+
+        loaded.down()
+        self.assertFalse(os.path.exists(state_filename))
+        self.assertEqual([], loaded.instance_ids)
+        self.assertEqual(['terminated', 'terminated'],
+                         [i.state for i in local.get_instances(swarm.instance_ids)])
+
+
+    def test_join(self):
+        """
+        """
+        state_filename = os.path.join(self.root, 'bees')
+        swarm = bees.Swarm.load(state_filename)
+        swarm.up(2, None, None, None, None, 'ubuntu', None, False, local_bees=True)
+        # fresh bees join the bees on the roster, whether they fire or not
+        fresh = local.up(1, exclude=swarm.instance_ids)
+        swarm._join(fresh + local.get_instances(['local-1']))
+        self.assertEqual(['local-0', 'local-1', 'local-2'], bees.Swarm.load(state_filename).instance_ids)
+        swarm.down()
+
+
+    def test_in_memory(self):
+        """
+        """
+        swarm = bees.Swarm()
+        swarm.up(1, None, None, None, None, 'ubuntu', None, False, local_bees=True)
+        self.assertEqual(['local-0'], swarm.instance_ids)
+        self.assertEqual(['local'], os.listdir(self.root))
+
+        swarm.park()
+        self.assertEqual(None, swarm.attack('http://127.0.0.1/'))
+        swarm.down()
+
+
+    def test_history(self):
+        """
+        """
+        self._fake_ab()
+        swarm = bees.Swarm()
+        swarm.up(2, None, None, None, None, 'ubuntu', None, False, local_bees=True)
+
+        def record(entry, filename=None):
+            raise AssertionError('an in-memory swarm recorded its attack')
+        planner.record = record
+        self.assertTrue(swarm.attack('http://127.0.0.1/', n=20, c=2).result)
+
+        planner.record = self.record
+        swarm.history_filename = os.path.join(self.root, 'history')
+        swarm.attack('http://127.0.0.1/', n=20, c=2)
+        with open(swarm.history_filename) as f:
+            entry = json.loads(f.readline())
+        self.assertEqual(('ab', {'local': 2}), (entry['engine'], entry['types']))
+        swarm.down()
+
+
+    def test_profiles(self):
+        """
+        """
+        self._fake_ab()
+        swarm = bees.Swarm()
+        swarm.up(1, None, None, None, None, 'ubuntu', None, False, local_bees=True)
+        self.assertEqual(None, swarm.attack('http://127.0.0.1/', n=20, c=2).ceiling)
+
+        result = {'cpus': 2, 'engines': {'ab': calibrate._get_profile(
+            [{'concurrency': 10, 'rps': 5000.0, 'ms': 2.0, 'p99': 5}])}}
+        swarm.profile_filename = os.path.join(self.root, 'profiles')
+        calibrate.save_profiles({'local': calibrate.merge_profiles([result])}, swarm.profile_filename)
+        self.assertEqual(5000.0, swarm.attack('http://127.0.0.1/', n=20, c=2).ceiling)
+        swarm.down()
+
+
+if __name__=='__main__':
+    unittest.main()
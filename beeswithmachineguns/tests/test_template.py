@@ -0,0 +1,175 @@
+"""
+"""
+import BaseHTTPServer
+import SocketServer
+import json
+import os
+import random
+import tempfile
+import threading
+import unittest
+
+from beeswithmachineguns import scenario, template
+from beeswithmachineguns.tester import ABTester, H2LoadTester, SiegeTester, ConnectionModel
+
+
+ORDERS = 'order,customer,amount\n1,ann,10\n2,bob,20\n3,cid,30\n'
+
+TEMPLATE = {
+    'method': 'POST',
+    'headers': {'Content-Type': 'application/json', 'X-Order': '${order}'},
+    'body': '{"customer": "${customer}", "amount": ${amount}}',
+    'data': 'orders.csv',
+}
+
+
+def _write(directory, name, content):
+    filename = os.path.join(directory, name)
+    with open(filename, 'w') as f:
+        f.write(content)
+    return filename
+
+
+class OrderHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """
+    Records the orders posted to it.
+    """
+
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        self.server.orders.append((self.headers['X-Order'], json.loads(body)))
+        self.send_response(201)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+
+    def log_message(self, *args):
+        pass
+
+
+class OrderServer(SocketServer.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+    request_queue_size = 64
+
+
+class TemplateTestCase(unittest.TestCase):
+    """
+    """
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        _write(self.directory, 'orders.csv', ORDERS)
+        self.filename = _write(self.directory, 'order.json', json.dumps(TEMPLATE))
+
+
+    def test_renderer(self):
+        """
+        """
+        renderer = template.Renderer('POST', template.compile_text('/orders/${order}'), 'example.com',
+                                     [('X-Customer', template.compile_text('${customer}'))],
+                                     template.compile_text('amount=${amount}&note=${missing}'))
+        self.assertEqual('POST /orders/7 HTTP/1.1\r\nHost: example.com\r\nX-Customer: ann\r\n'
+                         'Content-Length: 17\r\n\r\namount=1000&note=',
+                         renderer.render({'order': '7', 'customer': 'ann', 'amount': '1000'}))
+        # rendering again fills the same slots afresh
+        self.assertEqual('POST /orders/8 HTTP/1.1\r\nHost: example.com\r\nX-Customer: bob\r\n'
+                         'Cookie: a=1; sid=2\r\nContent-Length: 15\r\n\r\namount=5&note=x',
+                         renderer.render({'order': '8', 'customer': 'bob', 'amount': '5', 'missing': 'x'},
+                                         {'sid': '2', 'a': '1'}))
+
+        renderer = template.Renderer('GET', ['/'], 'example.com', [], keepalive=False)
+        self.assertEqual('GET / HTTP/1.1\r\nHost: example.com\r\nConnection: close\r\n\r\n', renderer.render({}))
+
+
+    def test_data(self):
+        """
+        """
+        self.assertEqual(None, template.compile_data({}))
+        data = template.compile_data({'data': 'orders.csv', 'order': 'random'}, self.directory)
+        self.assertEqual(['order', 'customer', 'amount'], data['columns'])
+        self.assertEqual([['1', 'ann', '10'], ['2', 'bob', '20'], ['3', 'cid', '30']], data['rows'])
+        self.assertEqual('random', data['order'])
+        self.assertEqual(2, len(template.read_data(os.path.join(self.directory, 'orders.csv'), limit=2)[1]))
+
+        for name, content in [('ragged.csv', 'a,b\n1,2\n3\n'), ('empty.csv', 'a,b\n'), ('bad.csv', 'a-b\n1\n')]:
+            _write(self.directory, name, content)
+            self.assertRaises(ValueError, template.compile_data, {'data': name}, self.directory)
+        self.assertRaises(ValueError, template.compile_data, {'data': 'missing.csv'}, self.directory)
+        self.assertRaises(ValueError, template.compile_data, {'data': 'orders.csv', 'order': 'shuffled'}, self.directory)
+
+
+    def test_load(self):
+        """
+        """
+        plan = template.load(self.filename, 'http://example.com/orders')
+        self.assertEqual(1, len(plan['steps']))
+        self.assertTrue(template.has_variables(plan))
+        self.assertEqual(template.Request('POST', [('Content-Type', 'application/json'), ('X-Order', '2')],
+                                          '{"customer": "bob", "amount": 20}'),
+                         template.get_request(plan, 1))
+
+        _write(self.directory, 'body.json', '{"customer": "ann"}')
+        filename = _write(self.directory, 'static.json', json.dumps({'method': 'PUT', 'body_file': 'body.json'}))
+        plan = template.load(filename, 'http://example.com/orders')
+        self.assertFalse(template.has_variables(plan))
+        self.assertEqual(template.Request('PUT', [], '{"customer": "ann"}'), template.get_request(plan))
+
+        filename = _write(self.directory, 'list.json', '[]')
+        self.assertRaises(ValueError, template.load, filename, 'http://example.com/')
+        self.assertRaises(ValueError, template.load, self.filename, '/orders')
+
+
+    def test_commands(self):
+        """
+        """
+        connection = ConnectionModel(False, None, None, None, None)
+        post = template.Request('POST', [('Content-Type', 'application/json'), ('X-Order', '1')], '{}')
+        delete = template.Request('DELETE', [], None)
+
+        cmd = ABTester().get_command(100, 10, False, 'http://example.com/', connection=connection, request=post)
+        self.assertTrue("-p request.body -T application/json -H 'X-Order: 1' \"http://example.com/\"" in cmd)
+        cmd = ABTester().get_command(100, 10, False, 'http://example.com/', connection=connection, request=delete)
+        self.assertTrue('-m DELETE "http://example.com/"' in cmd)
+        self.assertTrue('-p' not in cmd)
+
+        cmd = SiegeTester().get_command(100, 10, False, 'http://example.com/', connection=connection, request=post)
+        self.assertTrue("-H 'X-Order: 1' \"http://example.com/ POST <request.body\"" in cmd)
+        cmd = SiegeTester().get_command(100, 10, False, 'http://example.com/', connection=connection, request=delete)
+        self.assertTrue('"http://example.com/ DELETE"' in cmd)
+
+        cmd = H2LoadTester().get_command(100, 10, False, 'http://example.com/', connection=connection, request=post)
+        self.assertTrue("-d request.body -H 'Content-Type: application/json'" in cmd)
+        self.assertTrue(':method' not in cmd)
+        cmd = H2LoadTester().get_command(100, 10, False, 'http://example.com/', connection=connection, request=delete)
+        self.assertTrue("-H ':method: DELETE'" in cmd)
+
+
+    def test_runner(self):
+        """
+        """
+        server = OrderServer(('127.0.0.1', 0), OrderHandler)
+        server.orders = []
+        thread = threading.Thread(target=server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        try:
+            plan = template.load(self.filename, 'http://127.0.0.1:%i/orders' % server.server_address[1])
+            runner = scenario.Runner(plan, 5, requests=30, rng=random.Random(1))
+            runner.run()
+        finally:
+            server.shutdown()
+        self.assertEqual(30, runner.completed)
+        self.assertEqual(0, runner.non_2xx)
+        self.assertEqual(30, len(server.orders))
+        customers = {'1': 'ann', '2': 'bob', '3': 'cid'}
+        for order, body in server.orders:
+            self.assertEqual(customers[order], body['customer'])
+            self.assertEqual(int(order) * 10, body['amount'])
+        # drawn in turn, so each row as often as the others
+        self.assertEqual([10, 10, 10], [[o for o, b in server.orders].count(k) for k in '123'])
+
+
+if __name__=='__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+"""
+"""
+import json
+import os
+import tempfile
+import unittest
+
+from beeswithmachineguns import tracing
+
+
+class TracerTestCase(unittest.TestCase):
+    """
+    """
+
+    def test_span(self):
+        """
+        """
+        t = tracing.Tracer(pid=3)
+
+        with t.span('ssh_connect', bee='2/i-1234'):
+            pass
+
+        self.assertEqual(1, len(t.spans))
+        span = t.spans[0]
+        self.assertEqual('ssh_connect', span['name'])
+        self.assertEqual(3, span['pid'])
+        self.assertEqual({'bee': '2/i-1234'}, span['args'])
+        self.assertTrue(span['duration'] >= 0.0)
+
+
+    def test_span_records_on_error(self):
+        """
+        """
+        t = tracing.Tracer()
+
+        try:
+            with t.span('attack'):
+                raise ValueError('boom')
+        except ValueError:
+            pass
+
+        self.assertEqual(['attack'], [s['name'] for s in t.spans])
+
+
+    def test_write_chrome_trace(self):
+        """
+        """
+        t = tracing.Tracer()
+        t.add('ec2_describe', 100.0, 0.25)
+        t.add('attack', 100.5, 1.0, bee='0/i-1')
+
+        fd, filename = tempfile.mkstemp()
+        os.close(fd)
+        try:
+            t.write(filename)
+            trace = json.load(open(filename))
+        finally:
+            os.remove(filename)
+
+        spans = [e for e in trace['traceEvents'] if e['ph'] == 'X']
+        self.assertEqual(2, len(spans))
+        self.assertEqual(100000000, spans[0]['ts'])
+        self.assertEqual(250000, spans[0]['dur'])
+        meta = [e for e in trace['traceEvents'] if e['ph'] == 'M']
+        self.assertEqual('controller', meta[0]['args']['name'])
+
+
+    def test_null_tracer(self):
+        """
+        """
+        t = tracing.NullTracer()
+        with t.span('attack'):
+            pass
+        self.assertEqual([], t.spans)
+
+
+if __name__=='__main__':
+    unittest.main()
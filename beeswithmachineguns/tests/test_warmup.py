@@ -0,0 +1,81 @@
+"""
+"""
+import BaseHTTPServer
+import random
+import threading
+import unittest
+
+from beeswithmachineguns import warmup
+
+
+class _Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        status = self.path == '/missing' and 404 or 200
+        self.send_response(status)
+        self.send_header('Content-Length', '2')
+        self.end_headers()
+        self.wfile.write('ok')
+
+    def log_message(self, *args):
+        pass
+
+
+class WarmupTestCase(unittest.TestCase):
+    """
+    """
+
+    def test_get_hosts(self):
+        """
+        """
+        self.assertEqual(
+            ['api.example.com', 'www.example.com'],
+            warmup.get_hosts([
+                'http://www.example.com/a',
+                'https://api.example.com:8443/b POST {"a": 1}',
+                'http://www.example.com/c',
+            ]))
+
+
+    def test_sample_urls(self):
+        """
+        """
+        urls = ['http://www.example.com/%i' % i for i in range(1000)]
+        sample = warmup.sample_urls(iter(urls), 10, random.Random(1))
+
+        self.assertEqual(10, len(sample))
+        self.assertEqual(10, len(set(sample)))
+        self.assertTrue(set(sample) <= set(urls))
+        self.assertEqual(urls[:3], warmup.sample_urls(iter(urls[:3]), 10))
+
+
+    def test_fire(self):
+        """
+        """
+        server = BaseHTTPServer.HTTPServer(('127.0.0.1', 0), _Handler)
+        thread = threading.Thread(target=server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        try:
+            base = 'http://127.0.0.1:%i' % server.server_port
+            summary = warmup.fire([base + '/', base + '/missing'], 20, 2)
+        finally:
+            server.shutdown()
+
+        self.assertEqual(20, summary['requests'])
+        self.assertEqual(0, summary['failed'])
+        self.assertEqual(10, summary['non_2xx'])
+        self.assertEqual(20, summary['histogram'].count)
+
+
+    def test_fire_unreachable(self):
+        """
+        """
+        summary = warmup.fire(['http://127.0.0.1:1/'], 3, 1)
+        self.assertEqual(3, summary['requests'])
+        self.assertEqual(3, summary['failed'])
+
+
+if __name__=='__main__':
+    unittest.main()
@@ -0,0 +1,111 @@
+"""
+Span-based phase timing for the controller and the bees.
+
+Spans are plain dicts so they can be returned from the multiprocessing
+workers in L{bees._attack} and merged into the controller's tracer.  A
+finished trace is written as Chrome trace event JSON, which can be loaded
+into chrome://tracing, Perfetto or any OTLP importer that accepts it.
+"""
+
+from contextlib import contextmanager
+import json
+import logging
+import time
+
+
+class Tracer(object):
+    """
+    Records named, timed spans grouped by process (pid) and lane (tid).
+
+    By convention the controller is pid 0 and bee i is pid i + 1.
+    """
+
+    def __init__(self, pid=0, tid=0):
+        self.pid = pid
+        self.tid = tid
+        self.spans = []
+
+
+    @contextmanager
+    def span(self, name, **args):
+        """
+        Time the enclosed block and record it as a span.
+
+        @param name: phase name, e.g. 'ssh_connect'
+        @type name: str
+        @param args: extra key/values stored with the span
+        """
+        t1 = time.time()
+        try:
+            yield args
+        finally:
+            self.add(name, t1, time.time() - t1, **args)
+
+
+    def add(self, name, start, duration, **args):
+        """
+        Record an already-measured span.
+
+        @param start: epoch seconds
+        @param duration: seconds
+        """
+        self.spans.append({
+            'name': name,
+            'pid': self.pid,
+            'tid': self.tid,
+            'start': start,
+            'duration': duration,
+            'args': args,
+        })
+
+
+    def extend(self, spans):
+        """
+        Merge spans recorded by another tracer (e.g. in a worker process).
+        """
+        self.spans.extend(spans or [])
+
+
+    def to_chrome_trace(self):
+        """
+        @return: dict in Chrome trace event format
+        """
+        events = []
+        names = {}
+        for s in self.spans:
+            names.setdefault(s['pid'], s['args'].get('bee', 'controller' if s['pid'] == 0 else 'bee %i' % (s['pid'] - 1)))
+            events.append({
+                'name': s['name'],
+                'ph': 'X',
+                'pid': s['pid'],
+                'tid': s['tid'],
+                'ts': int(s['start'] * 1e6),
+                'dur': int(s['duration'] * 1e6),
+                'args': s['args'],
+            })
+        for pid, name in names.items():
+            events.append({
+                'name': 'process_name',
+                'ph': 'M',
+                'pid': pid,
+                'args': {'name': name},
+            })
+        return {'traceEvents': events, 'displayTimeUnit': 'ms'}
+
+
+    def write(self, filename):
+        """
+        Write the trace to a local file as Chrome trace JSON.
+        """
+        with open(filename, 'w') as f:
+            json.dump(self.to_chrome_trace(), f)
+        logging.info('Wrote %i spans to %s' % (len(self.spans), filename))
+
+
+class NullTracer(Tracer):
+    """
+    Tracer that records nothing; used when tracing is disabled.
+    """
+
+    def add(self, name, start, duration, **args):
+        pass
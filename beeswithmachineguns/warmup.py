@@ -0,0 +1,201 @@
+"""
+Bee-side warm-up before an attack.
+
+Run on a bee (with the package staged as bees.zip) as
+
+    PYTHONPATH=bees.zip python -m beeswithmachineguns.warmup resolve TARGET
+    PYTHONPATH=bees.zip python -m beeswithmachineguns.warmup fire [options] TARGET
+
+where TARGET is either a url or a file of urls.  'resolve' looks up every
+target host once and prints a RESOLVED_MARKER line per host, so the bee
+can pin them.  'fire' sends a burst of requests over keep-alive
+connections and prints a summary after WARMUP_MARKER; it is never counted
+in the attack's results.
+"""
+
+from optparse import OptionParser
+import httplib
+import json
+import random
+import socket
+import sys
+import threading
+import time
+import urlparse
+
+from beeswithmachineguns.histogram import Histogram
+
+
+RESOLVED_MARKER = 'bees-resolved:'
+
+WARMUP_MARKER = 'bees-warmup:'
+
+
+def read_targets(target):
+    """
+    @param target: a url, or the name of a file of urls
+    @return: iterator over the target urls
+    """
+    if target.startswith('http://') or target.startswith('https://'):
+        return iter([target])
+    return (line.strip() for line in open(target) if line.strip())
+
+
+def get_hosts(urls):
+    """
+    @return: sorted list of the distinct hosts in the urls
+    """
+    hosts = set()
+    for url in urls:
+        hostname = urlparse.urlparse(url.split()[0]).hostname
+        if hostname:
+            hosts.add(hostname)
+    return sorted(hosts)
+
+
+def resolve(hosts):
+    """
+    @return: dict of host -> address, for the hosts which resolve
+    """
+    addresses = {}
+    for host in hosts:
+        try:
+            addresses[host] = socket.gethostbyname(host)
+        except socket.error:
+            pass
+    return addresses
+
+
+def sample_urls(urls, k, rng=random):
+    """
+    Reservoir sample of k urls, reading the urls only once.
+    """
+    sample = []
+    for n, url in enumerate(urls):
+        if n < k:
+            sample.append(url)
+        else:
+            j = rng.randint(0, n)
+            if j < k:
+                sample[j] = url
+    return sample
+
+
+class _Worker(threading.Thread):
+    """
+    Issues requests over one keep-alive connection per host.
+    """
+
+    def __init__(self, next_url, summary, lock, timeout):
+        threading.Thread.__init__(self)
+        self.daemon = True
+        self.next_url = next_url
+        self.summary = summary
+        self.lock = lock
+        self.timeout = timeout
+        self.connections = {}
+
+    def _connection(self, parts):
+        key = (parts.scheme, parts.netloc)
+        if key not in self.connections:
+            if parts.scheme == 'https':
+                self.connections[key] = httplib.HTTPSConnection(parts.netloc, timeout=self.timeout)
+            else:
+                self.connections[key] = httplib.HTTPConnection(parts.netloc, timeout=self.timeout)
+        return self.connections[key]
+
+    def run(self):
+        while True:
+            url = self.next_url()
+            if url is None:
+                break
+            parts = urlparse.urlparse(url.split()[0])
+            path = parts.path or '/'
+            if parts.query:
+                path += '?' + parts.query
+            t1 = time.time()
+            try:
+                connection = self._connection(parts)
+                connection.request('GET', path)
+                response = connection.getresponse()
+                response.read()
+                status = response.status
+            except (socket.error, httplib.HTTPException):
+                # start afresh next time
+                self.connections.pop((parts.scheme, parts.netloc), None)
+                status = None
+            ms = (time.time() - t1) * 1000
+            with self.lock:
+                self.summary['requests'] += 1
+                if status is None:
+                    self.summary['failed'] += 1
+                else:
+                    self.summary['histogram'].record(ms)
+                    if not 200 <= status < 300:
+                        self.summary['non_2xx'] += 1
+        for connection in self.connections.values():
+            connection.close()
+
+
+def fire(urls, requests, concurrency, timeout=10):
+    """
+    Send a burst of requests, cycling through urls.
+
+    @return: dict with the number of 'requests', 'failed' and 'non_2xx'
+        responses, the latency 'histogram' (a L{Histogram}) and 'elapsed'
+        seconds.
+    """
+    summary = {'requests': 0, 'failed': 0, 'non_2xx': 0, 'histogram': Histogram()}
+    if not urls or requests <= 0:
+        summary['elapsed'] = 0.0
+        return summary
+
+    lock = threading.Lock()
+    issued = [0]
+
+    def next_url():
+        with lock:
+            if issued[0] >= requests:
+                return None
+            issued[0] += 1
+            return urls[(issued[0] - 1) % len(urls)]
+
+    t1 = time.time()
+    workers = [_Worker(next_url, summary, lock, timeout) for n in range(max(1, min(concurrency, requests)))]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    summary['elapsed'] = time.time() - t1
+    return summary
+
+
+def main():
+    parser = OptionParser(usage='%prog resolve|fire [options] URL_OR_FILE')
+    parser.add_option('-n', '--requests', dest='requests', type='int', default=100)
+    parser.add_option('-c', '--concurrency', dest='concurrency', type='int', default=10)
+    parser.add_option('-s', '--sample', dest='sample', type='int', default=0,
+                      help='warm with a random sample of this many urls from the file')
+    (options, args) = parser.parse_args()
+
+    if len(args) != 2 or args[0] not in ('resolve', 'fire'):
+        parser.error('expected resolve or fire and a url or url file')
+    command, target = args
+
+    if command == 'resolve':
+        for host, address in sorted(resolve(get_hosts(read_targets(target))).items()):
+            print >> sys.stdout, '%s %s %s' % (RESOLVED_MARKER, address, host)
+        return
+
+    if options.sample:
+        urls = sample_urls(read_targets(target), options.sample)
+    else:
+        urls = [read_targets(target).next()]
+
+    summary = fire(urls, options.requests, options.concurrency)
+    summary['histogram'] = summary['histogram'].to_dict()
+    print >> sys.stdout, '%s %s' % (WARMUP_MARKER, json.dumps(summary))
+
+
+if __name__ == '__main__':
+    main()